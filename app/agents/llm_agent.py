@@ -1,17 +1,97 @@
 from dotenv import load_dotenv
-from openai import OpenAI
 import os
-import google.generativeai as genai
+import sys
 import logging
-from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_exception_type
-import requests
-import openai
-import google.api_core.exceptions
+import time
+from typing import Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_exception
+from app.agents import llm_clients
+from app.agents.model_router import model_router
+
+# Os SDKs dos provedores (openai, google.generativeai + protobuf/grpc) são pesados e
+# só são importados no primeiro uso, para não pesar no cold start da API e dos workers.
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Best-of-N na OpenAI: um único request com o parâmetro `n` (prompt cobrado uma vez).
+# False força chamadas paralelas, como no Gemini.
+OPENAI_NATIVE_N = os.getenv("OPENAI_NATIVE_N", "true").lower() in ("1", "true", "yes")
+
+
+def _is_transient_error(exc: BaseException) -> bool:
+    """
+    Erros temporários que justificam nova tentativa. Consulta apenas SDKs já
+    importados (uma exceção de um SDK implica que ele foi carregado).
+    """
+    openai_mod = sys.modules.get("openai")
+    if openai_mod and isinstance(exc, (openai_mod.APITimeoutError, openai_mod.APIConnectionError, openai_mod.RateLimitError)):
+        return True
+    google_exceptions = sys.modules.get("google.api_core.exceptions")
+    if google_exceptions and isinstance(exc, (google_exceptions.ServiceUnavailable, google_exceptions.ResourceExhausted)):
+        return True
+    requests_exceptions = sys.modules.get("requests.exceptions")
+    if requests_exceptions and isinstance(exc, requests_exceptions.RequestException):
+        return True
+    return False
+
+
+def _is_model_not_found(exc: BaseException) -> bool:
+    openai_mod = sys.modules.get("openai")
+    if openai_mod and isinstance(exc, openai_mod.NotFoundError):
+        return True
+    google_exceptions = sys.modules.get("google.api_core.exceptions")
+    return bool(google_exceptions and isinstance(exc, google_exceptions.NotFound))
+
+
+FINISH_REASON_LENGTH = "length"
+
+
+def normalize_finish_reason(reason) -> Optional[str]:
+    """finish_reason da OpenAI ("length", "stop"...) ou FinishReason do Gemini (MAX_TOKENS...) -> "length"/"stop"/..."""
+    if reason is None:
+        return None
+    name = str(getattr(reason, "name", None) or reason).lower()
+    if name == FINISH_REASON_LENGTH or name.endswith("max_tokens"):
+        return FINISH_REASON_LENGTH
+    return name.rsplit(".", 1)[-1]
+
+
+def stitch_continuation(partial: str, continuation: str, min_overlap: int = 8, max_overlap: int = 200) -> str:
+    """
+    Junta a resposta truncada com a continuação. Remove fences de Markdown que a LLM
+    costuma reabrir e o trecho repetido no início da continuação (maior sufixo de
+    `partial` que é prefixo da continuação, entre min_overlap e max_overlap caracteres;
+    sobreposições menores são coincidência, ex: uma aspa).
+    """
+    text = continuation
+    stripped = text.lstrip()
+    if stripped.startswith("```"):
+        text = stripped.split("\n", 1)[1] if "\n" in stripped else ""
+    for size in range(min(len(partial), len(text), max_overlap), min_overlap - 1, -1):
+        if partial.endswith(text[:size]):
+            text = text[size:]
+            break
+    return partial + text
+
+
+# (provedor, modelo) que rejeitaram response_format/response_schema: seguem sem saída estruturada
+_STRUCTURED_UNSUPPORTED: set = set()
+
+
+def _is_structured_output_rejected(exc: BaseException) -> bool:
+    """Erro 400 do provedor por causa do response_format (OpenAI) ou response_schema/mime type (Gemini)."""
+    message = str(exc).lower()
+    openai_mod = sys.modules.get("openai")
+    if openai_mod and isinstance(exc, openai_mod.BadRequestError):
+        return "response_format" in message or "json_schema" in message
+    google_exceptions = sys.modules.get("google.api_core.exceptions")
+    if google_exceptions and isinstance(exc, (google_exceptions.InvalidArgument, google_exceptions.BadRequest)):
+        return "response_schema" in message or "response_mime_type" in message or "json mode" in message
+    return False
+
 
 class InvalidModelError(Exception):  # Exceção personalizada
     """Exceção para modelos de LLM inválidos ou descontinuados."""
@@ -22,6 +102,7 @@ class LLMAgent:
     def __init__(self):
         self.openai_client = None
         self.gemini_client = None
+        self.gemini_clients = {}  # Modelo -> GenerativeModel (o roteador pode escolher outro modelo)
         self.chosen_llm = os.getenv("CHOSEN_LLM", "openai")
         self.openai_model = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo-0125")
         self.gemini_model = os.getenv("GEMINI_MODEL", "gemini-pro")
@@ -36,56 +117,42 @@ class LLMAgent:
                 logger.error("Variável de ambiente OPENAI_API_KEY não configurada.")
                 raise ValueError("OPENAI_API_KEY não configurada.")
             try:
-                self.openai_client = OpenAI(api_key=openai_api_key)
-                logger.info("Cliente OpenAI inicializado com sucesso.")
+                # Cliente do processo: o pool de conexões sobrevive às tasks (app.agents.llm_clients)
+                self.openai_client = llm_clients.openai_client(openai_api_key)
             except Exception as e:
                 logger.error(f"Erro ao inicializar cliente OpenAI: {e}", exc_info=True)
                 raise
         return self.openai_client
 
-    def get_gemini_client(self):
-        if self.gemini_client is None:
+    def get_gemini_client(self, model: Optional[str] = None):
+        model = model or self.gemini_model
+        if model not in self.gemini_clients:
             gemini_api_key = os.getenv("GEMINI_API_KEY")
             if not gemini_api_key:
                 logger.error("Variável de ambiente GEMINI_API_KEY não configurada.")
                 raise ValueError("GEMINI_API_KEY não configurada.")
             try:
-                genai.configure(api_key=gemini_api_key)
-                self.gemini_client = genai.GenerativeModel(self.gemini_model)
-                logger.info("Cliente Gemini inicializado com sucesso.")
+                self.gemini_clients[model] = llm_clients.gemini_model(gemini_api_key, model)
+                self.gemini_client = self.gemini_client or self.gemini_clients[model]
             except Exception as e:
                 logger.error(f"Erro ao inicializar cliente Gemini: {e}", exc_info=True)
                 raise
-        return self.gemini_client
-
-    @retry(
-        retry=retry_if_exception_type((
-            openai.APITimeoutError,
-            openai.APIConnectionError,
-            openai.RateLimitError,
-            google.api_core.exceptions.ServiceUnavailable,
-            google.api_core.exceptions.ResourceExhausted,
-            requests.exceptions.RequestException
-        )),
-        stop=stop_after_attempt(5),
-        wait=wait_fixed(2),
-        reraise=True
-    )
-    def generate_text(self, prompt_data: dict, llm_config: dict = None) -> dict:
-        logger.info(f"Gerando texto com LLM")
+        return self.gemini_clients[model]
 
+    def resolve_model(self, prompt_data: dict, llm_config: dict = None,
+                      task_type: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Provedor e modelo da chamada: os de llm_config, senão os padrões do ambiente; sem
+        modelo fixado, o roteador (app.agents.model_router) escolhe pelo `task_type`.
+        """
         chosen_llm = self.chosen_llm
         openai_model = self.openai_model
         gemini_model = self.gemini_model
-        temperature = self.temperature
         max_tokens = self.max_tokens
-        top_p = self.top_p
 
         if llm_config:
             chosen_llm = llm_config.get("llm", chosen_llm)
-            temperature = llm_config.get("temperature", temperature)
             max_tokens = llm_config.get("max_tokens", max_tokens)
-            top_p = llm_config.get("top_p", top_p)
             if chosen_llm == "openai":
                 model = llm_config.get("model")
                 if model is not None:
@@ -107,10 +174,44 @@ class LLMAgent:
             if gemini_model is None:
                 gemini_model = os.getenv("GEMINI_MODEL", "gemini-pro")
             model_to_use = gemini_model
-        
+
+        if model_router.enabled and not (llm_config or {}).get("model"):
+            route = model_router.route(task_type, chosen_llm, model_to_use, prompt_data, max_tokens)
+            chosen_llm, model_to_use = route.provider, route.model
+        return chosen_llm, model_to_use
+
+    @retry(
+        retry=retry_if_exception(_is_transient_error),
+        stop=stop_after_attempt(5),
+        wait=wait_fixed(2),
+        reraise=True
+    )
+    def generate_text(self, prompt_data: dict, llm_config: dict = None, n: int = 1, structured=None,
+                      task_type: Optional[str] = None) -> dict:
+        """
+        Gera o texto com a LLM configurada. Com `n` > 1 (apenas OpenAI), o retorno inclui
+        "candidates" com os N textos; "text" é sempre o primeiro.
+        `structured` (app.utils.structured_output.StructuredOutput) pede saída no JSON Schema da
+        resposta; "structured" no retorno indica se o provedor/modelo aceitou (senão, texto livre).
+        Sem modelo fixado em llm_config, o roteador (app.agents.model_router) escolhe provedor e
+        modelo pelo `task_type`; "provider" e "model" no retorno são os usados de fato.
+        """
+        logger.info(f"Gerando texto com LLM")
+
+        temperature = self.temperature
+        max_tokens = self.max_tokens
+        top_p = self.top_p
+        if llm_config:
+            temperature = llm_config.get("temperature", temperature)
+            max_tokens = llm_config.get("max_tokens", max_tokens)
+            top_p = llm_config.get("top_p", top_p)
+        chosen_llm, model_to_use = self.resolve_model(prompt_data, llm_config, task_type)
+
         formatted_prompt_log = f"Prompt Data para LLM ({chosen_llm}): {prompt_data}"
         logger.info(formatted_prompt_log)
+        use_structured = structured is not None and (chosen_llm, model_to_use) not in _STRUCTURED_UNSUPPORTED
 
+        started = time.monotonic()
         try:
             if chosen_llm == "openai":
                 client = self.get_openai_client()
@@ -123,22 +224,33 @@ class LLMAgent:
                     ],
                     temperature=temperature,
                     max_tokens=max_tokens,
-                    top_p=top_p
+                    top_p=top_p,
+                    **({"n": n} if n > 1 else {}),
+                    **({"response_format": structured.openai_response_format} if use_structured else {})
                 )
                 # teste de log.
                 logger.info(f"Resposta da OpenAI: {response.choices[0].message.content}")
 
                 prompt_tokens = response.usage.prompt_tokens
-                completion_tokens = response.usage.completion_tokens
+                completion_tokens = response.usage.completion_tokens  # Soma das N escolhas
 
-                return {
+                model_router.stats.record(chosen_llm, model_to_use, time.monotonic() - started, ok=True)
+                result = {
                     "text": response.choices[0].message.content,
                     "prompt_tokens": prompt_tokens,
                     "completion_tokens": completion_tokens,
+                    "finish_reason": normalize_finish_reason(response.choices[0].finish_reason),
+                    "structured": use_structured,
+                    "provider": chosen_llm,
+                    "model": model_to_use,
                 }
+                if n > 1:
+                    result["candidates"] = [choice.message.content for choice in response.choices]
+                    result["finish_reasons"] = [normalize_finish_reason(choice.finish_reason) for choice in response.choices]
+                return result
 
             elif chosen_llm == "gemini":
-                client = self.get_gemini_client()
+                client = self.get_gemini_client(model_to_use)
 
                 request = f"""
                 system: {prompt_data.get("system", "")}
@@ -168,10 +280,17 @@ class LLMAgent:
                     }
                 ]
 
-                generation_config = genai.types.GenerationConfig(
+                from google.generativeai.types import GenerationConfig
+                structured_config = {}
+                if use_structured:
+                    structured_config["response_mime_type"] = "application/json"
+                    if structured.gemini_schema is not None:  # Campos livres: só JSON mode
+                        structured_config["response_schema"] = structured.gemini_schema
+                generation_config = GenerationConfig(
                     candidate_count=1,
                     max_output_tokens=max_tokens,
-                    temperature=temperature
+                    temperature=temperature,
+                    **structured_config
                 )
 
                 response = client.generate_content(
@@ -183,26 +302,76 @@ class LLMAgent:
                 completion_tokens = client.count_tokens(response.text).total_tokens
 
                 logger.debug(f"Resposta do Gemini: {response.text}")
+                model_router.stats.record(chosen_llm, model_to_use, time.monotonic() - started, ok=True)
+                candidates = getattr(response, "candidates", None) or []
                 return {
                     "text": response.text,
                     "prompt_tokens": prompt_tokens,
                     "completion_tokens": completion_tokens,
+                    "finish_reason": normalize_finish_reason(candidates[0].finish_reason) if candidates else None,
+                    "structured": use_structured and structured.gemini_schema is not None,
+                    "provider": chosen_llm,
+                    "model": model_to_use,
                 }
             else:
                 error_message = f"LLM desconhecida: {chosen_llm}"
                 logger.error(error_message)
                 raise ValueError(error_message)
 
-        except openai.NotFoundError as e:  # Captura erro específico da OpenAI
-            error_message = f"Modelo OpenAI inválido/descontinuado: {model_to_use}. Erro: {e}"
-            logger.error(error_message, exc_info=True)
-            raise InvalidModelError(error_message) from e  # Lança exceção personalizada
-
-        except google.api_core.exceptions.NotFound as e:  # Captura erro específico do Gemini (se for NotFound)
-            error_message = f"Modelo Gemini inválido/descontinuado: {model_to_use}. Erro: {e}"
-            logger.error(error_message, exc_info=True)
-            raise InvalidModelError(error_message) from e
-
-        except Exception as e: #Exceções genericas
+        except Exception as e:
+            if use_structured and _is_structured_output_rejected(e):
+                _STRUCTURED_UNSUPPORTED.add((chosen_llm, model_to_use))
+                logger.warning(f"Modelo {model_to_use} ({chosen_llm}) não aceita saída estruturada; seguindo sem schema. Erro: {e}")
+                return self.generate_text(prompt_data, llm_config, n=n, task_type=task_type)
+            if chosen_llm in ("openai", "gemini"):
+                model_router.stats.record(chosen_llm, model_to_use, None, ok=False)
+            if _is_model_not_found(e):  # NotFound da OpenAI ou do Gemini
+                provider_name = "OpenAI" if chosen_llm == "openai" else "Gemini"
+                error_message = f"Modelo {provider_name} inválido/descontinuado: {model_to_use}. Erro: {e}"
+                logger.error(error_message, exc_info=True)
+                raise InvalidModelError(error_message) from e  # Lança exceção personalizada
+            #Exceções genericas
             logger.error(f"Erro ao gerar texto com LLM {chosen_llm}: {e}", exc_info=True)
             raise
+
+    def generate_candidates(self, prompt_data: dict, llm_config: dict = None, n: int = 2, structured=None,
+                            task_type: Optional[str] = None) -> dict:
+        """
+        Gera N candidatos concorrentes para o mesmo prompt (best-of-N), no tempo de parede de
+        uma chamada: parâmetro `n` da OpenAI ou N chamadas paralelas (Gemini). Candidatos que
+        falham são descartados; só lança a exceção se todos falharem.
+        Retorna {"texts": [...], "finish_reasons": [...], "prompt_tokens": total, "completion_tokens": total,
+        "provider": ..., "model": ...} (o modelo roteado, o mesmo para todos os candidatos).
+        """
+        # Roteia uma vez e fixa o modelo: todos os candidatos usam o mesmo provedor/modelo, e o
+        # `n` nativo só vale se o roteador ficou na OpenAI
+        provider, model = self.resolve_model(prompt_data, llm_config, task_type)
+        llm_config = {**(llm_config or {}), "llm": provider, "model": model}
+        if provider == "openai" and OPENAI_NATIVE_N:
+            response = self.generate_text(prompt_data, llm_config, n=n, structured=structured, task_type=task_type)
+            return {"texts": response.get("candidates") or [response["text"]],
+                    "finish_reasons": response.get("finish_reasons") or [response.get("finish_reason")],
+                    "prompt_tokens": response["prompt_tokens"], "completion_tokens": response["completion_tokens"],
+                    "provider": response.get("provider"), "model": response.get("model")}
+
+        with ThreadPoolExecutor(max_workers=n, thread_name_prefix="llm-candidate") as pool:
+            futures = [pool.submit(self.generate_text, prompt_data, llm_config, structured=structured, task_type=task_type)
+                       for _ in range(n)]
+        responses, errors = [], []
+        for future in futures:
+            try:
+                responses.append(future.result())
+            except Exception as e:
+                errors.append(e)
+        if not responses:
+            raise errors[0]
+        if errors:
+            logger.warning(f"{len(errors)} de {n} candidatos falharam; seguindo com {len(responses)}.")
+        return {
+            "texts": [response["text"] for response in responses],
+            "finish_reasons": [response.get("finish_reason") for response in responses],
+            "prompt_tokens": sum(response["prompt_tokens"] for response in responses),
+            "completion_tokens": sum(response["completion_tokens"] for response in responses),
+            "provider": responses[0].get("provider"),
+            "model": responses[0].get("model"),
+        }
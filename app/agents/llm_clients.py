@@ -0,0 +1,227 @@
+# app/agents/llm_clients.py
+"""
+Clientes dos provedores de LLM compartilhados pelo processo do worker.
+
+Os processadores (e o LLMAgent de cada um) são do processo do worker (consumer.get_processor),
+mas um LLMAgent ainda pode ser criado fora deles (testes, scripts, API). Antes, cada LLMAgent
+criava um `OpenAI` novo, com um pool httpx novo, e chamava `genai.configure`, que descarta os
+canais gRPC do Gemini; toda geração pagava TCP + TLS até o provedor. Aqui os clientes ficam em
+registros do processo, compartilhados por todos os LLMAgent:
+- OpenAI: um cliente por (chave, base URL). O pool httpx tem limites ajustáveis, keep-alive
+  e HTTP/2 quando o pacote `h2` está instalado (LLM_HTTP2=auto);
+- Gemini: `genai.configure` só roda quando a chave muda, e há um GenerativeModel por modelo.
+  O canal gRPC (HTTP/2) do cliente padrão do SDK passa a ser reaproveitado entre tasks.
+
+Com o prefork do Celery, os clientes são criados em cada processo filho
+(`warm_up` no worker_process_init) e o registro é esvaziado no fork, porque um pool
+herdado do pai compartilharia sockets entre processos.
+
+O tempo de conexão é medido no transporte httpx, pelo trace do httpcore:
+- llm_http_requests_total{provider, connection=new|reused};
+- llm_http_connect_seconds_total{provider}, com TCP + TLS das conexões novas;
+- llm_http_connect_saved_seconds_total{provider}: para cada chamada que reaproveitou
+  uma conexão, soma o tempo médio de conexão medido até então.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from dotenv import load_dotenv
+from app.utils import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20"))
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "10"))
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "90"))  # s ociosa antes de fechar
+LLM_HTTP_TIMEOUT = float(os.getenv("LLM_HTTP_TIMEOUT", "120"))
+LLM_HTTP_CONNECT_TIMEOUT = float(os.getenv("LLM_HTTP_CONNECT_TIMEOUT", "10"))
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "auto").lower()  # auto (se h2 instalado), true, false
+LLM_WARMUP = os.getenv("LLM_WARMUP", "true").lower() in ("1", "true", "yes")
+LLM_WARMUP_TIMEOUT = float(os.getenv("LLM_WARMUP_TIMEOUT", "5"))
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
+_lock = threading.Lock()
+_openai_clients: Dict[Tuple[str, Optional[str]], object] = {}
+_gemini_models: Dict[str, object] = {}
+_gemini_key: Optional[str] = None
+
+
+def _credential_key(api_key: str) -> str:
+    """Chave do registro sem guardar a credencial em claro."""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+def http2_enabled() -> bool:
+    if LLM_HTTP2 in ("0", "false", "no"):
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        if LLM_HTTP2 in ("1", "true", "yes"):
+            logger.warning("LLM_HTTP2 ativo, mas o pacote 'h2' não está instalado; usando HTTP/1.1 com keep-alive.")
+        return False
+
+
+class _ConnectStats:
+    """Média do tempo de conexão (TCP + TLS) por provedor, base da estimativa de economia."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals: Dict[str, Tuple[float, int]] = {}
+
+    def add(self, provider: str, seconds: float) -> None:
+        with self._lock:
+            total, count = self._totals.get(provider, (0.0, 0))
+            self._totals[provider] = (total + seconds, count + 1)
+
+    def average(self, provider: str) -> Optional[float]:
+        with self._lock:
+            total, count = self._totals.get(provider, (0.0, 0))
+            return total / count if count else None
+
+    def reset(self) -> None:
+        with self._lock:
+            self._totals.clear()
+
+
+connect_stats = _ConnectStats()
+
+
+class _ConnectTrace:
+    """Callback do trace do httpcore para uma requisição: mede o connect/TLS, se houver."""
+
+    def __init__(self):
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    def __call__(self, event: str, info: dict) -> None:
+        if event == "connection.connect_tcp.started":
+            self.started = time.perf_counter()
+        elif event in ("connection.connect_tcp.complete", "connection.start_tls.complete") and self.started is not None:
+            self.finished = time.perf_counter()
+
+    @property
+    def connect_seconds(self) -> Optional[float]:
+        return self.finished - self.started if self.started is not None and self.finished is not None else None
+
+
+def build_transport(provider: str, http2: Optional[bool] = None):
+    """Transporte httpx com pool ajustado e medição de conexões novas/reaproveitadas."""
+    import httpx
+
+    class _MeasuredTransport(httpx.HTTPTransport):
+        def handle_request(self, request):
+            trace = _ConnectTrace()
+            request.extensions = {**request.extensions, "trace": trace}
+            try:
+                return super().handle_request(request)
+            finally:
+                _record_connection(provider, trace.connect_seconds if trace.started is not None else None,
+                                   reused=trace.started is None)
+
+    return _MeasuredTransport(
+        limits=httpx.Limits(max_connections=LLM_HTTP_MAX_CONNECTIONS,
+                            max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+                            keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY),
+        http2=http2_enabled() if http2 is None else http2,
+    )
+
+
+def _record_connection(provider: str, connect_seconds: Optional[float], reused: bool) -> None:
+    metrics.increment("llm_http_requests_total", provider=provider, connection="reused" if reused else "new")
+    if reused:
+        average = connect_stats.average(provider)
+        if average:
+            metrics.increment("llm_http_connect_saved_seconds_total", average, provider=provider)
+    elif connect_seconds is not None:
+        connect_stats.add(provider, connect_seconds)
+        metrics.increment("llm_http_connect_seconds_total", connect_seconds, provider=provider)
+
+
+def openai_client(api_key: str, base_url: Optional[str] = OPENAI_BASE_URL):
+    """Cliente OpenAI do processo para (chave, base URL), criado no primeiro uso."""
+    key = (_credential_key(api_key), base_url)
+    client = _openai_clients.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _openai_clients.get(key)
+        if client is None:
+            import httpx
+            from openai import DefaultHttpxClient, OpenAI
+
+            http_client = DefaultHttpxClient(
+                transport=build_transport("openai"),
+                timeout=httpx.Timeout(LLM_HTTP_TIMEOUT, connect=LLM_HTTP_CONNECT_TIMEOUT),
+            )
+            client = OpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+            _openai_clients[key] = client
+            logger.info(f"Cliente OpenAI do processo criado (base_url={base_url or 'padrão'}, "
+                        f"http2={http2_enabled()}, keep-alive={LLM_HTTP_MAX_KEEPALIVE} conexões).")
+    return client
+
+
+def gemini_model(api_key: str, model: str):
+    """GenerativeModel do processo; `genai.configure` só roda quando a chave muda."""
+    global _gemini_key
+    credential = _credential_key(api_key)
+    with _lock:
+        if credential == _gemini_key and model in _gemini_models:
+            return _gemini_models[model]
+        import google.generativeai as genai
+
+        if credential != _gemini_key:
+            genai.configure(api_key=api_key)  # Recria o cliente padrão (e o canal gRPC) do SDK
+            _gemini_models.clear()
+            _gemini_key = credential
+        client = _gemini_models[model] = genai.GenerativeModel(model)
+        logger.info(f"Cliente Gemini ({model}) do processo criado.")
+        return client
+
+
+def warm_up(provider: Optional[str] = None) -> None:
+    """
+    Cria o cliente do provedor configurado e abre a primeira conexão antes da primeira task
+    (worker_process_init). Basta uma chamada barata da API pública do SDK (GET /models, sem
+    retentativas e com timeout curto) para o TCP + TLS; a resposta é descartada. Falhas só
+    geram aviso: a task criaria a conexão depois.
+    """
+    if not LLM_WARMUP:
+        return
+    provider = provider or os.getenv("CHOSEN_LLM", "openai")
+    try:
+        if provider == "openai" and os.getenv("OPENAI_API_KEY"):
+            client = openai_client(os.getenv("OPENAI_API_KEY"))
+            started = time.perf_counter()
+            # with_options copia o cliente, mas reaproveita o mesmo pool httpx
+            client.with_options(timeout=LLM_WARMUP_TIMEOUT, max_retries=0).models.list()
+            logger.info(f"Conexão com a OpenAI aquecida em {time.perf_counter() - started:.3f}s.")
+        elif provider == "gemini" and os.getenv("GEMINI_API_KEY"):
+            gemini_model(os.getenv("GEMINI_API_KEY"), os.getenv("GEMINI_MODEL", "gemini-pro"))
+    except Exception as e:
+        logger.warning(f"Aquecimento do cliente {provider} falhou (a conexão será aberta na primeira task): {e}")
+
+
+def reset() -> None:
+    """Esquece os clientes do processo (no fork e nos testes)."""
+    global _gemini_key
+    _openai_clients.clear()
+    _gemini_models.clear()
+    _gemini_key = None
+    connect_stats.reset()
+
+
+def _reset_after_fork() -> None:
+    global _lock
+    _lock = threading.Lock()
+    reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,222 @@
+# app/agents/model_router.py
+"""
+Roteamento de modelo por task_type, custo e latência, consultado pelo LLMAgent.generate_text
+quando a requisição não fixa o modelo (llm_config.model).
+
+Para cada chamada, os candidatos são os modelos do catálogo que:
+- são do provedor pedido (todos os provedores com MODEL_ROUTER_CROSS_PROVIDER=true);
+- atendem ao nível mínimo do task_type (MODEL_ROUTER_TASK_TIERS, opt-in, ex: "epic=high,wbs=high";
+  prompts acima de MODEL_ROUTER_LARGE_PROMPT_TOKENS pedem "high");
+- comportam o prompt estimado + max_tokens na janela de contexto;
+- não estão com taxa de erro recente acima de MODEL_ROUTER_MAX_ERROR_RATE.
+Vence a menor nota: custo estimado (tabela de custo do catálogo, em USD) + latência esperada
+(média móvel das chamadas recentes do processo, ou o valor inicial do catálogo) vezes
+MODEL_ROUTER_LATENCY_WEIGHT (USD por segundo), ajustada pela taxa de erro (retentativas).
+
+MODEL_ROUTER_MODE:
+- "shadow" (padrão): calcula e registra a decisão (log e métricas com o custo estimado da
+  rota e do modelo padrão), mas a chamada usa o modelo padrão. Serve para avaliar a política
+  com tráfego real antes de ativá-la;
+- "enforce": usa o modelo escolhido;
+- "off": não consulta o roteador.
+Modelos fora do catálogo não são comparáveis: a chamada segue com o modelo padrão.
+"""
+import json
+import logging
+import math
+import os
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from dotenv import load_dotenv
+from app.utils import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+MODEL_ROUTER_MODE = os.getenv("MODEL_ROUTER_MODE", "shadow").lower()
+MODEL_ROUTER_CROSS_PROVIDER = os.getenv("MODEL_ROUTER_CROSS_PROVIDER", "false").lower() in ("1", "true", "yes")
+MODEL_ROUTER_LATENCY_WEIGHT = float(os.getenv("MODEL_ROUTER_LATENCY_WEIGHT", "0.001"))  # USD por segundo
+MODEL_ROUTER_MAX_ERROR_RATE = float(os.getenv("MODEL_ROUTER_MAX_ERROR_RATE", "0.5"))
+MODEL_ROUTER_MIN_SAMPLES = int(os.getenv("MODEL_ROUTER_MIN_SAMPLES", "5"))  # Antes disso a taxa de erro não exclui
+MODEL_ROUTER_LARGE_PROMPT_TOKENS = int(os.getenv("MODEL_ROUTER_LARGE_PROMPT_TOKENS", "8000"))  # 0 = desligado
+MODEL_ROUTER_COMPLETION_RATIO = float(os.getenv("MODEL_ROUTER_COMPLETION_RATIO", "0.5"))  # Fração de max_tokens esperada
+MODEL_ROUTER_EWMA_ALPHA = float(os.getenv("MODEL_ROUTER_EWMA_ALPHA", "0.2"))
+MODEL_ROUTER_CHARS_PER_TOKEN = 4
+
+TIERS = ("standard", "high")
+
+
+class ModelSpec(NamedTuple):
+    provider: str
+    model: str
+    tier: str
+    input_cost: float  # USD por 1k tokens de prompt
+    output_cost: float  # USD por 1k tokens de resposta
+    context_tokens: int
+    latency: float  # Latência inicial estimada (s), até haver amostras
+
+
+DEFAULT_CATALOG: List[ModelSpec] = [
+    ModelSpec("openai", "gpt-4o-mini", "standard", 0.00015, 0.0006, 128000, 4.0),
+    ModelSpec("openai", "gpt-3.5-turbo-0125", "standard", 0.0005, 0.0015, 16385, 4.0),
+    ModelSpec("openai", "gpt-4o", "high", 0.0025, 0.01, 128000, 8.0),
+    ModelSpec("gemini", "gemini-1.5-flash", "standard", 0.000075, 0.0003, 1000000, 3.0),
+    ModelSpec("gemini", "gemini-pro", "standard", 0.0005, 0.0015, 30720, 5.0),
+    ModelSpec("gemini", "gemini-1.5-pro", "high", 0.00125, 0.005, 2000000, 8.0),
+]
+# Sem níveis por padrão: em enforce um nível "high" trocaria o modelo pedido (ex: gpt-3.5 -> gpt-4o)
+# e o custo subiria sem o operador pedir. Quem quiser opta via MODEL_ROUTER_TASK_TIERS.
+DEFAULT_TASK_TIERS: Dict[str, str] = {}
+
+
+def _load_catalog() -> List[ModelSpec]:
+    """MODEL_ROUTER_CATALOG: lista JSON de objetos com os campos de ModelSpec (substitui o padrão)."""
+    raw = os.getenv("MODEL_ROUTER_CATALOG")
+    if not raw:
+        return list(DEFAULT_CATALOG)
+    return [ModelSpec(**entry) for entry in json.loads(raw)]
+
+
+def _load_task_tiers() -> Dict[str, str]:
+    """MODEL_ROUTER_TASK_TIERS: "epic=high,wbs=high" (vazio = nenhum task_type exige nível)."""
+    tiers = dict(DEFAULT_TASK_TIERS)
+    for pair in os.getenv("MODEL_ROUTER_TASK_TIERS", "").split(","):
+        if "=" in pair:
+            task_type, tier = pair.split("=", 1)
+            tiers[task_type.strip()] = tier.strip()
+    return tiers
+
+
+class Route(NamedTuple):
+    provider: str
+    model: str
+    baseline_provider: str
+    baseline_model: str
+    estimated_cost: Optional[float]  # USD da rota; None se o modelo padrão está fora do catálogo
+    baseline_cost: Optional[float]
+    enforced: bool
+    reason: str
+
+    @property
+    def changed(self) -> bool:
+        return (self.provider, self.model) != (self.baseline_provider, self.baseline_model)
+
+
+class _Stats:
+    __slots__ = ("latency", "error_rate", "samples")
+
+    def __init__(self):
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.samples = 0
+
+
+class ModelStats:
+    """Latência e taxa de erro recentes por (provedor, modelo), em médias móveis exponenciais."""
+
+    def __init__(self, alpha: float = MODEL_ROUTER_EWMA_ALPHA):
+        self.alpha = alpha
+        self._stats: Dict[Tuple[str, str], _Stats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, provider: str, model: str, latency: Optional[float], ok: bool) -> None:
+        with self._lock:
+            stats = self._stats.setdefault((provider, model), _Stats())
+            stats.samples += 1
+            stats.error_rate += self.alpha * ((0.0 if ok else 1.0) - stats.error_rate)
+            if ok and latency is not None:
+                stats.latency = latency if stats.latency is None else stats.latency + self.alpha * (latency - stats.latency)
+            latency_value, error_rate = stats.latency, stats.error_rate
+        if latency_value is not None:
+            metrics.set_gauge("llm_model_latency_seconds", round(latency_value, 3), provider=provider, model=model)
+        metrics.set_gauge("llm_model_error_rate", round(error_rate, 3), provider=provider, model=model)
+
+    def get(self, provider: str, model: str) -> Tuple[Optional[float], float, int]:
+        """(latência média ou None, taxa de erro, amostras)."""
+        with self._lock:
+            stats = self._stats.get((provider, model))
+            return (stats.latency, stats.error_rate, stats.samples) if stats else (None, 0.0, 0)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+def estimate_prompt_tokens(prompt_data: dict) -> int:
+    chars = sum(len(prompt_data.get(key) or "") for key in ("system", "user", "assistant"))
+    return math.ceil(chars / MODEL_ROUTER_CHARS_PER_TOKEN)
+
+
+class ModelRouter:
+    def __init__(self, catalog: Optional[Iterable[ModelSpec]] = None, task_tiers: Optional[Dict[str, str]] = None,
+                 mode: str = MODEL_ROUTER_MODE, stats: Optional[ModelStats] = None,
+                 cross_provider: bool = MODEL_ROUTER_CROSS_PROVIDER):
+        self.catalog = {(spec.provider, spec.model): spec for spec in (catalog if catalog is not None else _load_catalog())}
+        self.task_tiers = task_tiers if task_tiers is not None else _load_task_tiers()
+        self.mode = mode
+        self.stats = stats or ModelStats()
+        self.cross_provider = cross_provider
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode in ("shadow", "enforce")
+
+    def required_tier(self, task_type: Optional[str], prompt_tokens: int) -> str:
+        tier = self.task_tiers.get(task_type or "", "standard")
+        if MODEL_ROUTER_LARGE_PROMPT_TOKENS and prompt_tokens > MODEL_ROUTER_LARGE_PROMPT_TOKENS:
+            tier = "high"
+        return tier
+
+    def estimate_cost(self, spec: ModelSpec, prompt_tokens: int, max_tokens: int) -> float:
+        completion_tokens = max_tokens * MODEL_ROUTER_COMPLETION_RATIO
+        return (prompt_tokens * spec.input_cost + completion_tokens * spec.output_cost) / 1000
+
+    def score(self, spec: ModelSpec, prompt_tokens: int, max_tokens: int) -> float:
+        latency, error_rate, _ = self.stats.get(spec.provider, spec.model)
+        expected = self.estimate_cost(spec, prompt_tokens, max_tokens) + MODEL_ROUTER_LATENCY_WEIGHT * (latency or spec.latency)
+        return expected / max(1.0 - error_rate, 0.05)  # Erros custam retentativas
+
+    def _eligible(self, spec: ModelSpec, provider: str, tier: str, needed_tokens: int) -> bool:
+        if not self.cross_provider and spec.provider != provider:
+            return False
+        if TIERS.index(spec.tier) < TIERS.index(tier) or spec.context_tokens < needed_tokens:
+            return False
+        _, error_rate, samples = self.stats.get(spec.provider, spec.model)
+        return samples < MODEL_ROUTER_MIN_SAMPLES or error_rate <= MODEL_ROUTER_MAX_ERROR_RATE
+
+    def route(self, task_type: Optional[str], provider: str, baseline_model: str, prompt_data: dict,
+              max_tokens: int) -> Route:
+        """Decisão para uma chamada; em shadow o provedor/modelo retornados são os do padrão."""
+        baseline = self.catalog.get((provider, baseline_model))
+        if baseline is None:
+            return Route(provider, baseline_model, provider, baseline_model, None, None, False, "fora do catálogo")
+        prompt_tokens = estimate_prompt_tokens(prompt_data)
+        tier = self.required_tier(task_type, prompt_tokens)
+        needed = prompt_tokens + max_tokens
+        candidates = [spec for spec in self.catalog.values() if self._eligible(spec, provider, tier, needed)]
+        if not candidates:
+            chosen, reason = baseline, "sem candidato elegível"
+        else:
+            chosen = min(candidates, key=lambda spec: self.score(spec, prompt_tokens, max_tokens))
+            reason = f"nível {tier}, ~{prompt_tokens} tokens de prompt"
+        enforce = self.mode == "enforce"
+        route = Route(
+            chosen.provider if enforce else provider, chosen.model if enforce else baseline_model,
+            provider, baseline_model,
+            self.estimate_cost(chosen, prompt_tokens, max_tokens), self.estimate_cost(baseline, prompt_tokens, max_tokens),
+            enforce, reason,
+        )
+        label = task_type or "default"
+        metrics.increment("model_router_decisions_total", task_type=label, mode=self.mode,
+                          routed=chosen.model, baseline=baseline_model)
+        metrics.increment("model_router_estimated_cost_usd_total", route.estimated_cost, task_type=label, kind="routed")
+        metrics.increment("model_router_estimated_cost_usd_total", route.baseline_cost, task_type=label, kind="baseline")
+        if (chosen.provider, chosen.model) != (provider, baseline_model):
+            logger.info(f"Roteador de modelo ({self.mode}) para {label}: {chosen.provider}/{chosen.model} em vez de "
+                        f"{provider}/{baseline_model} ({reason}; custo estimado {route.estimated_cost:.5f} vs "
+                        f"{route.baseline_cost:.5f} USD).")
+        return route
+
+
+model_router = ModelRouter()
@@ -1,7 +1,9 @@
 from celery import Celery
 import logging
 import os
+from typing import Any, Dict, Optional
 from dotenv import load_dotenv
+from app.utils import json_codec
 
 load_dotenv()
 logger = logging.getLogger(__name__)
@@ -15,20 +17,91 @@ logger.info(f"IN APP/CELERY.PY - CELERY_RESULT_BACKEND from env: '{backend_url}'
 if not broker_url:
     logger.critical("Variável de ambiente CELERY_BROKER_URL não definida!")
     raise ValueError("Variável de ambiente CELERY_BROKER_URL não definida!")
-if not backend_url:
-    logger.critical("Variável de ambiente CELERY_RESULT_BACKEND não definida!")
-    raise ValueError("Variável de ambiente CELERY_RESULT_BACKEND não definida!")
 
 
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_int(name: str, default: Optional[int]) -> Optional[int]:
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return int(value)
+
+
+def resolve_backend_url(url: Optional[str]) -> Optional[str]:
+    """
+    Modo sem result backend: CELERY_RESULT_BACKEND vazio, "disabled" ou "none".
+    As tasks retornam None e reportam status pela tabela `requests` e pela
+    notification_queue, então o backend é opcional.
+    """
+    if not url or url.strip().lower() in ("disabled", "none"):
+        return None
+    return url
+
+
+def build_celery_settings(result_backend: Optional[str]) -> Dict[str, Any]:
+    """
+    Configuração do Celery a partir do ambiente.
+
+    Variáveis (todas opcionais):
+        CELERY_TASK_IGNORE_RESULT: Não grava resultado das tasks (padrão: true).
+        CELERY_STORE_ERRORS_EVEN_IF_IGNORED: Grava falhas mesmo com ignore_result (padrão: false).
+        CELERY_RESULT_EXPIRES: Expiração dos resultados gravados, em segundos (padrão: 3600).
+        CELERY_TASK_TRACK_STARTED: Grava o estado STARTED (padrão: false; custa uma escrita por task).
+        CELERY_WORKER_PREFETCH_MULTIPLIER: Mensagens reservadas por processo (padrão: 1, tasks longas de LLM).
+        CELERY_TASK_ACKS_LATE: Ack só após a execução (padrão: true).
+        CELERY_VISIBILITY_TIMEOUT: Segundos até redelivery de mensagem não confirmada em brokers
+            com visibility timeout (Redis/SQS) (padrão: 3600; deve ser maior que a task mais longa).
+        CELERY_WORKER_MAX_TASKS_PER_CHILD: Recicla o processo após N tasks (padrão: 100).
+        CELERY_WORKER_MAX_MEMORY_PER_CHILD: Recicla o processo acima de N KiB de RSS (padrão: desativado).
+    """
+    # Sem backend não há onde gravar: força o modo sem resultado
+    ignore_result = _env_bool("CELERY_TASK_IGNORE_RESULT", True) or result_backend is None
+    acks_late = _env_bool("CELERY_TASK_ACKS_LATE", True)
+    settings: Dict[str, Any] = {
+        "task_ignore_result": ignore_result,
+        "task_store_errors_even_if_ignored": result_backend is not None and _env_bool("CELERY_STORE_ERRORS_EVEN_IF_IGNORED", False),
+        "task_track_started": result_backend is not None and _env_bool("CELERY_TASK_TRACK_STARTED", False),
+        "result_expires": _env_int("CELERY_RESULT_EXPIRES", 3600),
+        "worker_prefetch_multiplier": _env_int("CELERY_WORKER_PREFETCH_MULTIPLIER", 1),
+        "task_acks_late": acks_late,  # Para garantir que a task só seja removida da fila após sucesso ou falha explícita
+        # Com acks_late, uma task cujo processo morreu (OOM, SIGKILL) volta para a fila
+        "task_reject_on_worker_lost": acks_late,
+        "broker_transport_options": {"visibility_timeout": _env_int("CELERY_VISIBILITY_TIMEOUT", 3600)},
+        "worker_max_tasks_per_child": _env_int("CELERY_WORKER_MAX_TASKS_PER_CHILD", 100),
+        "worker_max_memory_per_child": _env_int("CELERY_WORKER_MAX_MEMORY_PER_CHILD", None),
+    }
+    if result_backend is None:
+        logger.warning("CELERY_RESULT_BACKEND não definido: Celery rodando sem result backend (resultados ignorados).")
+    return settings
+
+
+result_backend_url = resolve_backend_url(backend_url)
+
 celery_app = Celery(
     'tasks',
     broker=broker_url,
-    backend=backend_url,
+    backend=result_backend_url,
     include=['app.workers.consumer']
 )
 
-celery_app.conf.task_serializer = 'json'
-celery_app.conf.result_serializer = 'json'
-celery_app.conf.accept_content = ['json']
+# Serializer JSON rápido (orjson/msgspec com fallback para stdlib). Os dois formatos são
+# sempre aceitos; o de envio vem de CELERY_SERIALIZER e fica em 'json' por uma release:
+# workers antigos rejeitam 'fastjson' (ContentDisallowed). Rollout em duas fases: publicar
+# esta versão em todos os processos e só depois trocar CELERY_SERIALIZER para 'fastjson'.
+json_codec.register_celery_serializer()
+CELERY_SERIALIZER = os.getenv('CELERY_SERIALIZER', 'json')
+if CELERY_SERIALIZER not in ('json', json_codec.CELERY_SERIALIZER_NAME):
+    raise ValueError(f"CELERY_SERIALIZER inválido: '{CELERY_SERIALIZER}' (use 'json' ou '{json_codec.CELERY_SERIALIZER_NAME}')")
+celery_app.conf.task_serializer = CELERY_SERIALIZER
+celery_app.conf.result_serializer = CELERY_SERIALIZER
+celery_app.conf.accept_content = [json_codec.CELERY_SERIALIZER_NAME, 'json']
+celery_app.conf.result_accept_content = [json_codec.CELERY_SERIALIZER_NAME, 'json']
 celery_app.conf.timezone = 'UTC'
 celery_app.conf.enable_utc = True
+celery_app.conf.update(build_celery_settings(result_backend_url))
@@ -1,7 +1,11 @@
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session, sessionmaker
 from .models import Base
+from app.utils import json_codec
 from dotenv import load_dotenv
+from typing import Callable, Optional
+import threading
 import os
 import logging
 
@@ -10,15 +14,39 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    logger.error("Variável de ambiente DATABASE_URL não configurada.")  # LOG ANTES DE LANÇAR A EXCEÇÃO
-    raise ValueError("DATABASE_URL environment variable not set")
 
-print(f"Using database: {DATABASE_URL}")
+# O engine (e o driver psycopg2) é criado no primeiro uso, não no import: a API e os
+# workers sobem mais rápido e módulos que só precisam dos modelos não dependem do banco.
+_engine: Optional[Engine] = None
+_engine_lock = threading.Lock()
 
-# Adicionar timeout global (opcional)
-engine = create_engine(DATABASE_URL, connect_args={"options": "-c statement_timeout=5000"})  # Timeout de 5 segundos (5000 ms)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def get_engine() -> Engine:
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                if not DATABASE_URL:
+                    logger.error("Variável de ambiente DATABASE_URL não configurada.")  # LOG ANTES DE LANÇAR A EXCEÇÃO
+                    raise ValueError("DATABASE_URL environment variable not set")
+                logger.info(f"Using database: {make_url(DATABASE_URL).render_as_string(hide_password=True)}")
+                # Adicionar timeout global (opcional)
+                _engine = create_engine(
+                    DATABASE_URL,
+                    connect_args={"options": "-c statement_timeout=5000"},  # Timeout de 5 segundos (5000 ms)
+                    json_serializer=json_codec.dumps,  # Colunas JSON (tags, reflection, gherkin, wbs) via codec rápido
+                    json_deserializer=json_codec.loads,
+                )
+    return _engine
+
+
+class _LazySession(Session):
+    """Session que usa o engine padrão (criado sob demanda) quando nenhum bind é informado."""
+    def __init__(self, bind=None, **kwargs):
+        super().__init__(bind=bind if bind is not None else get_engine(), **kwargs)
+
+
+SessionLocal = sessionmaker(class_=_LazySession, autocommit=False, autoflush=False)
 
 
 def get_db():
@@ -29,5 +57,13 @@ def get_db():
         db.close()
 
 
-# def create_tables():
-#     Base.metadata.create_all(bind=engine)
+def get_session_factory() -> Callable[[], Session]:
+    """
+    Fábrica de sessões para código que roda fora do ciclo da dependência get_db (o
+    gerador do streaming da exportação, revalidações do cache de leitura em segundo
+    plano): dependências com yield são finalizadas antes do corpo da resposta ser enviado.
+    """
+    return SessionLocal
+
+
+# O esquema é gerenciado pelas migrações Alembic (migrations/): alembic upgrade head
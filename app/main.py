@@ -1,6 +1,6 @@
 from fastapi import FastAPI
-from app.routers import generation
-# from app.database import create_tables
+from app.routers import generation, export, hierarchy, history, search, usage, metrics
+from app.utils import cache_invalidation
 import logging
 from contextlib import asynccontextmanager  # <--- Importar asynccontextmanager
 
@@ -8,16 +8,13 @@ logger = logging.getLogger(__name__)
 
 @asynccontextmanager  # <--- Decorador
 async def lifespan(app: FastAPI):  # <--- Função lifespan, recebe a app como argumento
-    # Startup logic (create tables)
-    try:
-        pass
-        # create_tables()
-        # logger.info("Tabelas criadas com sucesso (se não existiam).")
-    except Exception as e:
-        pass
-        # logger.error(f"Erro ao criar tabelas: {e}", exc_info=True)
+    # Startup logic: o esquema do banco é aplicado pelas migrações (alembic upgrade head), não pela API
+    # Invalidação do cache de leitura (status/artefatos) pelos eventos de notificação
+    listener = cache_invalidation.start_listener()
     yield  # <---  Ponto de "pausa" entre startup e shutdown
-    # Shutdown logic (nothing to do here, in this case)
+    # Shutdown logic
+    if listener:
+        listener.stop()
 
 
 def create_app() -> FastAPI:
@@ -31,11 +28,32 @@ def create_app() -> FastAPI:
         openapi_tags=[{
             "name": "Generation",
             "description": "Endpoints para geracao de artefatos"
+        }, {
+            "name": "Export",
+            "description": "Exportacao (streaming NDJSON) dos artefatos de um projeto"
+        }, {
+            "name": "Hierarchy",
+            "description": "Subarvore e ancestrais de um artefato (indice de hierarquia)"
+        }, {
+            "name": "History",
+            "description": "Versoes anteriores de um artefato (incluindo as arquivadas)"
+        }, {
+            "name": "Search",
+            "description": "Busca por tags e Gherkin (indices GIN sobre JSONB)"
+        }, {
+            "name": "Usage",
+            "description": "Consumo de tokens por projeto, task_type e modelo; orcamentos por projeto"
         }],
         lifespan=lifespan,  # <--- Passa a função lifespan
     )
 
     # Rotas
     app.include_router(generation.router, prefix="/generation", tags=["generation"])
+    app.include_router(export.router, prefix="/export", tags=["export"])
+    app.include_router(hierarchy.router, prefix="/hierarchy", tags=["hierarchy"])
+    app.include_router(history.router, prefix="/history", tags=["history"])
+    app.include_router(search.router, prefix="/search", tags=["search"])
+    app.include_router(usage.router, prefix="/usage", tags=["usage"])
+    app.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
 
     return app
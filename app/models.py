@@ -1,12 +1,20 @@
-from sqlalchemy import Column, String, Integer, Text, DateTime, ForeignKey, JSON, Boolean
+from sqlalchemy import Column, String, Integer, Text, DateTime, ForeignKey, JSON, Boolean, Index, PrimaryKeyConstraint, UniqueConstraint, CheckConstraint, Identity, event, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import UUID, JSONB
 import enum
 
 Base = declarative_base()
 
+# JSONB no PostgreSQL (indexável com GIN, consultas com @>); JSON genérico nos demais bancos
+JSONDocument = JSON().with_variant(JSONB(), "postgresql")
+
+
+def gin_index(name: str, column: str) -> Index:
+    """Índice GIN jsonb_path_ops (consultas de contenção @>), criado só no PostgreSQL."""
+    return Index(name, column, postgresql_using="gin", postgresql_ops={column: "jsonb_path_ops"}).ddl_if(dialect="postgresql")
+
 
 class TaskType(enum.Enum):
     EPIC = "epic"
@@ -36,7 +44,7 @@ class Epic(Base):
     title = Column(String)
     project_id = Column(UUID(as_uuid=True), nullable=True, index=True)
     description = Column(Text)
-    tags = Column(JSON)
+    tags = Column(JSONDocument)
     version = Column(Integer, default=1)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -45,10 +53,15 @@ class Epic(Base):
     prompt_tokens = Column(Integer, nullable=True)
     completion_tokens = Column(Integer, nullable=True)
     summary = Column(Text, nullable=True)
-    reflection = Column(JSON, nullable=True)
+    reflection = Column(JSONDocument, nullable=True)
     work_item_id = Column(String, nullable=True)
     parent_board_id = Column(String, nullable=True)
 
+    __table_args__ = (
+        gin_index("ix_epics_tags_gin", "tags"),
+        gin_index("ix_epics_reflection_gin", "reflection"),
+    )
+
 
 class Feature(Base):
     __tablename__ = "features"
@@ -66,7 +79,7 @@ class Feature(Base):
     prompt_tokens = Column(Integer, nullable=True)
     completion_tokens = Column(Integer, nullable=True)
     summary = Column(Text, nullable=True)
-    reflection = Column(JSON, nullable=True)
+    reflection = Column(JSONDocument, nullable=True)
     work_item_id = Column(String, nullable=True)
     parent_board_id = Column(String, nullable=True)
     acceptance_criteria = Column(Text)
@@ -92,7 +105,7 @@ class UserStory(Base):
     prompt_tokens = Column(Integer, nullable=True)
     completion_tokens = Column(Integer, nullable=True)
     summary = Column(Text, nullable=True)
-    reflection = Column(JSON, nullable=True)
+    reflection = Column(JSONDocument, nullable=True)
     work_item_id = Column(String, nullable=True)
     parent_board_id = Column(String, nullable=True)
 
@@ -114,7 +127,7 @@ class Task(Base):
     prompt_tokens = Column(Integer, nullable=True)
     completion_tokens = Column(Integer, nullable=True)
     summary = Column(Text, nullable=True)
-    reflection = Column(JSON, nullable=True)
+    reflection = Column(JSONDocument, nullable=True)
     work_item_id = Column(String, nullable=True)
     parent_board_id = Column(String, nullable=True)
 
@@ -128,7 +141,7 @@ class Bug(Base):  # Não vamos alterar por enquanto
     project_id = Column(UUID(as_uuid=True), nullable=True, index=True)
     repro_steps = Column(Text)
     system_info = Column(Text)
-    tags = Column(JSON)
+    tags = Column(JSONDocument)
     version = Column(Integer, default=1)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -137,10 +150,12 @@ class Bug(Base):  # Não vamos alterar por enquanto
     prompt_tokens = Column(Integer, nullable=True)
     completion_tokens = Column(Integer, nullable=True)
     summary = Column(Text, nullable=True)
-    reflection = Column(JSON, nullable=True)
+    reflection = Column(JSONDocument, nullable=True)
     work_item_id = Column(String, nullable=True)
     parent_board_id = Column(String, nullable=True)
 
+    __table_args__ = (gin_index("ix_bugs_tags_gin", "tags"),)
+
 
 class Issue(Base):# Não vamos alterar por enquanto
     __tablename__ = "issues"
@@ -149,7 +164,7 @@ class Issue(Base):# Não vamos alterar por enquanto
     title = Column(String)
     project_id = Column(UUID(as_uuid=True), nullable=True, index=True)
     description = Column(Text)
-    tags = Column(JSON)
+    tags = Column(JSONDocument)
     version = Column(Integer, default=1)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -158,10 +173,12 @@ class Issue(Base):# Não vamos alterar por enquanto
     prompt_tokens = Column(Integer, nullable=True)
     completion_tokens = Column(Integer, nullable=True)
     summary = Column(Text, nullable=True)
-    reflection = Column(JSON, nullable=True)
+    reflection = Column(JSONDocument, nullable=True)
     work_item_id = Column(String, nullable=True)
     parent_board_id = Column(String, nullable=True)
 
+    __table_args__ = (gin_index("ix_issues_tags_gin", "tags"),)
+
 
 class PBI(Base):# Não vamos alterar por enquanto
     __tablename__ = "pbis"
@@ -170,7 +187,7 @@ class PBI(Base):# Não vamos alterar por enquanto
     title = Column(String)
     project_id = Column(UUID(as_uuid=True), nullable=True, index=True)
     description = Column(Text)
-    tags = Column(JSON)
+    tags = Column(JSONDocument)
     version = Column(Integer, default=1)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -179,27 +196,63 @@ class PBI(Base):# Não vamos alterar por enquanto
     prompt_tokens = Column(Integer, nullable=True)
     completion_tokens = Column(Integer, nullable=True)
     summary = Column(Text, nullable=True)
-    reflection = Column(JSON, nullable=True)
+    reflection = Column(JSONDocument, nullable=True)
     work_item_id = Column(String, nullable=True)
     parent_board_id = Column(String, nullable=True)
 
+    __table_args__ = (gin_index("ix_pbis_tags_gin", "tags"),)
+
+
+# created_at igual ao instante (48 bits iniciais, em ms) do request_id quando ele é um UUIDv7
+REQUEST_ID_CREATED_AT_CHECK = (
+    "request_id !~ '^[0-9a-f]{8}-[0-9a-f]{4}-7[0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12}$' "
+    "OR created_at = to_timestamp(0) + ('x' || translate(left(request_id, 13), '-', ''))::bit(48)::bigint "
+    "* interval '1 millisecond'"
+)
+
 
 class Request(Base):
+    """
+    Particionada por mês de created_at no PostgreSQL (partições e retenção em
+    app.utils.request_retention). A chave de partição precisa estar na PK e nas
+    constraints únicas. request_id é um UUIDv7 gravado com created_at igual ao seu
+    instante (app.utils.request_ids), então (request_id, created_at) é único por
+    request_id e as buscas por request_id podam para uma partição.
+    """
     __tablename__ = "requests"
-    id = Column(Integer, primary_key=True)
-    request_id = Column(String, unique=True)
+    id = Column(Integer, Identity(), primary_key=True)
+    request_id = Column(String, nullable=False)
     parent = Column(Integer)
     parent_type = Column(String(50), nullable=True)
     project_id = Column(UUID(as_uuid=True), nullable=True, index=True)
     task_type = Column(String)
     status = Column(String)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
     processed_at = Column(DateTime(timezone=True))
     error_message = Column(Text)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     artifact_type = Column(String)
     artifact_id = Column(Integer)
 
+    __table_args__ = (
+        UniqueConstraint("request_id", "created_at", name="uq_requests_request_id"),
+        # UUIDv7 só com o created_at do próprio instante (IDs antigos, não-v7, ficam de fora)
+        CheckConstraint(REQUEST_ID_CREATED_AT_CHECK, name="ck_requests_request_id_created_at").ddl_if(dialect="postgresql"),
+        # Polling de status (/status e início das tasks) só com index-only scan
+        Index("ix_requests_status_poll", "request_id",
+              postgresql_include=["status", "parent", "task_type", "created_at", "processed_at", "project_id"]),
+        # Poda por status e idade
+        Index("ix_requests_status_created_at", "status", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+
+@event.listens_for(Request.__table__, "after_create")
+def _create_request_partitions(target, connection, **kw):
+    """Sem partições a tabela particionada recusa qualquer INSERT: cria a DEFAULT e as dos meses correntes."""
+    from app.utils import request_retention  # Evita import circular (request_retention importa os modelos)
+    request_retention.create_partitions(connection)
+
 
 class TestCase(Base):
     __tablename__ = "test_cases"
@@ -208,7 +261,7 @@ class TestCase(Base):
     parent_type = Column(String(50), nullable=True)
     title = Column(String)  # Adicionado title para o caso de teste
     project_id = Column(UUID(as_uuid=True), nullable=True, index=True)
-    gherkin = Column(JSON)  # Agora armazena o Gherkin como JSON
+    gherkin = Column(JSONDocument)  # Agora armazena o Gherkin como JSON
     script = Column(Text, nullable=True)  # <-- Adicionado: Campo para o script de automação
     version = Column(Integer, default=1)
     is_active = Column(Boolean, default=True)
@@ -218,13 +271,19 @@ class TestCase(Base):
     prompt_tokens = Column(Integer, nullable=True)
     completion_tokens = Column(Integer, nullable=True)
     summary = Column(Text, nullable=True)
-    reflection = Column(JSON, nullable=True)
+    reflection = Column(JSONDocument, nullable=True)
     work_item_id = Column(String, nullable=True)
     parent_board_id = Column(String, nullable=True)
     priority = Column(String)
 
     actions = relationship("Action", back_populates="test_case")  # Relacionamento 1:N com Action
 
+    __table_args__ = (
+        # O parser grava o Gherkin como string JSON; `#>> '{}'` + ::jsonb normaliza string ou objeto
+        Index("ix_test_cases_gherkin_gin", text("((gherkin #>> '{}')::jsonb) jsonb_path_ops"),
+              postgresql_using="gin").ddl_if(dialect="postgresql"),
+    )
+
 
 # A tabela Gherkin foi removida
 class Action(Base):
@@ -244,7 +303,7 @@ class WBS(Base):
     parent = Column(Integer, ForeignKey('epics.id'))  # Chave estrangeira para Epic
     parent_type = Column(String(50), nullable=True)
     project_id = Column(UUID(as_uuid=True), nullable=True, index=True)
-    wbs = Column(JSON)  # Armazena a WBS como JSON
+    wbs = Column(JSONDocument)  # Armazena a WBS como JSON
     version = Column(Integer, default=1)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -253,6 +312,117 @@ class WBS(Base):
     prompt_tokens = Column(Integer, nullable=True)
     completion_tokens = Column(Integer, nullable=True)
     summary = Column(Text, nullable=True)
-    reflection = Column(JSON, nullable=True)
+    reflection = Column(JSONDocument, nullable=True)
     work_item_id = Column(String, nullable=True)
     parent_board_id = Column(String, nullable=True)
+
+    __table_args__ = (gin_index("ix_wbs_wbs_gin", "wbs"),)
+
+
+class OutboxMessage(Base):
+    """
+    Outbox transacional das notificações: gravada na mesma transação dos artefatos e do
+    status da requisição, e publicada no RabbitMQ pelo relay (app.workers.outbox_relay).
+    """
+    __tablename__ = "notification_outbox"
+    id = Column(Integer, primary_key=True)
+    request_id = Column(String, index=True)
+    queue = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    published_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # O relay só lê mensagens pendentes, em ordem de id
+        Index("ix_notification_outbox_pending", "id", postgresql_where=published_at.is_(None)),
+    )
+
+
+class ArtifactHierarchy(Base):
+    """
+    Closure table da hierarquia de artefatos, chaveada por (tipo, id): uma linha para cada par
+    (ancestral, descendente), incluindo o próprio nó (depth=0). Subárvore e cadeia de ancestrais
+    saem numa única consulta. Mantida por app.utils.hierarchy.
+    """
+    __tablename__ = "artifact_hierarchy"
+    ancestor_type = Column(String(50), nullable=False)
+    ancestor_id = Column(Integer, nullable=False)
+    descendant_type = Column(String(50), nullable=False)
+    descendant_id = Column(Integer, nullable=False)
+    depth = Column(Integer, nullable=False)
+    is_active = Column(Boolean, default=True, nullable=False)  # is_active do descendente
+
+    __table_args__ = (
+        PrimaryKeyConstraint("ancestor_type", "ancestor_id", "descendant_type", "descendant_id"),
+        Index("ix_artifact_hierarchy_descendant", "descendant_type", "descendant_id", "depth"),
+    )
+
+
+class ArtifactHistory(Base):
+    """
+    Versões inativas arquivadas (movidas das tabelas quentes pelo app.workers.history_archiver).
+    Particionada por tipo de artefato no PostgreSQL (partições criadas por
+    app.utils.history.ensure_partitions). `data` guarda a linha original completa
+    (TestCases com as ações em data["actions"]).
+    """
+    __tablename__ = "artifact_history"
+    artifact_type = Column(String(50), nullable=False)
+    artifact_id = Column(Integer, nullable=False)  # ID original na tabela quente
+    version = Column(Integer)
+    project_id = Column(UUID(as_uuid=True), nullable=True)
+    parent = Column(Integer, nullable=True)  # Pai hierárquico (team_project_id no Epic)
+    parent_type = Column(String(50), nullable=True)
+    data = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True))
+    deactivated_at = Column(DateTime(timezone=True))
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        PrimaryKeyConstraint("artifact_type", "artifact_id"),
+        Index("ix_artifact_history_lineage", "artifact_type", "parent_type", "parent", "version"),
+        Index("ix_artifact_history_project", "project_id"),
+        {"postgresql_partition_by": "LIST (artifact_type)"},
+    )
+
+
+@event.listens_for(ArtifactHistory.__table__, "after_create")
+def _create_history_partitions(target, connection, **kw):
+    from app.utils import history  # Evita import circular
+    history.create_partitions(connection)
+
+
+class TokenUsage(Base):
+    """
+    Ledger de consumo de tokens: uma linha por requisição concluída, gravada na mesma
+    transação dos artefatos (só inserções, sem disputa de lock num contador por projeto).
+    Agregado por projeto, task_type e modelo em app.utils.token_budget.
+    """
+    __tablename__ = "token_usage"
+    id = Column(Integer, primary_key=True)
+    request_id = Column(String, nullable=False)
+    project_id = Column(UUID(as_uuid=True), nullable=True)  # None: requisição sem projeto resolvido
+    task_type = Column(String(50), nullable=False)
+    provider = Column(String(20), nullable=False)
+    model = Column(String(100), nullable=False)
+    prompt_tokens = Column(Integer, default=0, nullable=False)
+    completion_tokens = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        # Consumo do período corrente na admissão e relatório por projeto
+        Index("ix_token_usage_project_created", "project_id", "created_at",
+              postgresql_include=["prompt_tokens", "completion_tokens"]),
+        Index("ix_token_usage_created", "created_at"),
+    )
+
+
+class ProjectBudget(Base):
+    """Orçamento de tokens por projeto (sem linha: TOKEN_BUDGET_DEFAULT)."""
+    __tablename__ = "project_budgets"
+    project_id = Column(UUID(as_uuid=True), primary_key=True)
+    token_limit = Column(Integer, nullable=False)  # Tokens (prompt + completion) por período; 0 = sem limite
+    period = Column(String(10), default="month", nullable=False)  # day | month
+    action = Column(String(10), default="reject", nullable=False)  # reject | queue
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
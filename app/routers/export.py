@@ -0,0 +1,173 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Table, and_, func, literal, select, union_all
+from sqlalchemy.orm import Session
+from app.database import get_session_factory
+from app.models import TaskType, Epic, Feature, UserStory, Task, TestCase, Action, WBS, Bug, Issue, PBI
+from app.utils import json_codec
+from datetime import datetime
+from typing import Callable, Iterator, List, Optional, Tuple
+from uuid import UUID
+import hashlib
+import logging
+import os
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+EXPORT_YIELD_PER = int(os.getenv("EXPORT_YIELD_PER", "500"))  # Linhas por fetch do cursor server-side
+EXPORT_CHUNK_BYTES = int(os.getenv("EXPORT_CHUNK_BYTES", str(64 * 1024)))  # Tamanho aproximado de cada chunk HTTP
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Ordem de exportação: pais antes dos filhos, para o cliente poder aplicar linha a linha
+EXPORT_MODELS: List[Tuple[TaskType, type]] = [
+    (TaskType.EPIC, Epic),
+    (TaskType.FEATURE, Feature),
+    (TaskType.USER_STORY, UserStory),
+    (TaskType.TASK, Task),
+    (TaskType.TEST_CASE, TestCase),
+    (TaskType.WBS, WBS),
+    (TaskType.BUG, Bug),
+    (TaskType.ISSUE, Issue),
+    (TaskType.PBI, PBI),
+]
+
+
+def _changed_at(table: Table):
+    # updated_at só é preenchido em updates; itens nunca alterados usam created_at
+    return func.coalesce(table.c.updated_at, table.c.created_at)
+
+
+def _filters(table: Table, project_id: UUID, since: Optional[datetime]) -> list:
+    conditions = [table.c.project_id == project_id]
+    if since is None:
+        conditions.append(table.c.is_active == True)
+    else:
+        # Sync incremental: inclui itens desativados desde `since` para o cliente removê-los
+        conditions.append(_changed_at(table) > since)
+    return conditions
+
+
+def compute_export_version(db: Session, project_id: UUID, since: Optional[datetime]) -> Tuple[str, Optional[datetime]]:
+    """
+    ETag e watermark da exportação numa única consulta (UNION ALL de agregados por tabela).
+    Considera todas as linhas do projeto (ativas ou não): desativar, criar ou reprocessar
+    um item muda count/max(id)/max(updated_at) e, portanto, o ETag.
+    """
+    aggregates = [
+        select(
+            literal(task_type.value).label("task_type"),
+            func.count().label("total"),
+            func.max(model.__table__.c.id).label("max_id"),
+            func.max(_changed_at(model.__table__)).label("changed_at"),
+        ).where(model.__table__.c.project_id == project_id)
+        for task_type, model in EXPORT_MODELS
+    ]
+    rows = db.execute(union_all(*aggregates)).all()
+    digest = hashlib.sha1(f"{project_id}|{since.isoformat() if since else ''}".encode())
+    watermark: Optional[datetime] = None
+    for row in sorted(rows, key=lambda r: r.task_type):
+        digest.update(f"|{row.task_type}:{row.total}:{row.max_id}:{row.changed_at}".encode())
+        if row.changed_at is not None and (watermark is None or row.changed_at > watermark):
+            watermark = row.changed_at
+    return f'W/"{digest.hexdigest()}"', watermark
+
+
+def _stream_table(db: Session, task_type: TaskType, model: type, project_id: UUID, since: Optional[datetime]) -> Iterator[dict]:
+    table = model.__table__
+    stmt = select(table).where(*_filters(table, project_id, since)).order_by(table.c.id)
+    result = db.execute(stmt.execution_options(yield_per=EXPORT_YIELD_PER))
+    for row in result.mappings():
+        yield {"type": task_type.value, "data": dict(row)}
+
+
+def _stream_test_cases(db: Session, project_id: UUID, since: Optional[datetime]) -> Iterator[dict]:
+    """TestCases com as ações ativas embutidas: um único JOIN ordenado, agrupado em streaming."""
+    tc = TestCase.__table__
+    action = Action.__table__
+    stmt = (
+        select(tc, action.c.id.label("action_id"), action.c.step.label("action_step"),
+               action.c.expected_result.label("action_expected_result"))
+        .select_from(tc.outerjoin(action, and_(action.c.test_case_id == tc.c.id, action.c.is_active == True)))
+        .where(*_filters(tc, project_id, since))
+        .order_by(tc.c.id, action.c.id)
+    )
+    current: Optional[dict] = None
+    for row in db.execute(stmt.execution_options(yield_per=EXPORT_YIELD_PER)).mappings():
+        if current is None or current["id"] != row["id"]:
+            if current is not None:
+                yield {"type": TaskType.TEST_CASE.value, "data": current}
+            current = {column.name: row[column.name] for column in tc.columns}
+            current["actions"] = []
+        if row["action_id"] is not None:
+            current["actions"].append({"id": row["action_id"], "step": row["action_step"],
+                                       "expected_result": row["action_expected_result"]})
+    if current is not None:
+        yield {"type": TaskType.TEST_CASE.value, "data": current}
+
+
+def iter_project_records(db: Session, project_id: UUID, since: Optional[datetime]) -> Iterator[dict]:
+    for task_type, model in EXPORT_MODELS:
+        if task_type == TaskType.TEST_CASE:
+            yield from _stream_test_cases(db, project_id, since)
+        else:
+            yield from _stream_table(db, task_type, model, project_id, since)
+
+
+def _ndjson_chunks(session_factory: Callable[[], Session], project_id: UUID, since: Optional[datetime],
+                   etag: str, watermark: Optional[datetime]) -> Iterator[bytes]:
+    db = session_factory()
+    buffer = bytearray()
+    count = 0
+    try:
+        for record in iter_project_records(db, project_id, since):
+            buffer += json_codec.dumps_bytes(record)
+            buffer += b"\n"
+            count += 1
+            if len(buffer) >= EXPORT_CHUNK_BYTES:
+                yield bytes(buffer)
+                buffer.clear()
+        # Linha final: permite ao cliente detectar exportação truncada
+        buffer += json_codec.dumps_bytes({"type": "end", "count": count, "etag": etag, "watermark": watermark})
+        buffer += b"\n"
+        yield bytes(buffer)
+        logger.info(f"Exportação do projeto {project_id} concluída: {count} registro(s).")
+    finally:
+        db.close()
+
+
+@router.get("/projects/{project_id}")
+def export_project(
+    project_id: UUID,
+    since: Optional[datetime] = Query(None, description="Só itens criados/alterados/desativados após este instante (ISO 8601)."),
+    if_none_match: Optional[str] = Header(None),
+    session_factory: Callable[[], Session] = Depends(get_session_factory),
+):
+    """
+    Exporta os artefatos de um projeto em NDJSON (um objeto {"type", "data"} por linha),
+    com memória constante (cursor server-side via yield_per). Sem `since`, só itens ativos;
+    com `since`, inclui itens desativados (is_active=false). A última linha é
+    {"type": "end", "count", "etag", "watermark"}; use o watermark como próximo `since`.
+    """
+    logger.info(f"Requisição GET /export/projects/{project_id} recebida (since={since}).")
+    db = session_factory()
+    try:
+        etag, watermark = compute_export_version(db, project_id, since)
+    except Exception as e:
+        logger.error(f"Erro ao calcular versão da exportação do projeto {project_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erro ao consultar o banco de dados.")
+    finally:
+        db.close()
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if watermark is not None:
+        headers["X-Sync-Watermark"] = watermark.isoformat()
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return StreamingResponse(
+        _ndjson_chunks(session_factory, project_id, since, etag, watermark),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers=headers,
+    )
@@ -1,12 +1,15 @@
 from fastapi import APIRouter, HTTPException, Depends, status
 from app.schemas.schemas import Request as RequestSchema, Response, IndependentCreationRequest, StatusResponse, LLMConfig, ReprocessRequest
-from app.database import get_db
+from app.database import get_db, get_session_factory
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from app.models import Request as DBRequest, TaskType, Status, Epic, Feature, UserStory, Task, TestCase, WBS, Bug, Issue, PBI
 import uuid
-from app.workers.consumer import process_message_task, reprocess_work_item_task, process_independent_creation_task
+from app.utils import hierarchy, read_cache, request_ids, token_budget
+from app.workers.signatures import process_message_task, reprocess_work_item_task, process_independent_creation_task
 from pydantic import ValidationError
 from sqlalchemy.exc import IntegrityError
+from typing import Any, Callable, Dict, Optional
 import logging
 
 router = APIRouter()
@@ -25,12 +28,52 @@ MODEL_MAP = {
 }
 
 
+def _parent_project(db: Session, parent_type: str, parent: Optional[int]) -> Optional[uuid.UUID]:
+    """project_id do artefato pai (None para pai 'project', sem pai ou pai sem projeto)."""
+    try:
+        model = MODEL_MAP.get(TaskType(parent_type))
+    except ValueError:
+        return None
+    if model is None or parent is None:
+        return None
+    return db.execute(select(model.project_id).where(model.id == parent)).scalar()
+
+
+def _admit(db: Session, project_id: Optional[uuid.UUID],
+           session_factory: Optional[Callable[[], Session]] = None) -> Optional[str]:
+    """
+    Admissão pelo orçamento de tokens do projeto, antes de criar a requisição: 429 se o projeto
+    passou do limite com ação "reject"; com "queue" retorna a fila Celery de baixa prioridade.
+    """
+    admission = token_budget.check_admission(db, project_id, session_factory)
+    if admission is None or admission.action is None:
+        return None
+    if admission.action == "reject":
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=(f"Orçamento de tokens do projeto {project_id} esgotado: {admission.used} de "
+                    f"{admission.budget.token_limit} tokens desde {admission.since.isoformat()}."),
+        )
+    return admission.queue
+
+
+def _enqueue(signature, task_args: Dict[str, Any], queue: Optional[str]) -> None:
+    if queue:
+        signature.apply_async(kwargs=task_args, queue=queue)
+    else:
+        signature.delay(**task_args)
+
+
 @router.post("/generate/", response_model=Response, status_code=status.HTTP_201_CREATED)
-async def generate(request: RequestSchema, db: Session = Depends(get_db)):
+async def generate(request: RequestSchema, db: Session = Depends(get_db),
+                   session_factory: Callable[[], Session] = Depends(get_session_factory)):
     logger.info(f"Requisição POST /generate/ recebida. Task Type: {request.task_type}, Parent ID: {request.parent}") # Log correto
+    queue = _admit(db, _parent_project(db, request.parent_type.value, request.parent), session_factory)
+    request_id, created_at = request_ids.new_request_id()  # UUIDv7: created_at sai do próprio id
     try:
         db_request = DBRequest(
-            request_id=str(uuid.uuid4()),
+            request_id=request_id,
+            created_at=created_at,
             parent=str(request.parent),
             parent_type=request.parent_type.value,
             task_type=request.task_type.value,
@@ -59,8 +102,8 @@ async def generate(request: RequestSchema, db: Session = Depends(get_db)):
             "type_test": request.type_test
         }
 
-        # Enviar a task para o Celery
-        process_message_task.delay(**task_args)  # Usar ** para desempacotar o dicionário
+        # Enviar a task para o Celery (fila de baixa prioridade se o projeto passou do orçamento)
+        _enqueue(process_message_task, task_args, queue)
 
         logger.info(f"Task Celery 'process_demand_task' enfileirada para request_id: {db_request.request_id}.")
 
@@ -84,10 +127,38 @@ async def generate(request: RequestSchema, db: Session = Depends(get_db)):
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Erro interno ao processar requisição: {str(e)}")
 
 
+def _load_status(db: Session, request_id: str) -> Optional[Dict[str, Any]]:
+    # Só as colunas da resposta (ix_requests_status_poll); o cache de leitura absorve o polling
+    row = db.execute(
+        select(DBRequest.request_id, DBRequest.project_id, DBRequest.parent, DBRequest.task_type, DBRequest.status,
+               DBRequest.created_at, DBRequest.processed_at, DBRequest.artifact_type, DBRequest.artifact_id)
+        .where(request_ids.where_request_id(request_id))  # Com o created_at do UUIDv7: uma partição
+    ).first()
+    return dict(row._mapping) if row else None
+
+
+def _load_artifact(db: Session, task_type: TaskType, artifact_id: int) -> Optional[Dict[str, Any]]:
+    model = MODEL_MAP[task_type]
+    item = db.query(model).filter(model.id == artifact_id).first()
+    # Pai hierárquico conforme o mapeamento de colunas do índice de hierarquia
+    return {"id": item.id, "parent_id": hierarchy.parent_of(task_type, item), "project_id": item.project_id} if item else None
+
+
+def _in_new_session(session_factory: Callable[[], Session], load: Callable[..., Any], *args) -> Callable[[], Any]:
+    """Carga para a revalidação em segundo plano, com sessão própria (a da requisição já terá fechado)."""
+    def run():
+        with session_factory() as db:
+            return load(db, *args)
+    return run
+
+
 @router.get("/status/{request_id}", response_model=StatusResponse)
-async def get_status(request_id: str, db: Session = Depends(get_db)):
+async def get_status(request_id: str, db: Session = Depends(get_db),
+                     session_factory: Callable[[], Session] = Depends(get_session_factory)):
     logger.info(f"Requisição GET /status/{request_id} recebida.")
-    request = db.query(DBRequest).filter(DBRequest.request_id == request_id).first()
+    # Cache de leitura: invalidado pelos eventos da notification_queue, TTL curto enquanto pendente
+    request = read_cache.get_status(request_id, lambda: _load_status(db, request_id),
+                                    _in_new_session(session_factory, _load_status, request_id))
 
     if not request:
         logger.warning(f"Requisição {request_id} não encontrada.")
@@ -95,12 +166,15 @@ async def get_status(request_id: str, db: Session = Depends(get_db)):
 
     logger.info(f"Status da requisição {request_id} retornado.")
     return StatusResponse(
-        request_id=request.request_id,
-        parent=request.parent,  # Retornar o parent (que era o request_id_client)
-        task_type=request.task_type,
-        status=request.status,
-        created_at=request.created_at,
-        processed_at=request.processed_at
+        request_id=request["request_id"],
+        project_id=str(request["project_id"]) if request["project_id"] else None,
+        parent=request["parent"],  # Retornar o parent (que era o request_id_client)
+        task_type=request["task_type"],
+        status=request["status"],
+        created_at=request["created_at"],
+        processed_at=request["processed_at"],
+        artifact_type=request["artifact_type"],
+        artifact_id=request["artifact_id"]
     )
 
 
@@ -110,7 +184,8 @@ async def reprocess(
     artifact_type: str,
     artifact_id: int,
     request: ReprocessRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    session_factory: Callable[[], Session] = Depends(get_session_factory)
 ):
     logger.info(f"Requisição POST /reprocess/{artifact_type}/{artifact_id} recebida.")
 
@@ -130,32 +205,26 @@ async def reprocess(
             detail=f"Tipo de artefato não suportado: {artifact_type}"
         )
 
-    existing_artifact = db.query(model).filter(model.id == artifact_id).first()
+    existing_artifact = read_cache.get_artifact(
+        task_type_enum.value, artifact_id,
+        lambda: _load_artifact(db, task_type_enum, artifact_id),
+        _in_new_session(session_factory, _load_artifact, task_type_enum, artifact_id),
+    )
     if not existing_artifact:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Artefato {artifact_type} com ID {artifact_id} não encontrado"
         )
 
-    # Determinar o parent_id com base no tipo de artefato
-    if task_type_enum == TaskType.EPIC:
-        parent_id = existing_artifact.team_project_id
-    elif task_type_enum in [TaskType.FEATURE, TaskType.USER_STORY, TaskType.TASK, TaskType.TEST_CASE, TaskType.WBS]:
-        parent_id = existing_artifact.parent
-    elif task_type_enum == TaskType.BUG:
-        parent_id = existing_artifact.user_story_id
-    elif task_type_enum == TaskType.ISSUE:
-        parent_id = existing_artifact.user_story_id
-    elif task_type_enum == TaskType.PBI:
-        parent_id = existing_artifact.feature_id
-    else:
-        parent_id = None
+    parent_id = existing_artifact["parent_id"]
+    queue = _admit(db, existing_artifact.get("project_id"), session_factory)
 
     # Criar a requisição de reprocessamento
-    request_id = str(uuid.uuid4())
+    request_id, created_at = request_ids.new_request_id()
     try:
         db_request = DBRequest(
             request_id=request_id,
+            created_at=created_at,
             task_type=task_type_enum.value,
             status=Status.PENDING.value,
             parent=str(parent_id) if parent_id is not None else None,  # Corrigido
@@ -187,7 +256,7 @@ async def reprocess(
     }
 
     try:
-        reprocess_work_item_task.delay(**task_args)
+        _enqueue(reprocess_work_item_task, task_args, queue)
     except TypeError as e:
         logger.error(f"Erro ao enfileirar task Celery: {e}", exc_info=True)
         raise HTTPException(
@@ -202,20 +271,23 @@ async def reprocess(
 
 # --- ROTA PARA CRIAÇÃO DE ARTEFATOS INDEPENDENTE ---
 @router.post("/independent/", response_model=Response, status_code=status.HTTP_201_CREATED)
-async def create_independent(request: IndependentCreationRequest, db: Session = Depends(get_db)):
+async def create_independent(request: IndependentCreationRequest, db: Session = Depends(get_db),
+                             session_factory: Callable[[], Session] = Depends(get_session_factory)):
     """
     Cria um artefato de forma mais independente, exigindo project_id
     e permitindo um parent opcional.
     """
     logger.info(f"Requisição POST /independent/ recebida. Task Type: {request.task_type}, Project ID: {request.project_id}, Parent ID: {request.parent}")
+    queue = _admit(db, request.project_id, session_factory)
 
     # Gerar ID único para a requisição interna
-    request_id_interno = str(uuid.uuid4())
+    request_id_interno, created_at = request_ids.new_request_id()
 
     try:
         # Criar registro da requisição no banco de dados
         db_request = DBRequest(
             request_id=request_id_interno,
+            created_at=created_at,
             project_id=request.project_id,
             parent=str(request.parent) if request.parent is not None else None,
             parent_type=request.parent_type.value if request.parent_type else None,
@@ -259,7 +331,7 @@ async def create_independent(request: IndependentCreationRequest, db: Session =
     # Enviar a nova task para o Celery
     try:
         # Chamar a NOVA task Celery
-        process_independent_creation_task.delay(**task_args)
+        _enqueue(process_independent_creation_task, task_args, queue)
         logger.info(f"Task Celery 'process_independent_creation_task' enfileirada para request_id: {request_id_interno}.")
     except Exception as e: # Capturar exceção mais genérica ao enfileirar
         logger.error(f"Erro ao enfileirar task Celery 'process_independent_creation_task': {e}", exc_info=True)
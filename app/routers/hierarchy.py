@@ -0,0 +1,50 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from app.database import get_db
+from app.models import TaskType
+from app.schemas.schemas import HierarchyResponse, HierarchyNodeResponse
+from app.utils import hierarchy
+from typing import Optional
+import logging
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+def _resolve_type(artifact_type: str, allow_project: bool = False) -> TaskType:
+    try:
+        task_type = TaskType(artifact_type)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Tipo de artefato inválido: {artifact_type}")
+    if task_type not in hierarchy.HIERARCHY_SPECS and not (allow_project and task_type == TaskType.PROJECT):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Tipo de artefato não suportado na hierarquia: {artifact_type}")
+    return task_type
+
+
+def _response(task_type: TaskType, artifact_id: int, nodes) -> HierarchyResponse:
+    return HierarchyResponse(type=task_type.value, id=artifact_id,
+                             nodes=[HierarchyNodeResponse(**node._asdict()) for node in nodes])
+
+
+@router.get("/{artifact_type}/{artifact_id}/subtree", response_model=HierarchyResponse)
+def get_subtree(
+    artifact_type: str,
+    artifact_id: int,
+    include_inactive: bool = Query(False, description="Inclui descendentes desativados."),
+    max_depth: Optional[int] = Query(None, ge=1, description="Profundidade máxima (1 = só filhos diretos)."),
+    db: Session = Depends(get_db),
+):
+    """Subárvore completa do artefato (ou do team project, com artifact_type=project) numa única consulta."""
+    logger.info(f"Requisição GET /hierarchy/{artifact_type}/{artifact_id}/subtree recebida.")
+    task_type = _resolve_type(artifact_type, allow_project=True)
+    nodes = hierarchy.get_subtree(db, task_type, artifact_id, include_inactive=include_inactive, max_depth=max_depth)
+    return _response(task_type, artifact_id, nodes)
+
+
+@router.get("/{artifact_type}/{artifact_id}/ancestors", response_model=HierarchyResponse)
+def get_ancestors(artifact_type: str, artifact_id: int, db: Session = Depends(get_db)):
+    """Cadeia de ancestrais do artefato, do pai direto até a raiz, numa única consulta."""
+    logger.info(f"Requisição GET /hierarchy/{artifact_type}/{artifact_id}/ancestors recebida.")
+    task_type = _resolve_type(artifact_type)
+    return _response(task_type, artifact_id, hierarchy.get_ancestors(db, task_type, artifact_id))
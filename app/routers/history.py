@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from app.database import get_db
+from app.models import TaskType
+from app.schemas.schemas import ArtifactHistoryResponse, ArtifactVersionResponse
+from app.utils import hierarchy, history
+import logging
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+@router.get("/{artifact_type}/{artifact_id}", response_model=ArtifactHistoryResponse)
+def get_artifact_history(artifact_type: str, artifact_id: int, db: Session = Depends(get_db)):
+    """
+    Versões da linhagem do artefato (mesmo tipo e mesmo pai), da mais recente para a mais
+    antiga: ativas e inativas das tabelas quentes e as já arquivadas em artifact_history.
+    """
+    logger.info(f"Requisição GET /history/{artifact_type}/{artifact_id} recebida.")
+    try:
+        task_type = TaskType(artifact_type)
+        hierarchy.get_spec(task_type)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Tipo de artefato inválido: {artifact_type}")
+
+    versions = history.artifact_versions(db, task_type, artifact_id)
+    if versions is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"Artefato {artifact_type} com ID {artifact_id} não encontrado")
+    return ArtifactHistoryResponse(type=task_type.value, id=artifact_id,
+                                   versions=[ArtifactVersionResponse(**version._asdict()) for version in versions])
@@ -0,0 +1,10 @@
+from fastapi import APIRouter, Response
+from app.utils import metrics
+
+router = APIRouter()
+
+
+@router.get("", include_in_schema=False)
+def get_metrics():
+    """Métricas no formato do Prometheus (todos os workers do gunicorn com PROMETHEUS_MULTIPROC_DIR)."""
+    return Response(content=metrics.exposition(), media_type=metrics.CONTENT_TYPE)
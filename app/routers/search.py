@@ -0,0 +1,57 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from app.database import get_db
+from app.models import TaskType
+from app.schemas.schemas import SearchResponse, SearchHitResponse
+from app.utils import json_search
+from typing import List, Optional
+from uuid import UUID
+import logging
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+def _response(hits) -> SearchResponse:
+    return SearchResponse(items=[SearchHitResponse(**hit._asdict()) for hit in hits])
+
+
+@router.get("/projects/{project_id}/tags", response_model=SearchResponse)
+def search_by_tags(
+    project_id: UUID,
+    tag: List[str] = Query(..., description="Tag (repetir o parâmetro para várias)."),
+    match: str = Query("all", pattern="^(all|any)$", description="all: todas as tags; any: qualquer uma."),
+    type: Optional[List[str]] = Query(None, description="Tipos de artefato (epic, bug, issue, pbi)."),
+    include_inactive: bool = Query(False),
+    db: Session = Depends(get_db),
+):
+    """Artefatos do projeto por tag (índices GIN sobre as colunas JSONB de tags)."""
+    logger.info(f"Requisição GET /search/projects/{project_id}/tags recebida (tags={tag}, match={match}).")
+    try:
+        task_types = [TaskType(value) for value in type] if type else None
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if task_types and any(task_type not in json_search.TAGGED_MODELS for task_type in task_types):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Tipos com tags: {[t.value for t in json_search.TAGGED_MODELS]}")
+    hits = json_search.find_by_tags(db, project_id, tag, task_types, match_all=match == "all",
+                                    include_inactive=include_inactive)
+    return _response(hits)
+
+
+@router.get("/projects/{project_id}/gherkin", response_model=SearchResponse)
+def search_gherkin(
+    project_id: UUID,
+    q: str = Query(..., min_length=1, description="Texto procurado nos passos do Gherkin."),
+    step: Optional[str] = Query(None, description="Passo: scenario, given, when ou then."),
+    exact: bool = Query(False, description="Igualdade exata no passo (usa o índice GIN; exige step)."),
+    include_inactive: bool = Query(False),
+    db: Session = Depends(get_db),
+):
+    """Casos de teste do projeto por conteúdo do Gherkin."""
+    logger.info(f"Requisição GET /search/projects/{project_id}/gherkin recebida (step={step}, exact={exact}).")
+    try:
+        hits = json_search.search_gherkin(db, project_id, q, step=step, exact=exact, include_inactive=include_inactive)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return _response(hits)
@@ -0,0 +1,58 @@
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from app.database import get_db
+from app.schemas.schemas import BudgetRequest, BudgetResponse, UsageReportResponse, UsageRowResponse
+from app.utils import token_budget
+import logging
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+def _report(db: Session, project_id: Optional[UUID], start: Optional[datetime], end: Optional[datetime],
+            budget: Optional[BudgetResponse] = None) -> UsageReportResponse:
+    rows = token_budget.usage_report(db, project_id, start, end)
+    return UsageReportResponse(
+        start=start, end=end, budget=budget,
+        rows=[UsageRowResponse(**row._asdict()) for row in rows],
+        total_tokens=sum(row.prompt_tokens + row.completion_tokens for row in rows),
+    )
+
+
+def _budget_response(db: Session, project_id: UUID) -> BudgetResponse:
+    budget = token_budget.get_budget(db, project_id)
+    since = token_budget.period_start(budget.period)
+    return BudgetResponse(**budget._asdict(), used=token_budget.used_tokens(db, project_id, since), period_start=since)
+
+
+@router.get("/", response_model=UsageReportResponse)
+def get_usage(start: Optional[datetime] = None, end: Optional[datetime] = None, db: Session = Depends(get_db)):
+    """Consumo de tokens de todos os projetos no intervalo [start, end), por projeto, task_type e modelo."""
+    logger.info(f"Requisição GET /usage/ recebida (start={start}, end={end}).")
+    return _report(db, None, start, end)
+
+
+@router.get("/projects/{project_id}", response_model=UsageReportResponse)
+def get_project_usage(project_id: UUID, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                      db: Session = Depends(get_db)):
+    """
+    Consumo do projeto por task_type e modelo. Sem `start`, o intervalo começa no período
+    corrente do orçamento. Inclui o orçamento e o consumo do período.
+    """
+    logger.info(f"Requisição GET /usage/projects/{project_id} recebida (start={start}, end={end}).")
+    budget = _budget_response(db, project_id)
+    return _report(db, project_id, start or budget.period_start, end, budget)
+
+
+@router.put("/projects/{project_id}/budget", response_model=BudgetResponse)
+def put_project_budget(project_id: UUID, request: BudgetRequest, db: Session = Depends(get_db)):
+    logger.info(f"Requisição PUT /usage/projects/{project_id}/budget recebida: {request.model_dump()}")
+    try:
+        token_budget.set_budget(db, project_id, request.token_limit, request.period, request.action)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    db.commit()
+    return _budget_response(db, project_id)
@@ -12,6 +12,9 @@ class LLMConfig(BaseModel):
     temperature: Optional[float] = Field(0.7, description="Temperatura para geração de texto (0.0 a 1.0).")
     max_tokens: Optional[int] = Field(1000, description="Número máximo de tokens a serem gerados.")
     top_p: Optional[float] = Field(None, description="Top P para amostragem de nucleus (OpenAI).")
+    best_of_n: Optional[int] = Field(None, ge=1, le=5, description="Candidatos gerados em paralelo; o melhor válido é usado (padrão: BEST_OF_N_TASK_TYPES).")
+    best_of_n_scorer: Optional[str] = Field(None, description="Scorer best-of-N registrado (padrão: BEST_OF_N_SCORER).")
+    semantic_cache: Optional[bool] = Field(None, description="False ignora o cache semântico de gerações nesta requisição (padrão: SEMANTIC_CACHE_ENABLED).")
 
     @validator('llm')
     def check_llm_valid(cls, value):
@@ -81,13 +84,85 @@ class Response(BaseModel):
 class StatusResponse(BaseModel):
     request_id: str = Field(..., description="ID da requisição da API (interno).")
     project_id: Optional[str] = Field(None, description="ID do Projeto (UUID) associado à requisição, se disponível.")
-    parent: int = Field(..., description="ID do item pai.")
+    parent: Optional[int] = Field(None, description="ID do item pai.")
     task_type: str = Field(..., description="Tipo da tarefa.")
     status: str = Field(..., description="Status da requisição (pending, completed, failed).")
     created_at: datetime = Field(..., description="Data de criação da requisição.")
     processed_at: Optional[datetime] = Field(None, description="Data de processamento da requisição (se completada).")
-    artifact_type: str = Field(..., description="Tipo de artefato")
-    artifact_id: int = Field(..., description="ID do artefato")
+    artifact_type: Optional[str] = Field(None, description="Tipo de artefato (reprocessamento)")
+    artifact_id: Optional[int] = Field(None, description="ID do artefato (reprocessamento)")
+
+
+class HierarchyNodeResponse(BaseModel):
+    type: str = Field(..., description="Tipo do artefato (epic, feature, ..., project).")
+    id: int = Field(..., description="ID do artefato.")
+    depth: int = Field(..., description="Distância até o nó consultado (1 = filho/pai direto).")
+    is_active: bool = Field(..., description="Se o artefato está ativo.")
+
+
+class HierarchyResponse(BaseModel):
+    type: str = Field(..., description="Tipo do nó consultado.")
+    id: int = Field(..., description="ID do nó consultado.")
+    nodes: List[HierarchyNodeResponse] = Field(..., description="Descendentes ou ancestrais, ordenados por profundidade.")
+
+
+class ArtifactVersionResponse(BaseModel):
+    id: int = Field(..., description="ID do artefato (na tabela quente ou o original, se arquivado).")
+    version: Optional[int] = Field(None, description="Versão do artefato.")
+    is_active: bool = Field(..., description="Se é a versão ativa.")
+    archived: bool = Field(..., description="Se a versão já foi movida para o histórico.")
+    created_at: Optional[datetime] = Field(None, description="Data de criação da versão.")
+    deactivated_at: Optional[datetime] = Field(None, description="Data de desativação (versões inativas).")
+    data: Dict[str, Any] = Field(..., description="Linha completa da versão (TestCase inclui 'actions').")
+
+
+class ArtifactHistoryResponse(BaseModel):
+    type: str = Field(..., description="Tipo do artefato consultado.")
+    id: int = Field(..., description="ID do artefato consultado.")
+    versions: List[ArtifactVersionResponse] = Field(..., description="Versões da linhagem, da mais recente para a mais antiga.")
+
+
+class SearchHitResponse(BaseModel):
+    type: str = Field(..., description="Tipo do artefato.")
+    id: int = Field(..., description="ID do artefato.")
+    title: Optional[str] = Field(None, description="Título do artefato.")
+    version: Optional[int] = Field(None, description="Versão do artefato.")
+
+
+class SearchResponse(BaseModel):
+    items: List[SearchHitResponse] = Field(..., description="Artefatos encontrados, ordenados por tipo e ID.")
+
+
+class UsageRowResponse(BaseModel):
+    project_id: Optional[UUID] = Field(None, description="ID do Projeto (None: requisições sem projeto).")
+    task_type: str = Field(..., description="Tipo da tarefa.")
+    provider: str = Field(..., description="Provedor da LLM (openai ou gemini).")
+    model: str = Field(..., description="Modelo da LLM.")
+    requests: int = Field(..., description="Requisições concluídas.")
+    prompt_tokens: int = Field(..., description="Tokens de prompt.")
+    completion_tokens: int = Field(..., description="Tokens de resposta.")
+
+
+class BudgetRequest(BaseModel):
+    token_limit: int = Field(..., ge=0, description="Tokens (prompt + completion) por período; 0 = sem limite.")
+    period: str = Field("month", description="Período do orçamento (day ou month, em UTC).")
+    action: str = Field("reject", description="Ação acima do limite: reject (429) ou queue (fila de baixa prioridade).")
+
+
+class BudgetResponse(BaseModel):
+    token_limit: int = Field(..., description="Tokens por período; 0 = sem limite.")
+    period: str = Field(..., description="Período do orçamento.")
+    action: str = Field(..., description="Ação acima do limite.")
+    used: Optional[int] = Field(None, description="Tokens consumidos no período corrente.")
+    period_start: Optional[datetime] = Field(None, description="Início (UTC) do período corrente.")
+
+
+class UsageReportResponse(BaseModel):
+    start: Optional[datetime] = Field(None, description="Início do intervalo (inclusivo).")
+    end: Optional[datetime] = Field(None, description="Fim do intervalo (exclusivo).")
+    rows: List[UsageRowResponse] = Field(..., description="Consumo por projeto, task_type, provedor e modelo.")
+    total_tokens: int = Field(..., description="Soma de prompt e completion de todas as linhas.")
+    budget: Optional[BudgetResponse] = Field(None, description="Orçamento do projeto (relatório de um projeto).")
 
 
 class IndependentCreationRequest(BaseModel):
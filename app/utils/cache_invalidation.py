@@ -0,0 +1,114 @@
+# app/utils/cache_invalidation.py
+"""
+Listener de invalidação do cache de leitura (app.utils.read_cache) em cada processo da API.
+
+O relay do outbox publica uma cópia de cada evento da notification_queue no exchange
+fanout NOTIFICATION_EVENTS_EXCHANGE. Cada processo da API liga uma fila exclusiva
+(auto-delete) a esse exchange e invalida status/artefato ao receber o evento. Ao
+(re)conectar, os caches são esvaziados, pois eventos podem ter sido perdidos enquanto a
+fila não existia; o TTL limita a defasagem caso o broker fique fora do ar.
+"""
+import logging
+import os
+import threading
+from typing import Callable, Optional
+from dotenv import load_dotenv
+from app.utils import json_codec, metrics, outbox, read_cache
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CACHE_INVALIDATION_ENABLED = os.getenv("CACHE_INVALIDATION_ENABLED", "true").lower() in ("1", "true", "yes")
+CACHE_INVALIDATION_RECONNECT_MAX = float(os.getenv("CACHE_INVALIDATION_RECONNECT_MAX", "30"))  # Segundos
+
+
+def handle_event(body: bytes) -> None:
+    try:
+        payload = json_codec.loads(body)
+    except json_codec.JSONDecodeError as e:
+        metrics.increment("read_cache_invalid_events_total")
+        logger.warning(f"Evento de invalidação inválido ignorado: {e}")
+        return
+    for notification in outbox.unwrap(payload):  # Relay em modo de lote publica um evento por envelope
+        read_cache.invalidate_from_notification(notification)
+        metrics.increment("read_cache_events_total")
+
+
+def _default_connection_factory():
+    import pika  # pika só quando o listener está ativo
+    from app.utils.rabbitmq import RABBITMQ_HOST, RABBITMQ_USER, RABBITMQ_PASSWORD
+
+    credentials = pika.PlainCredentials(RABBITMQ_USER, RABBITMQ_PASSWORD)
+    return pika.BlockingConnection(pika.ConnectionParameters(host=RABBITMQ_HOST, credentials=credentials, heartbeat=60))
+
+
+class InvalidationListener:
+    def __init__(self, connection_factory: Callable[[], object] = _default_connection_factory,
+                 exchange: Optional[str] = None, reconnect_max: float = CACHE_INVALIDATION_RECONNECT_MAX):
+        if exchange is None:
+            from app.utils.rabbitmq import NOTIFICATION_EVENTS_EXCHANGE
+            exchange = NOTIFICATION_EVENTS_EXCHANGE
+        self.connection_factory = connection_factory
+        self.exchange = exchange
+        self.reconnect_max = reconnect_max
+        self.connection = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _consume_once(self) -> None:
+        self.connection = self.connection_factory()
+        channel = self.connection.channel()
+        channel.exchange_declare(exchange=self.exchange, exchange_type="fanout", durable=True)
+        queue = channel.queue_declare(queue="", exclusive=True, auto_delete=True).method.queue
+        channel.queue_bind(queue=queue, exchange=self.exchange)
+        read_cache.clear_all()  # Eventos anteriores à fila podem ter sido perdidos
+        logger.info(f"Listener de invalidação do cache ligado ao exchange {self.exchange}.")
+        # auto_ack: perder um evento só custa o TTL
+        for _method, _properties, body in channel.consume(queue=queue, auto_ack=True, inactivity_timeout=1):
+            if self._stop.is_set():
+                break
+            if body is not None:
+                handle_event(body)
+
+    def run(self) -> None:
+        backoff = 1.0
+        while not self._stop.is_set():
+            try:
+                self._consume_once()
+                backoff = 1.0
+            except Exception as e:
+                metrics.increment("read_cache_listener_errors_total")
+                logger.warning(f"Listener de invalidação desconectado ({e}); nova tentativa em {backoff:.0f}s.")
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, self.reconnect_max)
+            finally:
+                self._close_connection()
+
+    def _close_connection(self) -> None:
+        if self.connection is not None:
+            try:
+                if self.connection.is_open:
+                    self.connection.close()
+            except Exception as e:
+                logger.debug(f"Erro ao fechar conexão do listener de invalidação: {e}")
+        self.connection = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self.run, name="read-cache-invalidation", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def start_listener() -> Optional[InvalidationListener]:
+    """Inicia o listener quando o cache e a invalidação estão habilitados e há broker configurado."""
+    if not (read_cache.READ_CACHE_ENABLED and CACHE_INVALIDATION_ENABLED and os.getenv("RABBITMQ_HOST")):
+        logger.info("Listener de invalidação do cache desativado; o cache depende só do TTL.")
+        return None
+    listener = InvalidationListener()
+    listener.start()
+    return listener
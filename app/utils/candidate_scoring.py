@@ -0,0 +1,116 @@
+# app/utils/candidate_scoring.py
+"""
+Seleção best-of-N entre candidatos gerados pela LLM.
+
+Cada candidato passa pela mesma extração (reparo local, sem chamada de correção) e
+validação do parser_registry usadas no processamento. Candidatos válidos recebem uma
+nota de um scorer plugável (registrado em SCORERS); o de maior nota vence e, no empate,
+o de menor índice.
+
+Scorer padrão ("default"): 1 por ser válido + cobertura dos campos do schema (0..1) +
+tamanho do JSON (0..0.5, satura em BEST_OF_N_TARGET_CHARS) + número de itens nos tipos
+que aceitam lista (0..0.5, satura em BEST_OF_N_TARGET_ITEMS).
+"""
+import logging
+import os
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+from dotenv import load_dotenv
+from pydantic import BaseModel, ValidationError
+from app.models import TaskType
+from app.utils import json_codec, metrics
+from app.utils.json_extraction import JSONExtractionError, extract_json
+from app.utils.parser_registry import get_spec
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+BEST_OF_N_TARGET_CHARS = int(os.getenv("BEST_OF_N_TARGET_CHARS", "2000"))
+BEST_OF_N_TARGET_ITEMS = int(os.getenv("BEST_OF_N_TARGET_ITEMS", "3"))
+
+
+class Candidate(NamedTuple):
+    index: int
+    text: str  # JSON extraído (ou o texto bruto, se inválido)
+    items: Optional[List[BaseModel]]  # Itens validados pelo schema; None se inválido
+    error: Optional[str] = None
+
+    @property
+    def valid(self) -> bool:
+        return self.items is not None
+
+
+Scorer = Callable[[TaskType, Candidate], float]
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+def coverage(items: Sequence[BaseModel]) -> float:
+    """Fração dos campos do schema preenchidos (média entre os itens)."""
+    fractions = []
+    for item in items:
+        values = item.model_dump()
+        if values:
+            fractions.append(sum(not _is_empty(v) for v in values.values()) / len(values))
+    return sum(fractions) / len(fractions) if fractions else 0.0
+
+
+def default_scorer(task_type: TaskType, candidate: Candidate) -> float:
+    if not candidate.valid:
+        return float("-inf")
+    score = 1.0 + coverage(candidate.items)
+    score += 0.5 * min(len(candidate.text) / BEST_OF_N_TARGET_CHARS, 1.0)
+    if get_spec(task_type).many:
+        score += 0.5 * min(len(candidate.items) / BEST_OF_N_TARGET_ITEMS, 1.0)
+    return score
+
+
+SCORERS: Dict[str, Scorer] = {"default": default_scorer}
+
+
+def register_scorer(name: str, scorer: Scorer) -> Scorer:
+    """Registra um scorer para uso via BEST_OF_N_SCORER ou llm_config["best_of_n_scorer"]."""
+    SCORERS[name] = scorer
+    return scorer
+
+
+def get_scorer(name: Optional[str]) -> Scorer:
+    scorer = SCORERS.get(name or "default")
+    if scorer is None:
+        raise ValueError(f"Scorer best-of-N desconhecido: {name}")
+    return scorer
+
+
+def evaluate(task_type: TaskType, index: int, text: str, many: Optional[bool] = None) -> Candidate:
+    """Extrai e valida um candidato com a spec do TaskType."""
+    try:
+        extracted = extract_json(text, task_type.value).text
+    except JSONExtractionError as e:
+        return Candidate(index, text or "", None, f"JSON inválido: {e}")
+    try:
+        return Candidate(index, extracted, get_spec(task_type).validate(extracted, many=many))
+    except (json_codec.JSONDecodeError, ValidationError) as e:
+        return Candidate(index, extracted, None, f"Schema inválido: {e.__class__.__name__}")
+
+
+def select_best(task_type: TaskType, texts: Sequence[str], scorer: Optional[Scorer] = None,
+                many: Optional[bool] = None) -> Optional[Candidate]:
+    """Avalia os candidatos e retorna o melhor válido (None se nenhum for válido)."""
+    scorer = scorer or default_scorer
+    best, best_score = None, float("-inf")
+    for index, text in enumerate(texts):
+        candidate = evaluate(task_type, index, text, many)
+        metrics.increment("llm_best_of_n_candidates_total", task_type=task_type.value,
+                          outcome="valid" if candidate.valid else "invalid")
+        if not candidate.valid:
+            logger.info(f"Candidato {index} de {task_type.value} descartado: {candidate.error}")
+            continue
+        score = scorer(task_type, candidate)
+        logger.debug(f"Candidato {index} de {task_type.value}: nota {score:.3f}")
+        if best is None or score > best_score:
+            best, best_score = candidate, score
+    if best is not None:
+        logger.info(f"Best-of-{len(texts)} para {task_type.value}: candidato {best.index} selecionado (nota {best_score:.3f}).")
+    return best
@@ -0,0 +1,110 @@
+# app/utils/chunking.py
+"""
+Divisão de entradas longas (transcrições de reunião no `user_input`) em chunks com
+sobreposição e fusão das listas de artefatos geradas para cada chunk.
+
+Os tokens são estimados por caracteres (CHUNK_CHARS_PER_TOKEN, padrão 4, próximo da
+média dos tokenizers da OpenAI para português/inglês), sem depender do tokenizer do
+provedor. A divisão respeita parágrafos e linhas; só quebra no meio de uma linha (em
+espaço) quando ela sozinha excede o limite. Cada chunk repete o final do anterior
+(`overlap_tokens`) para que um requisito na fronteira apareça inteiro em pelo menos um.
+
+A fusão valida cada resposta com o parser_registry e remove duplicatas pelo título
+normalizado (a sobreposição gera o mesmo artefato em chunks vizinhos), mantendo a
+versão mais completa.
+"""
+import os
+import re
+import unicodedata
+from typing import Any, Iterable, List
+from dotenv import load_dotenv
+from pydantic import BaseModel
+from app.models import TaskType
+from app.utils import json_codec
+from app.utils.parser_registry import get_spec
+
+load_dotenv()
+
+CHUNK_CHARS_PER_TOKEN = float(os.getenv("CHUNK_CHARS_PER_TOKEN", "4"))
+
+
+def estimate_tokens(text: str) -> int:
+    return int(len(text or "") / CHUNK_CHARS_PER_TOKEN) + 1 if text else 0
+
+
+def _units(text: str, max_chars: int) -> List[str]:
+    """Linhas do texto (com a quebra de linha), quebrando em espaços as maiores que max_chars."""
+    units = []
+    for line in text.splitlines(keepends=True):
+        while len(line) > max_chars:
+            cut = line.rfind(" ", 0, max_chars)
+            cut = cut + 1 if cut > 0 else max_chars
+            units.append(line[:cut])
+            line = line[cut:]
+        if line:
+            units.append(line)
+    return units
+
+
+def split_text(text: str, max_tokens: int, overlap_tokens: int = 0) -> List[str]:
+    """Divide o texto em chunks de até max_tokens (estimados), repetindo ~overlap_tokens do anterior."""
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+    max_chars = int(max_tokens * CHUNK_CHARS_PER_TOKEN)
+    overlap_chars = min(int(overlap_tokens * CHUNK_CHARS_PER_TOKEN), max_chars // 2)
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    for unit in _units(text, max_chars - overlap_chars):
+        if current and size + len(unit) > max_chars:
+            chunks.append("".join(current))
+            # Sobreposição: últimas linhas do chunk anterior que cabem em overlap_chars
+            tail: List[str] = []
+            tail_size = 0
+            for previous in reversed(current):
+                if tail_size + len(previous) > overlap_chars:
+                    break
+                tail.insert(0, previous)
+                tail_size += len(previous)
+            current, size = tail, tail_size
+        current.append(unit)
+        size += len(unit)
+    chunks.append("".join(current))  # O último sempre tem ao menos uma linha nova
+    return chunks
+
+
+def _dedupe_key(item: BaseModel) -> str:
+    title = getattr(item, "title", None)
+    if isinstance(title, str) and title.strip():
+        normalized = unicodedata.normalize("NFKD", title).encode("ascii", "ignore").decode().casefold()
+        return re.sub(r"[\W_]+", " ", normalized).strip()
+    return json_codec.dumps(item.model_dump())
+
+
+def _richness(item: BaseModel) -> int:
+    return len(json_codec.dumps(item.model_dump()))
+
+
+def merge_items(task_type: TaskType, responses: Iterable[Any]) -> List[BaseModel]:
+    """Valida as respostas JSON de cada chunk e junta os itens, sem duplicatas, na ordem de aparição."""
+    spec = get_spec(task_type)
+    merged: dict = {}
+    for response in responses:
+        for item in spec.validate(response, many=True):
+            key = _dedupe_key(item)
+            if key not in merged or _richness(item) > _richness(merged[key]):
+                merged[key] = item  # Substituir mantém a posição da primeira ocorrência
+    return list(merged.values())
+
+
+def dump_items(items: Iterable[BaseModel]) -> str:
+    """JSON (lista) com os itens fundidos, no formato aceito por parse_items."""
+    return json_codec.dumps([item.model_dump() for item in items])
+
+
+def is_chunkable(task_type: TaskType) -> bool:
+    """Só tipos cuja resposta é uma lista de artefatos podem ser gerados por partes."""
+    try:
+        return get_spec(task_type).many
+    except ValueError:
+        return False
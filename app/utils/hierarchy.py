@@ -0,0 +1,183 @@
+# app/utils/hierarchy.py
+"""
+Índice de hierarquia dos artefatos (closure table `artifact_hierarchy`).
+
+As relações de pai estão espalhadas em colunas heterogêneas (`parent`+`parent_type`,
+`team_project_id` no Epic, `user_story_id` em Bug/Issue, `feature_id` no PBI). As specs
+abaixo centralizam esse mapeamento; o índice guarda um par (ancestral, descendente) por
+linha, de modo que subárvore e cadeia de ancestrais saem numa única consulta.
+
+Manutenção (sempre na transação de quem chama, sem commit):
+- criação: `index_items` após o flush dos novos itens (um INSERT ... SELECT por lote);
+- desativação: `mark_inactive` (um UPDATE por lote);
+- reprocessamento: `index_items` idempotente (indexa itens anteriores ao índice).
+"""
+import logging
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+from sqlalchemy import and_, delete, exists, func, literal, select, union_all, update
+from sqlalchemy.orm import Session
+
+from app.models import ArtifactHierarchy, TaskType, Epic, Feature, UserStory, Task, TestCase, WBS, Bug, Issue, PBI
+
+logger = logging.getLogger(__name__)
+
+
+class HierarchySpec(NamedTuple):
+    model: type
+    parent_column: str  # Coluna com o ID do pai
+    default_parent_type: TaskType  # Tipo do pai quando não há coluna parent_type (ou ela é nula)
+    has_parent_type: bool = True  # Se o modelo tem a coluna parent_type
+
+
+HIERARCHY_SPECS: Dict[TaskType, HierarchySpec] = {
+    TaskType.EPIC: HierarchySpec(Epic, "team_project_id", TaskType.PROJECT),
+    TaskType.FEATURE: HierarchySpec(Feature, "parent", TaskType.EPIC),
+    TaskType.USER_STORY: HierarchySpec(UserStory, "parent", TaskType.FEATURE),
+    TaskType.TASK: HierarchySpec(Task, "parent", TaskType.USER_STORY),
+    TaskType.TEST_CASE: HierarchySpec(TestCase, "parent", TaskType.USER_STORY),
+    TaskType.WBS: HierarchySpec(WBS, "parent", TaskType.EPIC),
+    TaskType.BUG: HierarchySpec(Bug, "user_story_id", TaskType.USER_STORY, has_parent_type=False),
+    TaskType.ISSUE: HierarchySpec(Issue, "user_story_id", TaskType.USER_STORY, has_parent_type=False),
+    TaskType.PBI: HierarchySpec(PBI, "feature_id", TaskType.FEATURE, has_parent_type=False),
+}
+
+# Pais antes dos filhos: usado na reconstrução completa do índice
+INDEX_ORDER: List[TaskType] = [
+    TaskType.EPIC, TaskType.FEATURE, TaskType.WBS, TaskType.PBI, TaskType.USER_STORY,
+    TaskType.TASK, TaskType.TEST_CASE, TaskType.ISSUE, TaskType.BUG,
+]
+
+
+class HierarchyNode(NamedTuple):
+    type: str
+    id: int
+    depth: int
+    is_active: bool
+
+
+def get_spec(task_type: TaskType) -> HierarchySpec:
+    """Retorna a spec de hierarquia do TaskType ou lança ValueError se o tipo não for indexado."""
+    spec = HIERARCHY_SPECS.get(task_type)
+    if spec is None:
+        raise ValueError(f"Tipo {task_type.value} não faz parte do índice de hierarquia.")
+    return spec
+
+
+def parent_of(task_type: TaskType, item: Any) -> Optional[int]:
+    """ID do pai hierárquico de um artefato carregado (Epic: team_project_id)."""
+    spec = HIERARCHY_SPECS.get(task_type)
+    return getattr(item, spec.parent_column) if spec else None
+
+
+def _parent_type_expr(spec: HierarchySpec):
+    if spec.has_parent_type:
+        return func.coalesce(spec.model.__table__.c.parent_type, spec.default_parent_type.value)
+    return literal(spec.default_parent_type.value)
+
+
+def index_items(db: Session, task_type: TaskType, ids: Optional[Iterable[int]] = None) -> None:
+    """
+    Indexa os itens (todos, se `ids` for None) com um único INSERT ... SELECT: linha própria
+    (depth 0), pai direto (depth 1) e os ancestrais do pai já indexados (depth + 1).
+    Idempotente: itens que já têm a linha própria no índice são ignorados.
+    """
+    spec = get_spec(task_type)
+    table = spec.model.__table__
+    h = ArtifactHierarchy.__table__
+    type_value = literal(task_type.value)
+    parent_id = table.c[spec.parent_column]
+    parent_type = _parent_type_expr(spec)
+    is_active = func.coalesce(table.c.is_active, True)
+
+    indexed = h.alias("indexed")  # Alias: o SELECT dos ancestrais também usa `h` no FROM
+    conditions = [~exists().where(indexed.c.descendant_type == task_type.value,
+                                  indexed.c.descendant_id == table.c.id, indexed.c.depth == 0)]
+    if ids is not None:
+        ids = list(ids)
+        if not ids:
+            return
+        conditions.append(table.c.id.in_(ids))
+
+    own = select(type_value, table.c.id, type_value, table.c.id, literal(0), is_active).where(*conditions)
+    direct_parent = (select(parent_type, parent_id, type_value, table.c.id, literal(1), is_active)
+                     .where(parent_id.isnot(None), *conditions))
+    ancestors = (
+        select(h.c.ancestor_type, h.c.ancestor_id, type_value, table.c.id, h.c.depth + 1, is_active)
+        .select_from(table.join(h, and_(h.c.descendant_type == parent_type, h.c.descendant_id == parent_id,
+                                         h.c.depth >= 1)))
+        .where(*conditions)
+    )
+    db.execute(h.insert().from_select(
+        ["ancestor_type", "ancestor_id", "descendant_type", "descendant_id", "depth", "is_active"],
+        union_all(own, direct_parent, ancestors),
+    ))
+
+
+def mark_inactive(db: Session, task_type: TaskType, ids: Iterable[int]) -> None:
+    """Marca os itens como inativos no índice (todas as linhas em que são descendentes)."""
+    ids = list(ids)
+    if not ids or task_type not in HIERARCHY_SPECS:
+        return
+    h = ArtifactHierarchy.__table__
+    db.execute(update(h).where(h.c.descendant_type == task_type.value, h.c.descendant_id.in_(ids))
+               .values(is_active=False))
+
+
+def get_subtree(db: Session, task_type: TaskType, item_id: int, include_inactive: bool = False,
+                max_depth: Optional[int] = None) -> List[HierarchyNode]:
+    """Descendentes de (tipo, id) numa única consulta, ordenados por profundidade (sem o próprio nó)."""
+    h = ArtifactHierarchy.__table__
+    stmt = select(h.c.descendant_type, h.c.descendant_id, h.c.depth, h.c.is_active).where(
+        h.c.ancestor_type == task_type.value, h.c.ancestor_id == item_id, h.c.depth >= 1)
+    if not include_inactive:
+        stmt = stmt.where(h.c.is_active == True)
+    if max_depth is not None:
+        stmt = stmt.where(h.c.depth <= max_depth)
+    stmt = stmt.order_by(h.c.depth, h.c.descendant_type, h.c.descendant_id)
+    return [HierarchyNode(*row) for row in db.execute(stmt)]
+
+
+def get_ancestors(db: Session, task_type: TaskType, item_id: int) -> List[HierarchyNode]:
+    """
+    Cadeia de ancestrais de (tipo, id) numa única consulta, do pai direto até a raiz.
+    O is_active de cada ancestral vem da linha própria dele (ancestrais fora do índice, como
+    o projeto do Epic, são considerados ativos).
+    """
+    h = ArtifactHierarchy.__table__
+    own = h.alias("own")
+    stmt = (
+        select(h.c.ancestor_type, h.c.ancestor_id, h.c.depth, func.coalesce(own.c.is_active, True))
+        .select_from(h.outerjoin(own, and_(own.c.descendant_type == h.c.ancestor_type,
+                                           own.c.descendant_id == h.c.ancestor_id, own.c.depth == 0)))
+        .where(h.c.descendant_type == task_type.value, h.c.descendant_id == item_id, h.c.depth >= 1)
+        .order_by(h.c.depth)
+    )
+    return [HierarchyNode(*row) for row in db.execute(stmt)]
+
+
+def rebuild_index(db: Session) -> None:
+    """Reconstrói o índice inteiro a partir das tabelas (backfill / correção). Não faz commit."""
+    db.execute(delete(ArtifactHierarchy.__table__))
+    for task_type in INDEX_ORDER:
+        index_items(db, task_type)
+        logger.info(f"Índice de hierarquia reconstruído para {task_type.value}.")
+
+
+def main() -> None:
+    from app.database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        rebuild_index(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+# app/utils/history.py
+"""
+Arquivo de versões: move versões inativas das tabelas quentes para `artifact_history`.
+
+Cada regeneração desativa a versão anterior (is_active=False) e, sem arquivamento, as
+linhas mortas ficam para sempre em features/user_stories/test_cases/actions. O arquivamento
+é feito em lotes, filhos antes dos pais: uma linha só sai da tabela quente quando nenhuma
+outra linha quente a referencia por FK (ex: uma Feature inativa com User Stories ainda
+presentes fica até as User Stories serem arquivadas). As ações dos TestCases vão junto,
+embutidas em data["actions"].
+
+Consulta: `list_versions` / `artifact_versions` juntam as versões das tabelas quentes e do
+histórico de uma mesma linhagem (tipo + pai).
+"""
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import Column, delete, exists, func, insert, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from app.models import Action, ArtifactHierarchy, ArtifactHistory, Base, TaskType
+from app.utils import hierarchy, json_codec, metrics
+
+logger = logging.getLogger(__name__)
+
+# Filhos antes dos pais (inverso da ordem de indexação da hierarquia)
+ARCHIVE_ORDER: List[TaskType] = list(reversed(hierarchy.INDEX_ORDER))
+
+
+class ArtifactVersion(NamedTuple):
+    id: int
+    version: Optional[int]
+    is_active: bool
+    archived: bool
+    created_at: Optional[datetime]
+    deactivated_at: Optional[datetime]
+    data: Dict[str, Any]
+
+
+def create_partitions(conn: Connection) -> None:
+    """
+    Cria as partições de `artifact_history` (uma por tipo + DEFAULT) no PostgreSQL, na
+    transação de `conn`. Idempotente; em outros bancos a tabela não é particionada e nada
+    é feito. Também chamada no after_create da tabela (Base.metadata.create_all).
+    """
+    if conn.dialect.name != "postgresql":
+        return
+    for task_type in ARCHIVE_ORDER:
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS artifact_history_{task_type.value} PARTITION OF artifact_history "
+            f"FOR VALUES IN ('{task_type.value}')"
+        ))
+    conn.execute(text("CREATE TABLE IF NOT EXISTS artifact_history_default PARTITION OF artifact_history DEFAULT"))
+
+
+def ensure_partitions(engine: Engine) -> None:
+    """`create_partitions` numa transação própria do engine."""
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        create_partitions(conn)
+
+
+def _referencing_columns(table) -> List[Column]:
+    """Colunas de outras tabelas com FK para `table` (exceto actions, arquivadas junto com o TestCase)."""
+    return [
+        fk.parent
+        for other in Base.metadata.sorted_tables if other is not Action.__table__
+        for fk in other.foreign_keys if fk.column.table is table
+    ]
+
+
+def _plain(row: Dict[str, Any]) -> Dict[str, Any]:
+    # datetime/UUID -> tipos JSON, independente do json_serializer do engine
+    return json_codec.loads(json_codec.dumps_bytes(row))
+
+
+def _attach_actions(db: Session, test_cases: List[Dict[str, Any]]) -> None:
+    """Embute as ações de cada TestCase em row["actions"] (uma única consulta)."""
+    table = Action.__table__
+    actions: Dict[int, List[Dict[str, Any]]] = {}
+    stmt = select(table).where(table.c.test_case_id.in_([row["id"] for row in test_cases])).order_by(table.c.id)
+    for action in db.execute(stmt).mappings():
+        actions.setdefault(action["test_case_id"], []).append(dict(action))
+    for row in test_cases:
+        row["actions"] = actions.get(row["id"], [])
+
+
+def archive_batch(db: Session, task_type: TaskType, cutoff: datetime, batch_size: int) -> int:
+    """
+    Arquiva um lote de versões inativas de `task_type` desativadas antes de `cutoff`.
+    Um SELECT ... FOR UPDATE SKIP LOCKED, um INSERT no histórico e os DELETEs (ações,
+    linhas quentes e índice de hierarquia). Não faz commit. Retorna quantas linhas moveu.
+    """
+    spec = hierarchy.get_spec(task_type)
+    table = spec.model.__table__
+    has_parent_type = "parent_type" in table.c
+
+    stmt = (
+        select(table)
+        .where(
+            table.c.is_active == False,
+            func.coalesce(table.c.updated_at, table.c.created_at) < cutoff,
+            *[~exists().where(column == table.c.id) for column in _referencing_columns(table)],
+        )
+        .order_by(table.c.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    rows = [dict(row) for row in db.execute(stmt).mappings()]
+    if not rows:
+        return 0
+    ids = [row["id"] for row in rows]
+
+    if task_type == TaskType.TEST_CASE:
+        _attach_actions(db, rows)
+        db.execute(delete(Action.__table__).where(Action.__table__.c.test_case_id.in_(ids)))
+
+    db.execute(insert(ArtifactHistory.__table__), [
+        {
+            "artifact_type": task_type.value,
+            "artifact_id": row["id"],
+            "version": row.get("version"),
+            "project_id": row.get("project_id"),
+            "parent": row.get(spec.parent_column),
+            "parent_type": (row["parent_type"] if has_parent_type else None) or spec.default_parent_type.value,
+            "data": _plain(row),
+            "created_at": row.get("created_at"),
+            "deactivated_at": row.get("updated_at"),
+        }
+        for row in rows
+    ])
+    db.execute(delete(table).where(table.c.id.in_(ids)))
+    index = ArtifactHierarchy.__table__
+    db.execute(delete(index).where(index.c.descendant_type == task_type.value, index.c.descendant_id.in_(ids)))
+    metrics.increment("history_archived_total", len(rows), artifact_type=task_type.value)
+    return len(rows)
+
+
+def list_versions(db: Session, task_type: TaskType, parent: Optional[int],
+                  parent_type: Optional[str] = None) -> List[ArtifactVersion]:
+    """
+    Todas as versões (ativas, inativas e arquivadas) de uma linhagem tipo + pai,
+    da mais recente para a mais antiga.
+    """
+    spec = hierarchy.get_spec(task_type)
+    table = spec.model.__table__
+    parent_type = parent_type or spec.default_parent_type.value
+
+    hot_stmt = select(table).where(table.c[spec.parent_column] == parent)
+    if "parent_type" in table.c:
+        hot_stmt = hot_stmt.where(func.coalesce(table.c.parent_type, spec.default_parent_type.value) == parent_type)
+    hot_rows = [dict(row) for row in db.execute(hot_stmt).mappings()]
+    if task_type == TaskType.TEST_CASE and hot_rows:
+        _attach_actions(db, hot_rows)
+
+    h = ArtifactHistory.__table__
+    archived_rows = db.execute(
+        select(h.c.artifact_id, h.c.version, h.c.created_at, h.c.deactivated_at, h.c.data)
+        .where(h.c.artifact_type == task_type.value, h.c.parent_type == parent_type, h.c.parent == parent)
+    ).all()
+
+    versions = [
+        ArtifactVersion(row["id"], row.get("version"), bool(row.get("is_active")), False,
+                        row.get("created_at"), None if row.get("is_active") else row.get("updated_at"), _plain(row))
+        for row in hot_rows
+    ] + [
+        ArtifactVersion(row.artifact_id, row.version, False, True, row.created_at, row.deactivated_at, row.data)
+        for row in archived_rows
+    ]
+    versions.sort(key=lambda v: (-(v.version or 0), v.id))
+    return versions
+
+
+def artifact_versions(db: Session, task_type: TaskType, artifact_id: int) -> Optional[List[ArtifactVersion]]:
+    """
+    Versões da linhagem do artefato (mesmo tipo e mesmo pai), esteja ele na tabela quente
+    ou já arquivado. Retorna None se o artefato não existir em nenhum dos dois.
+    """
+    spec = hierarchy.get_spec(task_type)
+    table = spec.model.__table__
+    columns = [table.c[spec.parent_column]]
+    if "parent_type" in table.c:
+        columns.append(table.c.parent_type)
+    row = db.execute(select(*columns).where(table.c.id == artifact_id)).first()
+    if row is None:
+        h = ArtifactHistory.__table__
+        row = db.execute(select(h.c.parent, h.c.parent_type).where(
+            h.c.artifact_type == task_type.value, h.c.artifact_id == artifact_id)).first()
+        if row is None:
+            return None
+    parent = row[0]
+    parent_type = row[1] if len(row) > 1 else None
+    return list_versions(db, task_type, parent, parent_type)
@@ -0,0 +1,125 @@
+# app/utils/json_codec.py
+"""
+Codec JSON plugável usado pelos parsers, pelo serializer do Celery, pelo
+producer AMQP e pelas colunas JSON do SQLAlchemy.
+
+O backend é escolhido pela variável de ambiente JSON_CODEC ("orjson",
+"msgspec", "json" ou "auto"). Em modo "auto" (padrão) usa o primeiro backend
+rápido instalado e cai para a biblioteca padrão `json` se nenhum estiver
+disponível.
+"""
+import json
+import logging
+import os
+from typing import Any, Callable, Tuple, Union
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# orjson.JSONDecodeError já herda deste tipo e msgspec.DecodeError é convertido nele,
+# então os `except json.JSONDecodeError` existentes continuam válidos.
+JSONDecodeError = json.JSONDecodeError
+
+CELERY_SERIALIZER_NAME = "fastjson"
+CELERY_CONTENT_TYPE = "application/x-fastjson"
+
+_SUPPORTED_BACKENDS = ("orjson", "msgspec", "json")
+
+
+def _stdlib_dumps_bytes(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def _stdlib_loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+
+def _load_orjson() -> Tuple[Callable[[Any], bytes], Callable[[Any], Any]]:
+    import orjson
+
+    def dumps_bytes(obj: Any) -> bytes:
+        # default=str cobre tipos não nativos (ex: Decimal) como a fallback stdlib
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+    # orjson.JSONDecodeError já é subclasse de json.JSONDecodeError
+    return dumps_bytes, orjson.loads
+
+
+def _load_msgspec() -> Tuple[Callable[[Any], bytes], Callable[[Any], Any]]:
+    import msgspec
+
+    encoder = msgspec.json.Encoder(enc_hook=str)
+    decoder = msgspec.json.Decoder()
+
+    def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+        try:
+            return decoder.decode(data)
+        except msgspec.DecodeError as e:
+            raise JSONDecodeError(str(e), data if isinstance(data, str) else "", 0) from e
+
+    return encoder.encode, loads
+
+
+_LOADERS = {
+    "orjson": _load_orjson,
+    "msgspec": _load_msgspec,
+}
+
+
+def _select_backend(requested: str) -> Tuple[str, Callable[[Any], bytes], Callable[[Any], Any]]:
+    """Resolve o backend solicitado, caindo para stdlib json se não estiver instalado."""
+    requested = (requested or "auto").strip().lower()
+    if requested not in _SUPPORTED_BACKENDS and requested != "auto":
+        logger.warning(f"JSON_CODEC desconhecido: '{requested}'. Usando modo 'auto'.")
+        requested = "auto"
+
+    candidates = ["orjson", "msgspec"] if requested == "auto" else [requested]
+    for name in candidates:
+        if name == "json":
+            break
+        try:
+            dumps_bytes, loads = _LOADERS[name]()
+            return name, dumps_bytes, loads
+        except ImportError:
+            if requested != "auto":
+                logger.warning(f"Backend JSON '{name}' não instalado. Usando json da biblioteca padrão.")
+    return "json", _stdlib_dumps_bytes, _stdlib_loads
+
+
+BACKEND, _dumps_bytes, _loads = _select_backend(os.getenv("JSON_CODEC", "auto"))
+logger.debug(f"Codec JSON em uso: {BACKEND}")
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """Serializa `obj` para JSON compacto em UTF-8 (bytes)."""
+    return _dumps_bytes(obj)
+
+
+def dumps(obj: Any) -> str:
+    """Serializa `obj` para JSON compacto (str)."""
+    return _dumps_bytes(obj).decode("utf-8")
+
+
+def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+    """Desserializa JSON a partir de str ou bytes. Lança JSONDecodeError em JSON inválido."""
+    return _loads(data)
+
+
+def register_celery_serializer() -> None:
+    """
+    Registra o serializer `fastjson` no registry do kombu.
+    Idempotente: pode ser chamado por qualquer módulo que configure uma app Celery.
+    """
+    from kombu.serialization import register
+
+    register(
+        CELERY_SERIALIZER_NAME,
+        dumps_bytes,
+        loads,
+        content_type=CELERY_CONTENT_TYPE,
+        content_encoding="utf-8",
+    )
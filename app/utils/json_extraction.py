@@ -0,0 +1,216 @@
+# app/utils/json_extraction.py
+"""
+Extração tolerante de JSON a partir da saída da LLM.
+
+Modelos frequentemente envolvem o JSON em blocos ```json, adicionam uma frase
+antes/depois do array ou deixam vírgulas sobrando. Em vez de falhar a geração
+inteira (e pagar outra chamada à LLM), `extract_json` localiza o valor JSON mais
+externo e aplica reparos comuns, registrando em métricas quais foram usados.
+"""
+import logging
+import re
+from typing import Any, Callable, List, NamedTuple, Optional, Tuple
+from app.utils import json_codec, metrics
+
+logger = logging.getLogger(__name__)
+
+_FENCE_BLOCK = re.compile(r"```[A-Za-z0-9_-]*[ \t]*\r?\n?(.*?)```", re.DOTALL)
+_FENCE_OPEN = re.compile(r"^```[A-Za-z0-9_-]*[ \t]*\r?\n?")
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+_PYTHON_LITERALS = re.compile(r"\b(True|False|None)\b")
+_LINE_COMMENT = re.compile(r"(^|\s)//[^\n]*")
+_PYTHON_TO_JSON = {"True": "true", "False": "false", "None": "null"}
+
+
+class JSONExtractionError(json_codec.JSONDecodeError):
+    """
+    Nenhum valor JSON válido pôde ser extraído/reparado do texto.
+    Herda de JSONDecodeError (e portanto ValueError) para ser tratada pelos handlers existentes.
+    """
+    def __init__(self, msg: str, doc: str = "", pos: int = 0):
+        super().__init__(msg, doc, pos)
+
+    def __str__(self) -> str:
+        return self.msg
+
+
+class ExtractionResult(NamedTuple):
+    value: Any  # Valor JSON desserializado (list/dict)
+    text: str  # Texto JSON limpo correspondente a `value`
+    repairs: List[str]  # Reparos aplicados, na ordem
+
+
+def _split_strings(text: str) -> List[Tuple[bool, str]]:
+    """Divide o texto em segmentos (é_string, conteúdo), respeitando escapes."""
+    segments: List[Tuple[bool, str]] = []
+    buf_start = 0
+    i = 0
+    length = len(text)
+    while i < length:
+        if text[i] == '"':
+            if i > buf_start:
+                segments.append((False, text[buf_start:i]))
+            j = i + 1
+            while j < length:
+                if text[j] == "\\":
+                    j += 2
+                    continue
+                if text[j] == '"':
+                    break
+                j += 1
+            end = min(j + 1, length)
+            segments.append((True, text[i:end]))
+            i = buf_start = end
+            continue
+        i += 1
+    if buf_start < length:
+        segments.append((False, text[buf_start:]))
+    return segments
+
+
+def _map_outside_strings(text: str, fn: Callable[[str], str]) -> str:
+    return "".join(seg if is_str else fn(seg) for is_str, seg in _split_strings(text))
+
+
+def _map_inside_strings(text: str, fn: Callable[[str], str]) -> str:
+    return "".join(fn(seg) if is_str else seg for is_str, seg in _split_strings(text))
+
+
+def _find_value_end(text: str, start: int) -> Optional[int]:
+    """Índice logo após o fechamento do valor iniciado em `start` (None se desbalanceado)."""
+    depth = 0
+    in_string = False
+    escape = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return None
+
+
+def _strip_fences(text: str) -> str:
+    for block in _FENCE_BLOCK.findall(text):
+        if "{" in block or "[" in block:
+            return block.strip()
+    # Bloco aberto e nunca fechado (ex: saída truncada)
+    return _FENCE_OPEN.sub("", text, count=1).strip()
+
+
+def _fix_smart_quotes(text: str) -> str:
+    # Só substitui se as aspas "inteligentes" estiverem fazendo papel de delimitador
+    if '"' in text:
+        return text
+    return text.replace("\u201c", '"').replace("\u201d", '"').replace("\u201e", '"')
+
+
+def _escape_control_characters(text: str) -> str:
+    return _map_inside_strings(text, lambda s: s.replace("\r", "\\r").replace("\n", "\\n").replace("\t", "\\t"))
+
+
+def _remove_trailing_commas(text: str) -> str:
+    return _map_outside_strings(text, lambda s: _TRAILING_COMMA.sub(r"\1", s))
+
+
+def _fix_python_literals(text: str) -> str:
+    return _map_outside_strings(text, lambda s: _PYTHON_LITERALS.sub(lambda m: _PYTHON_TO_JSON[m.group(1)], s))
+
+
+def _remove_comments(text: str) -> str:
+    return _map_outside_strings(text, lambda s: _LINE_COMMENT.sub(r"\1", s))
+
+
+# Ordem importa: reparos mais comuns/baratos primeiro
+_REPAIRS: List[Tuple[str, Callable[[str], str]]] = [
+    ("smart_quotes", _fix_smart_quotes),
+    ("control_characters", _escape_control_characters),
+    ("trailing_commas", _remove_trailing_commas),
+    ("comments", _remove_comments),
+    ("python_literals", _fix_python_literals),
+]
+
+
+def _try_loads(text: str) -> Tuple[bool, Any]:
+    try:
+        return True, json_codec.loads(text)
+    except json_codec.JSONDecodeError:
+        return False, None
+
+
+def _record(repairs: List[str], task_type: str) -> None:
+    for repair in repairs:
+        metrics.increment("llm_json_repairs_total", repair=repair, task_type=task_type)
+
+
+def extract_json(text: Optional[str], task_type: str = "unknown") -> ExtractionResult:
+    """
+    Extrai o valor JSON mais externo de `text`, aplicando reparos se necessário.
+
+    Args:
+        text: Saída bruta da LLM.
+        task_type: Usado apenas como label nas métricas.
+
+    Returns:
+        ExtractionResult com o valor, o texto JSON limpo e a lista de reparos aplicados.
+
+    Raises:
+        JSONExtractionError: Se nenhum JSON válido puder ser obtido.
+    """
+    if not text or not text.strip():
+        metrics.increment("llm_json_extraction_failures_total", task_type=task_type)
+        raise JSONExtractionError("Resposta da LLM vazia; nenhum JSON encontrado.")
+
+    ok, value = _try_loads(text)
+    if ok:
+        return ExtractionResult(value, text, [])
+
+    repairs: List[str] = []
+    candidate = text.strip().lstrip("\ufeff")
+
+    if "```" in candidate:
+        unfenced = _strip_fences(candidate)
+        if unfenced != candidate:
+            repairs.append("markdown_fence")
+            candidate = unfenced
+
+    starts = [idx for idx in (candidate.find("{"), candidate.find("[")) if idx != -1]
+    if not starts:
+        metrics.increment("llm_json_extraction_failures_total", task_type=task_type)
+        raise JSONExtractionError("Nenhum objeto ou array JSON encontrado na resposta da LLM.")
+    start = min(starts)
+    end = _find_value_end(candidate, start)
+    snippet = candidate[start:end] if end is not None else candidate[start:]
+    if start > 0 or (end is not None and candidate[end:].strip()):
+        repairs.append("surrounding_prose")
+
+    ok, value = _try_loads(snippet)
+    if not ok:
+        for name, repair in _REPAIRS:
+            repaired = repair(snippet)
+            if repaired == snippet:
+                continue
+            snippet = repaired
+            repairs.append(name)
+            ok, value = _try_loads(snippet)
+            if ok:
+                break
+
+    if not ok:
+        metrics.increment("llm_json_extraction_failures_total", task_type=task_type)
+        raise JSONExtractionError(f"JSON inválido e não reparável na resposta da LLM (reparos tentados: {repairs or 'nenhum'}).")
+
+    _record(repairs, task_type)
+    logger.info(f"JSON extraído da resposta da LLM ({task_type}) com reparos: {repairs}")
+    return ExtractionResult(value, snippet, repairs)
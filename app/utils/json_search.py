@@ -0,0 +1,135 @@
+# app/utils/json_search.py
+"""
+Consultas sobre as colunas JSONB (tags, gherkin).
+
+No PostgreSQL os filtros viram operadores JSONB (`@>`) servidos pelos índices GIN
+jsonb_path_ops declarados em app.models; em outros bancos (SQLite dos testes) as linhas
+do projeto são carregadas e filtradas em Python com a mesma semântica.
+O filtro por projeto usa a coluna project_id; os itens da rota /generate a recebem do pai
+(WorkItemProcessor.process e migração 0007).
+"""
+import logging
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence
+from uuid import UUID
+
+from sqlalchemy import cast, literal, literal_column, or_, select, type_coerce, union_all
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Session
+
+from app.models import TaskType, Epic, Bug, Issue, PBI, TestCase
+from app.utils import json_codec
+
+logger = logging.getLogger(__name__)
+
+TAGGED_MODELS: Dict[TaskType, type] = {
+    TaskType.EPIC: Epic,
+    TaskType.BUG: Bug,
+    TaskType.ISSUE: Issue,
+    TaskType.PBI: PBI,
+}
+
+GHERKIN_STEPS = ("scenario", "given", "when", "then")
+
+
+class SearchHit(NamedTuple):
+    type: str
+    id: int
+    title: Optional[str]
+    version: Optional[int]
+
+
+def _is_postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def gherkin_document():
+    """Gherkin como JSONB, seja string JSON (formato do parser) ou objeto: mesma expressão do índice GIN."""
+    return cast(TestCase.gherkin.op("#>>")(literal_column("'{}'")), JSONB)
+
+
+def _gherkin_dict(value: Any) -> Dict[str, Any]:
+    if isinstance(value, str):
+        try:
+            value = json_codec.loads(value)
+        except json_codec.JSONDecodeError:
+            return {}
+    return value if isinstance(value, dict) else {}
+
+
+def match_tags(item_tags: Any, tags: Sequence[str], match_all: bool = True) -> bool:
+    """Semântica do filtro de tags (também usada no fallback em Python)."""
+    present = set(item_tags or [])
+    return all(tag in present for tag in tags) if match_all else any(tag in present for tag in tags)
+
+
+def find_by_tags(db: Session, project_id: UUID, tags: Sequence[str], task_types: Optional[Iterable[TaskType]] = None,
+                 match_all: bool = True, include_inactive: bool = False) -> List[SearchHit]:
+    """
+    Artefatos do projeto com as tags (todas, ou qualquer uma com match_all=False).
+    PostgreSQL: um único UNION ALL com `tags @> '[...]'` por tabela (índices GIN).
+    """
+    models = [(task_type, TAGGED_MODELS[task_type]) for task_type in (task_types or TAGGED_MODELS)]
+    tags = list(tags)
+    if not tags:
+        return []
+
+    if not _is_postgres(db):
+        hits = []
+        for task_type, model in models:
+            stmt = select(model.id, model.title, model.version, model.tags).where(model.project_id == project_id)
+            if not include_inactive:
+                stmt = stmt.where(model.is_active == True)
+            hits.extend(SearchHit(task_type.value, row.id, row.title, row.version)
+                        for row in db.execute(stmt) if match_tags(row.tags, tags, match_all))
+        return sorted(hits, key=lambda hit: (hit.type, hit.id))
+
+    selects = []
+    for task_type, model in models:
+        column = type_coerce(model.tags, JSONB)
+        condition = column.contains(tags) if match_all else or_(*[column.contains([tag]) for tag in tags])
+        stmt = select(literal(task_type.value).label("type"), model.id, model.title, model.version).where(
+            model.project_id == project_id, condition)
+        if not include_inactive:
+            stmt = stmt.where(model.is_active == True)
+        selects.append(stmt)
+    union = union_all(*selects).subquery()
+    return [SearchHit(*row) for row in db.execute(select(union).order_by(union.c.type, union.c.id))]
+
+
+def search_gherkin(db: Session, project_id: UUID, term: str, step: Optional[str] = None, exact: bool = False,
+                   include_inactive: bool = False) -> List[SearchHit]:
+    """
+    Casos de teste do projeto cujo Gherkin contém `term` (em `step` ou em qualquer passo).
+    Com exact=True (exige `step`) a busca é por igualdade via `@>`, servida pelo índice GIN;
+    sem exact é um ILIKE restrito ao projeto.
+    """
+    if step is not None and step not in GHERKIN_STEPS:
+        raise ValueError(f"Passo Gherkin inválido: {step}")
+    if exact and step is None:
+        raise ValueError("Busca exata no Gherkin exige o passo (step).")
+    steps = [step] if step else list(GHERKIN_STEPS)
+
+    if not _is_postgres(db):
+        stmt = select(TestCase.id, TestCase.title, TestCase.version, TestCase.gherkin).where(TestCase.project_id == project_id)
+        if not include_inactive:
+            stmt = stmt.where(TestCase.is_active == True)
+        needle = term.lower()
+        hits = []
+        for row in db.execute(stmt):
+            document = _gherkin_dict(row.gherkin)
+            values = [str(document.get(name, "")) for name in steps]
+            if (exact and values[0] == term) or (not exact and any(needle in value.lower() for value in values)):
+                hits.append(SearchHit(TaskType.TEST_CASE.value, row.id, row.title, row.version))
+        return sorted(hits, key=lambda hit: hit.id)
+
+    document = gherkin_document()
+    if exact:
+        condition = document.contains({step: term})
+    else:
+        pattern = f"%{term}%"
+        condition = or_(*[document[name].astext.ilike(pattern) for name in steps])
+    stmt = select(literal(TaskType.TEST_CASE.value), TestCase.id, TestCase.title, TestCase.version).where(
+        TestCase.project_id == project_id, condition)
+    if not include_inactive:
+        stmt = stmt.where(TestCase.is_active == True)
+    return [SearchHit(*row) for row in db.execute(stmt.order_by(TestCase.id))]
@@ -0,0 +1,170 @@
+# app/utils/metrics.py
+"""
+Contadores e gauges da aplicação.
+
+Nomes seguem o estilo Prometheus (`<assunto>_<unidade>_total`) e aceitam labels
+como kwargs, ex.: increment("llm_json_repairs_total", repair="markdown_fence").
+
+Cada valor fica em memória do processo (`get`/`snapshot`, usados nos testes e nos
+benchmarks) e é espelhado no prometheus_client para exposição:
+- API: rota GET /metrics (app/routers/metrics.py);
+- workers Celery e serviços (relay, consumidor, pruner, archiver): `start_http_exporter`
+  sobe um endpoint HTTP em METRICS_PORT (0 = desligado).
+Com vários processos (gunicorn -w N, Celery prefork) defina PROMETHEUS_MULTIPROC_DIR:
+cada processo grava os valores em arquivos nesse diretório e a exposição soma todos
+(modo multiprocess do prometheus_client). Gauges expõem o valor mais recente.
+"""
+import logging
+import os
+import shutil
+import threading
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()  # PROMETHEUS_MULTIPROC_DIR precisa estar no ambiente antes do import do prometheus_client
+
+try:
+    import prometheus_client
+    from prometheus_client import CollectorRegistry, Counter, Gauge, multiprocess
+except ImportError:  # Sem o pacote: só os valores em memória (a exposição usa o snapshot)
+    prometheus_client = None
+
+logger = logging.getLogger(__name__)
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR", "")
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = defaultdict(float)
+# Espelho no prometheus_client: nome -> (métrica, nomes dos labels)
+_exported: Dict[str, Tuple[object, Tuple[str, ...]]] = {}
+_registry = CollectorRegistry() if prometheus_client is not None and not PROMETHEUS_MULTIPROC_DIR else None
+
+
+def _key(name: str, labels: Dict[str, object]) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _export(kind: str, name: str, value: float, labels: Tuple[Tuple[str, str], ...]) -> None:
+    """Atualiza a métrica do prometheus_client. Falha aqui nunca afeta quem registra a métrica."""
+    if prometheus_client is None:
+        return
+    labelnames = tuple(k for k, _ in labels)
+    try:
+        exported = _exported.get(name)
+        if exported is None:
+            if kind == "counter":
+                metric = Counter(name, name, labelnames, registry=_registry)
+            else:
+                metric = Gauge(name, name, labelnames, registry=_registry, multiprocess_mode="mostrecent")
+            exported = _exported[name] = (metric, labelnames)
+        metric, expected = exported
+        if labelnames != expected:
+            logger.warning(f"Métrica {name} com labels {labelnames} diferentes de {expected}: não exportada.")
+            return
+        target = metric.labels(**dict(labels)) if labelnames else metric
+        if kind == "counter":
+            target.inc(value)
+        else:
+            target.set(value)
+    except Exception as e:
+        logger.warning(f"Falha ao exportar métrica {name}: {e}")
+
+
+def increment(name: str, value: float = 1, **labels) -> None:
+    """Incrementa o contador `name` com os labels fornecidos."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] += value
+        _export("counter", name, value, key[1])
+    logger.debug(f"Métrica {name}{labels} += {value}")
+
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    """Define o valor atual do gauge `name` (ex: tamanho de tabela em bytes)."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = value
+        _export("gauge", name, value, key[1])
+    logger.debug(f"Métrica {name}{labels} = {value}")
+
+
+def get(name: str, **labels) -> float:
+    """Valor atual do contador neste processo (0 se nunca incrementado)."""
+    with _lock:
+        return _counters.get(_key(name, labels), 0)
+
+
+def snapshot() -> Dict[str, Dict[str, float]]:
+    """Cópia de todos os contadores do processo: {nome: {"label=valor,...": valor}}."""
+    result: Dict[str, Dict[str, float]] = defaultdict(dict)
+    with _lock:
+        for (name, labels), value in _counters.items():
+            result[name][",".join(f"{k}={v}" for k, v in labels)] = value
+    return dict(result)
+
+
+def _render_snapshot() -> bytes:
+    lines = []
+    with _lock:
+        for (name, labels), value in sorted(_counters.items()):
+            rendered = ",".join(f'{k}="{v}"' for k, v in labels)
+            lines.append(f"{name}{{{rendered}}} {value}" if rendered else f"{name} {value}")
+    return ("\n".join(lines) + "\n").encode()
+
+
+def _collection_registry():
+    """Registry lido na exposição: o do processo ou, em modo multiprocess, a soma dos arquivos."""
+    if not PROMETHEUS_MULTIPROC_DIR:
+        return _registry
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def exposition() -> bytes:
+    """Métricas no formato texto do Prometheus (de todos os processos em modo multiprocess)."""
+    if prometheus_client is None:
+        return _render_snapshot()
+    return prometheus_client.generate_latest(_collection_registry())
+
+
+def prepare_multiprocess_dir() -> None:
+    """
+    Limpa PROMETHEUS_MULTIPROC_DIR. Chamar uma vez no processo pai (gunicorn on_starting,
+    Celery worker_init), antes dos filhos: arquivos de execuções anteriores somariam valores antigos.
+    """
+    if not PROMETHEUS_MULTIPROC_DIR:
+        return
+    shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+
+def mark_process_dead(pid: int) -> None:
+    """Remove os gauges do processo filho que terminou (modo multiprocess)."""
+    if prometheus_client is not None and PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
+
+
+def start_http_exporter(port: int = METRICS_PORT) -> Optional[object]:
+    """Sobe o endpoint HTTP de métricas dos workers e serviços (port 0 = desligado)."""
+    if not port:
+        return None
+    if prometheus_client is None:
+        logger.warning("prometheus_client não instalado: endpoint de métricas não iniciado.")
+        return None
+    server, _thread = prometheus_client.start_http_server(port, registry=_collection_registry())
+    logger.info(f"Métricas expostas em :{port}/metrics.")
+    return server
+
+
+def reset() -> None:
+    """Zera todos os contadores (uso em testes)."""
+    with _lock:
+        _counters.clear()
+        if _registry is not None:
+            for metric, _ in _exported.values():
+                _registry.unregister(metric)
+        _exported.clear()
@@ -0,0 +1,319 @@
+# app/utils/migrations.py
+"""
+Helpers para as migrações Alembic (diretório migrations/) e dry-run com estimativa de lock.
+
+Regras das migrações que tocam tabelas grandes (PostgreSQL):
+- índices em tabelas existentes: `create_index_concurrently` (SHARE UPDATE EXCLUSIVE, não
+  bloqueia escrita; fora de transação via autocommit_block; índice inválido de execução
+  anterior é removido e recriado);
+- backfills: `run_in_batches` / `batched_backfill`, um commit por faixa de id, com pausa entre
+  lotes e lote adaptativo (encolhe quando um lote passa de MIGRATION_BATCH_TARGET_SECONDS);
+- DDL com ACCESS EXCLUSIVE só em passos curtos (só metadados). O env.py define lock_timeout
+  (MIGRATION_LOCK_TIMEOUT) para a migração falhar em vez de enfileirar o tráfego atrás dela.
+
+Em modo offline (`alembic upgrade --sql`) os helpers emitem o SQL equivalente sem consultar o banco.
+
+Dry-run (não aplica nada): SQL pendente de cada revisão, nível de lock por comando e
+linhas/tamanho estimados das tabelas afetadas (pg_class.reltuples):
+    python -m app.utils.migrations [--target head]
+"""
+import argparse
+import logging
+import os
+import re
+import sys
+import time
+from io import StringIO
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+from alembic import op
+from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "5000"))
+MIGRATION_BATCH_SLEEP = float(os.getenv("MIGRATION_BATCH_SLEEP", "0.05"))  # Pausa (s) entre lotes
+MIGRATION_BATCH_TARGET_SECONDS = float(os.getenv("MIGRATION_BATCH_TARGET_SECONDS", "1.0"))
+MIGRATION_LOCK_TIMEOUT = os.getenv("MIGRATION_LOCK_TIMEOUT", "5s")
+MIN_BATCH_SIZE = 100
+LARGE_TABLE_ROWS = int(os.getenv("MIGRATION_LARGE_TABLE_ROWS", "100000"))  # Acima disso, lock proporcional é risco alto
+
+BATCH_MARKER = "-- migrations: em lotes"
+
+
+def is_postgresql() -> bool:
+    return op.get_context().dialect.name == "postgresql"
+
+
+def is_offline() -> bool:
+    return op.get_context().as_sql
+
+
+def create_index_concurrently(name: str, table: str, columns: Sequence, **kwargs) -> None:
+    """
+    Cria um índice sem bloquear escrita. PostgreSQL: CREATE INDEX CONCURRENTLY IF NOT EXISTS
+    fora de transação (um índice inválido, sobra de execução interrompida, é recriado).
+    Outros bancos: CREATE INDEX comum. `postgresql_only=True` pula os demais bancos (GIN etc.).
+    """
+    postgresql_only = kwargs.pop("postgresql_only", False)
+    if not is_postgresql():
+        if not postgresql_only:
+            op.create_index(name, table, columns, **kwargs)
+        return
+    with op.get_context().autocommit_block():
+        if not is_offline():
+            valid = op.get_bind().execute(text(
+                "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"
+            ), {"name": name}).scalar()
+            if valid is False:
+                logger.warning(f"Índice {name} inválido (CONCURRENTLY interrompido); recriando.")
+                op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+        op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True, **kwargs)
+
+
+def drop_index_concurrently(name: str, table: str, **kwargs) -> None:
+    """DROP INDEX CONCURRENTLY IF EXISTS no PostgreSQL; DROP INDEX nos demais bancos."""
+    postgresql_only = kwargs.pop("postgresql_only", False)
+    if not is_postgresql():
+        if not postgresql_only:
+            op.drop_index(name, table_name=table, **kwargs)
+        return
+    with op.get_context().autocommit_block():
+        op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True, **kwargs)
+
+
+def run_in_batches(sql: str, table: str, key: str = "id", params: Optional[Dict] = None,
+                   batch_size: Optional[int] = None, sleep: Optional[float] = None) -> int:
+    """
+    Executa `sql` (com os parâmetros :start e :end) para cada faixa [start, end) de `table.key`,
+    um commit por lote. O lote encolhe pela metade quando passa de MIGRATION_BATCH_TARGET_SECONDS
+    e volta a crescer até `batch_size` quando fica rápido. Retorna as linhas afetadas.
+    Offline: emite um único comando cobrindo a tabela inteira.
+    """
+    batch_size = batch_size or MIGRATION_BATCH_SIZE
+    sleep = MIGRATION_BATCH_SLEEP if sleep is None else sleep
+    params = dict(params or {})
+
+    if is_offline():
+        whole = sql.replace(":start", f"(SELECT min({key}) FROM {table})").replace(":end", f"(SELECT max({key}) + 1 FROM {table})")
+        op.execute(f"{BATCH_MARKER} (batch_size={batch_size}, {table}.{key})\n{whole}")
+        return 0
+
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        low, high = conn.execute(text(f"SELECT min({key}), max({key}) FROM {table}")).one()
+        if low is None:
+            return 0
+        total, batches, size, start = 0, 0, batch_size, low
+        while start <= high:
+            began = time.monotonic()
+            result = conn.execute(text(sql), {**params, "start": start, "end": start + size})
+            elapsed = time.monotonic() - began
+            total += max(result.rowcount or 0, 0)
+            batches += 1
+            start += size
+            if elapsed > MIGRATION_BATCH_TARGET_SECONDS:
+                size = max(MIN_BATCH_SIZE, size // 2)
+            elif elapsed < MIGRATION_BATCH_TARGET_SECONDS / 2:
+                size = min(batch_size, size * 2)
+            if batches % 100 == 0:
+                logger.info(f"{table}: {batches} lote(s), {total} linha(s), {key} até {start - 1} de {high}.")
+            if sleep:
+                time.sleep(sleep)  # Dá espaço para o tráfego normal, a replicação e o autovacuum
+    logger.info(f"{table}: concluído em {batches} lote(s), {total} linha(s).")
+    return total
+
+
+def batched_backfill(table: str, set_clause: str, where: Optional[str] = None, key: str = "id",
+                     params: Optional[Dict] = None, batch_size: Optional[int] = None,
+                     sleep: Optional[float] = None) -> int:
+    """UPDATE `table` SET `set_clause` [WHERE `where`] em lotes por faixa de `key` (ver run_in_batches)."""
+    condition = f"{key} >= :start AND {key} < :end"
+    if where:
+        condition += f" AND ({where})"
+    return run_in_batches(f"UPDATE {table} SET {set_clause} WHERE {condition}", table, key, params, batch_size, sleep)
+
+
+# --- Dry-run: classificação de lock -------------------------------------------------------
+
+class LockImpact(NamedTuple):
+    statement: str
+    table: Optional[str]
+    lock: str  # Modo de lock do PostgreSQL na tabela afetada ("-" quando não há tabela existente)
+    blocks: str  # "nada", "escrita" ou "leitura e escrita"
+    duration: str  # "breve" (só metadados), "proporcional" (varre/reescreve a tabela) ou "em lotes"
+    rows: Optional[int] = None
+    bytes: Optional[int] = None
+
+    @property
+    def risk(self) -> str:
+        if self.blocks == "nada" or self.duration != "proporcional":
+            return "baixo"
+        return "alto" if (self.rows or 0) >= LARGE_TABLE_ROWS else "médio"
+
+
+_IDENT = r'"?([\w.]+)"?'
+# (padrão, modo de lock, o que bloqueia, duração); a primeira regra que casar vale
+LOCK_RULES = [
+    (rf"^CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\b.*?\bON\s+(?:ONLY\s+)?{_IDENT}", "SHARE UPDATE EXCLUSIVE", "nada", "proporcional"),
+    (rf"^CREATE\s+(?:UNIQUE\s+)?INDEX\b.*?\bON\s+(?:ONLY\s+)?{_IDENT}", "SHARE", "escrita", "proporcional"),
+    (r"^DROP\s+INDEX\s+CONCURRENTLY\b", "SHARE UPDATE EXCLUSIVE", "nada", "breve"),
+    (r"^DROP\s+INDEX\b", "ACCESS EXCLUSIVE", "leitura e escrita", "breve"),
+    (rf"^CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?[\w.\"]+\s+PARTITION\s+OF\s+{_IDENT}", "ACCESS EXCLUSIVE", "leitura e escrita", "breve"),
+    (rf"^CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?{_IDENT}", "-", "nada", "breve"),
+    (rf"^DROP\s+TABLE\s+(?:IF\s+EXISTS\s+)?{_IDENT}", "ACCESS EXCLUSIVE", "leitura e escrita", "breve"),
+    (rf"^ALTER\s+TABLE\s+(?:IF\s+EXISTS\s+)?(?:ONLY\s+)?{_IDENT}.*\bALTER\s+COLUMN\b.*\bTYPE\b", "ACCESS EXCLUSIVE", "leitura e escrita", "proporcional"),
+    (rf"^ALTER\s+TABLE\s+(?:IF\s+EXISTS\s+)?(?:ONLY\s+)?{_IDENT}.*\bSET\s+NOT\s+NULL\b", "ACCESS EXCLUSIVE", "leitura e escrita", "proporcional"),
+    (rf"^ALTER\s+TABLE\s+(?:IF\s+EXISTS\s+)?(?:ONLY\s+)?{_IDENT}.*\bADD\s+CONSTRAINT\b.*\bNOT\s+VALID\b", "SHARE ROW EXCLUSIVE", "escrita", "breve"),
+    (rf"^ALTER\s+TABLE\s+(?:IF\s+EXISTS\s+)?(?:ONLY\s+)?{_IDENT}.*\bVALIDATE\s+CONSTRAINT\b", "SHARE UPDATE EXCLUSIVE", "nada", "proporcional"),
+    (rf"^ALTER\s+TABLE\s+(?:IF\s+EXISTS\s+)?(?:ONLY\s+)?{_IDENT}.*\bADD\s+(?:CONSTRAINT\s+\S+\s+)?FOREIGN\s+KEY\b", "SHARE ROW EXCLUSIVE", "escrita", "proporcional"),
+    (rf"^ALTER\s+TABLE\s+(?:IF\s+EXISTS\s+)?(?:ONLY\s+)?{_IDENT}.*\bADD\s+(?:CONSTRAINT\s+\S+\s+)?(?:UNIQUE|PRIMARY\s+KEY)\b", "ACCESS EXCLUSIVE", "leitura e escrita", "proporcional"),
+    (rf"^ALTER\s+TABLE\s+(?:IF\s+EXISTS\s+)?(?:ONLY\s+)?{_IDENT}.*\bDETACH\s+PARTITION\b.*\bCONCURRENTLY\b", "SHARE UPDATE EXCLUSIVE", "nada", "breve"),
+    (rf"^ALTER\s+TABLE\s+(?:IF\s+EXISTS\s+)?(?:ONLY\s+)?{_IDENT}", "ACCESS EXCLUSIVE", "leitura e escrita", "breve"),
+    (rf"^ALTER\s+INDEX\s+(?:IF\s+EXISTS\s+)?{_IDENT}", "ACCESS EXCLUSIVE", "leitura e escrita", "breve"),
+    (rf"^LOCK\s+TABLE\s+{_IDENT}", "ACCESS EXCLUSIVE", "leitura e escrita", "breve"),
+    (rf"^(?:CREATE|DROP)\s+TRIGGER\b.*?\bON\s+{_IDENT}", "SHARE ROW EXCLUSIVE", "escrita", "breve"),
+    (rf"^UPDATE\s+{_IDENT}", "ROW EXCLUSIVE", "nada", "proporcional"),
+    (rf"^DELETE\s+FROM\s+{_IDENT}", "ROW EXCLUSIVE", "nada", "proporcional"),
+    (rf"^INSERT\s+INTO\s+{_IDENT}", "ROW EXCLUSIVE", "nada", "breve"),
+]
+# Sem efeito de lock em tabelas de dados
+_IGNORED = re.compile(r"^(BEGIN|COMMIT|SET\b|SELECT\b|CREATE\s+(OR\s+REPLACE\s+)?FUNCTION\b|DROP\s+FUNCTION\b|"
+                      r"(INSERT\s+INTO|UPDATE|CREATE\s+TABLE)\s+alembic_version\b)", re.IGNORECASE)
+_COMPILED_RULES = [(re.compile(pattern, re.IGNORECASE | re.DOTALL), lock, blocks, duration)
+                   for pattern, lock, blocks, duration in LOCK_RULES]
+
+
+def _strip_comments(statement: str) -> str:
+    return "\n".join(line for line in statement.splitlines() if not line.strip().startswith("--")).strip()
+
+
+def classify(statement: str) -> Optional[LockImpact]:
+    """Nível de lock de um comando SQL do PostgreSQL; None para comandos sem impacto (BEGIN, SET, ...)."""
+    sql = _strip_comments(statement)
+    if not sql or _IGNORED.match(sql):
+        return None
+    batched = BATCH_MARKER in statement
+    for pattern, lock, blocks, duration in _COMPILED_RULES:
+        match = pattern.match(sql)
+        if match:
+            table = match.group(1).split(".")[-1] if match.groups() else None
+            return LockImpact(sql, table, lock, blocks, "em lotes" if batched else duration)
+    return LockImpact(sql, None, "desconhecido", "verificar", "verificar")
+
+
+def split_statements(script: str) -> List[str]:
+    """Separa o SQL gerado pelo modo offline do Alembic (comandos terminados em ';' no fim da linha)."""
+    statements, current, in_dollar = [], [], False
+    for line in script.splitlines():
+        current.append(line)
+        in_dollar ^= line.count("$$") % 2 == 1  # Corpo de função plpgsql
+        if not in_dollar and line.rstrip().endswith(";"):
+            statements.append("\n".join(current).strip().rstrip(";").strip())
+            current = []
+    if "".join(current).strip():
+        statements.append("\n".join(current).strip())
+    return [statement for statement in statements if _strip_comments(statement) or BATCH_MARKER in statement]
+
+
+def classify_script(script: str) -> List[LockImpact]:
+    """
+    Classifica os comandos de um script. Comandos sobre tabelas criadas antes no mesmo script
+    (ainda vazias e sem tráfego) não bloqueiam nada.
+    """
+    impacts, created = [], set()
+    for impact in filter(None, map(classify, split_statements(script))):
+        if re.match(r"^CREATE\s+TABLE\b(?!.*\bPARTITION\s+OF\b)", impact.statement, re.IGNORECASE | re.DOTALL):
+            created.add(impact.table)
+            impact = impact._replace(table=None)
+        elif impact.table in created:
+            impact = impact._replace(lock="-", blocks="nada", duration="breve", table=None)
+        impacts.append(impact)
+    return impacts
+
+
+def estimate(conn: Connection, impacts: Iterable[LockImpact]) -> List[LockImpact]:
+    """Preenche linhas (reltuples) e tamanho (pg_total_relation_size, somando partições) das tabelas afetadas."""
+    impacts = list(impacts)
+    tables = sorted({impact.table for impact in impacts if impact.table})
+    sizes = {}
+    for table in tables:
+        row = conn.execute(text(
+            "SELECT sum(greatest(c.reltuples, 0))::bigint, sum(pg_total_relation_size(c.oid))::bigint "
+            "FROM pg_class c WHERE c.oid IN (SELECT relid FROM pg_partition_tree(to_regclass(:table)))"
+        ), {"table": table}).one()
+        sizes[table] = (row[0], row[1]) if row[0] is not None else (None, None)
+    return [impact._replace(rows=sizes[impact.table][0], bytes=sizes[impact.table][1]) if impact.table else impact
+            for impact in impacts]
+
+
+def pending_sql(config, conn: Connection, target: str = "head") -> Dict[str, str]:
+    """SQL (modo offline) de cada revisão pendente entre a versão atual do banco e `target`."""
+    from alembic import command
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+
+    current = MigrationContext.configure(conn).get_current_revision()
+    script = ScriptDirectory.from_config(config)
+    revisions = list(reversed(list(script.iterate_revisions(target, current or "base"))))
+    scripts = {}
+    for revision in revisions:
+        buffer = StringIO()
+        config.output_buffer = buffer
+        span = f"{revision.down_revision}:{revision.revision}" if revision.down_revision else revision.revision
+        command.upgrade(config, span, sql=True)
+        scripts[revision.revision] = buffer.getvalue()
+    config.output_buffer = None
+    return scripts
+
+
+def format_report(scripts: Dict[str, List[LockImpact]]) -> str:
+    lines = []
+    for revision, impacts in scripts.items():
+        lines.append(f"== {revision}")
+        for impact in impacts:
+            size = "" if impact.rows is None else f" ~{impact.rows} linha(s), {(impact.bytes or 0) // 1024 // 1024} MB"
+            first_line = impact.statement.splitlines()[0][:100]
+            lines.append(f"  [{impact.risk:>5}] {impact.lock:<22} bloqueia {impact.blocks:<17} {impact.duration:<12}"
+                         f" {impact.table or '-'}{size}\n          {first_line}")
+        if not impacts:
+            lines.append("  (sem comandos com impacto de lock)")
+    return "\n".join(lines) if lines else "Banco já está na revisão alvo."
+
+
+def dry_run(target: str = "head") -> str:
+    """Relatório de impacto de lock das migrações pendentes no banco de DATABASE_URL (PostgreSQL)."""
+    from alembic.config import Config
+    from sqlalchemy import create_engine
+    from app.database import DATABASE_URL
+
+    config = Config(os.path.join(os.path.dirname(__file__), "..", "..", "alembic.ini"))
+    engine = create_engine(DATABASE_URL)
+    try:
+        if engine.dialect.name != "postgresql":
+            raise ValueError("A estimativa de lock só se aplica ao PostgreSQL.")
+        with engine.connect() as conn:
+            scripts = pending_sql(config, conn, target)
+            report = {
+                revision: estimate(conn, classify_script(sql))
+                for revision, sql in scripts.items()
+            }
+    finally:
+        engine.dispose()
+    return format_report(report)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Dry-run das migrações pendentes: SQL, locks e tamanho das tabelas.")
+    parser.add_argument("--target", default="head", help="Revisão alvo (padrão: head).")
+    args = parser.parse_args()
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), stream=sys.stderr)
+    print(dry_run(args.target))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# app/utils/outbox.py
+"""
+Gravação de notificações no outbox transacional.
+
+Em vez de publicar no RabbitMQ durante a task (dual-write: commit no banco e depois
+publish, com retries bloqueando o worker), a notificação vira uma linha em
+`notification_outbox` na MESMA transação dos artefatos e do status da requisição.
+O relay (`python -m app.workers.outbox_relay`) publica as linhas pendentes com
+publisher confirms e as marca como publicadas.
+"""
+import logging
+import os
+from typing import Any, Dict, List
+from sqlalchemy.orm import Session
+from app.models import OutboxMessage
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Mesmo nome de app.utils.rabbitmq.NOTIFICATION_QUEUE, sem importar pika no worker
+NOTIFICATION_QUEUE = "notification_queue"
+# Envelopes de lote (relay com NOTIFICATION_PUBLISH_MODE=batch|both)
+NOTIFICATION_BATCH_QUEUE = os.getenv("NOTIFICATION_BATCH_QUEUE", "notification_batch_queue")
+BATCH_ENVELOPE_TYPE = "notification_batch"
+
+
+def batch_envelope(payloads: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Envelope com várias notificações, publicado como uma única mensagem."""
+    return {"type": BATCH_ENVELOPE_TYPE, "count": len(payloads), "notifications": payloads}
+
+
+def unwrap(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Notificações de uma mensagem: as do envelope de lote ou a própria mensagem."""
+    if isinstance(payload, dict) and payload.get("type") == BATCH_ENVELOPE_TYPE:
+        return list(payload.get("notifications") or [])
+    return [payload]
+
+
+def enqueue_notification(db: Session, payload: Dict[str, Any], queue: str = NOTIFICATION_QUEUE) -> OutboxMessage:
+    """Adiciona a notificação ao outbox na transação corrente. Não faz commit."""
+    message = OutboxMessage(request_id=payload.get("request_id"), queue=queue, payload=payload, attempts=0)
+    db.add(message)
+    metrics.increment("outbox_enqueued_total", queue=queue)
+    logger.debug(f"Notificação enfileirada no outbox para ReqID {payload.get('request_id')} (fila {queue}).")
+    return message
@@ -0,0 +1,222 @@
+# app/utils/parser_registry.py
+"""
+Registry único de parsers por TaskType.
+
+Cada `ParserSpec` declara o schema Pydantic da resposta, o modelo SQLAlchemy e o
+mapeamento de campos. A mesma spec é usada na criação (`parse_items`) e no
+reprocessamento (`parse_update`). Os `TypeAdapter`s são construídos uma única vez,
+no import, e validam direto do texto/bytes JSON (`validate_json`), sem dict intermediário.
+"""
+import logging
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Type, Union
+from pydantic import BaseModel, TypeAdapter, ValidationError, create_model
+from app.models import TaskType, Epic, Feature, UserStory, Task, Bug, Issue, PBI, TestCase, Action, WBS
+from app.schemas.schemas import (
+    EpicResponse, FeatureResponse, UserStoryResponse, TaskResponse,
+    BugResponse, IssueResponse, PBIResponse, TestCaseResponse, WBSResponse
+)
+from app.utils import json_codec
+from app.utils.json_extraction import extract_json
+
+logger = logging.getLogger(__name__)
+
+JSONInput = Union[str, bytes, bytearray]
+# Envelope da saída estruturada (app.utils.structured_output): {"items": [...]}; o strict da OpenAI exige objeto na raiz
+ENVELOPE_KEY = "items"
+
+
+def format_acceptance_criteria(value: Any) -> Optional[str]:
+    """Lista de critérios -> string com marcadores ("- item" por linha)."""
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, list):
+        return "\n".join(f"- {item}" for item in value)
+    logger.warning(f"acceptance_criteria em formato inesperado ({type(value)}), convertendo para string.")
+    return str(value)
+
+
+class FieldSpec(NamedTuple):
+    source: str  # Atributo do schema Pydantic
+    column: str  # Coluna do modelo SQLAlchemy
+    formatter: Optional[Callable[[Any], Any]] = None
+
+
+def _field(source: str, column: Optional[str] = None, formatter: Optional[Callable[[Any], Any]] = None) -> FieldSpec:
+    return FieldSpec(source, column or source, formatter)
+
+
+class ParserSpec:
+    """
+    Especificação declarativa de parsing de um TaskType.
+
+    Args:
+        task_type: Tipo do artefato.
+        label: Nome usado nas mensagens de erro.
+        schema: Schema Pydantic de um item da resposta da LLM.
+        model: Modelo SQLAlchemy criado a partir do item.
+        fields: Campos copiados do schema para o modelo (com formatação opcional).
+        parent_column: Coluna que recebe o ID do pai na criação (None para Epic).
+        many: Se a criação aceita lista de itens (ou objeto único).
+        wrapper_key: Chave que envolve cada item (ex: {"bug": {...}}); formato sem wrapper também é aceito.
+        child_field: Campo de lista com itens filhos (ex: actions do TestCase).
+        child_model: Modelo SQLAlchemy dos filhos.
+    """
+
+    def __init__(self, task_type: TaskType, label: str, schema: Type[BaseModel], model: type,
+                 fields: Sequence[FieldSpec], parent_column: Optional[str] = "parent", many: bool = True,
+                 wrapper_key: Optional[str] = None, child_field: Optional[str] = None,
+                 child_model: Optional[type] = None):
+        self.task_type = task_type
+        self.label = label
+        self.schema = schema
+        self.model = model
+        self.fields = tuple(fields)
+        self.parent_column = parent_column
+        self.many = many
+        self.wrapper_key = wrapper_key
+        self.child_field = child_field
+        self.child_model = child_model
+
+        item_type: Any = schema
+        if wrapper_key:
+            wrapper = create_model(f"{schema.__name__}Wrapper", **{wrapper_key: (schema, ...)})
+            item_type = Union[wrapper, schema]
+        self.envelope = create_model(f"{schema.__name__}Envelope", **{ENVELOPE_KEY: (List[item_type], ...)})
+        # Adapters compilados uma vez: objeto único e "lista, objeto ou envelope"
+        self.single_adapter: TypeAdapter = TypeAdapter(item_type)
+        self.many_adapter: TypeAdapter = TypeAdapter(Union[List[item_type], item_type, self.envelope])
+
+    # --- Validação ---
+
+    def _unwrap(self, item: BaseModel) -> BaseModel:
+        if self.wrapper_key and not isinstance(item, self.schema):
+            return getattr(item, self.wrapper_key)
+        return item
+
+    def validate(self, response: JSONInput, many: Optional[bool] = None, structured: bool = False) -> List[BaseModel]:
+        """
+        Valida o JSON e retorna a lista de itens do schema.
+        Tenta `validate_json` direto; só recorre à extração tolerante se o JSON for inválido.
+        Com `structured` (saída garantida pelo JSON Schema do provedor) não há extração tolerante.
+        """
+        adapter = self.many_adapter if (self.many if many is None else many) else self.single_adapter
+        try:
+            validated = adapter.validate_json(response)
+        except ValidationError as e:
+            if structured or not any(err.get("type") == "json_invalid" for err in e.errors()):
+                raise
+            text = response.decode("utf-8") if isinstance(response, (bytes, bytearray)) else response
+            validated = adapter.validate_json(extract_json(text, self.task_type.value).text)
+        if isinstance(validated, self.envelope):
+            validated = getattr(validated, ENVELOPE_KEY)
+        items = validated if isinstance(validated, list) else [validated]
+        return [self._unwrap(item) for item in items]
+
+    def _values(self, item: BaseModel) -> Dict[str, Any]:
+        values: Dict[str, Any] = {}
+        for source, column, formatter in self.fields:
+            value = getattr(item, source)
+            values[column] = formatter(value) if formatter else value
+        return values
+
+    # --- Criação ---
+
+    def parse_items(self, response: JSONInput, parent_id: Optional[int], prompt_tokens: int,
+                    completion_tokens: int, **extra_columns) -> List[Any]:
+        """
+        Cria instâncias do modelo SQLAlchemy a partir da resposta da LLM.
+        Campos como version, is_active, project_id e parent_type são definidos pelo processador.
+
+        Raises:
+            ValueError: Se ocorrer um erro durante o parsing ou validação.
+        """
+        try:
+            items = self.validate(response)
+        except (json_codec.JSONDecodeError, ValidationError) as e:
+            error_message = f"Erro ao parsear resposta de {self.label}: {e}"
+            logger.error(error_message, exc_info=True)
+            logger.debug(f"Resposta JSON problemática ({self.label}): {response}")
+            raise ValueError(error_message) from e
+
+        if not items:
+            logger.warning(f"Recebida lista vazia de {self.label} da LLM.")
+            return []
+
+        instances = []
+        for item in items:
+            columns = self._values(item)
+            if self.parent_column:
+                columns[self.parent_column] = parent_id
+            columns.update(extra_columns)
+            instance = self.model(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, **columns)
+            if self.child_field:
+                children = getattr(instance, self.child_field)
+                for child in getattr(item, self.child_field):
+                    children.append(self.child_model(**child.model_dump()))
+            instances.append(instance)
+        logger.info(f"Parsing de {len(instances)} {self.label}(s) concluído com sucesso.")
+        return instances
+
+    # --- Reprocessamento ---
+
+    def parse_update(self, response: JSONInput) -> Dict[str, Any]:
+        """
+        Retorna o dicionário {coluna: valor} para atualizar um artefato existente.
+        Se a LLM retornar uma lista, usa o primeiro item. Filhos (ex: actions) vêm como lista de dicts.
+
+        Raises:
+            ValueError: Se ocorrer um erro durante o parsing ou validação.
+        """
+        try:
+            items = self.validate(response, many=True)
+            if not items:
+                raise ValueError(f"Resposta JSON para atualização de {self.label} está vazia.")
+        except (json_codec.JSONDecodeError, ValidationError) as e:
+            error_message = f"Erro ao parsear {self.label} para reprocessamento: {e}"
+            logger.error(error_message, exc_info=True)
+            logger.debug(f"Resposta JSON problemática (Update {self.label}): {response}")
+            raise ValueError(error_message) from e
+
+        item = items[0]
+        update = self._values(item)
+        if self.child_field:
+            update[self.child_field] = [child.model_dump() for child in getattr(item, self.child_field)]
+        return update
+
+
+PARSER_SPECS: Dict[TaskType, ParserSpec] = {
+    spec.task_type: spec for spec in (
+        ParserSpec(TaskType.EPIC, "Épico", EpicResponse, Epic,
+                   fields=[_field("title"), _field("description"), _field("tags"), _field("reflection"), _field("summary")],
+                   parent_column=None, many=False),
+        ParserSpec(TaskType.FEATURE, "Feature", FeatureResponse, Feature,
+                   fields=[_field("title"), _field("description"),
+                           _field("acceptance_criteria", formatter=format_acceptance_criteria), _field("summary")]),
+        ParserSpec(TaskType.USER_STORY, "User Story", UserStoryResponse, UserStory,
+                   fields=[_field("title"), _field("description"),
+                           _field("acceptance_criteria", formatter=format_acceptance_criteria), _field("priority")]),
+        ParserSpec(TaskType.TASK, "Task", TaskResponse, Task,
+                   fields=[_field("title"), _field("description"), _field("estimate")]),
+        ParserSpec(TaskType.TEST_CASE, "TestCase", TestCaseResponse, TestCase,
+                   fields=[_field("title"), _field("gherkin", formatter=json_codec.dumps), _field("priority")],
+                   child_field="actions", child_model=Action),
+        ParserSpec(TaskType.WBS, "WBS", WBSResponse, WBS, fields=[_field("wbs")], many=False),
+        ParserSpec(TaskType.BUG, "Bug", BugResponse, Bug,
+                   fields=[_field("title"), _field("reproSteps", "repro_steps"), _field("systemInfo", "system_info"), _field("tags")],
+                   parent_column="user_story_id", wrapper_key="bug"),
+        ParserSpec(TaskType.ISSUE, "Issue", IssueResponse, Issue,
+                   fields=[_field("title"), _field("description"), _field("tags")],
+                   parent_column="user_story_id", wrapper_key="issue"),
+        ParserSpec(TaskType.PBI, "PBI", PBIResponse, PBI,
+                   fields=[_field("title"), _field("description"), _field("tags")],
+                   parent_column="feature_id", wrapper_key="pbi"),
+    )
+}
+
+
+def get_spec(task_type: TaskType) -> ParserSpec:
+    """Retorna a spec do TaskType ou lança ValueError se não houver parser JSON para ele."""
+    spec = PARSER_SPECS.get(task_type)
+    if spec is None:
+        raise ValueError(f"Parser para {task_type} não encontrado.")
+    return spec
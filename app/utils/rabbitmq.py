@@ -1,9 +1,14 @@
 from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_exception_type
 import pika
-import json
+import functools
 import logging
 import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Optional, Set, Tuple
 from dotenv import load_dotenv
+from app.utils import json_codec, metrics
 
 load_dotenv()
 
@@ -14,12 +19,17 @@ RABBITMQ_QUEUE = os.getenv("RABBITMQ_QUEUE")
 RABBITMQ_USER = os.getenv("RABBITMQ_USER", "guest")
 RABBITMQ_PASSWORD = os.getenv("RABBITMQ_PASSWORD", "guest")
 NOTIFICATION_QUEUE = "notification_queue"
+NOTIFICATION_BATCH_QUEUE = os.getenv("NOTIFICATION_BATCH_QUEUE", "notification_batch_queue")  # Envelopes de lote
+# Exchange fanout com cópia dos eventos de conclusão (invalidação do cache de leitura da API)
+NOTIFICATION_EVENTS_EXCHANGE = os.getenv("NOTIFICATION_EVENTS_EXCHANGE", "notification_events")
 
 
 class RabbitMQProducer:
-    def __init__(self):
+    def __init__(self, confirm_delivery: bool = False):
         self.connection = None
         self.channel = None
+        # Publisher confirms: basic_publish só retorna após o ack do broker (NackError/UnroutableError em falha)
+        self.confirm_delivery = confirm_delivery
         self._connect()
 
     def _connect(self):
@@ -31,6 +41,10 @@ class RabbitMQProducer:
             self.channel = self.connection.channel()
             self.channel.queue_declare(queue=RABBITMQ_QUEUE, durable=True)
             self.channel.queue_declare(queue=NOTIFICATION_QUEUE, durable=True) # Declara a nova fila
+            self.channel.queue_declare(queue=NOTIFICATION_BATCH_QUEUE, durable=True)
+            self.channel.exchange_declare(exchange=NOTIFICATION_EVENTS_EXCHANGE, exchange_type="fanout", durable=True)
+            if self.confirm_delivery:
+                self.channel.confirm_delivery()
             logger.info(f"Conectado ao RabbitMQ em {RABBITMQ_HOST}")
         except pika.exceptions.AMQPConnectionError as e:
             logger.error(f"Erro ao conectar ao RabbitMQ: {e}", exc_info=True)
@@ -49,7 +63,7 @@ class RabbitMQProducer:
             self.channel.basic_publish(
                 exchange='',
                 routing_key=queue_name,  # Usa o nome da fila fornecido
-                body=json.dumps(message),
+                body=json_codec.dumps_bytes(message),
                 properties=pika.BasicProperties(delivery_mode=2)
             )
             logger.debug(f"Mensagem publicada no RabbitMQ (fila {queue_name}): {message}")
@@ -66,6 +80,12 @@ class RabbitMQProducer:
             logger.error(f"Erro inesperado ao publicar: {e}", exc_info=True)
             raise # Re-levanta
 
+    def publish_event(self, message: dict, exchange: str = NOTIFICATION_EVENTS_EXCHANGE):
+        """Publica no exchange fanout de eventos (sem retry: o TTL do cache limita a defasagem)."""
+        if not self.connection or not self.connection.is_open:
+            self._connect()
+        self.channel.basic_publish(exchange=exchange, routing_key="", body=json_codec.dumps_bytes(message))
+
     def close(self):
         if self.connection and self.connection.is_open:
             self.connection.close()
@@ -75,46 +95,275 @@ class RabbitMQProducer:
         self.close()
 
 
-class RabbitMQConsumer: # Classe consumer não muda
-    def __init__(self, callback):
+RETRY_COUNT_HEADER = "x-retry-count"
+LAST_ERROR_HEADER = "x-last-error"
+RABBITMQ_CONSUMER_PREFETCH = int(os.getenv("RABBITMQ_CONSUMER_PREFETCH", "50"))
+RABBITMQ_CONSUMER_WORKERS = int(os.getenv("RABBITMQ_CONSUMER_WORKERS", "8"))
+RABBITMQ_CONSUMER_ACK_BATCH = int(os.getenv("RABBITMQ_CONSUMER_ACK_BATCH", "20"))
+RABBITMQ_CONSUMER_ACK_INTERVAL = float(os.getenv("RABBITMQ_CONSUMER_ACK_INTERVAL", "0.2"))  # s até o ack parcial
+RABBITMQ_CONSUMER_MAX_RETRIES = int(os.getenv("RABBITMQ_CONSUMER_MAX_RETRIES", "3"))
+RABBITMQ_CONSUMER_RETRY_DELAY_MS = int(os.getenv("RABBITMQ_CONSUMER_RETRY_DELAY_MS", "5000"))
+
+
+class AckTracker:
+    """
+    Acks em lote com `multiple=True`: o ack cobre todas as delivery tags até a informada, então
+    só pode chegar à maior tag contígua já concluída (os handlers terminam fora de ordem).
+    """
+
+    def __init__(self):
+        self._pending: Deque[int] = deque()  # Tags entregues e não confirmadas, em ordem de entrega
+        self._done: Set[int] = set()
+        self._ackable_tag: Optional[int] = None
+        self._ackable_count = 0
+
+    def add(self, delivery_tag: int) -> None:
+        self._pending.append(delivery_tag)
+
+    def complete(self, delivery_tag: int) -> None:
+        self._done.add(delivery_tag)
+        while self._pending and self._pending[0] in self._done:
+            tag = self._pending.popleft()
+            self._done.discard(tag)
+            self._ackable_tag = tag
+            self._ackable_count += 1
+
+    @property
+    def ackable(self) -> int:
+        return self._ackable_count
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    def take(self) -> Tuple[Optional[int], int]:
+        """(tag para basic_ack multiple, mensagens cobertas) e zera o lote."""
+        tag, count = self._ackable_tag, self._ackable_count
+        self._ackable_tag, self._ackable_count = None, 0
+        return tag, count
+
+
+def _default_connection_factory():
+    credentials = pika.PlainCredentials(RABBITMQ_USER, RABBITMQ_PASSWORD)
+    parameters = pika.ConnectionParameters(
+        host=RABBITMQ_HOST, credentials=credentials, heartbeat=600, blocked_connection_timeout=300)
+    return pika.BlockingConnection(parameters)
+
+
+class RabbitMQConsumer:
+    """
+    Consumidor com prefetch configurável, pool de handlers e acks em lote.
+
+    - A conexão (pika BlockingConnection) fica na thread que chama start_consuming; os handlers
+      rodam num ThreadPoolExecutor e devolvem o resultado para a thread da conexão
+      (add_callback_threadsafe), a única que usa o canal.
+    - Backpressure: o prefetch limita as mensagens entregues e ainda não confirmadas (em
+      processamento ou aguardando o ack do lote). Com handlers lentos o broker para de entregar,
+      e a fila acumula no RabbitMQ, não na memória do processo.
+    - Acks: um basic_ack(multiple=True) a cada `ack_batch` mensagens concluídas em sequência,
+      ou a cada `ack_interval` segundos.
+    - Falhas: a mensagem volta pela fila `<fila>.retry` (TTL de retry_delay_ms, depois
+      dead-letter de volta para a fila) com o header x-retry-count incrementado. Depois de
+      `max_retries` tentativas vai para o exchange `<fila>.dlx` (fila `<fila>.dead`) com
+      x-retry-count e x-last-error. Não há mais nack com requeue, que deixava uma mensagem
+      envenenada em loop. Se a publicação da cópia falhar (canal fechado, nack do broker), o
+      original fica sem ack, o canal é reaberto e o broker reentrega a mensagem.
+    A fila principal é declarada sem argumentos (compatível com a declaração do produtor).
+    Entrega at-least-once: se o processo cair antes do ack, o broker reentrega.
+
+    `callback(body: bytes, properties)` processa uma mensagem; exceção = falha.
+    """
+
+    def __init__(self, callback: Callable[[bytes, Any], None], queue: Optional[str] = None,
+                 prefetch: int = RABBITMQ_CONSUMER_PREFETCH, workers: int = RABBITMQ_CONSUMER_WORKERS,
+                 ack_batch: int = RABBITMQ_CONSUMER_ACK_BATCH, ack_interval: float = RABBITMQ_CONSUMER_ACK_INTERVAL,
+                 max_retries: int = RABBITMQ_CONSUMER_MAX_RETRIES, retry_delay_ms: int = RABBITMQ_CONSUMER_RETRY_DELAY_MS,
+                 connection_factory: Callable[[], Any] = _default_connection_factory):
+        self.callback = callback
+        self.queue = queue or RABBITMQ_QUEUE
+        self.retry_queue = f"{self.queue}.retry"
+        self.dead_letter_exchange = f"{self.queue}.dlx"
+        self.dead_letter_queue = f"{self.queue}.dead"
+        self.prefetch = max(1, prefetch)
+        self.workers = max(1, workers)
+        # Lote sempre abaixo do prefetch: senão o lote esperaria mensagens que o broker não entrega
+        self.ack_batch = max(1, min(ack_batch, self.prefetch // 2 or 1))
+        self.ack_interval = ack_interval
+        self.max_retries = max_retries
+        self.retry_delay_ms = retry_delay_ms
+        self.connection_factory = connection_factory
         self.connection = None
         self.channel = None
-        self.callback = callback
+        self.tracker = AckTracker()
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self._running = False
         self._connect()
 
     def _connect(self):
         try:
-            credentials = pika.PlainCredentials(RABBITMQ_USER, RABBITMQ_PASSWORD)
-            parameters = pika.ConnectionParameters(
-                host=RABBITMQ_HOST, credentials=credentials, heartbeat=600, blocked_connection_timeout=300)
-            self.connection = pika.BlockingConnection(parameters)
-            self.channel = self.connection.channel()
-            self.channel.queue_declare(queue=RABBITMQ_QUEUE, durable=True) # Mantem a declaração da fila de task
-            logger.info(f"Conectado ao RabbitMQ em {RABBITMQ_HOST}, queue: {RABBITMQ_QUEUE}")
-            self.channel.basic_qos(prefetch_count=1)
+            self.connection = self.connection_factory()
+            self._open_channel()
+            logger.info(f"Conectado ao RabbitMQ em {RABBITMQ_HOST}, fila {self.queue} (prefetch={self.prefetch}, "
+                        f"handlers={self.workers}, ack em lote={self.ack_batch}).")
         except pika.exceptions.AMQPConnectionError as e:
             logger.error(f"Erro ao conectar ao RabbitMQ: {e}", exc_info=True)
             raise
 
+    def _open_channel(self):
+        self.channel = self.connection.channel()
+        self.channel.queue_declare(queue=self.queue, durable=True)
+        self.channel.exchange_declare(exchange=self.dead_letter_exchange, exchange_type="direct", durable=True)
+        self.channel.queue_declare(queue=self.dead_letter_queue, durable=True)
+        self.channel.queue_bind(queue=self.dead_letter_queue, exchange=self.dead_letter_exchange, routing_key=self.queue)
+        self.channel.queue_declare(queue=self.retry_queue, durable=True, arguments={
+            "x-message-ttl": self.retry_delay_ms,
+            "x-dead-letter-exchange": "",
+            "x-dead-letter-routing-key": self.queue,
+        })
+        self.channel.confirm_delivery()  # Cópias de retry/dead-letter confirmadas antes do ack do original
+        self.channel.basic_qos(prefetch_count=self.prefetch)
+        self.tracker = AckTracker()  # Delivery tags recomeçam a cada canal
+
+    def _reopen_channel(self):
+        """
+        Troca o canal sem derrubar o processo. As mensagens sem ack do canal antigo voltam para a
+        fila e são reentregues no novo; resultados que ainda chegarem do canal antigo são descartados.
+        """
+        old = self.channel
+        if old is not None and old.is_open:
+            try:
+                self._flush_acks()  # O que já terminou não precisa ser reentregue
+                old.close()
+            except pika.exceptions.AMQPChannelError as e:
+                logger.warning(f"Falha ao fechar o canal antigo da fila {self.queue}: {e}")
+        self._open_channel()
+        self.channel.basic_consume(queue=self.queue, on_message_callback=self._on_message)
+        metrics.increment("rabbitmq_consumer_channel_reopens_total", queue=self.queue)
+        metrics.set_gauge("rabbitmq_consumer_in_flight", 0, queue=self.queue)
+        logger.warning(f"Canal da fila {self.queue} reaberto; mensagens sem ack serão reentregues.")
 
-    @retry(stop=stop_after_attempt(3), wait=wait_fixed(2), retry_error_callback=lambda retry_state: logger.warning(f"Tentativa de reconexão ao RabbitMQ ({retry_state.attempt_number}/{retry_state.outcome_sentinel})..."))
+    @retry(
+        retry=retry_if_exception_type(pika.exceptions.AMQPConnectionError),
+        stop=stop_after_attempt(3),
+        wait=wait_fixed(2),
+        reraise=True
+    )
     def start_consuming(self):
+        """Consome até stop(); reconecta em queda de conexão (mensagens sem ack são reentregues)."""
+        if not self.connection or not self.connection.is_open:
+            self._connect()
+        self._running = True
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="rabbitmq-handler")
         try:
-            self.channel.basic_consume(queue=RABBITMQ_QUEUE, on_message_callback=self._process_message)
+            self.channel.basic_consume(queue=self.queue, on_message_callback=self._on_message)
+            self.connection.call_later(self.ack_interval, self._on_ack_timer)
             logger.info("Consumer RabbitMQ aguardando mensagens...")
-            self.channel.start_consuming()
+            while True:
+                consuming = self.channel
+                try:
+                    consuming.start_consuming()
+                except pika.exceptions.AMQPChannelError as e:
+                    if consuming is self.channel:  # Canal fechado pelo broker fora do _settle
+                        logger.error(f"Canal da fila {self.queue} encerrado durante o consumo: {e}")
+                        self._reopen_channel()
+                # Volta a consumir se o canal foi trocado (_reopen_channel); senão foi stop()
+                if not self._running or consuming is self.channel:
+                    break
+            self._drain()
         except pika.exceptions.AMQPConnectionError as e:
             logger.error(f"Erro de conexão AMQP durante consumo: {e}", exc_info=True)
-            self._connect()
+            self.connection = None
             raise
+        finally:
+            self.executor.shutdown(wait=True)
 
-    def _process_message(self, ch, method, properties, body):
+    def stop(self, *_args):
+        """Para de receber; as mensagens em processamento terminam e são confirmadas (seguro em signal handler)."""
+        self._running = False
+        if self.connection and self.connection.is_open:
+            self.connection.add_callback_threadsafe(self.channel.stop_consuming)
+
+    def _drain(self, timeout: float = 30.0):
+        """Após o stop: espera os handlers em andamento e confirma o que terminou."""
+        deadline = time.monotonic() + timeout
+        while self.tracker.in_flight and time.monotonic() < deadline:
+            self.connection.process_data_events(time_limit=0.1)
+        self._flush_acks()
+
+    def _on_message(self, channel, method, properties, body):
+        self.tracker.add(method.delivery_tag)
+        metrics.set_gauge("rabbitmq_consumer_in_flight", self.tracker.in_flight, queue=self.queue)
+        self.executor.submit(self._handle, self.connection, channel, method.delivery_tag, properties, body)
+
+    def _handle(self, connection, channel, delivery_tag: int, properties, body: bytes):
+        """Thread do pool: executa o callback e devolve o resultado para a thread da conexão."""
+        error = None
         try:
-            self.callback(ch, method, properties, body)
+            self.callback(body, properties)
         except Exception as e:
-            logger.error(f"Erro ao processar mensagem: {e}", exc_info=True)
-            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
-    
+            error = e
+        try:
+            connection.add_callback_threadsafe(
+                functools.partial(self._settle, channel, delivery_tag, properties, body, error))
+        except Exception as e:  # Conexão caiu: o broker reentrega a mensagem
+            logger.warning(f"Resultado da mensagem {delivery_tag} descartado (conexão encerrada): {e}")
+
+    def _settle(self, channel, delivery_tag: int, properties, body: bytes, error: Optional[Exception]):
+        """Thread da conexão: encaminha falhas para retry/dead-letter e acumula o ack."""
+        if channel is not self.channel:
+            # Entregue por um canal já trocado: a tag não vale mais e o broker reentrega a mensagem
+            logger.info(f"Resultado da mensagem {delivery_tag} descartado (canal reaberto; será reentregue).")
+            return
+        if error is None:
+            metrics.increment("rabbitmq_consumer_messages_total", queue=self.queue, outcome="ok")
+        else:
+            try:
+                self._reroute(properties, body, error)
+            except pika.exceptions.AMQPChannelError as e:  # Inclui NackError/UnroutableError das confirmações
+                # Sem a cópia de retry/dead-letter não há ack: a mensagem fica sem confirmação e,
+                # com o canal reaberto, o broker a reentrega. Queda de conexão segue para start_consuming.
+                logger.error(f"Falha ao publicar retry/dead-letter da mensagem {delivery_tag} "
+                             f"da fila {self.queue}: {e}", exc_info=True)
+                metrics.increment("rabbitmq_consumer_messages_total", queue=self.queue, outcome="reroute_failed")
+                self._reopen_channel()
+                return
+        self.tracker.complete(delivery_tag)
+        metrics.set_gauge("rabbitmq_consumer_in_flight", self.tracker.in_flight, queue=self.queue)
+        if self.tracker.ackable >= self.ack_batch:
+            self._flush_acks()
+
+    def _reroute(self, properties, body: bytes, error: Exception):
+        headers = dict(getattr(properties, "headers", None) or {})
+        retries = int(headers.get(RETRY_COUNT_HEADER, 0)) + 1
+        headers[RETRY_COUNT_HEADER] = retries
+        new_properties = pika.BasicProperties(
+            delivery_mode=2, headers=headers,
+            content_type=getattr(properties, "content_type", None),
+            message_id=getattr(properties, "message_id", None),
+        )
+        if retries <= self.max_retries:
+            logger.warning(f"Falha ao processar mensagem da fila {self.queue} (tentativa {retries}/{self.max_retries}): {error}")
+            self.channel.basic_publish(exchange="", routing_key=self.retry_queue, body=body, properties=new_properties)
+            metrics.increment("rabbitmq_consumer_messages_total", queue=self.queue, outcome="retried")
+        else:
+            headers[LAST_ERROR_HEADER] = f"{error.__class__.__name__}: {str(error)[:500]}"
+            logger.error(f"Mensagem da fila {self.queue} enviada para {self.dead_letter_queue} após {retries - 1} "
+                         f"retentativa(s): {error}")
+            self.channel.basic_publish(exchange=self.dead_letter_exchange, routing_key=self.queue, body=body,
+                                       properties=new_properties)
+            metrics.increment("rabbitmq_consumer_messages_total", queue=self.queue, outcome="dead_lettered")
+
+    def _flush_acks(self):
+        tag, count = self.tracker.take()
+        if count:
+            self.channel.basic_ack(delivery_tag=tag, multiple=True)
+            metrics.increment("rabbitmq_consumer_acks_total", queue=self.queue)
+
+    def _on_ack_timer(self):
+        self._flush_acks()  # Lote parcial: não segura mensagens concluídas com tráfego baixo
+        if self._running and self.connection and self.connection.is_open:
+            self.connection.call_later(self.ack_interval, self._on_ack_timer)
+
     def close(self):
         if self.connection and self.connection.is_open:
             self.connection.close()
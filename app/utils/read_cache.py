@@ -0,0 +1,237 @@
+# app/utils/read_cache.py
+"""
+Cache de leitura em memória (TTL + LRU, por processo/worker da API) para o polling de
+status (/status), para a busca do artefato no /reprocess e para o consumo de tokens do
+período na admissão por orçamento (app.utils.token_budget).
+
+- Fresco (até `ttl`): devolve do cache.
+- Vencido mas dentro de `stale_ttl`: devolve o valor antigo e recarrega em segundo plano
+  (stale-while-revalidate; uma recarga por chave de cada vez).
+- Depois disso, ou após invalidação: recarrega na requisição.
+
+A invalidação vem dos mesmos eventos de conclusão que os workers gravam para a
+notification_queue (ver app.utils.cache_invalidation): `invalidate_from_notification`.
+Uma carga iniciada antes de uma invalidação da mesma chave não é gravada no cache.
+Valores None (não encontrado) não são guardados.
+
+Métricas: read_cache_requests_total{cache, result=hit|stale|miss}, gauge
+read_cache_hit_ratio{cache} (hit + stale sobre o total), read_cache_invalidations_total,
+read_cache_evictions_total e read_cache_revalidations_total{cache, outcome}.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Generic, Hashable, NamedTuple, Optional, TypeVar
+from dotenv import load_dotenv
+from app.models import Status
+from app.utils import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+READ_CACHE_ENABLED = os.getenv("READ_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+READ_CACHE_MAXSIZE = int(os.getenv("READ_CACHE_MAXSIZE", "10000"))  # Entradas por cache
+READ_CACHE_REVALIDATE_WORKERS = int(os.getenv("READ_CACHE_REVALIDATE_WORKERS", "2"))
+STATUS_CACHE_TTL = float(os.getenv("STATUS_CACHE_TTL", "2"))  # Requisições pendentes
+STATUS_CACHE_TERMINAL_TTL = float(os.getenv("STATUS_CACHE_TERMINAL_TTL", "300"))  # completed/failed
+STATUS_CACHE_STALE_TTL = float(os.getenv("STATUS_CACHE_STALE_TTL", "10"))
+ARTIFACT_CACHE_TTL = float(os.getenv("ARTIFACT_CACHE_TTL", "60"))
+ARTIFACT_CACHE_STALE_TTL = float(os.getenv("ARTIFACT_CACHE_STALE_TTL", "300"))
+# Consumo de tokens do período (admissão por orçamento, app.utils.token_budget)
+USAGE_CACHE_TTL = float(os.getenv("USAGE_CACHE_TTL", "10"))
+USAGE_CACHE_STALE_TTL = float(os.getenv("USAGE_CACHE_STALE_TTL", "30"))
+
+V = TypeVar("V")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=READ_CACHE_REVALIDATE_WORKERS,
+                                               thread_name_prefix="read-cache-revalidate")
+    return _executor
+
+
+class _Entry(NamedTuple):
+    value: Any
+    fresh_until: float
+    stale_until: float
+
+
+class ReadCache(Generic[V]):
+    def __init__(self, name: str, ttl: float, stale_ttl: float, maxsize: int = READ_CACHE_MAXSIZE,
+                 enabled: bool = READ_CACHE_ENABLED, clock: Callable[[], float] = time.monotonic,
+                 background: Optional[Callable[[Callable[[], None]], Any]] = None):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.maxsize = maxsize
+        self.enabled = enabled
+        self.clock = clock
+        # Executor das recargas em segundo plano (injetável nos testes)
+        self.background = background or (lambda job: _get_executor().submit(job))
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._invalidated: "OrderedDict[Hashable, int]" = OrderedDict()  # chave -> seq da última invalidação
+        self._seq = 0
+        self._cleared_at = 0  # seq do último clear()
+        self._refreshing = set()
+        self._hits = self._stale = self._misses = 0
+        self._lock = threading.Lock()
+
+    def _record(self, result: str) -> None:
+        # Chamado com o lock
+        if result == "hit":
+            self._hits += 1
+        elif result == "stale":
+            self._stale += 1
+        else:
+            self._misses += 1
+        metrics.increment("read_cache_requests_total", cache=self.name, result=result)
+        metrics.set_gauge("read_cache_hit_ratio", self._ratio(), cache=self.name)
+
+    def _ratio(self) -> float:
+        total = self._hits + self._stale + self._misses
+        return (self._hits + self._stale) / total if total else 0.0
+
+    def _store(self, key: Hashable, value: V, token: int, ttl: float) -> None:
+        if value is None:
+            return
+        with self._lock:
+            if token <= self._cleared_at or self._invalidated.get(key, -1) >= token:
+                return  # Invalidada durante a carga: o valor pode ser anterior ao evento
+            now = self.clock()
+            self._entries[key] = _Entry(value, now + ttl, now + ttl + self.stale_ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                metrics.increment("read_cache_evictions_total", cache=self.name)
+
+    def _load(self, key: Hashable, load: Callable[[], V], ttl_for: Optional[Callable[[V], float]]) -> V:
+        with self._lock:
+            self._seq += 1
+            token = self._seq
+        value = load()
+        if value is not None:
+            self._store(key, value, token, ttl_for(value) if ttl_for else self.ttl)
+        return value
+
+    def _revalidate(self, key: Hashable, load: Callable[[], V], ttl_for: Optional[Callable[[V], float]]) -> None:
+        try:
+            value = self._load(key, load, ttl_for)
+            if value is None:
+                self.invalidate(key, count=False)  # Sumiu do banco (ex: arquivada/podada)
+            metrics.increment("read_cache_revalidations_total", cache=self.name, outcome="ok")
+        except Exception as e:
+            metrics.increment("read_cache_revalidations_total", cache=self.name, outcome="error")
+            logger.warning(f"Falha ao revalidar {key!r} no cache {self.name}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get(self, key: Hashable, load: Callable[[], V], revalidate: Optional[Callable[[], V]] = None,
+            ttl_for: Optional[Callable[[V], float]] = None) -> V:
+        """
+        Valor da chave. `load` roda na requisição (miss); `revalidate` (padrão: `load`) roda em
+        segundo plano quando o valor está vencido e deve abrir a própria sessão do banco.
+        `ttl_for` permite TTL por valor (ex: status terminal dura mais).
+        """
+        if not self.enabled:
+            return load()
+        with self._lock:
+            entry = self._entries.get(key)
+            now = self.clock()
+            if entry is not None and now < entry.fresh_until:
+                self._entries.move_to_end(key)
+                self._record("hit")
+                return entry.value
+            if entry is not None and now < entry.stale_until:
+                self._entries.move_to_end(key)
+                self._record("stale")
+                schedule = key not in self._refreshing
+                if schedule:
+                    self._refreshing.add(key)
+            else:
+                self._record("miss")
+                schedule = None
+        if schedule is None:
+            return self._load(key, load, ttl_for)
+        if schedule:
+            try:
+                self.background(lambda: self._revalidate(key, revalidate or load, ttl_for))
+            except Exception as e:  # Executor encerrado: segue com o valor antigo
+                with self._lock:
+                    self._refreshing.discard(key)
+                logger.warning(f"Revalidação de {key!r} não agendada no cache {self.name}: {e}")
+        return entry.value
+
+    def invalidate(self, key: Hashable, count: bool = True) -> None:
+        with self._lock:
+            self._seq += 1
+            self._invalidated[key] = self._seq
+            self._invalidated.move_to_end(key)
+            while len(self._invalidated) > self.maxsize:
+                self._invalidated.popitem(last=False)
+            removed = self._entries.pop(key, None) is not None
+        if count:
+            metrics.increment("read_cache_invalidations_total", cache=self.name, removed=removed)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._seq += 1
+            self._entries.clear()
+            self._invalidated.clear()
+            self._cleared_at = self._seq  # Cargas em andamento não gravam o resultado
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self._hits, "stale": self._stale,
+                    "misses": self._misses, "hit_ratio": self._ratio()}
+
+
+def _status_ttl(value: Dict[str, Any]) -> float:
+    return STATUS_CACHE_TTL if value.get("status") == Status.PENDING.value else STATUS_CACHE_TERMINAL_TTL
+
+
+status_cache: ReadCache[Dict[str, Any]] = ReadCache("status", STATUS_CACHE_TTL, STATUS_CACHE_STALE_TTL)
+artifact_cache: ReadCache[Dict[str, Any]] = ReadCache("artifact", ARTIFACT_CACHE_TTL, ARTIFACT_CACHE_STALE_TTL)
+usage_cache: ReadCache[Dict[str, Any]] = ReadCache("token_usage", USAGE_CACHE_TTL, USAGE_CACHE_STALE_TTL)
+
+
+def get_status(request_id: str, load: Callable[[], Optional[Dict[str, Any]]],
+               revalidate: Optional[Callable[[], Optional[Dict[str, Any]]]] = None) -> Optional[Dict[str, Any]]:
+    """Status da requisição pelo cache (TTL curto enquanto pendente, longo quando terminal)."""
+    return status_cache.get(request_id, load, revalidate, ttl_for=_status_ttl)
+
+
+def get_artifact(task_type: str, artifact_id: int, load: Callable[[], Optional[Dict[str, Any]]],
+                 revalidate: Optional[Callable[[], Optional[Dict[str, Any]]]] = None) -> Optional[Dict[str, Any]]:
+    return artifact_cache.get((task_type, artifact_id), load, revalidate)
+
+
+def invalidate_from_notification(payload: Dict[str, Any]) -> None:
+    """Invalida o status da requisição e os artefatos tocados por um evento de notificação."""
+    request_id = payload.get("request_id")
+    if request_id:
+        status_cache.invalidate(request_id)
+    task_type = payload.get("task_type")
+    for item_id in payload.get("item_ids") or []:
+        artifact_cache.invalidate((task_type, item_id))
+    project_id = payload.get("project_id")
+    if project_id and payload.get("status") == Status.COMPLETED.value:
+        usage_cache.invalidate(str(project_id), count=False)  # Consumo novo no ledger
+
+
+def clear_all() -> None:
+    """Esvazia os caches (ex: reconexão do listener, quando eventos podem ter sido perdidos)."""
+    status_cache.clear()
+    artifact_cache.clear()
+    usage_cache.clear()
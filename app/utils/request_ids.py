@@ -0,0 +1,55 @@
+# app/utils/request_ids.py
+"""
+request_id das requisições: UUIDv7 (RFC 9562), com o instante de criação em milissegundos.
+
+A tabela `requests` é particionada por created_at e a chave de partição precisa estar em
+toda constraint única (uq_requests_request_id é (request_id, created_at)). Gravando
+created_at exatamente igual ao instante do UUIDv7 (`new_request_id`), cada request_id só
+tem um created_at possível e a constraint volta a garantir a unicidade de request_id; no
+PostgreSQL a ck_requests_request_id_created_at impede gravar outro instante. As buscas por
+request_id (`where_request_id`) incluem o created_at e leem uma única partição.
+
+IDs antigos (UUIDv4 de antes da troca, "legacy-<id>") não carregam o instante: a busca
+cai para request_id sozinho, varrendo o índice de cada partição.
+"""
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+from sqlalchemy import and_
+from app.models import Request
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def new_request_id(now: Optional[datetime] = None) -> Tuple[str, datetime]:
+    """Novo UUIDv7 e o created_at correspondente (truncado ao milissegundo), a gravar juntos."""
+    millis = int(((now or datetime.now(timezone.utc)) - _EPOCH) / timedelta(milliseconds=1))
+    random = int.from_bytes(os.urandom(10), "big")  # 12 bits de rand_a + 62 de rand_b
+    value = (
+        (millis & (2 ** 48 - 1)) << 80
+        | 0x7 << 76
+        | ((random >> 62) & 0xFFF) << 64
+        | 0b10 << 62
+        | (random & (2 ** 62 - 1))
+    )
+    return str(uuid.UUID(int=value)), _EPOCH + timedelta(milliseconds=millis)
+
+
+def created_at_of(request_id: str) -> Optional[datetime]:
+    """created_at gravado com o request_id, se ele for um UUIDv7; None para IDs antigos."""
+    try:
+        parsed = uuid.UUID(request_id)
+    except (TypeError, ValueError, AttributeError):
+        return None
+    if parsed.version != 7:
+        return None
+    return _EPOCH + timedelta(milliseconds=parsed.int >> 80)
+
+
+def where_request_id(request_id: str):
+    """Filtro por request_id com a chave de partição (poda para uma partição) quando disponível."""
+    created_at = created_at_of(request_id)
+    if created_at is None:
+        return Request.request_id == request_id
+    return and_(Request.request_id == request_id, Request.created_at == created_at)
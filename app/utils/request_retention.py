@@ -0,0 +1,209 @@
+# app/utils/request_retention.py
+"""
+Partições mensais e retenção da tabela `requests`.
+
+No PostgreSQL a tabela é particionada por RANGE (created_at), uma partição por mês
+(`requests_yYYYYmMM`) mais a DEFAULT. A retenção é configurável por status
+(REQUEST_RETENTION_DAYS_<STATUS>; vazio, "0" ou "none" = manter para sempre):
+- partições inteiras mais antigas que a maior retenção são desanexadas e removidas
+  (DETACH + DROP, sem DELETE linha a linha);
+- dentro das partições restantes, linhas vencidas são apagadas em lotes por status.
+
+As funções não fazem commit, exceto as de DDL (`ensure_partitions`, `drop_expired_partitions`),
+que usam a própria transação do engine.
+"""
+import logging
+import os
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+from sqlalchemy import delete, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from app.models import Request, Status
+from app.utils import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+REQUEST_PARTITIONS_AHEAD = int(os.getenv("REQUEST_PARTITIONS_AHEAD", "2"))  # Meses futuros pré-criados
+REQUEST_PARTITION_LOCK_TIMEOUT = os.getenv("REQUEST_PARTITION_LOCK_TIMEOUT", "5s")  # Espera máxima pelo lock do DDL
+_DEFAULT_RETENTION_DAYS = {Status.COMPLETED: "30", Status.FAILED: "90", Status.PENDING: "30"}
+_PARTITION_NAME = re.compile(r"^requests_y(\d{4})m(\d{2})$")
+
+
+def _retention_days(raw: Optional[str]) -> Optional[int]:
+    if raw is None or raw.strip().lower() in ("", "0", "none"):
+        return None
+    return int(raw)
+
+
+def load_retention_policy() -> Dict[Status, Optional[int]]:
+    """Dias de retenção por status, a partir das variáveis REQUEST_RETENTION_DAYS_<STATUS>."""
+    return {
+        status: _retention_days(os.getenv(f"REQUEST_RETENTION_DAYS_{status.name}", default))
+        for status, default in _DEFAULT_RETENTION_DAYS.items()
+    }
+
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _next_month(day: date) -> date:
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def partition_name(month: date) -> str:
+    return f"requests_y{month.year:04d}m{month.month:02d}"
+
+
+def _create_month_sql(name: str, month: date, upper: date) -> str:
+    """
+    Cria a partição do mês, se não existir. Se a DEFAULT já tem linhas desse mês (pruner
+    parado por mais de REQUEST_PARTITIONS_AHEAD meses), o CREATE falharia na checagem da
+    DEFAULT: ela é desanexada, a partição criada, as linhas movidas e a DEFAULT reanexada,
+    tudo na mesma transação. Um único comando (bloco DO), sem ida e volta por passo.
+    """
+    bounds = f"created_at >= '{month.isoformat()}' AND created_at < '{upper.isoformat()}'"
+    create = (f"CREATE TABLE {name} PARTITION OF requests "
+              f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')")
+    columns = ", ".join(column.name for column in Request.__table__.columns)
+    return (
+        "DO $$\n"
+        "BEGIN\n"
+        f"  IF to_regclass('{name}') IS NOT NULL THEN RETURN; END IF;\n"
+        f"  IF EXISTS (SELECT 1 FROM requests_default WHERE {bounds}) THEN\n"
+        f"    RAISE WARNING 'requests_default tem linhas de {name}: movendo para a nova partição';\n"
+        "    ALTER TABLE requests DETACH PARTITION requests_default;\n"
+        f"    {create};\n"
+        f"    INSERT INTO {name} ({columns}) SELECT {columns} FROM requests_default WHERE {bounds};\n"
+        f"    DELETE FROM requests_default WHERE {bounds};\n"
+        "    ALTER TABLE requests ATTACH PARTITION requests_default DEFAULT;\n"
+        "  ELSE\n"
+        f"    {create};\n"
+        "  END IF;\n"
+        "END $$"
+    )
+
+
+def create_partitions(conn: Connection, today: Optional[date] = None,
+                      months_ahead: int = REQUEST_PARTITIONS_AHEAD) -> List[str]:
+    """
+    Cria (se não existirem) a DEFAULT e as partições do mês corrente e dos `months_ahead`
+    seguintes, na transação de `conn`. Só no PostgreSQL. Retorna os nomes garantidos.
+    Também chamada no after_create de `requests` (Base.metadata.create_all).
+    O DDL trava `requests`: com lock_timeout, falha em vez de enfileirar o tráfego atrás dele.
+    """
+    if conn.dialect.name != "postgresql":
+        return []
+    conn.execute(text(f"SET LOCAL lock_timeout = '{REQUEST_PARTITION_LOCK_TIMEOUT}'"))
+    conn.execute(text("CREATE TABLE IF NOT EXISTS requests_default PARTITION OF requests DEFAULT"))
+    month = _month_start(today or datetime.now(timezone.utc).date())
+    names = []
+    for _ in range(months_ahead + 1):
+        upper = _next_month(month)
+        name = partition_name(month)
+        conn.execute(text(_create_month_sql(name, month, upper)))
+        names.append(name)
+        month = upper
+    return names
+
+
+def ensure_partitions(engine: Engine, today: Optional[date] = None, months_ahead: int = REQUEST_PARTITIONS_AHEAD) -> List[str]:
+    """`create_partitions` numa transação própria do engine."""
+    if engine.dialect.name != "postgresql":
+        return []
+    with engine.begin() as conn:
+        return create_partitions(conn, today, months_ahead)
+
+
+def list_partitions(engine: Engine) -> List[str]:
+    """Partições mensais existentes (nomes no padrão requests_yYYYYmMM), da mais antiga à mais nova."""
+    if engine.dialect.name != "postgresql":
+        return []
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'requests'::regclass"
+        )).scalars().all()
+    return sorted(name for name in rows if _PARTITION_NAME.match(name))
+
+
+def drop_expired_partitions(engine: Engine, policy: Dict[Status, Optional[int]],
+                            now: Optional[datetime] = None) -> List[str]:
+    """
+    Remove partições mensais cujo mês inteiro já passou da maior retenção da política.
+    Não faz nada se algum status for mantido para sempre. Retorna as partições removidas.
+    Uma transação por partição: um lock_timeout para no meio e mantém as já removidas.
+    """
+    if any(days is None for days in policy.values()):
+        return []
+    cutoff = ((now or datetime.now(timezone.utc)) - timedelta(days=max(policy.values()))).date()
+    dropped = []
+    for name in list_partitions(engine):
+        year, month = map(int, _PARTITION_NAME.match(name).groups())
+        if _next_month(date(year, month, 1)) > cutoff:
+            continue
+        # DETACH ... CONCURRENTLY não é aceito com partição DEFAULT: o DETACH trava `requests`
+        # (ACCESS EXCLUSIVE, só metadados). Com lock_timeout, uma transação longa faz o DETACH
+        # desistir (erro, nova tentativa no próximo ciclo) em vez de enfileirar o tráfego atrás dele.
+        with engine.begin() as conn:
+            conn.execute(text(f"SET LOCAL lock_timeout = '{REQUEST_PARTITION_LOCK_TIMEOUT}'"))
+            conn.execute(text(f"ALTER TABLE requests DETACH PARTITION {name}"))
+            conn.execute(text(f"DROP TABLE {name}"))
+        dropped.append(name)
+        metrics.increment("request_partitions_dropped_total")
+        logger.info(f"Partição {name} de requests removida (retenção de {max(policy.values())} dias).")
+    return dropped
+
+
+def prune_batch(db: Session, status: Status, older_than: datetime, batch_size: int) -> int:
+    """
+    Apaga até `batch_size` requisições de `status` criadas antes de `older_than`
+    (um SELECT das chaves pelo índice status+created_at e um DELETE). Não faz commit.
+    """
+    keys = db.execute(
+        select(Request.id, Request.created_at)
+        .where(Request.status == status.value, Request.created_at < older_than)
+        .order_by(Request.created_at)
+        .limit(batch_size)
+    ).all()
+    if not keys:
+        return 0
+    db.execute(
+        delete(Request).where(Request.id.in_([key.id for key in keys]), Request.created_at < older_than),
+        execution_options={"synchronize_session": False},
+    )
+    metrics.increment("requests_pruned_total", len(keys), status=status.value)
+    return len(keys)
+
+
+def collect_size_metrics(engine: Engine) -> Dict[str, int]:
+    """
+    Tamanho (bytes) da tabela e de cada índice de requests, somando as partições, como
+    gauges `requests_table_bytes` e `requests_index_bytes{index=...}`. Só no PostgreSQL.
+    """
+    if engine.dialect.name != "postgresql":
+        return {}
+    with engine.connect() as conn:
+        table_bytes = conn.execute(text(
+            "SELECT coalesce(sum(pg_table_size(relid)), 0) FROM pg_partition_tree('requests')"
+        )).scalar()
+        index_rows = conn.execute(text(
+            "SELECT coalesce(parent.relname, idx.relname) AS name, sum(pg_relation_size(idx.oid)) AS bytes "
+            "FROM pg_partition_tree('requests') tree "
+            "JOIN pg_index i ON i.indrelid = tree.relid "
+            "JOIN pg_class idx ON idx.oid = i.indexrelid "
+            "LEFT JOIN pg_inherits inh ON inh.inhrelid = idx.oid "
+            "LEFT JOIN pg_class parent ON parent.oid = inh.inhparent "
+            "GROUP BY 1"
+        )).all()
+    sizes = {"table": int(table_bytes)}
+    metrics.set_gauge("requests_table_bytes", int(table_bytes))
+    for name, size in index_rows:
+        sizes[name] = int(size)
+        metrics.set_gauge("requests_index_bytes", int(size), index=name)
+    return sizes
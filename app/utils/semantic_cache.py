@@ -0,0 +1,185 @@
+# app/utils/semantic_cache.py
+"""
+Cache semântico de gerações (opcional, SEMANTIC_CACHE_ENABLED): regenerações cujo
+`user_input` difere só em espaços, pontuação ou poucas palavras reaproveitam o resultado
+de uma geração anterior em vez de chamar a LLM.
+
+- Partição: task_type + contexto exato (prompt de sistema renderizado, assistant e
+  llm_config). Idioma, type_test, modelo e temperatura diferentes nunca se misturam.
+- Embedding do prompt de usuário renderizado: por padrão um vetorizador por hashing
+  (unigramas e bigramas de palavras normalizadas, TF sublinear, normalização L2), sem
+  modelo nem rede, então o cache funciona offline. Outros embedders (ex: um modelo local de
+  CPU) podem ser registrados com `register_embedder` e escolhidos por SEMANTIC_CACHE_EMBEDDER.
+- Índice em memória por partição (por processo do worker), LRU com até
+  SEMANTIC_CACHE_MAXSIZE entradas e TTL. Texto idêntico após normalização é achado pelo
+  digest; o resto é uma busca exata por cosseno nos vetores esparsos da partição, barata
+  perto de uma chamada à LLM nesses tamanhos.
+
+Só é hit a entrada com similaridade >= SEMANTIC_CACHE_THRESHOLD. Cada hit é registrado no
+log (requisição atual, requisição de origem e similaridade) para auditoria.
+Métricas: semantic_cache_requests_total{task_type, result=hit|miss} e
+semantic_cache_similarity{task_type} (gauge, último hit).
+"""
+import hashlib
+import logging
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+from dotenv import load_dotenv
+from app.models import TaskType
+from app.utils import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_MAXSIZE = int(os.getenv("SEMANTIC_CACHE_MAXSIZE", "500"))  # Entradas por partição
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "86400"))
+SEMANTIC_CACHE_DIMENSIONS = int(os.getenv("SEMANTIC_CACHE_DIMENSIONS", str(2 ** 18)))
+SEMANTIC_CACHE_EMBEDDER = os.getenv("SEMANTIC_CACHE_EMBEDDER", "hashing")
+
+SparseVector = Dict[int, float]
+Embedder = Callable[[str], SparseVector]
+
+_WORD = re.compile(r"\w+")
+
+
+def normalize_text(text: str) -> str:
+    """Minúsculas, sem acentos e com espaços colapsados (base do digest e do vetorizador)."""
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode().casefold()
+    return " ".join(_WORD.findall(text))
+
+
+def _feature_index(feature: str) -> Tuple[int, float]:
+    digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+    value = int.from_bytes(digest, "little")
+    # Sinal pelo bit mais alto: colisões tendem a se cancelar em vez de somar
+    return value % SEMANTIC_CACHE_DIMENSIONS, (1.0 if value >> 63 else -1.0)
+
+
+def hashing_embedder(text: str) -> SparseVector:
+    """Vetorizador por hashing: unigramas + bigramas de palavras, TF sublinear e norma L2."""
+    words = normalize_text(text).split()
+    features = Counter(words)
+    features.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    vector: SparseVector = {}
+    for feature, count in features.items():
+        index, sign = _feature_index(feature)
+        vector[index] = vector.get(index, 0.0) + sign * (1.0 + math.log(count))
+    norm = math.sqrt(sum(value * value for value in vector.values()))
+    return {index: value / norm for index, value in vector.items() if value} if norm else {}
+
+
+EMBEDDERS: Dict[str, Embedder] = {"hashing": hashing_embedder}
+
+
+def register_embedder(name: str, embedder: Embedder) -> Embedder:
+    """Registra um embedder (texto -> vetor esparso L2-normalizado) para SEMANTIC_CACHE_EMBEDDER."""
+    EMBEDDERS[name] = embedder
+    return embedder
+
+
+def cosine(a: SparseVector, b: SparseVector) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(value * b.get(index, 0.0) for index, value in a.items())
+
+
+class CachedGeneration(NamedTuple):
+    text: str
+    prompt_tokens: int  # Tokens da geração original (a reutilização não consome tokens)
+    completion_tokens: int
+    request_id: str  # Requisição que gerou o texto
+    similarity: float = 1.0
+
+
+class _Entry(NamedTuple):
+    digest: str
+    vector: SparseVector
+    generation: CachedGeneration
+    stored_at: float
+
+
+class SemanticCache:
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD, maxsize: int = SEMANTIC_CACHE_MAXSIZE,
+                 ttl: float = SEMANTIC_CACHE_TTL, embedder: Optional[Embedder] = None,
+                 enabled: bool = SEMANTIC_CACHE_ENABLED, clock: Callable[[], float] = time.monotonic):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.embedder = embedder or EMBEDDERS[SEMANTIC_CACHE_EMBEDDER]
+        self.enabled = enabled
+        self._clock = clock
+        self._partitions: Dict[str, "OrderedDict[str, _Entry]"] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def partition_key(task_type: TaskType, prompt_data: dict, llm_config: Optional[dict]) -> str:
+        config = sorted((k, str(v)) for k, v in (llm_config or {}).items() if k != "semantic_cache")
+        context = "\x1f".join([task_type.value, prompt_data.get("system", ""), prompt_data.get("assistant", ""), repr(config)])
+        return hashlib.sha256(context.encode("utf-8")).hexdigest()
+
+    def lookup(self, task_type: TaskType, prompt_data: dict, llm_config: Optional[dict],
+               request_id: Optional[str] = None) -> Optional[CachedGeneration]:
+        """Geração anterior equivalente (similaridade >= threshold) ou None."""
+        if not self.enabled:
+            return None
+        partition_key = self.partition_key(task_type, prompt_data, llm_config)
+        user_text = prompt_data.get("user", "")
+        digest = hashlib.sha256(normalize_text(user_text).encode("utf-8")).hexdigest()
+        now = self._clock()
+        best, best_score = None, 0.0
+        with self._lock:
+            partition = self._partitions.get(partition_key)
+            if partition:
+                for key in [k for k, e in partition.items() if now - e.stored_at > self.ttl]:
+                    del partition[key]
+                if digest in partition:
+                    best, best_score = partition[digest], 1.0
+                else:
+                    vector = self.embedder(user_text)
+                    for entry in partition.values():
+                        score = cosine(vector, entry.vector)
+                        if score > best_score:
+                            best, best_score = entry, score
+                if best is not None and best_score >= self.threshold:
+                    partition.move_to_end(best.digest)
+        if best is None or best_score < self.threshold:
+            metrics.increment("semantic_cache_requests_total", task_type=task_type.value, result="miss")
+            return None
+        metrics.increment("semantic_cache_requests_total", task_type=task_type.value, result="hit")
+        metrics.set_gauge("semantic_cache_similarity", round(best_score, 4), task_type=task_type.value)
+        logger.info(f"Cache semântico (auditoria): requisição {request_id} ({task_type.value}) reutilizou a geração "
+                    f"da requisição {best.generation.request_id}, similaridade {best_score:.4f}.")
+        return best.generation._replace(similarity=best_score)
+
+    def store(self, task_type: TaskType, prompt_data: dict, llm_config: Optional[dict], text: str,
+              prompt_tokens: int, completion_tokens: int, request_id: str) -> None:
+        """Guarda uma geração concluída com sucesso."""
+        if not self.enabled:
+            return
+        partition_key = self.partition_key(task_type, prompt_data, llm_config)
+        user_text = prompt_data.get("user", "")
+        digest = hashlib.sha256(normalize_text(user_text).encode("utf-8")).hexdigest()
+        entry = _Entry(digest, self.embedder(user_text),
+                       CachedGeneration(text, prompt_tokens, completion_tokens, request_id), self._clock())
+        with self._lock:
+            partition = self._partitions.setdefault(partition_key, OrderedDict())
+            partition[digest] = entry
+            partition.move_to_end(digest)
+            while len(partition) > self.maxsize:
+                partition.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._partitions.clear()
+
+
+semantic_cache = SemanticCache()
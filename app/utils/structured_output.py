@@ -0,0 +1,110 @@
+# app/utils/structured_output.py
+"""
+Saída estruturada (JSON Schema) derivada dos schemas Pydantic de resposta do parser_registry.
+
+- OpenAI: response_format {"type": "json_schema"}. Usa `strict` quando o schema permite
+  (todo objeto com propriedades fechadas); campos livres como Dict[str, Any] (reflection,
+  gherkin, wbs) desligam o strict, e o schema passa a orientar sem garantir.
+- Gemini: response_mime_type "application/json" + response_schema (subconjunto OpenAPI:
+  sem $ref, anyOf, additionalProperties). Com objetos livres, só o JSON mode.
+
+O strict da OpenAI exige objeto na raiz: tipos que geram lista usam o envelope
+{"items": [...]}, aceito pelo ParserSpec.validate junto com os formatos antigos.
+Os schemas são montados uma vez por TaskType.
+"""
+import copy
+from functools import lru_cache
+from typing import Any, Dict, NamedTuple, Optional
+from pydantic import TypeAdapter
+from app.models import TaskType
+from app.utils.parser_registry import ENVELOPE_KEY, PARSER_SPECS
+
+_GEMINI_DROP = ("title", "default", "additionalProperties", "$defs")
+
+
+class StructuredOutput(NamedTuple):
+    name: str
+    schema: Dict[str, Any]  # JSON Schema (Pydantic) do formato da resposta
+    strict: bool
+    gemini_schema: Optional[Dict[str, Any]]  # None: Gemini só em JSON mode
+
+    @property
+    def openai_response_format(self) -> Dict[str, Any]:
+        return {"type": "json_schema", "json_schema": {"name": self.name, "schema": self.schema, "strict": self.strict}}
+
+
+def _is_free_object(node: Dict[str, Any]) -> bool:
+    return node.get("type") == "object" and "properties" not in node
+
+
+def _walk(node: Dict[str, Any]):
+    """Nós de schema (não entra nos mapas de `properties`/`$defs` como se fossem schemas)."""
+    yield node
+    children = list(node.get("properties", {}).values()) + list(node.get("$defs", {}).values())
+    children += node.get("anyOf", []) + node.get("allOf", [])
+    for key in ("items", "additionalProperties"):
+        if isinstance(node.get(key), dict):
+            children.append(node[key])
+    for child in children:
+        yield from _walk(child)
+
+
+def _close_objects(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Formato strict da OpenAI: objetos fechados, todas as propriedades em required, sem default."""
+    schema = copy.deepcopy(schema)
+    for node in _walk(schema):
+        node.pop("default", None)
+        if "properties" in node:
+            node["additionalProperties"] = False
+            node["required"] = list(node["properties"])
+    return schema
+
+
+def _gemini_node(node: Dict[str, Any], defs: Dict[str, Any]) -> Dict[str, Any]:
+    if "$ref" in node:
+        return _gemini_node(defs[node["$ref"].rsplit("/", 1)[-1]], defs)
+    if "anyOf" in node:  # Optional[X] -> X nullable
+        options = [option for option in node["anyOf"] if option.get("type") != "null"]
+        resolved = dict(_gemini_node(options[0], defs))
+        if len(options) < len(node["anyOf"]):
+            resolved["nullable"] = True
+        if "description" in node:
+            resolved["description"] = node["description"]
+        return resolved
+    converted = {key: value for key, value in node.items() if key not in _GEMINI_DROP}
+    if "properties" in node:
+        converted["properties"] = {name: _gemini_node(prop, defs) for name, prop in node["properties"].items()}
+    if isinstance(node.get("items"), dict):
+        converted["items"] = _gemini_node(node["items"], defs)
+    return converted
+
+
+def _gemini_schema(schema: Dict[str, Any], free_form: bool) -> Optional[Dict[str, Any]]:
+    if free_form:
+        return None
+    return _gemini_node(schema, schema.get("$defs", {}))
+
+
+@lru_cache(maxsize=None)
+def for_task_type(task_type: TaskType) -> Optional[StructuredOutput]:
+    """Saída estruturada do TaskType (None para tipos sem parser JSON, ex: automation_script)."""
+    spec = PARSER_SPECS.get(task_type)
+    if spec is None:
+        return None
+    item = TypeAdapter(spec.schema).json_schema()  # Sem o wrapper (ex: {"bug": {...}}), também aceito
+    if spec.many:
+        defs = item.pop("$defs", None)
+        schema: Dict[str, Any] = {"type": "object", "properties": {ENVELOPE_KEY: {"type": "array", "items": item}},
+                                  "required": [ENVELOPE_KEY]}
+        if defs:
+            schema["$defs"] = defs
+    else:
+        schema = item
+    free_form = any(_is_free_object(node) for node in _walk(schema))
+    strict = not free_form
+    return StructuredOutput(
+        name=f"{task_type.value}_response",
+        schema=_close_objects(schema) if strict else schema,
+        strict=strict,
+        gemini_schema=_gemini_schema(schema, free_form),
+    )
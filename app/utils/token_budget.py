@@ -0,0 +1,174 @@
+# app/utils/token_budget.py
+"""
+Contabilidade de tokens por projeto e controle de admissão por orçamento.
+
+- Ledger (`token_usage`): o worker grava uma linha por requisição concluída na mesma
+  transação dos artefatos e do status (`record_usage`), com projeto, task_type, provedor e
+  modelo. Só inserções: não há um contador por projeto disputado por workers concorrentes.
+- Orçamento (`project_budgets`, ou TOKEN_BUDGET_DEFAULT quando o projeto não tem linha):
+  limite de tokens (prompt + completion) por período ("day" ou "month", em UTC) e a ação
+  quando o limite é atingido:
+  * "reject": a API responde 429 antes de criar a requisição;
+  * "queue": a requisição é aceita, mas vai para a fila Celery TOKEN_BUDGET_QUEUE, atendida
+    por um worker separado e de baixa concorrência, sem ocupar os workers dos demais projetos.
+- A admissão (`check_admission`) lê o consumo do período pelo cache de leitura da API
+  (read_cache.usage_cache, invalidado pelos eventos de conclusão do projeto). O controle é
+  aproximado: requisições admitidas juntas podem passar do limite em no máximo uma geração cada.
+
+Requisições sem projeto resolvido (ex: /generate com pai sem project_id) entram no ledger
+com project_id nulo e não passam pela admissão.
+"""
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Callable, List, NamedTuple, Optional
+from uuid import UUID
+from dotenv import load_dotenv
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app.models import ProjectBudget, TokenUsage
+from app.utils import metrics, read_cache
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+TOKEN_BUDGET_ENABLED = os.getenv("TOKEN_BUDGET_ENABLED", "true").lower() in ("1", "true", "yes")
+TOKEN_BUDGET_DEFAULT = int(os.getenv("TOKEN_BUDGET_DEFAULT", "0"))  # 0 = sem limite
+TOKEN_BUDGET_PERIOD = os.getenv("TOKEN_BUDGET_PERIOD", "month")
+TOKEN_BUDGET_ACTION = os.getenv("TOKEN_BUDGET_ACTION", "reject")
+TOKEN_BUDGET_QUEUE = os.getenv("TOKEN_BUDGET_QUEUE", "over_budget")
+
+PERIODS = ("day", "month")
+ACTIONS = ("reject", "queue")
+
+
+class Budget(NamedTuple):
+    token_limit: int  # 0 = sem limite
+    period: str
+    action: str
+
+
+class Admission(NamedTuple):
+    action: Optional[str]  # None (dentro do orçamento), "queue" ou "reject"
+    used: int
+    budget: Budget
+    since: datetime
+
+    @property
+    def queue(self) -> Optional[str]:
+        """Fila Celery da requisição (None: fila padrão)."""
+        return TOKEN_BUDGET_QUEUE if self.action == "queue" else None
+
+
+class UsageRow(NamedTuple):
+    project_id: Optional[UUID]
+    task_type: str
+    provider: str
+    model: str
+    requests: int
+    prompt_tokens: int
+    completion_tokens: int
+
+
+def period_start(period: str, now: Optional[datetime] = None) -> datetime:
+    """Início (UTC) do período corrente do orçamento."""
+    now = now or datetime.now(timezone.utc)
+    start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return start.replace(day=1) if period == "month" else start
+
+
+def record_usage(db: Session, request_id: str, project_id: Optional[UUID], task_type: str, provider: str,
+                 model: str, prompt_tokens: int, completion_tokens: int) -> None:
+    """Adiciona a linha do ledger na transação corrente (o commit é o da task)."""
+    db.add(TokenUsage(
+        request_id=request_id, project_id=project_id, task_type=task_type, provider=provider, model=model,
+        prompt_tokens=prompt_tokens or 0, completion_tokens=completion_tokens or 0,
+        created_at=datetime.now(timezone.utc),
+    ))
+    metrics.increment("llm_tokens_total", prompt_tokens or 0, task_type=task_type, model=model, kind="prompt")
+    metrics.increment("llm_tokens_total", completion_tokens or 0, task_type=task_type, model=model, kind="completion")
+
+
+def get_budget(db: Session, project_id: UUID) -> Budget:
+    row = db.get(ProjectBudget, project_id)
+    if row is None:
+        return Budget(TOKEN_BUDGET_DEFAULT, TOKEN_BUDGET_PERIOD, TOKEN_BUDGET_ACTION)
+    return Budget(row.token_limit, row.period, row.action)
+
+
+def set_budget(db: Session, project_id: UUID, token_limit: int, period: str = "month",
+               action: str = "reject") -> Budget:
+    """Cria ou atualiza o orçamento do projeto (commit pelo chamador)."""
+    if period not in PERIODS:
+        raise ValueError(f"Período de orçamento inválido: {period} (use {', '.join(PERIODS)})")
+    if action not in ACTIONS:
+        raise ValueError(f"Ação de orçamento inválida: {action} (use {', '.join(ACTIONS)})")
+    db.merge(ProjectBudget(project_id=project_id, token_limit=token_limit, period=period, action=action))
+    read_cache.usage_cache.invalidate(str(project_id), count=False)
+    return Budget(token_limit, period, action)
+
+
+def used_tokens(db: Session, project_id: UUID, since: datetime) -> int:
+    total = db.execute(
+        select(func.coalesce(func.sum(TokenUsage.prompt_tokens + TokenUsage.completion_tokens), 0))
+        .where(TokenUsage.project_id == project_id, TokenUsage.created_at >= since)
+    ).scalar()
+    return int(total or 0)
+
+
+def _load_usage(db: Session, project_id: UUID, period: str) -> dict:
+    since = period_start(period)
+    return {"since": since, "period": period, "tokens": used_tokens(db, project_id, since)}
+
+
+def check_admission(db: Session, project_id: Optional[UUID],
+                    session_factory: Optional[Callable[[], Session]] = None) -> Optional[Admission]:
+    """
+    Decisão de admissão do projeto (None: sem projeto, sem limite ou controle desligado).
+    `session_factory` abre a sessão da revalidação do consumo em segundo plano.
+    """
+    if not TOKEN_BUDGET_ENABLED or project_id is None:
+        return None
+    budget = get_budget(db, project_id)
+    if budget.token_limit <= 0:
+        return None
+
+    def revalidate():
+        with session_factory() as session:
+            return _load_usage(session, project_id, budget.period)
+
+    key = str(project_id)
+    usage = read_cache.usage_cache.get(key, lambda: _load_usage(db, project_id, budget.period),
+                                       revalidate if session_factory else None)
+    if usage["period"] != budget.period or usage["since"] != period_start(budget.period):
+        read_cache.usage_cache.invalidate(key, count=False)  # Virada do período ou troca de orçamento
+        usage = read_cache.usage_cache.get(key, lambda: _load_usage(db, project_id, budget.period))
+
+    action = budget.action if usage["tokens"] >= budget.token_limit else None
+    if action:
+        metrics.increment("token_budget_admissions_total", action=action)
+        logger.warning(f"Projeto {project_id} acima do orçamento ({usage['tokens']}/{budget.token_limit} tokens "
+                       f"desde {usage['since'].isoformat()}): {action}.")
+    else:
+        metrics.increment("token_budget_admissions_total", action="accept")
+    return Admission(action, usage["tokens"], budget, usage["since"])
+
+
+def usage_report(db: Session, project_id: Optional[UUID] = None, start: Optional[datetime] = None,
+                 end: Optional[datetime] = None) -> List[UsageRow]:
+    """Consumo agregado por projeto, task_type, provedor e modelo no intervalo [start, end)."""
+    query = select(
+        TokenUsage.project_id, TokenUsage.task_type, TokenUsage.provider, TokenUsage.model,
+        func.count().label("requests"),
+        func.coalesce(func.sum(TokenUsage.prompt_tokens), 0).label("prompt_tokens"),
+        func.coalesce(func.sum(TokenUsage.completion_tokens), 0).label("completion_tokens"),
+    ).group_by(TokenUsage.project_id, TokenUsage.task_type, TokenUsage.provider, TokenUsage.model)
+    if project_id is not None:
+        query = query.where(TokenUsage.project_id == project_id)
+    if start is not None:
+        query = query.where(TokenUsage.created_at >= start)
+    if end is not None:
+        query = query.where(TokenUsage.created_at < end)
+    query = query.order_by(TokenUsage.project_id, TokenUsage.task_type, TokenUsage.provider, TokenUsage.model)
+    return [UsageRow(*row) for row in db.execute(query).all()]
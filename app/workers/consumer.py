@@ -1,6 +1,6 @@
-from celery import Celery
 import logging
 import os
+import threading
 from typing import Optional, Dict, Any
 from uuid import UUID
 from datetime import datetime
@@ -9,88 +9,79 @@ from app.workers.processors.creation import WorkItemCreator
 from app.workers.processors.reprocessing import WorkItemReprocessor
 from app.database import SessionLocal
 from app.models import Request, Status, TaskType
-from app.utils.rabbitmq import RabbitMQProducer, NOTIFICATION_QUEUE
+from app.utils import metrics, outbox, request_ids
+from app.utils.outbox import NOTIFICATION_QUEUE
+from app.celery import celery_app
+from app.agents import llm_clients
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown
+from app.workers.signatures import (
+    PROCESS_DEMAND_TASK, REPROCESS_WORK_ITEM_TASK, PROCESS_INDEPENDENT_CREATION_TASK
+)
 from dotenv import load_dotenv
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
-broker_url = os.environ.get('CELERY_BROKER_URL')
-backend_url = os.environ.get('CELERY_RESULT_BACKEND')
-
-if not broker_url:
-    logger.critical("Variável de ambiente CELERY_BROKER_URL não definida!")
-    raise ValueError("Variável de ambiente CELERY_BROKER_URL não definida!")
-if not backend_url:
-    logger.critical("Variável de ambiente CELERY_RESULT_BACKEND não definida!")
-    raise ValueError("Variável de ambiente CELERY_RESULT_BACKEND não definida!")
-
-
-celery_app = Celery(
-    'tasks',
-    broker=broker_url,
-    backend=backend_url,
-    include=['app.workers.consumer']
-)
-
-celery_app.conf.task_serializer = 'json'
-celery_app.conf.result_serializer = 'json'
-celery_app.conf.accept_content = ['json']
-celery_app.conf.timezone = 'UTC'
-celery_app.conf.enable_utc = True
-celery_app.conf.task_acks_late = True # Para garantir que a task só seja removida da fila após sucesso ou falha explícita
-# celery_app.conf.worker_prefetch_multiplier = 1 # Para processar uma task por vez por worker
-
 # --- Função Helper para Handler de Exceção da Task ---
 def _handle_task_exception(request_id: str, task_type_str: Optional[str], exception: Exception):
     """
-    Tenta atualizar o status da requisição no DB para FAILED e enviar
-    uma notificação mínima quando ocorre uma exceção não tratada na task.
+    Tenta atualizar o status da requisição no DB para FAILED e gravar (no outbox,
+    no mesmo commit) uma notificação mínima quando ocorre uma exceção não tratada na task.
+    Se o banco estiver indisponível, publica a notificação diretamente no RabbitMQ.
     """
     logger.error(f"Erro EXCEPCIONAL não tratado na task para ReqID {request_id}: {exception}", exc_info=True)
     db_task = None
     producer_task = None
     error_message = f"Erro na task Celery: {exception.__class__.__name__}: {str(exception)[:200]}" # Mensagem truncada
 
-    # 1. Tentar atualizar status no DB
+    req = None
+    stored = False
+
+    def _notification_data() -> Dict[str, Any]:
+        # Tenta obter o project_id da request se possível (embora possa falhar se a request não foi encontrada)
+        project_id_from_req = str(req.project_id) if req is not None and getattr(req, 'project_id', None) else None
+        return {
+            "request_id": request_id, "status": Status.FAILED.value,
+            "error_message": error_message,
+            "project_id": project_id_from_req, "parent": None, "parent_type": None, "task_type": task_type_str,
+            "item_ids": [], "version": None, "work_item_id": None, "parent_board_id": None, "is_reprocessing": False
+        }
+
+    # 1. Atualizar status e gravar notificação no outbox (um único commit)
     try:
         logger.info(f"Tentando atualizar status para FAILED no DB para ReqID {request_id} via task exception handler.")
         db_task = SessionLocal()
-        req = db_task.query(Request).filter(Request.request_id == request_id).first()
+        req = db_task.query(Request).filter(request_ids.where_request_id(request_id)).first()
         if req:
             if req.status != Status.COMPLETED.value: # Só atualiza se não estiver COMPLETED
                 req.status = Status.FAILED.value
                 req.error_message = error_message
                 req.updated_at = datetime.now()
-                db_task.commit()
-                logger.info(f"Status atualizado para FAILED no DB para ReqID {request_id}.")
             else:
                  logger.warning(f"ReqID {request_id} já estava COMPLETED. Não atualizando status via task exception handler.")
         else:
             logger.warning(f"Não foi possível encontrar ReqID {request_id} no DB para atualizar status na task exception.")
+        outbox.enqueue_notification(db_task, _notification_data(), NOTIFICATION_QUEUE)
+        db_task.commit()
+        stored = True
+        logger.info(f"Status FAILED e notificação gravados (outbox) para ReqID {request_id}.")
     except Exception as db_exc:
         logger.error(f"Erro ao tentar atualizar status no DB via task exception handler para ReqID {request_id}: {db_exc}", exc_info=True)
         if db_task: db_task.rollback()
     finally:
         if db_task: db_task.close()
 
-    # 2. Tentar enviar notificação mínima de falha
+    if stored:
+        return
+
+    # 2. Banco indisponível: tentar enviar notificação mínima de falha diretamente
     try:
         logger.info(f"Tentando enviar notificação de falha mínima para ReqID {request_id} via task exception handler.")
+        from app.utils.rabbitmq import RabbitMQProducer  # pika só neste caminho de exceção
         producer_task = RabbitMQProducer()
-        # Tenta obter o project_id da request se possível (embora possa falhar se a request não foi encontrada)
-        project_id_from_req = None
-        if 'req' in locals() and req and hasattr(req, 'project_id'):
-             project_id_from_req = str(req.project_id) if req.project_id else None
-
-        notification_data = {
-            "request_id": request_id, "status": Status.FAILED.value,
-            "error_message": error_message,
-            "project_id": project_id_from_req, "parent": None, "parent_type": None, "task_type": task_type_str,
-            "item_ids": [], "version": None, "work_item_id": None, "parent_board_id": None, "is_reprocessing": False
-        }
-        producer_task.publish(notification_data, NOTIFICATION_QUEUE)
+        producer_task.publish(_notification_data(), NOTIFICATION_QUEUE)
+        producer_task.publish_event(_notification_data())  # Invalidação do cache de status da API
         logger.info(f"Notificação de falha mínima enviada para ReqID {request_id}.")
     except Exception as mq_exc:
             logger.error(f"Erro ao tentar enviar notificação via task exception handler para ReqID {request_id}: {mq_exc}", exc_info=True)
@@ -98,7 +89,51 @@ def _handle_task_exception(request_id: str, task_type_str: Optional[str], except
         if producer_task: producer_task.close()
 
 
-@celery_app.task(name="process_demand_task", bind=True) # bind=True para acessar self se precisar de retries do Celery
+def _progress_reporter(task):
+    """Progresso por chunk como estado PROGRESS da task (só há onde gravar com result backend)."""
+    if not celery_app.conf.result_backend:
+        return None
+    return lambda done, total: task.update_state(state="PROGRESS", meta={"chunks_done": done, "chunks_total": total})
+
+
+# Processadores do processo (sem estado por requisição), compartilhados pelas tasks.
+# Criados no primeiro uso em cada processo filho, depois do fork.
+_processors: Dict[type, Any] = {}
+_processors_lock = threading.Lock()
+
+
+def get_processor(processor_cls):
+    processor = _processors.get(processor_cls)
+    if processor is None:
+        with _processors_lock:
+            processor = _processors.setdefault(processor_cls, processor_cls())
+    return processor
+
+
+if hasattr(os, "register_at_fork"):
+    # Um processador herdado do pai guardaria os clientes da LLM do pai (ver app.agents.llm_clients)
+    os.register_at_fork(after_in_child=_processors.clear)
+
+
+@worker_init.connect
+def _start_metrics_exporter(**kwargs):
+    """No processo principal, antes do fork: os filhos gravam em PROMETHEUS_MULTIPROC_DIR e o pai expõe a soma."""
+    metrics.prepare_multiprocess_dir()
+    metrics.start_http_exporter()
+
+
+@worker_process_shutdown.connect
+def _mark_metrics_process_dead(pid=None, **kwargs):
+    metrics.mark_process_dead(pid or os.getpid())
+
+
+@worker_process_init.connect
+def _warm_up_llm_clients(**kwargs):
+    """Cada processo filho do worker cria o cliente da LLM e abre a conexão antes da primeira task."""
+    llm_clients.warm_up()
+
+
+@celery_app.task(name=PROCESS_DEMAND_TASK, bind=True) # bind=True para acessar self se precisar de retries do Celery
 def process_message_task(
     self, # Adicionado self por causa do bind=True
     request_id_interno: str,
@@ -111,12 +146,10 @@ def process_message_task(
     parent_board_id: Optional[str] = None,
     type_test: Optional[str] = None
 ):
-    creator = None
     try:
         logger.info(f"[Task process_demand_task] Iniciando para ReqID {request_id_interno}")
-        creator = WorkItemCreator()
         # Passa parent_type_str para o processador
-        creator.process(
+        get_processor(WorkItemCreator).process(
             request_id_interno=request_id_interno,
             task_type=task_type,
             prompt_data=prompt_data,
@@ -127,7 +160,8 @@ def process_message_task(
             parent_board_id=parent_board_id,
             type_test=type_test,
             project_id_str=None, # Rota original não passa project_id
-            artifact_id=None
+            artifact_id=None,
+            progress_callback=_progress_reporter(self)
         )
         logger.info(f"[Task process_demand_task] Concluída (lógica interna define status) para ReqID {request_id_interno}")
     except Exception as task_exc:
@@ -137,7 +171,7 @@ def process_message_task(
         # raise
 
 
-@celery_app.task(name="reprocess_work_item_task", bind=True)
+@celery_app.task(name=REPROCESS_WORK_ITEM_TASK, bind=True)
 def reprocess_work_item_task(
     self,
     request_id_interno: str,
@@ -150,11 +184,9 @@ def reprocess_work_item_task(
     parent_board_id: Optional[str] = None,
     type_test: Optional[str] = None
 ):
-    reprocessor = None
     try:
         logger.info(f"[Task reprocess_work_item_task] Iniciando para ReqID {request_id_interno}, Artefato {artifact_type}:{artifact_id}")
-        reprocessor = WorkItemReprocessor()
-        reprocessor.process(
+        get_processor(WorkItemReprocessor).process(
             request_id_interno=request_id_interno,
             task_type=artifact_type, # Passar artifact_type como task_type
             prompt_data=prompt_data,
@@ -173,7 +205,7 @@ def reprocess_work_item_task(
         # raise
 
 
-@celery_app.task(name="process_independent_creation_task", bind=True)
+@celery_app.task(name=PROCESS_INDEPENDENT_CREATION_TASK, bind=True)
 def process_independent_creation_task(
     self,
     request_id_interno: str,
@@ -188,14 +220,12 @@ def process_independent_creation_task(
     parent_board_id: Optional[str] = None,
     type_test: Optional[str] = None
 ):
-    creator = None
     try:
         logger.info(f"[Task process_independent_creation_task] Iniciando para ReqID {request_id_interno}")
-        creator = WorkItemCreator()
         # Passa project_id_str e parent_type_str para o processador
         # O 'parent' opcional desta task NÃO é passado diretamente para process,
         # pois process o obterá do DBRequest.
-        creator.process(
+        get_processor(WorkItemCreator).process(
             request_id_interno=request_id_interno,
             project_id_str=project_id, # Passa a string
             task_type=task_type,
@@ -206,7 +236,8 @@ def process_independent_creation_task(
             work_item_id=work_item_id,
             parent_board_id=parent_board_id,
             type_test=type_test,
-            artifact_id=None # Não é reprocessamento
+            artifact_id=None, # Não é reprocessamento
+            progress_callback=_progress_reporter(self)
         )
         logger.info(f"[Task process_independent_creation_task] Concluída (lógica interna define status) para ReqID {request_id_interno}")
     except Exception as task_exc:
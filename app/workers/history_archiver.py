@@ -0,0 +1,116 @@
+# app/workers/history_archiver.py
+"""
+Job de arquivamento de versões inativas (app.utils.history).
+
+Processo separado, no mesmo formato do relay do outbox: a cada ciclo percorre os tipos
+(filhos antes dos pais) e move lotes de versões desativadas há mais de
+HISTORY_ARCHIVE_MIN_AGE_HOURS para `artifact_history`, um commit por lote. Lotes com
+FOR UPDATE SKIP LOCKED permitem mais de uma réplica.
+
+A idade mínima preserva a sync incremental da exportação (?since=), que precisa ver os
+itens desativados: use um valor maior que o intervalo de sync dos clientes.
+
+Uso:
+    python -m app.workers.history_archiver            # loop
+    python -m app.workers.history_archiver --once     # um ciclo (cron)
+"""
+import argparse
+import logging
+import os
+import signal
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+from app.database import SessionLocal, get_engine
+from app.models import TaskType
+from app.utils import history, metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+HISTORY_ARCHIVE_BATCH_SIZE = int(os.getenv("HISTORY_ARCHIVE_BATCH_SIZE", "500"))
+HISTORY_ARCHIVE_MIN_AGE_HOURS = float(os.getenv("HISTORY_ARCHIVE_MIN_AGE_HOURS", "168"))  # 7 dias
+HISTORY_ARCHIVE_INTERVAL = float(os.getenv("HISTORY_ARCHIVE_INTERVAL", "3600"))  # Segundos entre ciclos
+HISTORY_ARCHIVE_ERROR_BACKOFF = float(os.getenv("HISTORY_ARCHIVE_ERROR_BACKOFF", "30"))
+
+
+class HistoryArchiver:
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal,
+                 batch_size: int = HISTORY_ARCHIVE_BATCH_SIZE, min_age_hours: float = HISTORY_ARCHIVE_MIN_AGE_HOURS,
+                 interval: float = HISTORY_ARCHIVE_INTERVAL):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.min_age = timedelta(hours=min_age_hours)
+        self.interval = interval
+        self._running = False
+
+    def archive_type(self, task_type: TaskType, cutoff: datetime) -> int:
+        """Arquiva todos os lotes elegíveis de um tipo. Retorna o total movido."""
+        total = 0
+        while True:
+            db = self.session_factory()
+            try:
+                moved = history.archive_batch(db, task_type, cutoff, self.batch_size)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+            total += moved
+            if moved < self.batch_size:
+                return total
+
+    def run_once(self) -> int:
+        """Um ciclo completo, filhos antes dos pais. Retorna o total de linhas arquivadas."""
+        cutoff = datetime.now(timezone.utc) - self.min_age
+        total = 0
+        for task_type in history.ARCHIVE_ORDER:
+            moved = self.archive_type(task_type, cutoff)
+            if moved:
+                logger.info(f"{moved} versão(ões) inativa(s) de {task_type.value} arquivada(s).")
+            total += moved
+        return total
+
+    def run_forever(self):
+        self._running = True
+        logger.info(f"Arquivamento de versões iniciado (lote={self.batch_size}, idade mínima={self.min_age}, "
+                    f"intervalo={self.interval}s).")
+        while self._running:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Erro no ciclo de arquivamento de versões: {e}", exc_info=True)
+                time.sleep(HISTORY_ARCHIVE_ERROR_BACKOFF)
+                continue
+            # Dorme em passos curtos para responder ao SIGTERM
+            deadline = time.monotonic() + self.interval
+            while self._running and time.monotonic() < deadline:
+                time.sleep(min(1.0, self.interval))
+        logger.info("Arquivamento de versões finalizado.")
+
+    def stop(self, *_args):
+        self._running = False
+
+
+def main(archiver: Optional[HistoryArchiver] = None):
+    parser = argparse.ArgumentParser(description="Arquiva versões inativas em artifact_history.")
+    parser.add_argument("--once", action="store_true", help="Executa um único ciclo e sai.")
+    args = parser.parse_args()
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    history.ensure_partitions(get_engine())
+    archiver = archiver or HistoryArchiver()
+    if args.once:
+        archiver.run_once()
+        return
+    metrics.start_http_exporter()
+    signal.signal(signal.SIGTERM, archiver.stop)
+    signal.signal(signal.SIGINT, archiver.stop)
+    archiver.run_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# app/workers/notification_consumer.py
+"""
+Serviço consumidor de notificações (RabbitMQConsumer de app.utils.rabbitmq).
+
+Consome NOTIFICATION_CONSUMER_QUEUE (padrão: notification_queue; aceita também a
+notification_batch_queue, com envelopes de lote do relay) com prefetch, pool de
+handlers, acks em lote, retentativas com x-retry-count e dead-letter (ver RabbitMQConsumer).
+O handler é NOTIFICATION_CONSUMER_HANDLER ("modulo:funcao", recebe o dict da notificação);
+o padrão (`log_notification`) valida, registra no log e conta por status. É a base para
+integrações em Python. Por padrão quem consome a notification_queue é o backend .NET: não
+rode este serviço na mesma fila que ele, porque os dois passariam a dividir as mensagens.
+
+Uso:
+    python -m app.workers.notification_consumer
+"""
+import importlib
+import logging
+import os
+import signal
+from typing import Any, Callable, Dict, Optional
+from dotenv import load_dotenv
+from app.utils import json_codec, metrics
+from app.utils.outbox import NOTIFICATION_QUEUE, unwrap
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_CONSUMER_QUEUE = os.getenv("NOTIFICATION_CONSUMER_QUEUE", NOTIFICATION_QUEUE)
+NOTIFICATION_CONSUMER_HANDLER = os.getenv("NOTIFICATION_CONSUMER_HANDLER", "")
+
+Handler = Callable[[Dict[str, Any]], None]
+
+
+def log_notification(notification: Dict[str, Any]) -> None:
+    """Handler padrão. Notificação sem request_id/status é inválida e vai para a dead-letter."""
+    if not notification.get("request_id") or not notification.get("status"):
+        raise ValueError(f"Notificação sem request_id/status: {str(notification)[:200]}")
+    metrics.increment("notifications_consumed_total", status=notification["status"])
+    logger.info(f"Notificação recebida: ReqID {notification['request_id']} => {notification['status']}")
+
+
+def load_handler(path: str = NOTIFICATION_CONSUMER_HANDLER) -> Handler:
+    if not path:
+        return log_notification
+    module_name, _, attribute = path.partition(":")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def make_callback(handler: Handler) -> Callable[[bytes, Any], None]:
+    """
+    Adapta o handler de notificação ao callback do consumidor (bytes JSON -> dict). Envelopes
+    de lote (NOTIFICATION_BATCH_QUEUE) chamam o handler por notificação; se uma falhar, o
+    envelope inteiro é retentado, então o handler deve ser idempotente por request_id.
+    """
+    def callback(body: bytes, _properties) -> None:
+        for notification in unwrap(json_codec.loads(body)):
+            handler(notification)
+    return callback
+
+
+def main(consumer=None, handler: Optional[Handler] = None):
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    metrics.start_http_exporter()
+    if consumer is None:
+        from app.utils.rabbitmq import RabbitMQConsumer  # pika só neste processo
+        consumer = RabbitMQConsumer(make_callback(handler or load_handler()), queue=NOTIFICATION_CONSUMER_QUEUE)
+    signal.signal(signal.SIGTERM, consumer.stop)
+    signal.signal(signal.SIGINT, consumer.stop)
+    try:
+        consumer.start_consuming()
+    finally:
+        consumer.close()
+    logger.info("Consumidor de notificações finalizado.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+# app/workers/outbox_relay.py
+"""
+Relay do outbox de notificações.
+
+Processo separado dos workers Celery: lê lotes de `notification_outbox` pendentes
+(FOR UPDATE SKIP LOCKED, permitindo mais de uma réplica), publica cada mensagem no
+RabbitMQ com publisher confirms e marca o lote como publicado num único commit.
+Entrega at-least-once: se o relay cair entre o publish e o commit, a mensagem é
+republicada; o consumidor .NET deve ser idempotente por request_id.
+
+NOTIFICATION_PUBLISH_MODE escolhe a entrega das notificações:
+- "message" (padrão, compatível): uma mensagem e um confirm por notificação na notification_queue;
+- "batch": as notificações pendentes são agrupadas por até NOTIFICATION_BATCH_WINDOW segundos
+  (ou até NOTIFICATION_BATCH_MAX) num envelope {"type": "notification_batch", "count", "notifications"}
+  publicado na NOTIFICATION_BATCH_QUEUE, com um único confirm por envelope;
+- "both": envelope e mensagens individuais, para migrar consumidores sem janela sem entrega.
+O evento de invalidação do cache segue o mesmo formato (um envelope por lote fora do modo "message").
+
+Uso:
+    python -m app.workers.outbox_relay
+"""
+import logging
+import os
+import signal
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import OutboxMessage
+from app.utils import metrics
+from app.utils.outbox import NOTIFICATION_BATCH_QUEUE, NOTIFICATION_QUEUE, batch_envelope
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "0.5"))  # Segundos entre consultas com outbox vazio
+OUTBOX_ERROR_BACKOFF = float(os.getenv("OUTBOX_ERROR_BACKOFF", "5"))  # Segundos de espera após erro de DB/broker
+NOTIFICATION_PUBLISH_MODE = os.getenv("NOTIFICATION_PUBLISH_MODE", "message").lower()
+NOTIFICATION_BATCH_MAX = int(os.getenv("NOTIFICATION_BATCH_MAX", "100"))  # Notificações por envelope
+NOTIFICATION_BATCH_WINDOW = float(os.getenv("NOTIFICATION_BATCH_WINDOW", "0.2"))  # Segundos de espera para encher o envelope
+PUBLISH_MODES = ("message", "batch", "both")
+
+
+def _default_producer_factory():
+    from app.utils.rabbitmq import RabbitMQProducer  # pika só no processo do relay
+    return RabbitMQProducer(confirm_delivery=True)
+
+
+class OutboxRelay:
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal,
+                 producer_factory: Callable[[], object] = _default_producer_factory,
+                 batch_size: int = OUTBOX_BATCH_SIZE, poll_interval: float = OUTBOX_POLL_INTERVAL,
+                 publish_mode: str = NOTIFICATION_PUBLISH_MODE, batch_max: int = NOTIFICATION_BATCH_MAX,
+                 batch_window: float = NOTIFICATION_BATCH_WINDOW):
+        if publish_mode not in PUBLISH_MODES:
+            raise ValueError(f"NOTIFICATION_PUBLISH_MODE inválido: {publish_mode!r} (use {', '.join(PUBLISH_MODES)})")
+        self.session_factory = session_factory
+        self.producer_factory = producer_factory
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.publish_mode = publish_mode
+        self.batch_max = max(1, batch_max)
+        self.batch_window = batch_window
+        # No modo de lote a consulta precisa trazer ao menos um envelope cheio
+        self.fetch_size = batch_size if publish_mode == "message" else max(batch_size, self.batch_max)
+        self.producer = None
+        self._running = False
+        self._window_started: Optional[float] = None
+
+    def _get_producer(self):
+        if self.producer is None:
+            self.producer = self.producer_factory()
+        return self.producer
+
+    def _reset_producer(self):
+        if self.producer is not None:
+            try:
+                self.producer.close()
+            except Exception as e:
+                logger.warning(f"Erro ao fechar conexão do relay com RabbitMQ: {e}")
+        self.producer = None
+
+    def _publish_event(self, producer, payload, origin: str):
+        """Cópia do evento para o exchange de invalidação do cache da API. Falha não bloqueia o lote."""
+        try:
+            producer.publish_event(payload)
+        except Exception as e:
+            metrics.increment("outbox_event_publish_failures_total")
+            logger.warning(f"Falha ao publicar evento de invalidação {origin}: {e}")
+
+    def _publish(self, producer, payload, queue: str):
+        producer.publish(payload, queue)  # Bloqueia até o confirm do broker
+        metrics.increment("outbox_broker_publishes_total", queue=queue)
+
+    @staticmethod
+    def _mark_published(message: OutboxMessage):
+        message.published_at = datetime.now(timezone.utc)
+        message.attempts = (message.attempts or 0) + 1
+        metrics.increment("outbox_published_total", queue=message.queue)
+
+    def _mark_failed(self, messages, error: Exception, queue: str):
+        """Broker indisponível ou mensagem rejeitada: registra e deixa o restante para o próximo ciclo."""
+        for message in messages:
+            message.attempts = (message.attempts or 0) + 1
+            message.last_error = f"{error.__class__.__name__}: {str(error)[:500]}"
+        metrics.increment("outbox_publish_failures_total", queue=queue)
+        self._reset_producer()
+
+    def _publish_each(self, producer, messages, events: bool = True):
+        """Uma mensagem (e um confirm) por linha. Retorna (publicadas, sem falha)."""
+        published = 0
+        for message in messages:
+            try:
+                self._publish(producer, message.payload, message.queue)
+            except Exception as e:
+                logger.error(f"Falha ao publicar mensagem {message.id} do outbox (ReqID {message.request_id}): {e}", exc_info=True)
+                self._mark_failed([message], e, message.queue)
+                return published, False
+            self._mark_published(message)
+            published += 1
+            if events and message.queue == NOTIFICATION_QUEUE:
+                self._publish_event(producer, message.payload, f"da mensagem {message.id} (ReqID {message.request_id})")
+        return published, True
+
+    def _publish_batches(self, producer, messages):
+        """Envelopes de até batch_max notificações, um confirm por envelope. Retorna (publicadas, sem falha)."""
+        published = 0
+        for start in range(0, len(messages), self.batch_max):
+            chunk = messages[start:start + self.batch_max]
+            envelope = batch_envelope([message.payload for message in chunk])
+            try:
+                self._publish(producer, envelope, NOTIFICATION_BATCH_QUEUE)
+            except Exception as e:
+                logger.error(f"Falha ao publicar envelope com {len(chunk)} notificação(ões) do outbox "
+                             f"(mensagens {chunk[0].id}..{chunk[-1].id}): {e}", exc_info=True)
+                self._mark_failed(chunk, e, NOTIFICATION_BATCH_QUEUE)
+                return published, False
+            metrics.increment("outbox_batches_published_total", queue=NOTIFICATION_BATCH_QUEUE)
+            if self.publish_mode == "both":
+                # Compatibilidade: as que falharem aqui voltam no próximo envelope (at-least-once)
+                sent, ok = self._publish_each(producer, chunk, events=False)
+                chunk = chunk[:sent]
+            else:
+                for message in chunk:
+                    self._mark_published(message)
+                ok = True
+            published += len(chunk)
+            if chunk:
+                self._publish_event(producer, batch_envelope([message.payload for message in chunk]),
+                                    f"do lote com {len(chunk)} notificação(ões)")
+            if not ok:
+                return published, False
+        return published, True
+
+    def _coalescing(self, pending: int) -> bool:
+        """Modo de lote: segura as pendências até encher um envelope ou vencer a janela."""
+        if self.publish_mode == "message" or pending >= self.batch_max or self.batch_window <= 0:
+            self._window_started = None
+            return False
+        now = time.monotonic()
+        if self._window_started is None:
+            self._window_started = now
+        if now - self._window_started < self.batch_window:
+            return True
+        self._window_started = None
+        return False
+
+    def _idle_wait(self) -> float:
+        """Espera até o próximo ciclo: o restante da janela de agrupamento, se houver uma aberta."""
+        if self._window_started is None:
+            return self.poll_interval
+        remaining = self.batch_window - (time.monotonic() - self._window_started)
+        return min(self.poll_interval, max(remaining, 0.0))
+
+    def relay_batch(self) -> int:
+        """Publica um lote de mensagens pendentes. Retorna quantas foram publicadas."""
+        db = self.session_factory()
+        try:
+            messages = (
+                db.query(OutboxMessage)
+                .filter(OutboxMessage.published_at.is_(None))
+                .order_by(OutboxMessage.id)
+                .limit(self.fetch_size)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            if not messages or self._coalescing(len(messages)):
+                db.rollback()  # Libera a transação aberta pelo SELECT (e os locks, durante a janela)
+                return 0
+
+            producer = self._get_producer()
+            if self.publish_mode == "message":
+                published, _ = self._publish_each(producer, messages)
+            else:
+                notifications = [m for m in messages if m.queue == NOTIFICATION_QUEUE]
+                published, ok = self._publish_batches(producer, notifications)
+                if ok:
+                    others, _ = self._publish_each(producer, [m for m in messages if m.queue != NOTIFICATION_QUEUE])
+                    published += others
+
+            db.commit()
+            if published:
+                logger.info(f"{published} notificação(ões) publicada(s) a partir do outbox.")
+            return published
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def run_forever(self):
+        """Loop principal: publica lotes enquanto houver pendências; senão aguarda poll_interval."""
+        self._running = True
+        logger.info(f"Relay do outbox iniciado (lote={self.fetch_size}, intervalo={self.poll_interval}s, "
+                    f"modo={self.publish_mode}).")
+        while self._running:
+            try:
+                published = self.relay_batch()
+            except Exception as e:
+                logger.error(f"Erro no ciclo do relay do outbox: {e}", exc_info=True)
+                self._reset_producer()
+                time.sleep(OUTBOX_ERROR_BACKOFF)
+                continue
+            if published < self.fetch_size:
+                time.sleep(self._idle_wait())
+        self._reset_producer()
+        logger.info("Relay do outbox finalizado.")
+
+    def stop(self, *_args):
+        self._running = False
+
+
+def main(relay: Optional[OutboxRelay] = None):
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    metrics.start_http_exporter()
+    relay = relay or OutboxRelay()
+    signal.signal(signal.SIGTERM, relay.stop)
+    signal.signal(signal.SIGINT, relay.stop)
+    relay.run_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,70 @@
 # app/workers/processors/base.py
 from abc import ABC, abstractmethod
-from typing import List, Optional, Dict, Any, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Callable, List, Optional, Dict, Any, Tuple
 import json
+from sqlalchemy import exists, select, update
 from sqlalchemy.orm import Session
 from app.database import SessionLocal
 from app.models import Request, Status, TaskType, Epic, Feature, UserStory, Task, Bug, Issue, PBI, TestCase, Action, WBS #, Project
-from app.utils import rabbitmq, parsers
-from app.agents.llm_agent import LLMAgent, InvalidModelError
+from app.utils import parsers, outbox, hierarchy, candidate_scoring, chunking, structured_output, token_budget, request_ids
+from app.utils.semantic_cache import semantic_cache
+from app.utils.parser_registry import get_spec
+from app.agents.llm_agent import LLMAgent, InvalidModelError, FINISH_REASON_LENGTH, stitch_continuation
 from datetime import datetime
-import pika
 from pydantic import ValidationError
 from sqlalchemy.exc import IntegrityError
 import logging
 from uuid import UUID
-from app.utils import rabbitmq
+from app.utils import metrics
+from app.utils.json_extraction import extract_json, JSONExtractionError
+import os
 
 logger = logging.getLogger(__name__)
 
+# Chamada de correção de JSON (só usada quando o reparo local é impossível).
+# Modelos mais baratos podem ser configurados por provedor; sem eles usa o modelo da requisição.
+JSON_FIX_MODELS = {
+    "openai": os.getenv("JSON_FIX_OPENAI_MODEL"),
+    "gemini": os.getenv("JSON_FIX_GEMINI_MODEL"),
+}
+JSON_FIX_SYSTEM_PROMPT = (
+    "Você corrige JSON inválido. Recebe um texto que deveria ser JSON e devolve o MESMO conteúdo "
+    "como JSON válido, sem alterar, resumir ou traduzir os valores. "
+    "Retorne SOMENTE o JSON corrigido, sem Markdown e sem texto adicional."
+)
+
+# Resposta cortada por max_tokens (finish_reason "length"): até LLM_MAX_CONTINUATIONS chamadas
+# de continuação a partir do texto parcial, costuradas antes do parsing.
+LLM_MAX_CONTINUATIONS = int(os.getenv("LLM_MAX_CONTINUATIONS", "2"))
+CONTINUATION_INSTRUCTION = (
+    "\n\nA resposta anterior foi interrompida pelo limite de tokens. Continue EXATAMENTE a partir do "
+    "último caractere da resposta parcial abaixo, sem repetir nada, sem Markdown e sem texto adicional.\n"
+    "Resposta parcial:\n"
+)
+
+# Saída estruturada (JSON Schema dos schemas de resposta) nas chamadas de geração; modelos que
+# não suportam seguem em texto livre (ver LLMAgent.generate_text)
+STRUCTURED_OUTPUT_ENABLED = os.getenv("STRUCTURED_OUTPUT_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Best-of-N: N gerações concorrentes, validadas pelos parsers e escolhidas por um scorer
+# (app.utils.candidate_scoring). Ativo para os tipos em BEST_OF_N_TASK_TYPES (ex: "epic,wbs")
+# ou por requisição via llm_config["best_of_n"].
+BEST_OF_N = int(os.getenv("BEST_OF_N", "3"))
+BEST_OF_N_MAX = int(os.getenv("BEST_OF_N_MAX", "5"))
+BEST_OF_N_TASK_TYPES = {t.strip() for t in os.getenv("BEST_OF_N_TASK_TYPES", "").split(",") if t.strip()}
+BEST_OF_N_SCORER = os.getenv("BEST_OF_N_SCORER", "default")
+
+# Entradas longas (transcrições): acima de CHUNK_THRESHOLD_TOKENS estimados no user_input, a
+# geração é feita por chunks de CHUNK_MAX_TOKENS com CHUNK_OVERLAP_TOKENS de sobreposição.
+CHUNKING_ENABLED = os.getenv("CHUNKING_ENABLED", "true").lower() in ("1", "true", "yes")
+CHUNK_THRESHOLD_TOKENS = int(os.getenv("CHUNK_THRESHOLD_TOKENS", "3000"))
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "2000"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "200"))
+CHUNK_MAX_PARALLEL = int(os.getenv("CHUNK_MAX_PARALLEL", "4"))
+
 PARENT_MODEL_MAP = {
     TaskType.EPIC: Epic,
     TaskType.FEATURE: Feature,
@@ -29,13 +77,75 @@ PARENT_MODEL_MAP = {
     # TaskType.PROJECT: Project,
 }
 
+class TaskContext:
+    """Estado de uma requisição em processamento: tudo o que não pode ficar no processador compartilhado."""
+    __slots__ = ("db", "llm_config", "progress_callback", "last_llm_model")
+
+    def __init__(self, db: Session, llm_config: Optional[dict] = None,
+                 progress_callback: Optional[Callable[[int, int], None]] = None):
+        self.db = db
+        self.llm_config = llm_config
+        # Chamado a cada chunk concluído, com (concluídos, total); ex: estado PROGRESS da task Celery
+        self.progress_callback = progress_callback
+        # (provedor, modelo) da última geração da requisição (ledger de tokens)
+        self.last_llm_model: Optional[Tuple[str, str]] = None
+
+    def close(self):
+        """Fecha a sessão da requisição."""
+        if self.db and self.db.is_active:
+            try:
+                self.db.close()
+                logger.debug("Conexão com banco de dados fechada")
+            except Exception as e:
+                logger.error(f"Erro ao fechar conexão com banco: {e}", exc_info=True)
+
+
+# Contexto da requisição corrente. ContextVar isola threads e corrotinas que compartilham o processador;
+# as threads dos chunks recebem uma cópia (copy_context) que aponta para o mesmo TaskContext.
+_current_task: ContextVar[TaskContext] = ContextVar("work_item_task")
+
+
 class WorkItemProcessor(ABC):
-    def __init__(self):
-        self.db: Session = SessionLocal()
-        self.producer = rabbitmq.RabbitMQProducer()
-        self.llm_agent = LLMAgent()
+    """
+    Processador sem estado por requisição: uma instância por processo do worker, compartilhada
+    pelas tasks (inclusive em pools de threads). A sessão do banco, o llm_config e o callback
+    de progresso de cada requisição ficam no TaskContext corrente (ver `process` e `task_context`).
+    """
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal, llm_agent: Optional[LLMAgent] = None):
+        self.session_factory = session_factory
+        # Compartilhado: o llm_config da requisição vai em cada chamada e o agente nunca é alterado.
+        # Notificações vão para o outbox (app.utils.outbox); o worker não abre conexão com o RabbitMQ
+        self.llm_agent = llm_agent or LLMAgent()
         self.parent_model_map = PARENT_MODEL_MAP # Tornando atributo de instância
 
+    @property
+    def context(self) -> TaskContext:
+        try:
+            return _current_task.get()
+        except LookupError:
+            raise RuntimeError("Nenhuma requisição em processamento (use process() ou task_context()).") from None
+
+    @property
+    def db(self) -> Session:
+        """Sessão da requisição corrente."""
+        return self.context.db
+
+    @property
+    def progress_callback(self) -> Optional[Callable[[int, int], None]]:
+        return self.context.progress_callback
+
+    @contextmanager
+    def task_context(self, db: Session, llm_config: Optional[dict] = None,
+                     progress_callback: Optional[Callable[[int, int], None]] = None):
+        """Torna `db` (sem fechá-la) a sessão da requisição corrente dentro do bloco."""
+        context = TaskContext(db, llm_config, progress_callback)
+        token = _current_task.set(context)
+        try:
+            yield context
+        finally:
+            _current_task.reset(token)
+
     @abstractmethod
     def _process_item(
         self,
@@ -68,11 +178,14 @@ class WorkItemProcessor(ABC):
         parent_board_id: Optional[str] = None,
         type_test: Optional[str] = None,
         artifact_id: Optional[int] = None, # ID do item se for reprocessamento
-        project_id_str: Optional[str] = None # UUID do projeto (obrigatório para /independent)
+        project_id_str: Optional[str] = None, # UUID do projeto (obrigatório para /independent)
+        progress_callback: Optional[Callable[[int, int], None]] = None
     ):
         """
         Orquestra o processamento completo de uma requisição (criação ou reprocessamento).
         Valida inputs, chama LLM, processa a resposta, atualiza DB e notifica.
+        Abre uma sessão própria (session_factory), fechada ao final; pode rodar em paralelo
+        com outras requisições no mesmo processador.
         """
         project_uuid: Optional[UUID] = None
         parent_id_from_req: Optional[int] = None
@@ -81,6 +194,8 @@ class WorkItemProcessor(ABC):
         generated_text: str = "" # Inicializar para bloco finally/except
         task_type_enum: Optional[TaskType] = None # Inicializar
 
+        context = TaskContext(self.session_factory(), llm_config, progress_callback)
+        token = _current_task.set(context)
         try:
             logger.info(f"Processando request_id: {request_id_interno}, task_type: {task_type}, artifact_id: {artifact_id}, project_id_str: {project_id_str}, parent_type_str: {parent_type_str}")
 
@@ -98,7 +213,7 @@ class WorkItemProcessor(ABC):
                     return
 
             # --- Busca Requisição DB ---
-            db_request = self.db.query(Request).filter(Request.request_id == request_id_interno).first()
+            db_request = self.db.query(Request).filter(request_ids.where_request_id(request_id_interno)).first()
             if not db_request:
                 logger.error(f"Requisição {request_id_interno} não encontrada no banco de dados.")
                 # Não podemos atualizar status, a notificação será mínima se a task falhar
@@ -158,21 +273,36 @@ class WorkItemProcessor(ABC):
                     else:
                         logger.info(f"Validação de existência pulada para pai tipo 'project' (ID={parent_id_hierarquico}).")
 
+            # Rota /generate (e pais criados sem projeto na requisição): os itens herdam o projeto
+            # do pai, para aparecerem na exportação e nas buscas por projeto
+            if project_uuid is None and parent_id_hierarquico is not None:
+                project_uuid = self._parent_project(parent_id_hierarquico, parent_type_enum_hierarquico)
+                if project_uuid is not None:
+                    logger.info(f"Usando project_id {project_uuid} do pai {parent_id_hierarquico} para ReqID {request_id_interno}")
+
             # --- Processamento Principal (LLM e DB Item) ---
             try:
                 effective_language = language if language else "português"
                 logger.info(f"Iniciando chamada LLM para ReqID: {request_id_interno}, Idioma: {effective_language}")
 
-                processed_prompt_data = self.process_prompt_data(prompt_data, type_test, effective_language)
-
-                if llm_config:
-                    self.configure_llm_agent(self.llm_agent, llm_config)
-
-                llm_response = self.llm_agent.generate_text(processed_prompt_data, llm_config)
-                generated_text = llm_response["text"]
-                prompt_tokens = llm_response["prompt_tokens"]
-                completion_tokens = llm_response["completion_tokens"]
-                logger.debug(f"Texto gerado pela LLM: {generated_text[:500]}...")
+                cacheable_prompt: Optional[dict] = None  # Prompt a guardar no cache semântico após o sucesso
+                if artifact_id is None and self._should_chunk(task_type_enum, prompt_data):
+                    # Transcrição longa: um chunk por chamada, em paralelo, e fusão das listas
+                    generated_text, prompt_tokens, completion_tokens = self._generate_chunked(
+                        request_id_interno, task_type_enum, prompt_data, type_test, effective_language, llm_config
+                    )
+                else:
+                    processed_prompt_data = self.process_prompt_data(prompt_data, type_test, effective_language)
+                    cached = self._semantic_cache_lookup(request_id_interno, task_type_enum, processed_prompt_data, llm_config)
+                    if cached is not None:
+                        # Reutilização não consome tokens
+                        generated_text, prompt_tokens, completion_tokens = cached.text, 0, 0
+                    else:
+                        generated_text, prompt_tokens, completion_tokens = self._generate(
+                            task_type_enum, processed_prompt_data, llm_config,
+                            many=True if artifact_id is not None else None  # Reprocessamento aceita lista (parse_update)
+                        )
+                        cacheable_prompt = processed_prompt_data
 
                 # Chamar implementação de _process_item
                 item_ids, new_version = self._process_item(
@@ -188,10 +318,13 @@ class WorkItemProcessor(ABC):
                     parent_type=parent_type_enum_hierarquico # Passa o tipo do pai hierárquico
                 )
 
-                # Commit e Notificação de Sucesso
-                self.db.commit()
-                logger.info(f"Commit realizado com sucesso para ReqID: {request_id_interno}.")
-                self.update_request_status(request_id_interno, Status.COMPLETED)
+                # Ledger de tokens, status e notificação (outbox) na mesma transação dos artefatos: um único commit
+                provider, model = self._llm_model()
+                token_budget.record_usage(
+                    self.db, request_id_interno, project_uuid, task_type_enum.value,
+                    provider, model, prompt_tokens, completion_tokens,
+                )
+                self.update_request_status(request_id_interno, Status.COMPLETED, commit=False)
                 self.send_notification(
                     request_id=request_id_interno,
                     project_id=project_uuid,
@@ -206,6 +339,16 @@ class WorkItemProcessor(ABC):
                     parent_board_id=parent_board_id,
                     is_reprocessing=(artifact_id is not None)
                 )
+                self.db.commit()
+                logger.info(f"Commit realizado com sucesso para ReqID: {request_id_interno}.")
+
+                # Só depois do commit: uma requisição que termina FAILED não deixa resposta no cache
+                if cacheable_prompt is not None and self._semantic_cache_enabled(llm_config):
+                    try:  # A requisição já está COMPLETED: falha no cache não pode marcá-la como FAILED
+                        semantic_cache.store(task_type_enum, cacheable_prompt, llm_config, generated_text,
+                                             prompt_tokens, completion_tokens, request_id_interno)
+                    except Exception as e:
+                        logger.warning(f"Falha ao gravar no cache semântico (ReqID {request_id_interno}): {e}")
 
             # --- Tratamento de Erros no Processamento Principal ---
             # Usar o helper centralizado _handle_failure aqui seria ideal (pensar na proxima melhorai)
@@ -216,16 +359,14 @@ class WorkItemProcessor(ABC):
                  # Poderíamos passar generated_text para o log dentro de _handle_failure
             except IntegrityError as e:
                 self._handle_failure(request_id_interno, db_request, task_type_enum, e, rollback=True, work_item_id=work_item_id, parent_board_id=parent_board_id, project_id=project_uuid)
-            except pika.exceptions.AMQPConnectionError as e:
-                # Erro de AMQP é especial, pois a notificação de falha também pode falhar
-                self._handle_amqp_connection_error(request_id_interno, db_request, task_type_enum, e, work_item_id, parent_board_id, project_uuid)
             except Exception as e:
                 # Usar helper para erros genéricos
                 self._handle_failure(request_id_interno, db_request, task_type_enum, e, rollback=True, work_item_id=work_item_id, parent_board_id=parent_board_id, project_id=project_uuid)
                 # raise # Não re-lançar aqui, deixar o wrapper da task logar se necessário
 
         finally:
-            self.close_resources()
+            _current_task.reset(token)
+            context.close()
             logger.debug(f"Recursos liberados para ReqID: {request_id_interno}")
 
 
@@ -239,10 +380,11 @@ class WorkItemProcessor(ABC):
             logger.warning(f"Tipo de pai não mapeado para validação: {parent_type.value}.")
             return False
         try:
-            exists = self.db.query(ParentModel.id).filter(ParentModel.id == parent_id).count() > 0
-            if exists: logger.debug(f"Pai encontrado: ID={parent_id}, Tipo={parent_type.value}")
+            # EXISTS para no primeiro registro (count() varreria todos os que casam)
+            exists_ = bool(self.db.scalar(select(exists().where(ParentModel.id == parent_id))))
+            if exists_: logger.debug(f"Pai encontrado: ID={parent_id}, Tipo={parent_type.value}")
             else: logger.warning(f"Pai NÃO encontrado: ID={parent_id}, Tipo={parent_type.value}")
-            return exists
+            return exists_
         except Exception as e:
             logger.error(f"Erro ao validar existência do pai (ID={parent_id}, Tipo={parent_type.value}): {e}", exc_info=True)
             return False
@@ -280,6 +422,207 @@ class WorkItemProcessor(ABC):
         return {"parent_id": parent_id, "parent_type": parent_type_enum, "project_id": project_id_uuid}
 
 
+    def _extract_or_fix_json(self, task_type: TaskType, generated_text: str, llm_config: Optional[dict]) -> Tuple[str, int, int]:
+        """
+        Extrai o JSON da resposta da LLM aplicando reparos locais (fences, texto ao redor, vírgulas...).
+        Só quando o reparo é impossível faz uma chamada extra, mais barata, pedindo a correção do JSON.
+        Retorna o texto JSON limpo e os tokens (prompt, completion) gastos na correção.
+        """
+        try:
+            extracted = extract_json(generated_text, task_type.value)
+            metrics.increment("llm_output_parse_total", task_type=task_type.value, mode="text",
+                              outcome="repaired" if extracted.repairs else "ok")
+            return extracted.text, 0, 0
+        except JSONExtractionError as e:
+            metrics.increment("llm_output_parse_total", task_type=task_type.value, mode="text", outcome="failed")
+            if not generated_text or not generated_text.strip():
+                raise
+            logger.warning(f"Reparo local do JSON falhou para {task_type.value} ({e}). Solicitando correção à LLM.")
+
+        fix_config = dict(llm_config or {})
+        fix_config["temperature"] = 0.0
+        provider = fix_config.get("llm") or self.llm_agent.chosen_llm
+        if JSON_FIX_MODELS.get(provider):
+            fix_config["model"] = JSON_FIX_MODELS[provider]
+        metrics.increment("llm_json_fix_calls_total", task_type=task_type.value)
+
+        fix_response = self.llm_agent.generate_text(
+            {"system": JSON_FIX_SYSTEM_PROMPT, "user": generated_text, "assistant": ""}, fix_config
+        )
+        try:
+            fixed = extract_json(fix_response["text"], task_type.value)
+        except JSONExtractionError:
+            metrics.increment("llm_json_fix_failures_total", task_type=task_type.value)
+            raise
+        logger.info(f"JSON de {task_type.value} corrigido pela LLM (tokens: prompt={fix_response['prompt_tokens']}, completion={fix_response['completion_tokens']}).")
+        return fixed.text, fix_response["prompt_tokens"], fix_response["completion_tokens"]
+
+
+    def _generate(self, task_type: TaskType, prompt_data: dict, llm_config: Optional[dict],
+                  many: Optional[bool] = None) -> Tuple[str, int, int]:
+        """Uma geração (ou best-of-N) já com o JSON extraído/corrigido: (texto, tokens de prompt, tokens de completion)."""
+        best_of_n = self._best_of_n(task_type, llm_config)
+        if best_of_n > 1:
+            return self._generate_best_of_n(task_type, prompt_data, llm_config, best_of_n, many=many)
+
+        generated_text, prompt_tokens, completion_tokens, structured = self._generate_text_complete(
+            task_type, prompt_data, llm_config
+        )
+        logger.debug(f"Texto gerado pela LLM: {generated_text[:500]}...")
+
+        if task_type == TaskType.AUTOMATION_SCRIPT: # Script não é JSON
+            return generated_text, prompt_tokens, completion_tokens
+        if structured and self._is_schema_valid(task_type, generated_text, many):
+            return generated_text, prompt_tokens, completion_tokens
+        generated_text, fix_prompt_tokens, fix_completion_tokens = self._extract_or_fix_json(
+            task_type, generated_text, llm_config
+        )
+        return generated_text, prompt_tokens + fix_prompt_tokens, completion_tokens + fix_completion_tokens
+
+    @staticmethod
+    def _semantic_cache_enabled(llm_config: Optional[dict]) -> bool:
+        """Cache semântico ligado no processo e não desligado na requisição (llm_config.semantic_cache)."""
+        return semantic_cache.enabled and (llm_config or {}).get("semantic_cache") is not False
+
+    def _semantic_cache_lookup(self, request_id: str, task_type: TaskType, prompt_data: dict,
+                               llm_config: Optional[dict]):
+        if not self._semantic_cache_enabled(llm_config):
+            return None
+        return semantic_cache.lookup(task_type, prompt_data, llm_config, request_id=request_id)
+
+    def _structured_output(self, task_type: TaskType):
+        return structured_output.for_task_type(task_type) if STRUCTURED_OUTPUT_ENABLED else None
+
+    def _is_schema_valid(self, task_type: TaskType, text: str, many: Optional[bool]) -> bool:
+        """
+        Caminho rápido da saída estruturada: validação direta pelo schema, sem extração tolerante.
+        Falhas (raras) seguem para _extract_or_fix_json e ficam na métrica llm_output_parse_total.
+        """
+        try:
+            get_spec(task_type).validate(text, many=many, structured=True)
+        except (ValidationError, ValueError) as e:
+            metrics.increment("llm_output_parse_total", task_type=task_type.value, mode="structured", outcome="failed")
+            logger.warning(f"Saída estruturada de {task_type.value} não validou ({e.__class__.__name__}); usando reparo tolerante.")
+            return False
+        metrics.increment("llm_output_parse_total", task_type=task_type.value, mode="structured", outcome="ok")
+        return True
+
+    def _generate_text_complete(self, task_type: TaskType, prompt_data: dict,
+                                llm_config: Optional[dict]) -> Tuple[str, int, int, bool]:
+        """
+        generate_text com continuação automática: enquanto a resposta vier cortada por max_tokens,
+        pede a continuação do texto parcial (até LLM_MAX_CONTINUATIONS vezes) e costura as partes.
+        Retorna (texto, tokens de prompt, tokens de completion, saída estruturada completa?).
+        """
+        response = self.llm_agent.generate_text(prompt_data, llm_config, structured=self._structured_output(task_type),
+                                                task_type=task_type.value)
+        self._remember_model(response)
+        structured = bool(response.get("structured"))
+        text = response["text"]
+        prompt_tokens, completion_tokens = response["prompt_tokens"], response["completion_tokens"]
+        continuations = 0
+        while response.get("finish_reason") == FINISH_REASON_LENGTH:
+            if continuations == 0:
+                metrics.increment("llm_truncations_total", task_type=task_type.value)
+            if continuations >= LLM_MAX_CONTINUATIONS:
+                metrics.increment("llm_truncations_unresolved_total", task_type=task_type.value)
+                logger.warning(f"Resposta de {task_type.value} ainda truncada após {continuations} continuação(ões).")
+                break
+            continuations += 1
+            metrics.increment("llm_continuations_total", task_type=task_type.value)
+            logger.info(f"Resposta de {task_type.value} truncada por max_tokens ({len(text)} caracteres); continuação {continuations}.")
+            continuation_prompt = dict(prompt_data, user=prompt_data.get("user", "") + CONTINUATION_INSTRUCTION + text)
+            # Fragmento: sem schema e no mesmo modelo da resposta parcial (sem novo roteamento)
+            response = self.llm_agent.generate_text(continuation_prompt, self._pinned_config(llm_config, response))
+            structured = False
+            text = stitch_continuation(text, response["text"])
+            prompt_tokens += response["prompt_tokens"]
+            completion_tokens += response["completion_tokens"]
+        return text, prompt_tokens, completion_tokens, structured
+
+    def _should_chunk(self, task_type: TaskType, prompt_data: dict) -> bool:
+        user_input = prompt_data.get("user_input")
+        return (CHUNKING_ENABLED and isinstance(user_input, str) and chunking.is_chunkable(task_type)
+                and chunking.estimate_tokens(user_input) > CHUNK_THRESHOLD_TOKENS)
+
+    def _generate_chunked(self, request_id: str, task_type: TaskType, prompt_data: dict, type_test: Optional[str],
+                          language: str, llm_config: Optional[dict]) -> Tuple[str, int, int]:
+        """
+        Divide o user_input em chunks com sobreposição, gera cada um em paralelo (mesmo prompt,
+        com o trecho no lugar do user_input) e funde as listas sem duplicatas.
+        Qualquer chunk com falha falha a requisição (a lista ficaria incompleta).
+        """
+        chunks = chunking.split_text(prompt_data["user_input"], CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS)
+        total = len(chunks)
+        logger.info(f"ReqID {request_id}: user_input de ~{chunking.estimate_tokens(prompt_data['user_input'])} tokens dividido em {total} chunks.")
+        metrics.increment("llm_chunked_requests_total", task_type=task_type.value)
+
+        def run(index: int, chunk: str) -> Tuple[str, int, int]:
+            chunk_prompt = dict(prompt_data, user_input=f"[Parte {index + 1} de {total}]\n{chunk}")
+            processed = self.process_prompt_data(chunk_prompt, type_test, language)
+            return self._generate(task_type, processed, llm_config, many=True)
+
+        results: List[Optional[Tuple[str, int, int]]] = [None] * total
+        with ThreadPoolExecutor(max_workers=min(CHUNK_MAX_PARALLEL, total), thread_name_prefix="llm-chunk") as pool:
+            futures = {pool.submit(copy_context().run, run, index, chunk): index for index, chunk in enumerate(chunks)}
+            try:
+                for done, future in enumerate(as_completed(futures), start=1):
+                    index = futures[future]
+                    results[index] = future.result()
+                    metrics.increment("llm_chunks_total", task_type=task_type.value)
+                    self._report_chunk_progress(request_id, task_type, index, done, total)
+            except Exception:
+                for future in futures:
+                    future.cancel()  # Chunks ainda não iniciados
+                raise
+
+        items = chunking.merge_items(task_type, [text for text, _, _ in results])
+        logger.info(f"ReqID {request_id}: {total} chunks fundidos em {len(items)} {task_type.value}(s).")
+        return chunking.dump_items(items), sum(r[1] for r in results), sum(r[2] for r in results)
+
+    def _report_chunk_progress(self, request_id: str, task_type: TaskType, index: int, done: int, total: int) -> None:
+        logger.info(f"ReqID {request_id}: chunk {index + 1} de {total} concluído ({done}/{total}).")
+        if self.progress_callback:
+            try:
+                self.progress_callback(done, total)
+            except Exception as e:  # Progresso é informativo: não falha a geração
+                logger.warning(f"Falha ao reportar progresso do ReqID {request_id}: {e}")
+
+    def _best_of_n(self, task_type: TaskType, llm_config: Optional[dict]) -> int:
+        """Número de candidatos: llm_config["best_of_n"] ou BEST_OF_N para os tipos configurados."""
+        if task_type == TaskType.AUTOMATION_SCRIPT:  # Sem parser JSON para validar os candidatos
+            return 1
+        requested = (llm_config or {}).get("best_of_n")
+        if requested is None:
+            requested = BEST_OF_N if task_type.value in BEST_OF_N_TASK_TYPES else 1
+        return max(1, min(int(requested), BEST_OF_N_MAX))
+
+    def _generate_best_of_n(self, task_type: TaskType, prompt_data: dict, llm_config: Optional[dict], n: int,
+                            many: Optional[bool] = None) -> Tuple[str, int, int]:
+        """
+        Gera N candidatos concorrentes e retorna (JSON do melhor candidato válido, tokens de prompt,
+        tokens de completion). Sem candidato válido, aplica _extract_or_fix_json ao primeiro.
+        """
+        scorer = candidate_scoring.get_scorer((llm_config or {}).get("best_of_n_scorer") or BEST_OF_N_SCORER)
+        response = self.llm_agent.generate_candidates(prompt_data, llm_config, n, structured=self._structured_output(task_type),
+                                                      task_type=task_type.value)
+        self._remember_model(response)
+        prompt_tokens, completion_tokens = response["prompt_tokens"], response["completion_tokens"]
+        metrics.increment("llm_best_of_n_requests_total", task_type=task_type.value)
+        truncated = sum(reason == FINISH_REASON_LENGTH for reason in response.get("finish_reasons") or [])
+        if truncated:  # Candidatos truncados costumam ser inválidos e perdem a seleção
+            metrics.increment("llm_truncations_total", truncated, task_type=task_type.value)
+
+        best = candidate_scoring.select_best(task_type, response["texts"], scorer, many=many)
+        if best is not None:
+            return best.text, prompt_tokens, completion_tokens
+
+        metrics.increment("llm_best_of_n_no_valid_total", task_type=task_type.value)
+        logger.warning(f"Nenhum dos {len(response['texts'])} candidatos de {task_type.value} é válido; tentando corrigir o primeiro.")
+        text, fix_prompt_tokens, fix_completion_tokens = self._extract_or_fix_json(task_type, response["texts"][0], llm_config)
+        return text, prompt_tokens + fix_prompt_tokens, completion_tokens + fix_completion_tokens
+
+
     def process_prompt_data(self, prompt_data: dict, type_test: Optional[str], language: str) -> dict:
         """Processa os dados do prompt injetando user_input, type_test e language."""
         prompt_data_dict = prompt_data.copy()
@@ -305,77 +648,89 @@ class WorkItemProcessor(ABC):
         return prompt_data_dict
 
 
-    def configure_llm_agent(self, agent: LLMAgent, config: dict):
-        """Configura o LLMAgent com base no dicionário de configuração."""
-        agent.chosen_llm = config.get("llm", agent.chosen_llm)
-        model_to_set = config.get("model")
-        if model_to_set:
-            if agent.chosen_llm == "openai": agent.openai_model = model_to_set
-            elif agent.chosen_llm == "gemini": agent.gemini_model = model_to_set
-        agent.temperature = config.get("temperature", agent.temperature)
-        agent.max_tokens = config.get("max_tokens", agent.max_tokens)
-        agent.top_p = config.get("top_p", agent.top_p)
-
-
-    def get_existing_items(self, db: Session, task_type: TaskType, parent: int, parent_type: Optional[TaskType] = None):
-        """Busca itens ativos existentes com base no pai e tipo de pai."""
-        logger.debug(f"Buscando itens existentes tipo {task_type.value} para pai ID {parent} e tipo pai {parent_type.value if parent_type else 'N/A'}")
-        ItemModel = PARENT_MODEL_MAP.get(task_type) # Modelo do item filho
+    def _parent_project(self, parent_id: int, parent_type: Optional[TaskType]) -> Optional[UUID]:
+        """project_id do artefato pai (o mesmo da admissão na API); None para pai 'project' ou sem projeto."""
+        ParentModel = PARENT_MODEL_MAP.get(parent_type)
+        if ParentModel is None:
+            return None
+        return self.db.execute(select(ParentModel.project_id).where(ParentModel.id == parent_id)).scalar()
+
+    def _remember_model(self, response: dict) -> None:
+        """Provedor/modelo usados de fato (o roteador de modelo pode trocar o padrão), para o ledger."""
+        if response.get("model"):
+            self.context.last_llm_model = (response.get("provider") or self.llm_agent.chosen_llm, response["model"])
+
+    @staticmethod
+    def _pinned_config(llm_config: Optional[dict], response: dict) -> Optional[dict]:
+        if not response.get("model"):
+            return llm_config
+        return dict(llm_config or {}, llm=response.get("provider"), model=response["model"])
+
+    def _llm_model(self) -> Tuple[str, str]:
+        """Provedor e modelo da geração para o ledger de tokens (o roteado ou o do llm_config/LLMAgent)."""
+        context = self.context
+        if context.last_llm_model:
+            return context.last_llm_model
+        config = context.llm_config or {}
+        provider = config.get("llm") or self.llm_agent.chosen_llm
+        default = self.llm_agent.openai_model if provider == "openai" else self.llm_agent.gemini_model
+        return provider, config.get("model") or default
+
+
+    def deactivate_and_get_next_version(self, db: Session, task_type: TaskType, parent: int,
+                                        parent_type: Optional[TaskType] = None) -> int:
+        """
+        Desativa os itens ativos do pai com um único UPDATE ... RETURNING e retorna a nova versão.
+        Não carrega os itens nem emite um UPDATE por item. Ações de TestCases desativados: um UPDATE extra.
+        """
+        ItemModel = PARENT_MODEL_MAP.get(task_type)
         if not ItemModel or not hasattr(ItemModel, 'parent'):
-             return []
+            return 1
 
-        query = db.query(ItemModel).filter(
-            ItemModel.parent == parent,
-            ItemModel.is_active == True
-        )
+        stmt = update(ItemModel).where(ItemModel.parent == parent, ItemModel.is_active == True)
         if parent_type and hasattr(ItemModel, 'parent_type'):
-           query = query.filter(ItemModel.parent_type == parent_type.value)
-           logger.debug(f"Filtrando também por parent_type = {parent_type.value}")
-
-        return query.all()
-
-    def get_new_version(self, existing_items: list) -> int:
-        """Calcula a nova versão com base nos itens existentes."""
-        return max((item.version or 0) for item in existing_items) + 1 if existing_items else 1
-
-
-    def deactivate_existing_items(self, db: Session, items: list, task_type: TaskType):
-        """Desativa itens existentes e suas ações (se for TestCase)."""
-        if not items: return
-        logger.info(f"Desativando {len(items)} item(ns) existente(s) do tipo {task_type.value}")
-        now = datetime.now()
-        for item in items:
-            item.is_active = False
-            item.updated_at = now
-            if task_type == TaskType.TEST_CASE and hasattr(item, 'actions'):
-                 # Desativar ações associadas
-                 self.db.query(Action).filter(Action.test_case_id == item.id, Action.is_active == True).update({"is_active": False})
-                 # logger.debug(f"Ações desativadas para TestCase ID {item.id}") # Logar pode ser verboso
-
-
-    def update_request_status(self, request_id: str, status: Status, error_message: str = None):
-        """Atualiza o status da requisição no banco de dados."""
+            stmt = stmt.where(ItemModel.parent_type == parent_type.value)
+        stmt = stmt.values(is_active=False, updated_at=datetime.now()).returning(ItemModel.id, ItemModel.version)
+        deactivated = db.execute(stmt, execution_options={"synchronize_session": False}).all()
+        if not deactivated:
+            return 1
+
+        logger.info(f"Desativados {len(deactivated)} item(ns) existente(s) do tipo {task_type.value}")
+        hierarchy.mark_inactive(db, task_type, [row.id for row in deactivated])
+        if task_type == TaskType.TEST_CASE:
+            db.execute(
+                update(Action).where(Action.test_case_id.in_([row.id for row in deactivated]), Action.is_active == True)
+                .values(is_active=False),
+                execution_options={"synchronize_session": False},
+            )
+        return max((row.version or 0) for row in deactivated) + 1
+
+    def update_request_status(self, request_id: str, status: Status, error_message: str = None, commit: bool = True):
+        """
+        Atualiza o status da requisição no banco de dados com um único UPDATE (o próprio
+        UPDATE trava a linha; não há SELECT ... FOR UPDATE antes).
+        Com commit=False só prepara a alteração na transação corrente (erros são propagados).
+        """
         logger.info(f"Atualizando status para ReqID: {request_id} => {status.value}")
         try:
-            # Usar with self.db.begin_nested() talvez? Ou garantir sessão separada?
-            # Por enquanto, assume que a sessão principal está ok.
-            db_request = self.db.query(Request).filter(Request.request_id == request_id).with_for_update().first() # Lock para update
-            if db_request:
-                db_request.status = status.value
-                db_request.updated_at = datetime.now()
-                if status == Status.COMPLETED:
-                    db_request.processed_at = datetime.now()
-                if status == Status.FAILED:
-                    db_request.error_message = error_message if error_message else "Falha no processamento"
-                # Commit é feito externamente ou precisa ser feito aqui? 🤔
-                # O fluxo atual sugere que o commit principal é feito após _process_item
-                # mas para falhas, precisamos commitar a atualização de status.
-                # Vamos commitar aqui explicitamente para garantir a atualização do status em caso de falha.
+            now = datetime.now()
+            values = {"status": status.value, "updated_at": now}
+            if status == Status.COMPLETED:
+                values["processed_at"] = now
+            if status == Status.FAILED:
+                values["error_message"] = error_message if error_message else "Falha no processamento"
+            result = self.db.execute(
+                update(Request).where(request_ids.where_request_id(request_id)).values(**values),
+                execution_options={"synchronize_session": False},
+            )
+            if result.rowcount == 0:
+                logger.warning(f"Requisição {request_id} não encontrada para atualização de status.")
+            if commit:
                 self.db.commit()
                 logger.info(f"Status atualizado e commitado para ReqID: {request_id}")
-            else:
-                logger.warning(f"Requisição {request_id} não encontrada para atualização de status.")
         except Exception as e:
+            if not commit:
+                raise
             logger.error(f"Erro ao atualizar status para ReqID {request_id}: {e}", exc_info=True)
             self.db.rollback() # Rollback da tentativa de atualização de status
 
@@ -385,7 +740,10 @@ class WorkItemProcessor(ABC):
                           error_message: Optional[str], item_ids: Optional[List[int]] = None,
                           version: Optional[int] = None, work_item_id: Optional[str] = None,
                           parent_board_id: Optional[str] = None, is_reprocessing: bool = False):
-        """Envia notificação para o RabbitMQ."""
+        """
+        Grava a notificação no outbox, na transação corrente (o commit é de quem chama).
+        O relay (app.workers.outbox_relay) publica no RabbitMQ.
+        """
         project_id_str = str(project_id) if project_id else None
         notification_data = {
             "request_id": request_id, "project_id": project_id_str, "parent": parent,
@@ -394,14 +752,8 @@ class WorkItemProcessor(ABC):
             "version": version, "work_item_id": work_item_id, "parent_board_id": parent_board_id,
             "is_reprocessing": is_reprocessing
         }
-        try:
-            self.producer.publish(notification_data, rabbitmq.NOTIFICATION_QUEUE)
-            logger.info(f"Notificação enviada para ReqID: {request_id}")
-        except Exception as e:
-            logger.error(f"Falha CRÍTICA ao enviar notificação para ReqID {request_id}: {e}", exc_info=True)
-            # O que fazer aqui? O status no DB pode estar COMPLETED ou FAILED.
-            # Retentar aqui é complicado sem saber o estado da transação principal.
-            # Confiar no retry do publish e no monitoramento.
+        outbox.enqueue_notification(self.db, notification_data, outbox.NOTIFICATION_QUEUE)
+        logger.info(f"Notificação gravada no outbox para ReqID: {request_id}")
 
 
     # --- Handlers de Erro (Refatorados para usar _handle_failure) ---
@@ -424,10 +776,7 @@ class WorkItemProcessor(ABC):
             except Exception as rb_exc:
                 logger.error(f"Erro durante o rollback para ReqID {request_id}: {rb_exc}", exc_info=True)
 
-        # Tentar atualizar o status no DB (já faz commit interno)
-        self.update_request_status(request_id, status_code, error_message)
-
-        # Tentar enviar notificação
+        # Status FAILED e notificação (outbox) num único commit
         parent_from_req = db_request.parent if db_request else None
         parent_type_from_req = None # Precisaria buscar o parent_type da request ou do item
         # Se db_request existe, tenta pegar o parent_type dele (se adicionarmos a coluna)
@@ -446,19 +795,28 @@ class WorkItemProcessor(ABC):
             parent_board_id=parent_board_id,
             is_reprocessing=False # Assumir que não é reprocessamento no erro? Ou verificar artifact_id?
         )
+        self._commit_failure(request_id, status_code, error_message)
+
+    def _commit_failure(self, request_id: str, status_code: Status, error_message: str):
+        """Atualiza o status e commita junto com a notificação já adicionada ao outbox."""
+        try:
+            self.update_request_status(request_id, status_code, error_message, commit=False)
+            self.db.commit()
+        except Exception as e:
+            logger.error(f"Falha CRÍTICA ao gravar status/notificação de falha para ReqID {request_id}: {e}", exc_info=True)
+            self.db.rollback()
 
     def _handle_initial_error(self, request_id: str, error_message: str):
          """Lida com erros que ocorrem antes de buscar db_request."""
          logger.error(f"Erro inicial para ReqID {request_id}: {error_message}")
-         # Tentar enviar uma notificação mínima sem dados do DB
+         # Notificação mínima sem dados do DB (via outbox)
          try:
-             producer_task = rabbitmq.RabbitMQProducer()
              notification_data = {"request_id": request_id, "status": Status.FAILED.value, "error_message": error_message}
-             producer_task.publish(notification_data, rabbitmq.NOTIFICATION_QUEUE)
-         except Exception as mq_exc:
-             logger.error(f"Falha ao enviar notificação de erro inicial para ReqID {request_id}: {mq_exc}", exc_info=True)
-         finally:
-             if 'producer_task' in locals() and producer_task: producer_task.close()
+             outbox.enqueue_notification(self.db, notification_data, outbox.NOTIFICATION_QUEUE)
+             self.db.commit()
+         except Exception as db_exc:
+             logger.error(f"Falha ao gravar notificação de erro inicial para ReqID {request_id}: {db_exc}", exc_info=True)
+             self.db.rollback()
 
 
     def _handle_processing_error(self, db_request: Request, task_type: TaskType, error_message: str, project_id: Optional[UUID]):
@@ -485,40 +843,7 @@ class WorkItemProcessor(ABC):
         self._handle_failure(request_id, db_request, task_type, error, rollback=True, work_item_id=work_item_id, parent_board_id=parent_board_id, project_id=project_id)
 
 
-    def handle_amqp_connection_error(self, request_id: str, db_request: Request, task_type: TaskType,
-                                    error: pika.exceptions.AMQPConnectionError, work_item_id: Optional[str],
-                                    parent_board_id: Optional[str], project_id: Optional[UUID] = None):
-        # Erro AMQP é especial, o status no DB pode já ter sido commitado (COMPLETED ou FAILED anterior)
-        error_message = f"Erro de conexão com RabbitMQ: {error}"
-        logger.error(f"{error_message} para ReqID: {request_id}", exc_info=True)
-        # Tentamos atualizar status para FAILED (pode não mudar se já for FAILED, ou sobrescrever COMPLETED)
-        self.update_request_status(request_id, Status.FAILED, error_message)
-        # A notificação de erro provavelmente falhará de novo, mas tentamos.
-        # send_notification é chamado dentro de _handle_failure se usássemos ele,
-        # mas aqui chamamos diretamente para clareza da situação especial.
-        self.send_notification(
-            request_id=request_id, project_id=project_id, parent=db_request.parent if db_request else None,
-            parent_type=None, # Não temos certeza do tipo aqui
-            task_type=task_type.value, status=Status.FAILED, error_message=error_message,
-            work_item_id=work_item_id, parent_board_id=parent_board_id
-        )
-
     def handle_generic_error(self, request_id: str, db_request: Request, task_type: TaskType,
                             error: Exception, work_item_id: Optional[str],
                             parent_board_id: Optional[str], project_id: Optional[UUID] = None):
         self._handle_failure(request_id, db_request, task_type, error, rollback=True, work_item_id=work_item_id, parent_board_id=parent_board_id, project_id=project_id)
-
-
-    def close_resources(self):
-        """Fecha conexões com recursos externos."""
-        if self.db and self.db.is_active:
-            try:
-                self.db.close()
-                logger.debug("Conexão com banco de dados fechada")
-            except Exception as e:
-                logger.error(f"Erro ao fechar conexão com banco: {e}", exc_info=True)
-        if self.producer:
-            try:
-                self.producer.close()
-            except Exception as e:
-                logger.error(f"Erro ao fechar conexão com RabbitMQ: {e}", exc_info=True)
@@ -2,7 +2,8 @@
 from typing import List, Optional, Tuple
 from app.workers.processors.base import WorkItemProcessor
 from app.models import Status, TaskType, Epic, Feature, UserStory, Task, TestCase, WBS, Bug, Issue, PBI, Action
-from app.utils import parsers
+from app.utils import hierarchy, parsers
+from app.utils.parser_registry import get_spec
 from sqlalchemy.orm import Session
 import logging
 from datetime import datetime
@@ -24,9 +25,7 @@ class WorkItemCreator(WorkItemProcessor):
         # A versão será sempre 1 neste caso.
         new_version = 1
         if parent is not None and parent_type is not None: # Só busca/desativa se tiver pai E tipo
-            existing_items = self.get_existing_items(self.db, task_type_enum, parent, parent_type) # Passa parent_type
-            new_version = self.get_new_version(existing_items)
-            self.deactivate_existing_items(self.db, existing_items, task_type_enum)
+            new_version = self.deactivate_and_get_next_version(self.db, task_type_enum, parent, parent_type)
         elif parent is not None and parent_type is None:
              logger.warning(f"Parent ID {parent} fornecido sem parent_type em _process_item para {task_type_enum.value}. Não buscando/desativando itens existentes.")
         else:
@@ -57,22 +56,6 @@ class WorkItemCreator(WorkItemProcessor):
         Cria novos itens no banco de dados com base no tipo de tarefa e no texto gerado pela LLM.
         Retorna uma lista de IDs dos itens criados.
         """
-        # Mapeamento de parsers e modelos para cada tipo de tarefa
-        parser_map = {
-            TaskType.EPIC: (parsers.parse_epic_response, Epic),
-            TaskType.FEATURE: (parsers.parse_feature_response, Feature),
-            TaskType.USER_STORY: (parsers.parse_user_story_response, UserStory),
-            TaskType.TASK: (parsers.parse_task_response, Task),
-            TaskType.BUG: (parsers.parse_bug_response, Bug),
-            TaskType.ISSUE: (parsers.parse_issue_response, Issue),
-            TaskType.PBI: (parsers.parse_pbi_response, PBI),
-            TaskType.TEST_CASE: (parsers.parse_test_case_response, TestCase),
-            TaskType.WBS: (parsers.parse_wbs_response, WBS),
-            TaskType.AUTOMATION_SCRIPT: (parsers.parse_automation_script_response, None), # Parser retorna string, não modelo
-        }
-
-        # Obtém o parser e o modelo correspondente ao tipo de tarefa
-        parser, model = parser_map[task_type]
         item_ids = [] # Lista para armazenar IDs dos itens criados/atualizados
 
         # --- Caso especial para AUTOMATION_SCRIPT ---
@@ -80,8 +63,7 @@ class WorkItemCreator(WorkItemProcessor):
             logger.info(f"Processando AUTOMATION_SCRIPT para TestCase ID: {parent}")
             try:
                 # Parseia o script (o parser recebe tokens mas só retorna string)
-                # A função parser aqui é parse_automation_script_response
-                automation_script = parser(generated_text, prompt_tokens, completion_tokens)
+                automation_script = parsers.parse_automation_script_response(generated_text, prompt_tokens, completion_tokens)
 
                 # Busca o TestCase pai usando o ID passado como 'parent'
                 parent_test_case = db.query(TestCase).filter(TestCase.id == parent).first()
@@ -99,9 +81,7 @@ class WorkItemCreator(WorkItemProcessor):
 
                     logger.info(f"Script e Tokens atualizados para TestCase ID {parent}: prompt={prompt_tokens}, completion={completion_tokens}")
 
-                    # Não precisa de add(), pois estamos modificando um objeto existente
-                    db.flush() # Garante que as alterações sejam enviadas ao DB antes do refresh
-                    db.refresh(parent_test_case) # Sincroniza o estado do objeto com o DB
+                    # Não precisa de add() nem flush: o UPDATE vai no commit da task
                     item_ids.append(parent_test_case.id) # Adiciona o ID do TestCase atualizado
                     # Retorna a lista contendo o ID do TestCase pai atualizado
                     return item_ids
@@ -118,8 +98,8 @@ class WorkItemCreator(WorkItemProcessor):
 
         # --- Caso especial para EPIC ---
         elif task_type == TaskType.EPIC:
-            # O parser parse_epic_response recebe (response, prompt_tokens, completion_tokens)
-            new_epic = parser(generated_text, prompt_tokens, completion_tokens)
+            # Spec de Epic é de objeto único (sem coluna de pai; team_project_id é definido abaixo)
+            new_epic = get_spec(task_type).parse_items(generated_text, None, prompt_tokens, completion_tokens)[0]
             new_epic.version = version
             new_epic.is_active = True
             # No caso de Epic, 'parent' representa o team_project_id
@@ -131,9 +111,9 @@ class WorkItemCreator(WorkItemProcessor):
             if project_id: new_epic.project_id = project_id
             # Não precisa setar created_at/updated_at aqui, o DB faz isso via server_default/onupdate
             db.add(new_epic)
-            db.flush() # Envia o comando INSERT para o DB e obtém o ID gerado
-            db.refresh(new_epic) # Atualiza o objeto new_epic com o ID e outros defaults do DB
+            db.flush() # INSERT ... RETURNING id (sem refresh: só o ID é necessário)
             item_ids.append(new_epic.id)
+            hierarchy.index_items(db, task_type, item_ids)
 
             logger.debug(f"Salvando item {task_type.value} com parent_id={parent} (team_project_id) e parent_type=None")
             
@@ -142,8 +122,8 @@ class WorkItemCreator(WorkItemProcessor):
 
         # --- Caso especial para WBS ---
         elif task_type == TaskType.WBS:
-            # O parser parse_wbs_response recebe (response, parent_id, prompt_tokens, completion_tokens)
-            new_wbs = parser(generated_text, parent, prompt_tokens, completion_tokens)
+            # Spec de WBS é de objeto único
+            new_wbs = get_spec(task_type).parse_items(generated_text, parent, prompt_tokens, completion_tokens)[0]
             new_wbs.version = version
             new_wbs.is_active = True
             # No caso de WBS, 'parent' é a FK para o Epic pai
@@ -152,30 +132,22 @@ class WorkItemCreator(WorkItemProcessor):
             new_wbs.parent_board_id = parent_board_id
             if project_id: new_wbs.project_id = project_id
             db.add(new_wbs)
-            db.flush()
-            db.refresh(new_wbs)
+            db.flush() # INSERT ... RETURNING id
             item_ids.append(new_wbs.id)
+            hierarchy.index_items(db, task_type, item_ids)
             logger.debug(f"Salvando item {task_type.value} com parent_id={parent} (FK para Epic) e parent_type=None")
             # Retorna a lista contendo o ID da nova WBS
             return item_ids
 
         # --- Caso geral para FEATURE, USER_STORY, TASK, TEST_CASE, BUG, ISSUE, PBI ---
         else:
-            # Para os outros tipos, os parsers geralmente retornam uma lista de objetos
-            # A assinatura padrão dos parsers é (response, parent_id, prompt_tokens, completion_tokens)
+            # Para os outros tipos, a spec retorna sempre uma lista de objetos (aceita lista ou objeto único)
 
             # Não precisa buscar itens existentes aqui, isso já foi feito em _process_item
-            # que chamou get_existing_items e deactivate_existing_items
+            # (deactivate_and_get_next_version)
 
             # Parseia os novos itens (pode retornar uma lista)
-            new_items_parsed = parser(generated_text, parent, prompt_tokens, completion_tokens)
-
-            # Certifica que new_items seja sempre uma lista para iterar
-            if not isinstance(new_items_parsed, list):
-                # Se o parser retornou um único objeto, coloca-o em uma lista
-                # (Embora a maioria dos parsers já retorne lista, é bom garantir)
-                if new_items_parsed is not None: new_items_parsed = [new_items_parsed]
-                else: new_items_parsed = []
+            new_items_parsed = get_spec(task_type).parse_items(generated_text, parent, prompt_tokens, completion_tokens)
 
             processed_items = [] 
             # Configura os novos itens antes de adicionar ao banco
@@ -216,9 +188,10 @@ class WorkItemCreator(WorkItemProcessor):
                 try:
                     logger.info(f"Adicionando {len(processed_items)} item(ns) do tipo {task_type.value} à sessão.")
                     db.add_all(processed_items) # Adiciona todos os itens configurados
-                    db.flush() # Envia para o DB e obtém IDs
+                    db.flush() # Um INSERT ... VALUES (...), (...) RETURNING id para o lote
                     item_ids.extend([item.id for item in processed_items if hasattr(item, 'id')])
                     logger.info(f"Itens adicionados com IDs: {item_ids}")
+                    hierarchy.index_items(db, task_type, item_ids) # Um INSERT ... SELECT no índice para o lote
                     for p_item in processed_items:
                         logger.debug(f"Item ID {p_item.id} na sessão APÓS flush: parent_type={p_item.parent_type}")
                     
@@ -2,6 +2,8 @@
 from typing import List, Optional, Tuple
 from app.workers.processors.base import WorkItemProcessor
 from app.models import Status, TaskType, Epic, Feature, UserStory, Task, TestCase, WBS, Bug, Issue, PBI, Action
+from app.utils import hierarchy
+from app.utils.parser_registry import get_spec
 from datetime import datetime
 import logging
 from uuid import UUID
@@ -81,65 +83,19 @@ class WorkItemReprocessor(WorkItemProcessor):
         if work_item_id is not None: existing_item.work_item_id = work_item_id
         if parent_board_id is not None: existing_item.parent_board_id = parent_board_id
 
-        # Atualiza campos específicos com base no tipo de artefato
-        logger.debug(f"Atualizando campos específicos para {task_type_enum.value} ID: {artifact_id}")
-        if task_type_enum == TaskType.FEATURE:
-            existing_item.title = updated_data.get("title", existing_item.title)
-            existing_item.description = updated_data.get("description", existing_item.description)
-            # Formata a lista de AC (se existir) para string antes de salvar
-            ac_list = updated_data.get("acceptance_criteria") # Parser retorna lista ou None
-            if isinstance(ac_list, list):
-                existing_item.acceptance_criteria = "\n".join(f"- {item}" for item in ac_list)
-            elif ac_list is None:
-                existing_item.acceptance_criteria = None
-            else: # Se não for lista nem None
-                logger.warning(f"Formato inesperado para acceptance_criteria no reprocessamento de Feature: {type(ac_list)}. Tentando salvar como string.")
-                existing_item.acceptance_criteria = str(ac_list)
-            existing_item.summary = updated_data.get("summary", existing_item.summary)
-
-        elif task_type_enum == TaskType.TEST_CASE:
-            existing_item.title = updated_data.get("title", existing_item.title)
-            existing_item.gherkin = updated_data.get("gherkin", existing_item.gherkin) # Parser retorna JSON stringificado? Confirmar.
-            existing_item.priority = updated_data.get("priority", existing_item.priority)
-            self._update_actions(existing_item, updated_data.get("actions", [])) # Parser retorna lista de dicts
-
-        elif task_type_enum == TaskType.WBS:
-            existing_item.wbs = updated_data.get("wbs", existing_item.wbs) # Parser retorna JSON (dict/list)
-
-        # Adicionar elif para outros tipos que precisam de tratamento especial (Bug, Issue, PBI, UserStory, Task se tiverem campos além de title/desc)
-        elif task_type_enum == TaskType.USER_STORY:
-             existing_item.title = updated_data.get("title", existing_item.title)
-             existing_item.description = updated_data.get("description", existing_item.description)
-             # User Story também tem acceptance_criteria, tratar igual Feature
-             ac_list_us = updated_data.get("acceptance_criteria")
-             if isinstance(ac_list_us, list):
-                 existing_item.acceptance_criteria = "\n".join(f"- {item}" for item in ac_list_us)
-             elif ac_list_us is None:
-                 existing_item.acceptance_criteria = None
-             else:
-                 logger.warning(f"Formato inesperado para acceptance_criteria no reprocessamento de UserStory: {type(ac_list_us)}. Tentando salvar como string.")
-                 existing_item.acceptance_criteria = str(ac_list_us)
-             existing_item.priority = updated_data.get("priority", existing_item.priority) # Adicionar priority ao parser de US update
-
-        elif task_type_enum == TaskType.TASK:
-             existing_item.title = updated_data.get("title", existing_item.title)
-             existing_item.description = updated_data.get("description", existing_item.description)
-             existing_item.estimate = updated_data.get("estimate", existing_item.estimate) # Adicionar estimate ao parser de Task update
-
-        # ... (adicionar lógica para Bug, Issue, PBI se necessário) ...
-
-        # Caso Padrão (inclui Epic, e outros não tratados acima)
-        else:
-            existing_item.title = updated_data.get("title", existing_item.title)
-            existing_item.description = updated_data.get("description", existing_item.description)
-            # Campos específicos do Epic
-            if task_type_enum == TaskType.EPIC:
-                existing_item.tags = updated_data.get("tags", existing_item.tags) # Parser retorna lista
-                existing_item.summary = updated_data.get("summary", existing_item.summary)
-                existing_item.reflection = updated_data.get("reflection", existing_item.reflection) # Parser retorna dict/JSON
+        # Atualiza campos específicos: o dicionário já vem com nomes de coluna e valores formatados
+        # pela spec do tipo (app.utils.parser_registry). Filhos (actions do TestCase) são recriados.
+        logger.debug(f"Atualizando campos específicos para {task_type_enum.value} ID: {artifact_id}: {list(updated_data)}")
+        for column, value in updated_data.items():
+            if column == "actions":
+                self._update_actions(existing_item, value)
+            else:
+                setattr(existing_item, column, value)
 
         # O commit é feito no método 'process' após esta função retornar
         self.db.flush() # Envia as alterações pendentes para o DB
+        # O pai não muda no reprocessamento: só indexa itens criados antes do índice existir
+        hierarchy.index_items(self.db, task_type_enum, [existing_item.id])
         logger.info(f"_process_item concluído para {task_type_enum.value} ID: {artifact_id}. Nova versão: {existing_item.version}")
         return [existing_item.id], existing_item.version
 
@@ -147,19 +103,9 @@ class WorkItemReprocessor(WorkItemProcessor):
         """
         Retorna o item existente com base no tipo e ID.
         """
-        model_map = {
-            TaskType.EPIC: Epic,
-            TaskType.FEATURE: Feature,
-            TaskType.USER_STORY: UserStory,
-            TaskType.TASK: Task,
-            TaskType.BUG: Bug,
-            TaskType.ISSUE: Issue,
-            TaskType.PBI: PBI,
-            TaskType.TEST_CASE: TestCase,
-            TaskType.WBS: WBS,
-        }
-        model = model_map.get(task_type)
-        if model is None:
+        try:
+            model = get_spec(task_type).model
+        except ValueError:
             raise ValueError(f"Modelo para {task_type} não encontrado.")
         return self.db.query(model).filter_by(id=artifact_id).first()
 
@@ -172,26 +118,10 @@ class WorkItemReprocessor(WorkItemProcessor):
         completion_tokens: int
     ) -> dict:
         """
-        Utiliza o parser de reprocessamento para extrair os dados atualizados do artefato.
-        Retorna um dicionário com os campos necessários para atualizar o registro.
+        Utiliza a spec de parsing do tipo para extrair os dados atualizados do artefato.
+        Retorna um dicionário {coluna: valor} com os campos necessários para atualizar o registro.
         """
-        from app.utils import parsers_reprocessing as prp
-        parser_map = {
-            TaskType.EPIC: prp.parse_epic_update,
-            TaskType.FEATURE: prp.parse_feature_update,
-            TaskType.USER_STORY: prp.parse_user_story_update,
-            TaskType.TASK: prp.parse_task_update,
-            TaskType.BUG: prp.parse_bug_update,
-            TaskType.ISSUE: prp.parse_issue_update,
-            TaskType.PBI: prp.parse_pbi_update,
-            TaskType.TEST_CASE: prp.parse_test_case_update,
-            TaskType.WBS: prp.parse_wbs_update,
-            TaskType.AUTOMATION_SCRIPT: prp.parse_automation_script_update,
-        }
-        parser = parser_map.get(task_type)
-        if not parser:
-            raise ValueError(f"Parser para {task_type} não encontrado.")
-        return parser(generated_text)
+        return get_spec(task_type).parse_update(generated_text)
 
     def _update_actions(self, test_case: TestCase, new_actions: List[dict]):
         """
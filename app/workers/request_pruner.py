@@ -0,0 +1,130 @@
+# app/workers/request_pruner.py
+"""
+Job de manutenção da tabela `requests` (app.utils.request_retention).
+
+A cada ciclo: garante as partições mensais à frente, remove partições inteiras vencidas,
+apaga em lotes as linhas vencidas por status (um commit por lote) e publica os tamanhos
+de tabela e índices como métricas. Falhas no DDL de partições não interrompem o ciclo:
+contam em request_partition_errors_total{step=create|drop} e são refeitas no próximo.
+
+Uso:
+    python -m app.workers.request_pruner            # loop
+    python -m app.workers.request_pruner --once     # um ciclo (cron)
+"""
+import argparse
+import logging
+import os
+import signal
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Optional
+from dotenv import load_dotenv
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from app.database import SessionLocal, get_engine
+from app.models import Status
+from app.utils import metrics, request_retention
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+REQUEST_PRUNE_BATCH_SIZE = int(os.getenv("REQUEST_PRUNE_BATCH_SIZE", "1000"))
+REQUEST_PRUNE_INTERVAL = float(os.getenv("REQUEST_PRUNE_INTERVAL", "3600"))  # Segundos entre ciclos
+REQUEST_PRUNE_ERROR_BACKOFF = float(os.getenv("REQUEST_PRUNE_ERROR_BACKOFF", "60"))
+
+
+class RequestPruner:
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal,
+                 engine_factory: Callable[[], Engine] = get_engine,
+                 policy: Optional[Dict[Status, Optional[int]]] = None,
+                 batch_size: int = REQUEST_PRUNE_BATCH_SIZE, interval: float = REQUEST_PRUNE_INTERVAL):
+        self.session_factory = session_factory
+        self.engine_factory = engine_factory
+        self.policy = policy if policy is not None else request_retention.load_retention_policy()
+        self.batch_size = batch_size
+        self.interval = interval
+        self._running = False
+
+    def prune_status(self, status: Status, older_than: datetime) -> int:
+        total = 0
+        while True:
+            db = self.session_factory()
+            try:
+                deleted = request_retention.prune_batch(db, status, older_than, self.batch_size)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+            total += deleted
+            if deleted < self.batch_size:
+                return total
+
+    def run_once(self) -> int:
+        """Um ciclo completo. Retorna o total de linhas apagadas (sem contar partições removidas)."""
+        engine = self.engine_factory()
+        now = datetime.now(timezone.utc)
+        # DDL de partições pode falhar (lock_timeout, DEFAULT inconsistente): registra e segue,
+        # a retenção por linhas não pode parar junto
+        self._partition_step("create", request_retention.ensure_partitions, engine)
+        self._partition_step("drop", request_retention.drop_expired_partitions, engine, self.policy, now)
+        total = 0
+        for status, days in self.policy.items():
+            if days is None:
+                continue
+            deleted = self.prune_status(status, now - timedelta(days=days))
+            if deleted:
+                logger.info(f"{deleted} requisição(ões) {status.value} com mais de {days} dias removida(s).")
+            total += deleted
+        sizes = request_retention.collect_size_metrics(engine)
+        if sizes:
+            logger.info(f"Tamanho de requests (bytes): {sizes}")
+        return total
+
+    def _partition_step(self, step: str, func: Callable, *args) -> None:
+        try:
+            func(*args)
+        except Exception as e:
+            metrics.increment("request_partition_errors_total", step=step)
+            logger.error(f"Falha na manutenção de partições de requests ({step}); nova tentativa no próximo ciclo: {e}",
+                         exc_info=True)
+
+    def run_forever(self):
+        self._running = True
+        logger.info(f"Manutenção de requests iniciada (retenção={ {s.value: d for s, d in self.policy.items()} }, "
+                    f"lote={self.batch_size}, intervalo={self.interval}s).")
+        while self._running:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Erro no ciclo de manutenção de requests: {e}", exc_info=True)
+                time.sleep(REQUEST_PRUNE_ERROR_BACKOFF)
+                continue
+            deadline = time.monotonic() + self.interval
+            while self._running and time.monotonic() < deadline:
+                time.sleep(min(1.0, self.interval))
+        logger.info("Manutenção de requests finalizada.")
+
+    def stop(self, *_args):
+        self._running = False
+
+
+def main(pruner: Optional[RequestPruner] = None):
+    parser = argparse.ArgumentParser(description="Partições, retenção e métricas de tamanho da tabela requests.")
+    parser.add_argument("--once", action="store_true", help="Executa um único ciclo e sai.")
+    args = parser.parse_args()
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    pruner = pruner or RequestPruner()
+    if args.once:
+        pruner.run_once()
+        return
+    metrics.start_http_exporter()
+    signal.signal(signal.SIGTERM, pruner.stop)
+    signal.signal(signal.SIGINT, pruner.stop)
+    pruner.run_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+# app/workers/signatures.py
+"""
+Assinaturas das tasks Celery para quem apenas enfileira (a API).
+
+Importar `app.workers.consumer` na API carregaria processadores, LLMAgent, SDKs dos
+provedores e pika sem necessidade. As assinaturas abaixo usam só o nome da task e o
+app Celery compartilhado (`app.celery`), então `.delay(...)` funciona igual.
+"""
+from app.celery import celery_app
+
+PROCESS_DEMAND_TASK = "process_demand_task"
+REPROCESS_WORK_ITEM_TASK = "reprocess_work_item_task"
+PROCESS_INDEPENDENT_CREATION_TASK = "process_independent_creation_task"
+
+# send_task não consulta task_ignore_result: sem esta opção o produtor ainda registra o
+# task_id no backend (ex: fila de resposta do rpc://) mesmo que ninguém leia o resultado.
+_OPTIONS = {"ignore_result": celery_app.conf.task_ignore_result}
+
+process_message_task = celery_app.signature(PROCESS_DEMAND_TASK, options=_OPTIONS)
+reprocess_work_item_task = celery_app.signature(REPROCESS_WORK_ITEM_TASK, options=_OPTIONS)
+process_independent_creation_task = celery_app.signature(PROCESS_INDEPENDENT_CREATION_TASK, options=_OPTIONS)
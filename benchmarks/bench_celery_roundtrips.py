@@ -0,0 +1,103 @@
+# benchmarks/bench_celery_roundtrips.py
+"""
+Conta as operações de broker e de result backend por task, no modo antigo
+(resultado gravado, STARTED rastreado) e no modo atual (ignore_result / sem backend).
+
+A task é enviada como a API envia (send_task via assinatura) e executada pelo
+mesmo tracer que o worker usa, com broker e backend em memória instrumentados.
+
+Uso:
+    python -m benchmarks.bench_celery_roundtrips [--tasks 200] [--backend cache+memory://]
+"""
+import argparse
+import time
+import uuid
+from collections import Counter
+from unittest import mock
+
+from celery import Celery
+from celery.app.trace import build_tracer
+from kombu import Producer
+
+from app.utils import json_codec
+
+TASK_NAME = "process_demand_task"
+
+SCENARIOS = {
+    # Configuração anterior: backend obrigatório, resultado de toda task gravado
+    "antes (resultado gravado)": {"backend": True, "conf": {"task_ignore_result": False, "task_track_started": True}, "ignore_result": False},
+    "ignore_result": {"backend": True, "conf": {"task_ignore_result": True}, "ignore_result": True},
+    "sem backend": {"backend": False, "conf": {"task_ignore_result": True}, "ignore_result": True},
+}
+
+BACKEND_OPERATIONS = ("on_task_call", "_store_result", "get_task_meta", "forget")
+
+
+def build_app(backend_url, conf) -> Celery:
+    json_codec.register_celery_serializer()
+    app = Celery("bench", broker="memory://", backend=backend_url)
+    app.conf.update(task_serializer=json_codec.CELERY_SERIALIZER_NAME, accept_content=[json_codec.CELERY_SERIALIZER_NAME, "json"],
+                    result_serializer=json_codec.CELERY_SERIALIZER_NAME, **conf)
+
+    @app.task(name=TASK_NAME, bind=True, shared=False)
+    def task(self, **kwargs):
+        return None
+
+    return app
+
+
+def run(name: str, scenario: dict, tasks: int, backend_url: str) -> None:
+    app = build_app(backend_url if scenario["backend"] else None, scenario["conf"])
+    counts: Counter = Counter()
+    backend = app.backend
+
+    def counting(op, original):
+        def wrapper(*args, **kwargs):
+            counts[f"backend.{op}"] += 1
+            return original(*args, **kwargs)
+        return wrapper
+
+    patches = [mock.patch.object(backend, op, counting(op, getattr(backend, op)))
+               for op in BACKEND_OPERATIONS if hasattr(backend, op)]
+    original_publish = Producer.publish
+
+    def publish(self, *args, **kwargs):
+        counts["broker.publish"] += 1
+        return original_publish(self, *args, **kwargs)
+
+    patches.append(mock.patch.object(Producer, "publish", publish))
+    task = app.tasks[TASK_NAME]
+    tracer = build_tracer(TASK_NAME, task, app=app)
+    signature = app.signature(TASK_NAME, options={"ignore_result": scenario["ignore_result"]})
+
+    for patcher in patches:
+        patcher.start()
+    start = time.perf_counter()
+    try:
+        for _ in range(tasks):
+            task_id = str(uuid.uuid4())
+            signature.apply_async(kwargs={"request_id_interno": task_id, "task_type": "feature"}, task_id=task_id)
+            tracer(task_id, (), {"request_id_interno": task_id}, {"id": task_id, "ignore_result": scenario["ignore_result"]})
+    finally:
+        for patcher in patches:
+            patcher.stop()
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    operations = ", ".join(f"{op}={count / tasks:.1f}" for op, count in sorted(counts.items())) or "nenhuma"
+    total = sum(counts.values()) / tasks
+    print(f"{name:28s} {total:4.1f} op/task ({operations}); {elapsed_ms / tasks:.3f} ms/task")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=200, help="Número de tasks por cenário.")
+    parser.add_argument("--backend", default="cache+memory://", help="URL do result backend nos cenários com backend.")
+    args = parser.parse_args()
+
+    print(f"Operações de broker/backend por task ({args.tasks} tasks, backend {args.backend}):")
+    for name, scenario in SCENARIOS.items():
+        run(name, scenario, args.tasks, args.backend)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# benchmarks/bench_history_archive.py
+"""
+Latência das consultas sobre a tabela quente `features` com N versões inativas
+acumuladas, antes e depois de arquivá-las em `artifact_history`.
+
+Consultas medidas (mediana de --repeat execuções):
+- itens ativos de um pai (o que a desativação/versionamento e o .NET consultam);
+- contagem de itens ativos de um projeto (mesmo filtro da exportação);
+- linhagem de versões de um pai no histórico (app.utils.history.list_versions).
+
+Usa SQLite em arquivo temporário por padrão; passe --database-url para um PostgreSQL
+descartável (as tabelas são recriadas).
+
+Uso:
+    python -m benchmarks.bench_history_archive [--rows 1000000] [--parents 1000] [--repeat 200]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from app.models import Base, Epic, Feature, TaskType
+from app.utils import history
+from app.workers.history_archiver import HistoryArchiver
+
+PROJECT_ID = uuid.uuid4()
+OLD = datetime(2020, 1, 1)
+
+
+def seed(engine, rows: int, parents: int, chunk: int = 20000) -> None:
+    with engine.begin() as conn:
+        conn.execute(insert(Epic.__table__), [{"id": i, "title": f"E{i}", "version": 1, "is_active": True}
+                                              for i in range(1, parents + 1)])
+        conn.execute(insert(Feature.__table__), [
+            {"title": f"F{i}", "description": "ativa", "parent": i, "parent_type": "epic", "version": rows // parents + 1,
+             "is_active": True, "project_id": PROJECT_ID} for i in range(1, parents + 1)
+        ])
+    for start in range(0, rows, chunk):
+        with engine.begin() as conn:
+            conn.execute(insert(Feature.__table__), [
+                {"title": f"F{i}", "description": "versão antiga " * 10, "acceptance_criteria": "- critério",
+                 "parent": i % parents + 1, "parent_type": "epic", "version": i // parents + 1, "is_active": False,
+                 "project_id": PROJECT_ID, "created_at": OLD, "updated_at": OLD}
+                for i in range(start, min(start + chunk, rows))
+            ])
+
+
+def measure(session_factory, parents: int, repeat: int, with_history: bool) -> dict:
+    table = Feature.__table__
+    samples = {"ativos do pai": [], "ativos do projeto": []}
+    if with_history:
+        samples["linhagem (histórico)"] = []
+    db = session_factory()
+    try:
+        for _ in range(repeat):
+            parent = random.randint(1, parents)
+            start = time.perf_counter()
+            db.execute(select(table.c.id, table.c.version).where(table.c.parent == parent, table.c.is_active == True)).all()
+            samples["ativos do pai"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            db.execute(select(func.count()).where(table.c.project_id == PROJECT_ID, table.c.is_active == True)).scalar()
+            samples["ativos do projeto"].append(time.perf_counter() - start)
+
+            if with_history:
+                start = time.perf_counter()
+                history.list_versions(db, TaskType.FEATURE, parent, "epic")
+                samples["linhagem (histórico)"].append(time.perf_counter() - start)
+    finally:
+        db.close()
+    return {name: statistics.median(values) * 1000 for name, values in samples.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Versões inativas acumuladas em features.")
+    parser.add_argument("--parents", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    tmpdir = None
+    url = args.database_url
+    if url is None:
+        tmpdir = tempfile.TemporaryDirectory()
+        url = f"sqlite:///{os.path.join(tmpdir.name, 'bench.db')}"
+    engine = create_engine(url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    history.ensure_partitions(engine)
+    session_factory = sessionmaker(bind=engine)
+
+    start = time.perf_counter()
+    seed(engine, args.rows, args.parents)
+    print(f"Seed: {args.rows} versões inativas + {args.parents} ativas em {time.perf_counter() - start:.1f}s ({engine.dialect.name})")
+
+    before = measure(session_factory, args.parents, args.repeat, with_history=False)
+
+    start = time.perf_counter()
+    moved = HistoryArchiver(session_factory, batch_size=args.batch_size, min_age_hours=0).run_once()
+    elapsed = time.perf_counter() - start
+    print(f"Arquivamento: {moved} linhas em {elapsed:.1f}s ({moved / max(elapsed, 1e-9):.0f} linhas/s)")
+
+    after = measure(session_factory, args.parents, args.repeat, with_history=True)
+
+    print(f"{'consulta':<24}{'antes (ms)':>14}{'depois (ms)':>14}")
+    for name in after:
+        previous = f"{before[name]:.3f}" if name in before else "-"
+        print(f"{name:<24}{previous:>14}{after[name]:>14.3f}")
+
+    engine.dispose()
+    if tmpdir is not None:
+        tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
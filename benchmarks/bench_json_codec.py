@@ -0,0 +1,98 @@
+# benchmarks/bench_json_codec.py
+"""
+Compara o codec JSON da aplicação (app.utils.json_codec) com a stdlib `json`
+em payloads do tamanho dos nossos prompts e respostas.
+
+Uso:
+    python -m benchmarks.bench_json_codec [--user-input-kb 20] [--items 50] [--repeat 2000]
+"""
+import argparse
+import json
+import timeit
+
+from app.utils import json_codec
+
+SYSTEM_PROMPT = (
+    "Você é um Analista de Negócios experiente em metodologias ágeis e ITIL. Receberá um texto "
+    "(que pode ser uma transcrição de reunião, documentação detalhada ou qualquer outro formato) "
+    "descrevendo um sistema, projeto ou conjunto de funcionalidades. "
+) * 8
+
+
+def build_task_args(user_input_kb: int) -> dict:
+    """Argumentos de uma task Celery com prompt completo (como enviados por /generate/)."""
+    transcript = ("Participante A: precisamos de integração com o Azure DevOps para gerar épicos. "
+                  "Participante B: e também casos de teste com ações e resultado esperado. ")
+    user_input = (transcript * (user_input_kb * 1024 // len(transcript) + 1))[: user_input_kb * 1024]
+    return {
+        "request_id_interno": "4f8a7c52-1f0e-4d8a-9d5b-0b9e1a6f2c11",
+        "task_type": "feature",
+        "prompt_data": {
+            "system": SYSTEM_PROMPT,
+            "user": "Analise o texto abaixo e extraia cada funcionalidade.\n\nTexto:\n\n{user_input}",
+            "assistant": "[{\"title\": \"Exemplo\", \"description\": \"Exemplo de descrição.\"}]",
+            "user_input": user_input,
+        },
+        "llm_config": {"llm": "openai", "model": None, "temperature": 0.7, "max_tokens": 1000, "top_p": None},
+        "parent_type": "epic",
+        "language": "português",
+        "work_item_id": None,
+        "parent_board_id": None,
+        "type_test": None,
+    }
+
+
+def build_llm_response(items: int) -> str:
+    """Resposta de LLM com `items` casos de teste (gherkin + ações)."""
+    test_case = {
+        "title": "Verificar login com credenciais corretas",
+        "priority": "High",
+        "gherkin": {
+            "scenario": "Login com sucesso",
+            "given": "Que o usuário está na página de login",
+            "when": "Ele informa e-mail e senha válidos",
+            "then": "O sistema redireciona para o dashboard",
+        },
+        "actions": [
+            {"step": f"Passo {i}: preencher o campo e confirmar", "expected_result": "Campo aceito sem erros"}
+            for i in range(5)
+        ],
+    }
+    return json.dumps([test_case] * items, ensure_ascii=False)
+
+
+def _bench(label: str, stdlib_fn, codec_fn, repeat: int) -> None:
+    t_std = timeit.timeit(stdlib_fn, number=repeat)
+    t_codec = timeit.timeit(codec_fn, number=repeat)
+    print(f"{label:<32} stdlib={t_std / repeat * 1e6:9.1f}us  "
+          f"{json_codec.BACKEND}={t_codec / repeat * 1e6:9.1f}us  ganho={t_std / t_codec:5.2f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user-input-kb", type=int, default=20, help="Tamanho do user_input em KB.")
+    parser.add_argument("--items", type=int, default=50, help="Número de itens na resposta da LLM.")
+    parser.add_argument("--repeat", type=int, default=2000, help="Repetições por medição.")
+    args = parser.parse_args()
+
+    task_args = build_task_args(args.user_input_kb)
+    task_args_encoded = json.dumps(task_args)
+    llm_response = build_llm_response(args.items)
+    notification = {
+        "request_id": task_args["request_id_interno"], "project_id": None, "parent": "123",
+        "parent_type": "epic", "task_type": "feature", "status": "completed", "error_message": None,
+        "item_ids": list(range(args.items)), "version": 2, "work_item_id": None,
+        "parent_board_id": None, "is_reprocessing": False,
+    }
+
+    print(f"Backend do codec: {json_codec.BACKEND}")
+    print(f"task args: {len(task_args_encoded) / 1024:.1f} KB | resposta LLM: {len(llm_response) / 1024:.1f} KB\n")
+
+    _bench("celery args dumps", lambda: json.dumps(task_args), lambda: json_codec.dumps_bytes(task_args), args.repeat)
+    _bench("celery args loads", lambda: json.loads(task_args_encoded), lambda: json_codec.loads(task_args_encoded), args.repeat)
+    _bench("parser loads (resposta LLM)", lambda: json.loads(llm_response), lambda: json_codec.loads(llm_response), args.repeat)
+    _bench("notificação AMQP dumps", lambda: json.dumps(notification), lambda: json_codec.dumps_bytes(notification), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
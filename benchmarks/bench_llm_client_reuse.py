@@ -0,0 +1,107 @@
+# benchmarks/bench_llm_client_reuse.py
+"""
+Compara o custo de conexão por chamada à OpenAI com um cliente novo por task (modo
+anterior: `OpenAI(api_key=...)` a cada LLMAgent) e com o cliente do processo
+(app.agents.llm_clients), contra um servidor local que imita /v1/chat/completions.
+
+O handshake TLS até o provedor é simulado por um atraso no aceite de cada conexão nova
+(--connect-delay-ms, padrão 60 ms, da ordem de um TLS 1.3 a um provedor em outra região).
+Com o cliente do processo, só a primeira chamada paga esse atraso. As métricas llm_http_*
+mostram as conexões novas/reaproveitadas; aqui o connect medido é só o TCP local (o atraso
+simulado fica no servidor), então a economia real aparece na diferença de ms/chamada.
+
+Uso:
+    python -m benchmarks.bench_llm_client_reuse [--calls 50] [--connect-delay-ms 60]
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.agents import llm_clients
+from app.utils import metrics
+
+COMPLETION = json.dumps({
+    "id": "chatcmpl-bench", "object": "chat.completion", "created": 0, "model": "gpt-4o-mini",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "[]"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 10, "completion_tokens": 1, "total_tokens": 11},
+}).encode()
+
+
+def start_server(connect_delay: float):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True  # Sem o atraso do ACK de cabeçalho e corpo em segmentos separados
+
+        def setup(self):
+            time.sleep(connect_delay)  # Handshake simulado: uma vez por conexão
+            super().setup()
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(COMPLETION)))
+            self.end_headers()
+            self.wfile.write(COMPLETION)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def _call(client) -> None:
+    client.chat.completions.create(model="gpt-4o-mini", messages=[{"role": "user", "content": "u"}])
+
+
+def per_task_client(base_url: str):
+    from openai import OpenAI
+    return OpenAI(api_key="sk-bench", base_url=base_url, max_retries=0)
+
+
+def shared_client(base_url: str):
+    return llm_clients.openai_client("sk-bench", base_url)
+
+
+def run(name: str, factory, base_url: str, calls: int) -> float:
+    metrics.reset()
+    llm_clients.reset()
+    start = time.perf_counter()
+    for _ in range(calls):
+        client = factory(base_url)  # Como o LLMAgent de cada task pede o cliente
+        _call(client)
+        if factory is per_task_client:
+            client.close()
+    per_call_ms = (time.perf_counter() - start) * 1000 / calls
+    print(f"{name:22s} {per_call_ms:7.2f} ms/chamada")
+    return per_call_ms
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=50, help="Chamadas por cenário.")
+    parser.add_argument("--connect-delay-ms", type=float, default=60.0, help="Atraso simulado por conexão nova.")
+    args = parser.parse_args()
+
+    server, base_url = start_server(args.connect_delay_ms / 1000)
+    try:
+        print(f"Chamadas à OpenAI simulada ({args.calls} por cenário, conexão nova custa {args.connect_delay_ms:.0f} ms):")
+        before = run("cliente por task", per_task_client, base_url, args.calls)
+        after = run("cliente do processo", shared_client, base_url, args.calls)
+        new = metrics.get("llm_http_requests_total", provider="openai", connection="new")
+        reused = metrics.get("llm_http_requests_total", provider="openai", connection="reused")
+        print(f"Cliente do processo: {new:.0f} conexão(ões) nova(s), {reused:.0f} reaproveitada(s); "
+              f"connect medido {metrics.get('llm_http_connect_seconds_total', provider='openai') * 1000:.1f} ms, "
+              f"economia estimada {metrics.get('llm_http_connect_saved_seconds_total', provider='openai') * 1000:.1f} ms.")
+        print(f"Economia por chamada: {before - after:.2f} ms")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
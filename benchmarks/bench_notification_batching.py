@@ -0,0 +1,96 @@
+# benchmarks/bench_notification_batching.py
+"""
+Operações no broker do relay do outbox ao escoar uma importação em massa, nos modos de
+NOTIFICATION_PUBLISH_MODE: "message" (uma mensagem persistente e um confirm por
+notificação), "batch" (um envelope por até --batch-max notificações) e "both".
+
+O outbox fica num SQLite temporário e o produtor é simulado: cada publish serializa o
+payload (como o RabbitMQProducer) e espera --confirm-ms, o tempo de ida e volta do
+publisher confirm. Todas as notificações precisam terminar publicadas.
+
+Uso:
+    python -m benchmarks.bench_notification_batching [--notifications 2000] [--batch-max 100] [--confirm-ms 1]
+"""
+import argparse
+import logging
+import tempfile
+import time
+
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.orm import sessionmaker
+
+from app.models import OutboxMessage
+from app.utils import json_codec, outbox
+from app.workers.outbox_relay import OutboxRelay
+
+
+class _CountingProducer:
+    """Produtor com confirm simulado; conta publishes, eventos e bytes enviados."""
+
+    def __init__(self, confirm_seconds: float):
+        self.confirm_seconds = confirm_seconds
+        self.publishes = 0
+        self.events = 0
+        self.bytes = 0
+
+    def publish(self, payload, queue):
+        self.bytes += len(json_codec.dumps_bytes(payload))
+        time.sleep(self.confirm_seconds)
+        self.publishes += 1
+
+    def publish_event(self, payload):
+        json_codec.dumps_bytes(payload)
+        self.events += 1
+
+    def close(self):
+        pass
+
+
+def _enqueue(session_factory, notifications: int) -> None:
+    with session_factory() as db:
+        for i in range(notifications):
+            outbox.enqueue_notification(db, {"request_id": f"bench-{i}", "task_type": "test_case",
+                                             "status": "completed", "item_ids": [i]})
+        db.commit()
+
+
+def _pending(session_factory) -> int:
+    with session_factory() as db:
+        return db.execute(select(func.count()).where(OutboxMessage.published_at.is_(None))).scalar()
+
+
+def run(mode: str, session_factory, notifications: int, batch_max: int, confirm_seconds: float) -> None:
+    _enqueue(session_factory, notifications)
+    producer = _CountingProducer(confirm_seconds)
+    relay = OutboxRelay(session_factory, lambda: producer, publish_mode=mode, batch_max=batch_max, batch_window=0)
+    start = time.perf_counter()
+    while relay.relay_batch():
+        pass
+    elapsed = time.perf_counter() - start
+    left = _pending(session_factory)
+    print(f"{mode:8s} {producer.publishes:6d} publishes {producer.events:6d} eventos "
+          f"{producer.bytes / 1024:8.0f} KiB {elapsed:7.2f} s ({notifications - left}/{notifications} publicadas)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notifications", type=int, default=2000)
+    parser.add_argument("--batch-max", type=int, default=100)
+    parser.add_argument("--confirm-ms", type=float, default=1.0, help="Ida e volta simulada do publisher confirm.")
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{directory}/bench.db")
+        event.listen(engine, "connect", lambda conn, _: conn.execute("PRAGMA synchronous=OFF"))
+        OutboxMessage.__table__.create(engine)
+        session_factory = sessionmaker(bind=engine)
+        print(f"Relay de {args.notifications} notificações (envelope de até {args.batch_max}, "
+              f"confirm de {args.confirm_ms} ms):")
+        for mode in ("message", "batch", "both"):
+            run(mode, session_factory, args.notifications, args.batch_max, args.confirm_ms / 1000)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
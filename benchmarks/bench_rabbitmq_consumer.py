@@ -0,0 +1,90 @@
+# benchmarks/bench_rabbitmq_consumer.py
+"""
+Mensagens por segundo do RabbitMQConsumer contra um RabbitMQ local (RABBITMQ_HOST, padrão
+localhost), no modo anterior (prefetch 1, um handler, um ack por mensagem) e no atual
+(prefetch, pool de handlers e acks em lote). O handler simula I/O com --handler-ms.
+
+Usa a fila descartável bench_consumer (e as filas .retry/.dead), apagada ao final.
+
+Uso:
+    python -m benchmarks.bench_rabbitmq_consumer [--messages 5000] [--handler-ms 2]
+        [--prefetch 50] [--workers 8] [--ack-batch 20]
+"""
+import argparse
+import os
+import threading
+import time
+
+os.environ.setdefault("RABBITMQ_HOST", "localhost")
+
+from app.utils import metrics, rabbitmq  # noqa: E402
+
+QUEUE = "bench_consumer"
+
+
+def _publish(messages: int) -> None:
+    connection = rabbitmq._default_connection_factory()
+    channel = connection.channel()
+    channel.queue_declare(queue=QUEUE, durable=True)
+    channel.queue_purge(queue=QUEUE)
+    body = b'{"request_id": "bench", "status": "completed"}'
+    for _ in range(messages):
+        channel.basic_publish(exchange="", routing_key=QUEUE, body=body)
+    connection.close()
+
+
+def _cleanup() -> None:
+    connection = rabbitmq._default_connection_factory()
+    channel = connection.channel()
+    for queue in (QUEUE, f"{QUEUE}.retry", f"{QUEUE}.dead"):
+        channel.queue_delete(queue=queue)
+    channel.exchange_delete(exchange=f"{QUEUE}.dlx")
+    connection.close()
+
+
+def run(name: str, messages: int, handler_seconds: float, **options) -> None:
+    _publish(messages)
+    done = 0
+    lock = threading.Lock()
+    consumer = None
+
+    def handler(body, properties):
+        nonlocal done
+        time.sleep(handler_seconds)
+        with lock:
+            done += 1
+            if done == messages:
+                consumer.stop()
+
+    consumer = rabbitmq.RabbitMQConsumer(handler, queue=QUEUE, **options)
+    start = time.perf_counter()
+    consumer.start_consuming()
+    elapsed = time.perf_counter() - start
+    acks = metrics.get("rabbitmq_consumer_acks_total", queue=QUEUE)
+    metrics.reset()
+    consumer.close()
+    print(f"{name:44s} {messages / elapsed:9.0f} msg/s ({acks:.0f} acks para {messages} mensagens)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--handler-ms", type=float, default=2.0, help="Tempo simulado de cada handler.")
+    parser.add_argument("--prefetch", type=int, default=rabbitmq.RABBITMQ_CONSUMER_PREFETCH)
+    parser.add_argument("--workers", type=int, default=rabbitmq.RABBITMQ_CONSUMER_WORKERS)
+    parser.add_argument("--ack-batch", type=int, default=rabbitmq.RABBITMQ_CONSUMER_ACK_BATCH)
+    args = parser.parse_args()
+
+    handler_seconds = args.handler_ms / 1000
+    print(f"Consumo de {args.messages} mensagens em {os.environ['RABBITMQ_HOST']} (handler de {args.handler_ms} ms):")
+    try:
+        run("antes (prefetch 1, 1 handler, ack por msg)", args.messages, handler_seconds,
+            prefetch=1, workers=1, ack_batch=1)
+        run(f"atual (prefetch {args.prefetch}, {args.workers} handlers, lote {args.ack_batch})", args.messages,
+            handler_seconds, prefetch=args.prefetch, workers=args.workers, ack_batch=args.ack_batch)
+    finally:
+        _cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# benchmarks/bench_tag_search.py
+"""
+Busca por tag: consulta JSONB com índice GIN (app.utils.json_search.find_by_tags) contra
+o filtro em Python (carregar os épicos do projeto e filtrar as tags na aplicação).
+
+O caminho GIN exige PostgreSQL: passe --database-url (banco descartável; as tabelas são
+recriadas). Sem PostgreSQL, roda só o filtro em Python sobre SQLite, como referência.
+
+Uso:
+    python -m benchmarks.bench_tag_search --database-url postgresql://... [--rows 200000] [--projects 20] [--repeat 50]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+
+from sqlalchemy import create_engine, insert, select, text
+from sqlalchemy.orm import sessionmaker
+
+from app.models import Base, Epic, TaskType
+from app.utils import json_search
+
+VOCABULARY = [f"tag{i}" for i in range(200)]
+
+
+def seed(engine, rows: int, projects, chunk: int = 10000) -> None:
+    rng = random.Random(42)
+    for start in range(0, rows, chunk):
+        with engine.begin() as conn:
+            conn.execute(insert(Epic.__table__), [
+                {"title": f"E{i}", "description": "d", "project_id": rng.choice(projects), "version": 1,
+                 "is_active": True, "tags": rng.sample(VOCABULARY, 4)}
+                for i in range(start, min(start + chunk, rows))
+            ])
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE epics"))
+
+
+def python_filter(db, project_id, tags):
+    rows = db.execute(select(Epic.id, Epic.title, Epic.version, Epic.tags)
+                      .where(Epic.project_id == project_id, Epic.is_active == True)).all()
+    return [row.id for row in rows if json_search.match_tags(row.tags, tags)]
+
+
+def timed(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--projects", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    tmpdir = None
+    url = args.database_url
+    if url is None:
+        tmpdir = tempfile.TemporaryDirectory()
+        url = f"sqlite:///{os.path.join(tmpdir.name, 'bench.db')}"
+        print("Sem --database-url PostgreSQL: só o filtro em Python (SQLite) será medido.")
+    engine = create_engine(url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    projects = [uuid.uuid4() for _ in range(args.projects)]
+    seed(engine, args.rows, projects)
+    db = sessionmaker(bind=engine)()
+
+    tags = ["tag1"]
+    project_id = projects[0]
+    expected = sorted(python_filter(db, project_id, tags))
+    results = {"filtro em Python": timed(lambda: python_filter(db, project_id, tags), args.repeat)}
+    if engine.dialect.name == "postgresql":
+        found = sorted(hit.id for hit in json_search.find_by_tags(db, project_id, tags, [TaskType.EPIC]))
+        assert found == expected, "GIN e filtro em Python divergem"
+        results["JSONB @> + GIN"] = timed(
+            lambda: json_search.find_by_tags(db, project_id, tags, [TaskType.EPIC]), args.repeat)
+        results["JSONB @> + GIN (todos os projetos)"] = timed(
+            lambda: db.execute(select(Epic.id).where(text("tags @> '[\"tag1\"]'::jsonb"))).all(), args.repeat)
+
+    print(f"{args.rows} épicos, {args.projects} projetos, {len(expected)} resultado(s) para {tags} no projeto")
+    for name, ms in results.items():
+        print(f"{name:<40}{ms:>10.3f} ms")
+
+    db.close()
+    engine.dispose()
+    if tmpdir is not None:
+        tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+# gunicorn.conf.py (carregado automaticamente pelo gunicorn a partir do diretório de trabalho)
+"""Métricas dos workers do gunicorn somadas no GET /metrics (PROMETHEUS_MULTIPROC_DIR)."""
+from app.utils import metrics
+
+
+def on_starting(server):
+    metrics.prepare_multiprocess_dir()
+
+
+def child_exit(server, worker):
+    metrics.mark_process_dead(worker.pid)
@@ -0,0 +1,88 @@
+# migrations/env.py
+"""
+Ambiente do Alembic: URL de DATABASE_URL (.env), ou sqlalchemy.url quando definida na Config,
+e metadata de app.models (autogenerate).
+
+Cada revisão roda na sua própria transação (transaction_per_migration), de modo que uma
+migração pode alternar passos transacionais curtos com autocommit_block (CREATE INDEX
+CONCURRENTLY, backfills em lotes de app.utils.migrations). No PostgreSQL a conexão usa
+lock_timeout = MIGRATION_LOCK_TIMEOUT e nenhum statement_timeout (o engine da aplicação usa 5s).
+"""
+import re
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine, pool
+from sqlalchemy.engine import make_url
+
+from app.database import DATABASE_URL
+from app.models import Base
+from app.utils import json_codec
+from app.utils.migrations import MIGRATION_LOCK_TIMEOUT
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+# Partições (criadas pelas migrações e pelos workers) não são modelos: fora do autogenerate
+_PARTITION = re.compile(r"^(requests_y\d{4}m\d{2}|requests_default|artifact_history_\w+)$")
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    if type_ == "table" and reflected and compare_to is None and _PARTITION.match(name or ""):
+        return False
+    return True
+
+
+def _url() -> str:
+    url = config.get_main_option("sqlalchemy.url") or DATABASE_URL
+    if not url:
+        raise ValueError("DATABASE_URL environment variable not set")
+    return url
+
+
+def run_migrations_offline() -> None:
+    """Gera o SQL (alembic upgrade --sql) sem conectar ao banco."""
+    context.configure(
+        url=_url(),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        include_object=include_object,
+        transaction_per_migration=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    url = _url()
+    connect_args = {}
+    if make_url(url).get_backend_name() == "postgresql":
+        connect_args["options"] = f"-c lock_timeout={MIGRATION_LOCK_TIMEOUT} -c statement_timeout=0"
+    engine = create_engine(
+        url,
+        poolclass=pool.NullPool,
+        connect_args=connect_args,
+        json_serializer=json_codec.dumps,
+        json_deserializer=json_codec.loads,
+    )
+    with engine.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
+            transaction_per_migration=True,
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+    engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,180 @@
+"""Esquema inicial (tabelas de artefatos, requests e actions)
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-19 09:00:00
+
+Esquema criado até então por `Base.metadata.create_all` (create_tables). Bancos que já têm
+essas tabelas devem ser marcados sem executar nada: `alembic stamp 0001_baseline`.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+# revision identifiers, used by Alembic.
+revision: str = "0001_baseline"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ARTIFACT_TABLES = ("epics", "features", "user_stories", "tasks", "bugs", "issues", "pbis", "test_cases", "wbs")
+
+
+def _tracking_columns():
+    """Colunas comuns a todos os artefatos (versão, auditoria, tokens e Azure DevOps)."""
+    return [
+        sa.Column("version", sa.Integer()),
+        sa.Column("is_active", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+        sa.Column("feedback", sa.Text(), nullable=True),
+        sa.Column("prompt_tokens", sa.Integer(), nullable=True),
+        sa.Column("completion_tokens", sa.Integer(), nullable=True),
+        sa.Column("summary", sa.Text(), nullable=True),
+        sa.Column("reflection", sa.JSON(), nullable=True),
+        sa.Column("work_item_id", sa.String(), nullable=True),
+        sa.Column("parent_board_id", sa.String(), nullable=True),
+    ]
+
+
+def _project_id():
+    return sa.Column("project_id", UUID(as_uuid=True), nullable=True)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "epics",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("team_project_id", sa.Integer()),
+        sa.Column("parent_type", sa.String(50), nullable=True),
+        sa.Column("title", sa.String()),
+        _project_id(),
+        sa.Column("description", sa.Text()),
+        sa.Column("tags", sa.JSON()),
+        *_tracking_columns(),
+    )
+    op.create_table(
+        "features",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("parent", sa.Integer(), sa.ForeignKey("epics.id")),
+        sa.Column("parent_type", sa.String(50), nullable=True),
+        sa.Column("title", sa.String()),
+        _project_id(),
+        sa.Column("description", sa.Text()),
+        sa.Column("acceptance_criteria", sa.Text()),
+        *_tracking_columns(),
+    )
+    op.create_table(
+        "user_stories",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("parent", sa.Integer(), sa.ForeignKey("features.id")),
+        sa.Column("parent_type", sa.String(50), nullable=True),
+        sa.Column("title", sa.String()),
+        _project_id(),
+        sa.Column("description", sa.Text()),
+        sa.Column("acceptance_criteria", sa.Text()),
+        sa.Column("priority", sa.String()),
+        sa.Column("dod", sa.Text(), nullable=True),
+        sa.Column("dor", sa.Text(), nullable=True),
+        *_tracking_columns(),
+    )
+    op.create_table(
+        "tasks",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("parent", sa.Integer(), sa.ForeignKey("user_stories.id")),
+        sa.Column("parent_type", sa.String(50), nullable=True),
+        sa.Column("title", sa.String()),
+        _project_id(),
+        sa.Column("description", sa.Text()),
+        sa.Column("estimate", sa.String()),
+        *_tracking_columns(),
+    )
+    op.create_table(
+        "issues",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_story_id", sa.Integer(), sa.ForeignKey("user_stories.id")),
+        sa.Column("title", sa.String()),
+        _project_id(),
+        sa.Column("description", sa.Text()),
+        sa.Column("tags", sa.JSON()),
+        *_tracking_columns(),
+    )
+    op.create_table(
+        "bugs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("issue_id", sa.Integer(), sa.ForeignKey("issues.id"), nullable=True),
+        sa.Column("user_story_id", sa.Integer(), sa.ForeignKey("user_stories.id"), nullable=True),
+        sa.Column("title", sa.String()),
+        _project_id(),
+        sa.Column("repro_steps", sa.Text()),
+        sa.Column("system_info", sa.Text()),
+        sa.Column("tags", sa.JSON()),
+        *_tracking_columns(),
+    )
+    op.create_table(
+        "pbis",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("feature_id", sa.Integer(), sa.ForeignKey("features.id")),
+        sa.Column("title", sa.String()),
+        _project_id(),
+        sa.Column("description", sa.Text()),
+        sa.Column("tags", sa.JSON()),
+        *_tracking_columns(),
+    )
+    op.create_table(
+        "requests",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("request_id", sa.String(), unique=True),
+        sa.Column("parent", sa.Integer()),
+        sa.Column("parent_type", sa.String(50), nullable=True),
+        _project_id(),
+        sa.Column("task_type", sa.String()),
+        sa.Column("status", sa.String()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("processed_at", sa.DateTime(timezone=True)),
+        sa.Column("error_message", sa.Text()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+        sa.Column("artifact_type", sa.String()),
+        sa.Column("artifact_id", sa.Integer()),
+    )
+    op.create_table(
+        "test_cases",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("parent", sa.Integer(), sa.ForeignKey("user_stories.id")),
+        sa.Column("parent_type", sa.String(50), nullable=True),
+        sa.Column("title", sa.String()),
+        _project_id(),
+        sa.Column("gherkin", sa.JSON()),
+        sa.Column("script", sa.Text(), nullable=True),
+        sa.Column("priority", sa.String()),
+        *_tracking_columns(),
+    )
+    op.create_table(
+        "actions",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("test_case_id", sa.Integer(), sa.ForeignKey("test_cases.id")),
+        sa.Column("step", sa.Text()),
+        sa.Column("expected_result", sa.Text()),
+        sa.Column("version", sa.Integer()),
+        sa.Column("is_active", sa.Boolean()),
+    )
+    op.create_table(
+        "wbs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("parent", sa.Integer(), sa.ForeignKey("epics.id")),
+        sa.Column("parent_type", sa.String(50), nullable=True),
+        _project_id(),
+        sa.Column("wbs", sa.JSON()),
+        *_tracking_columns(),
+    )
+    # Tabelas vazias neste ponto: índices comuns, sem CONCURRENTLY
+    for table in ARTIFACT_TABLES + ("requests",):
+        op.create_index(f"ix_{table}_project_id", table, ["project_id"])
+
+
+def downgrade() -> None:
+    for table in ("actions", "wbs", "test_cases", "requests", "pbis", "bugs", "issues", "tasks",
+                  "user_stories", "features", "epics"):
+        op.drop_table(table)
@@ -0,0 +1,91 @@
+"""Outbox de notificações, índice de hierarquia e arquivo de versões
+
+Revision ID: 0002_outbox_hierarchy_history
+Revises: 0001_baseline
+Create Date: 2026-10-19 09:10:00
+
+Só tabelas novas (sem lock nas tabelas quentes além de ACCESS SHARE na carga do índice de
+hierarquia). artifact_history é particionada por tipo no PostgreSQL.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+from app.utils import migrations
+
+# revision identifiers, used by Alembic.
+revision: str = "0002_outbox_hierarchy_history"
+down_revision: Union[str, None] = "0001_baseline"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+HISTORY_PARTITIONS = ("bug", "issue", "test_case", "task", "user_story", "pbi", "wbs", "feature", "epic")
+
+
+def upgrade() -> None:
+    op.create_table(
+        "notification_outbox",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("request_id", sa.String()),
+        sa.Column("queue", sa.String(), nullable=False),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("published_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index("ix_notification_outbox_request_id", "notification_outbox", ["request_id"])
+    op.create_index("ix_notification_outbox_pending", "notification_outbox", ["id"],
+                    postgresql_where=sa.text("published_at IS NULL"))
+
+    op.create_table(
+        "artifact_hierarchy",
+        sa.Column("ancestor_type", sa.String(50), nullable=False),
+        sa.Column("ancestor_id", sa.Integer(), nullable=False),
+        sa.Column("descendant_type", sa.String(50), nullable=False),
+        sa.Column("descendant_id", sa.Integer(), nullable=False),
+        sa.Column("depth", sa.Integer(), nullable=False),
+        sa.Column("is_active", sa.Boolean(), nullable=False),
+        sa.PrimaryKeyConstraint("ancestor_type", "ancestor_id", "descendant_type", "descendant_id"),
+    )
+    op.create_index("ix_artifact_hierarchy_descendant", "artifact_hierarchy", ["descendant_type", "descendant_id", "depth"])
+
+    op.create_table(
+        "artifact_history",
+        sa.Column("artifact_type", sa.String(50), nullable=False),
+        sa.Column("artifact_id", sa.Integer(), nullable=False),
+        sa.Column("version", sa.Integer()),
+        sa.Column("project_id", UUID(as_uuid=True), nullable=True),
+        sa.Column("parent", sa.Integer(), nullable=True),
+        sa.Column("parent_type", sa.String(50), nullable=True),
+        sa.Column("data", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True)),
+        sa.Column("deactivated_at", sa.DateTime(timezone=True)),
+        sa.Column("archived_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint("artifact_type", "artifact_id"),
+        postgresql_partition_by="LIST (artifact_type)",
+    )
+    op.create_index("ix_artifact_history_lineage", "artifact_history", ["artifact_type", "parent_type", "parent", "version"])
+    op.create_index("ix_artifact_history_project", "artifact_history", ["project_id"])
+    if migrations.is_postgresql():
+        for artifact_type in HISTORY_PARTITIONS:
+            op.execute(f"CREATE TABLE artifact_history_{artifact_type} PARTITION OF artifact_history "
+                       f"FOR VALUES IN ('{artifact_type}')")
+        op.execute("CREATE TABLE artifact_history_default PARTITION OF artifact_history DEFAULT")
+
+    if not migrations.is_offline():
+        # Carga do índice com os artefatos existentes (o mesmo que python -m app.utils.hierarchy)
+        from sqlalchemy.orm import Session
+        from app.utils import hierarchy
+
+        db = Session(bind=op.get_bind())
+        hierarchy.rebuild_index(db)
+        db.close()
+
+
+def downgrade() -> None:
+    op.drop_table("artifact_history")  # Remove também as partições
+    op.drop_table("artifact_hierarchy")
+    op.drop_table("notification_outbox")
@@ -0,0 +1,177 @@
+"""Tabela requests particionada por mês de created_at
+
+Revision ID: 0003_partition_requests
+Revises: 0002_outbox_hierarchy_history
+Create Date: 2026-10-19 09:20:00
+
+PostgreSQL, sem lock longo na tabela em uso:
+1. cria requests_new particionada (PK (id, created_at), índices de polling e de poda) com as
+   partições mensais desde a requisição mais antiga, mais a DEFAULT;
+2. trigger em requests replica INSERT/UPDATE/DELETE para requests_new enquanto a cópia roda;
+3. cópia em lotes por faixa de id (um commit por lote, ON CONFLICT DO NOTHING: linhas já
+   replicadas pelo trigger são mais novas);
+4. troca de nomes numa transação curta (lock_timeout do env.py) e ajuste da identity.
+
+Demais bancos: recria a tabela e copia numa única transação.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+from app.utils import migrations
+
+# revision identifiers, used by Alembic.
+revision: str = "0003_partition_requests"
+down_revision: Union[str, None] = "0002_outbox_hierarchy_history"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = ("id", "request_id", "parent", "parent_type", "project_id", "task_type", "status", "created_at",
+           "processed_at", "error_message", "updated_at", "artifact_type", "artifact_id")
+PARTITIONS_AHEAD = 2
+SYNC_FUNCTION = "requests_partition_sync"
+EPOCH = "'epoch'::timestamptz"  # created_at nulo (não deveria existir) vai para a DEFAULT
+
+
+def _values(prefix: str, epoch: str) -> str:
+    """Colunas de origem; request_id e created_at passam a ser NOT NULL (fazem parte da PK/unique)."""
+    replaced = {
+        "request_id": f"coalesce({prefix}request_id, 'legacy-' || {prefix}id)",
+        "created_at": f"coalesce({prefix}created_at, {epoch})",
+    }
+    return ", ".join(replaced.get(column, f"{prefix}{column}") for column in COLUMNS)
+
+
+def _create_partitioned(name: str, pk_name: str, project_index: str) -> None:
+    op.create_table(
+        name,
+        sa.Column("id", sa.Integer(), sa.Identity(), nullable=False),
+        sa.Column("request_id", sa.String(), nullable=False),
+        sa.Column("parent", sa.Integer()),
+        sa.Column("parent_type", sa.String(50), nullable=True),
+        sa.Column("project_id", UUID(as_uuid=True), nullable=True),
+        sa.Column("task_type", sa.String()),
+        sa.Column("status", sa.String()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("processed_at", sa.DateTime(timezone=True)),
+        sa.Column("error_message", sa.Text()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+        sa.Column("artifact_type", sa.String()),
+        sa.Column("artifact_id", sa.Integer()),
+        sa.PrimaryKeyConstraint("id", "created_at", name=pk_name),
+        sa.UniqueConstraint("request_id", "created_at", name="uq_requests_request_id"),
+        postgresql_partition_by="RANGE (created_at)",
+    )
+    # Tabela nova e vazia: índices criados antes da cópia, sem CONCURRENTLY
+    op.create_index(project_index, name, ["project_id"])
+    op.create_index("ix_requests_status_poll", name, ["request_id"],
+                    postgresql_include=["status", "parent", "task_type", "created_at", "processed_at", "project_id"])
+    op.create_index("ix_requests_status_created_at", name, ["status", "created_at"])
+
+
+def _next_month(month):
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _create_monthly_partitions(table: str) -> None:
+    from app.utils.request_retention import partition_name
+
+    now = datetime.now(timezone.utc)
+    oldest = None
+    if not migrations.is_offline():
+        oldest = op.get_bind().execute(sa.text("SELECT min(created_at) FROM requests")).scalar()
+    month = (oldest or now).date().replace(day=1)
+    last = now.date().replace(day=1)
+    for _ in range(PARTITIONS_AHEAD):
+        last = _next_month(last)
+    while month <= last:
+        upper = _next_month(month)
+        op.execute(f"CREATE TABLE {partition_name(month)} PARTITION OF {table} "
+                   f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')")
+        month = upper
+    op.execute(f"CREATE TABLE requests_default PARTITION OF {table} DEFAULT")
+
+
+def _upgrade_postgresql() -> None:
+    _create_partitioned("requests_new", "requests_new_pkey", "ix_requests_new_project_id")
+    _create_monthly_partitions("requests_new")
+
+    columns = ", ".join(COLUMNS)
+    op.execute(
+        f"CREATE OR REPLACE FUNCTION {SYNC_FUNCTION}() RETURNS trigger AS $$\n"
+        f"BEGIN\n"
+        f"  IF TG_OP IN ('UPDATE', 'DELETE') THEN DELETE FROM requests_new WHERE id = OLD.id; END IF;\n"
+        f"  IF TG_OP = 'DELETE' THEN RETURN OLD; END IF;\n"
+        f"  INSERT INTO requests_new ({columns}) VALUES ({_values('NEW.', EPOCH)});\n"
+        f"  RETURN NEW;\n"
+        f"END $$ LANGUAGE plpgsql"
+    )
+    op.execute(f"CREATE TRIGGER {SYNC_FUNCTION} AFTER INSERT OR UPDATE OR DELETE ON requests "
+               f"FOR EACH ROW EXECUTE FUNCTION {SYNC_FUNCTION}()")
+
+    migrations.run_in_batches(
+        f"INSERT INTO requests_new ({columns}) SELECT {_values('', EPOCH)} FROM requests "
+        f"WHERE id >= :start AND id < :end ON CONFLICT DO NOTHING",
+        "requests",
+    )
+
+    # Troca: transação curta, só metadados (a cópia já está em dia graças ao trigger)
+    op.execute("LOCK TABLE requests, requests_new IN ACCESS EXCLUSIVE MODE")
+    op.execute(f"DROP TRIGGER {SYNC_FUNCTION} ON requests")
+    op.execute(f"DROP FUNCTION {SYNC_FUNCTION}()")
+    op.execute("ALTER TABLE requests RENAME TO requests_legacy")
+    op.execute("ALTER TABLE requests_legacy RENAME CONSTRAINT requests_pkey TO requests_legacy_pkey")
+    op.execute("ALTER INDEX ix_requests_project_id RENAME TO ix_requests_legacy_project_id")
+    op.execute("ALTER TABLE requests_new RENAME TO requests")
+    op.execute("ALTER TABLE requests RENAME CONSTRAINT requests_new_pkey TO requests_pkey")
+    op.execute("ALTER INDEX ix_requests_new_project_id RENAME TO ix_requests_project_id")
+    op.execute("SELECT setval(pg_get_serial_sequence('requests', 'id'), "
+               "(SELECT coalesce(max(id), 0) + 1 FROM requests), false)")
+    op.execute("DROP TABLE requests_legacy")
+
+
+def upgrade() -> None:
+    if migrations.is_postgresql():
+        _upgrade_postgresql()
+        return
+    op.drop_index("ix_requests_project_id", table_name="requests")
+    op.rename_table("requests", "requests_legacy")
+    _create_partitioned("requests", "requests_pkey", "ix_requests_project_id")
+    op.execute(f"INSERT INTO requests ({', '.join(COLUMNS)}) "
+               f"SELECT {_values('', 'CURRENT_TIMESTAMP')} FROM requests_legacy")
+    op.drop_table("requests_legacy")
+
+
+def downgrade() -> None:
+    # Volta à tabela simples com uma cópia bloqueante (uso excepcional)
+    for index in ("ix_requests_project_id", "ix_requests_status_poll", "ix_requests_status_created_at"):
+        op.drop_index(index, table_name="requests")
+    op.rename_table("requests", "requests_partitioned")
+    if migrations.is_postgresql():
+        op.execute("ALTER TABLE requests_partitioned RENAME CONSTRAINT requests_pkey TO requests_partitioned_pkey")
+    op.create_table(
+        "requests",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("request_id", sa.String(), unique=True),
+        sa.Column("parent", sa.Integer()),
+        sa.Column("parent_type", sa.String(50), nullable=True),
+        sa.Column("project_id", UUID(as_uuid=True), nullable=True),
+        sa.Column("task_type", sa.String()),
+        sa.Column("status", sa.String()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("processed_at", sa.DateTime(timezone=True)),
+        sa.Column("error_message", sa.Text()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+        sa.Column("artifact_type", sa.String()),
+        sa.Column("artifact_id", sa.Integer()),
+    )
+    op.create_index("ix_requests_project_id", "requests", ["project_id"])
+    columns = ", ".join(COLUMNS)
+    op.execute(f"INSERT INTO requests ({columns}) SELECT {columns} FROM requests_partitioned")
+    if migrations.is_postgresql():
+        op.execute("SELECT setval(pg_get_serial_sequence('requests', 'id'), "
+                   "(SELECT coalesce(max(id), 0) + 1 FROM requests), false)")
+    op.drop_table("requests_partitioned")
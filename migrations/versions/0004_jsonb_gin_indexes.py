@@ -0,0 +1,93 @@
+"""Colunas JSON -> JSONB e índices GIN (PostgreSQL)
+
+Revision ID: 0004_jsonb_gin_indexes
+Revises: 0003_partition_requests
+Create Date: 2026-10-19 09:30:00
+
+`ALTER COLUMN ... TYPE jsonb` reescreveria cada tabela sob ACCESS EXCLUSIVE. Por coluna:
+1. ADD COLUMN <col>__jsonb (só metadados) e um trigger que mantém a cópia em INSERT/UPDATE;
+2. backfill em lotes (migrations.batched_backfill);
+3. troca de nomes numa transação curta (RENAME + DROP COLUMN, sem reescrita).
+Depois, índices GIN com CREATE INDEX CONCURRENTLY. Colunas já em jsonb são puladas.
+Nos demais bancos nada muda (JSON genérico, sem GIN).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils import migrations
+
+# revision identifiers, used by Alembic.
+revision: str = "0004_jsonb_gin_indexes"
+down_revision: Union[str, None] = "0003_partition_requests"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ARTIFACT_TABLES = ("epics", "features", "user_stories", "tasks", "bugs", "issues", "pbis", "test_cases", "wbs")
+JSONB_COLUMNS = [(table, "reflection") for table in ARTIFACT_TABLES] + [
+    ("epics", "tags"), ("bugs", "tags"), ("issues", "tags"), ("pbis", "tags"),
+    ("test_cases", "gherkin"), ("wbs", "wbs"),
+]
+GIN_INDEXES = [
+    ("ix_epics_tags_gin", "epics", "tags"),
+    ("ix_epics_reflection_gin", "epics", "reflection"),
+    ("ix_bugs_tags_gin", "bugs", "tags"),
+    ("ix_issues_tags_gin", "issues", "tags"),
+    ("ix_pbis_tags_gin", "pbis", "tags"),
+    ("ix_wbs_wbs_gin", "wbs", "wbs"),
+]
+
+
+def _is_jsonb(table: str, column: str) -> bool:
+    if migrations.is_offline():
+        return False
+    data_type = op.get_bind().execute(sa.text(
+        "SELECT data_type FROM information_schema.columns WHERE table_name = :table AND column_name = :column"
+    ), {"table": table, "column": column}).scalar()
+    return data_type == "jsonb"
+
+
+def _convert_column(table: str, column: str) -> None:
+    if _is_jsonb(table, column):
+        return
+    shadow = f"{column}__jsonb"
+    trigger = f"{table}_{column}_jsonb_sync"
+    op.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {shadow} jsonb")
+    op.execute(f"CREATE OR REPLACE FUNCTION {trigger}() RETURNS trigger AS $$ "
+               f"BEGIN NEW.{shadow} := NEW.{column}::jsonb; RETURN NEW; END $$ LANGUAGE plpgsql")
+    op.execute(f"DROP TRIGGER IF EXISTS {trigger} ON {table}")
+    op.execute(f"CREATE TRIGGER {trigger} BEFORE INSERT OR UPDATE OF {column} ON {table} "
+               f"FOR EACH ROW EXECUTE FUNCTION {trigger}()")
+
+    migrations.batched_backfill(table, f"{shadow} = {column}::jsonb", f"{column} IS NOT NULL AND {shadow} IS NULL")
+
+    op.execute(f"ALTER TABLE {table} RENAME COLUMN {column} TO {column}__json_old")
+    op.execute(f"ALTER TABLE {table} RENAME COLUMN {shadow} TO {column}")
+    op.execute(f"DROP TRIGGER IF EXISTS {trigger} ON {table}")
+    op.execute(f"DROP FUNCTION IF EXISTS {trigger}()")
+    op.execute(f"ALTER TABLE {table} DROP COLUMN {column}__json_old")
+
+
+def upgrade() -> None:
+    if not migrations.is_postgresql():
+        return
+    for table, column in JSONB_COLUMNS:
+        _convert_column(table, column)
+    for name, table, column in GIN_INDEXES:
+        migrations.create_index_concurrently(name, table, [column], postgresql_using="gin",
+                                             postgresql_ops={column: "jsonb_path_ops"})
+    # O parser grava o Gherkin como string JSON; `#>> '{}'` + ::jsonb normaliza string ou objeto
+    migrations.create_index_concurrently("ix_test_cases_gherkin_gin", "test_cases",
+                                         [sa.text("((gherkin #>> '{}')::jsonb) jsonb_path_ops")],
+                                         postgresql_using="gin")
+
+
+def downgrade() -> None:
+    if not migrations.is_postgresql():
+        return
+    for name, table in [(name, table) for name, table, _ in GIN_INDEXES] + [("ix_test_cases_gherkin_gin", "test_cases")]:
+        migrations.drop_index_concurrently(name, table)
+    # json aceita qualquer jsonb; reescreve a tabela (downgrade é uso excepcional)
+    for table, column in JSONB_COLUMNS:
+        op.execute(f"ALTER TABLE {table} ALTER COLUMN {column} TYPE json USING {column}::json")
@@ -0,0 +1,52 @@
+"""Ledger de consumo de tokens e orçamentos por projeto
+
+Revision ID: 0005_token_usage_budgets
+Revises: 0004_jsonb_gin_indexes
+Create Date: 2026-10-19 10:00:00
+
+Só tabelas novas (sem lock nas tabelas existentes). O ledger começa vazio: o consumo
+anterior continua só nos prompt_tokens/completion_tokens de cada artefato.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+# revision identifiers, used by Alembic.
+revision: str = "0005_token_usage_budgets"
+down_revision: Union[str, None] = "0004_jsonb_gin_indexes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "token_usage",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("request_id", sa.String(), nullable=False),
+        sa.Column("project_id", UUID(as_uuid=True), nullable=True),
+        sa.Column("task_type", sa.String(50), nullable=False),
+        sa.Column("provider", sa.String(20), nullable=False),
+        sa.Column("model", sa.String(100), nullable=False),
+        sa.Column("prompt_tokens", sa.Integer(), nullable=False),
+        sa.Column("completion_tokens", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+    op.create_index("ix_token_usage_project_created", "token_usage", ["project_id", "created_at"],
+                    postgresql_include=["prompt_tokens", "completion_tokens"])
+    op.create_index("ix_token_usage_created", "token_usage", ["created_at"])
+
+    op.create_table(
+        "project_budgets",
+        sa.Column("project_id", UUID(as_uuid=True), primary_key=True),
+        sa.Column("token_limit", sa.Integer(), nullable=False),
+        sa.Column("period", sa.String(10), nullable=False),
+        sa.Column("action", sa.String(10), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("project_budgets")
+    op.drop_table("token_usage")
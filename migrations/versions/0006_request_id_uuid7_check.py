@@ -0,0 +1,43 @@
+"""request_id UUIDv7 amarrado ao created_at (PostgreSQL)
+
+Revision ID: 0006_request_id_uuid7_check
+Revises: 0005_token_usage_budgets
+Create Date: 2026-10-19 12:00:00
+
+A API passa a gerar request_id como UUIDv7 e a gravar created_at igual ao instante do id
+(app.utils.request_ids). A CHECK garante isso no banco: com ela, uq_requests_request_id
+(request_id, created_at) volta a tornar request_id único. IDs antigos (não-v7) ficam de fora.
+ADD ... NOT VALID é só metadado; o VALIDATE roda depois do commit, com SHARE UPDATE
+EXCLUSIVE (leituras e escritas continuam). Demais bancos: nada muda.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from app.utils import migrations
+
+# revision identifiers, used by Alembic.
+revision: str = "0006_request_id_uuid7_check"
+down_revision: Union[str, None] = "0005_token_usage_budgets"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CONSTRAINT = "ck_requests_request_id_created_at"
+CHECK = (
+    "request_id !~ '^[0-9a-f]{8}-[0-9a-f]{4}-7[0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12}$' "
+    "OR created_at = to_timestamp(0) + ('x' || translate(left(request_id, 13), '-', ''))::bit(48)::bigint "
+    "* interval '1 millisecond'"
+)
+
+
+def upgrade() -> None:
+    if not migrations.is_postgresql():
+        return
+    op.execute(f"ALTER TABLE requests ADD CONSTRAINT {CONSTRAINT} CHECK ({CHECK}) NOT VALID")
+    with op.get_context().autocommit_block():
+        op.execute(f"ALTER TABLE requests VALIDATE CONSTRAINT {CONSTRAINT}")
+
+
+def downgrade() -> None:
+    if migrations.is_postgresql():
+        op.execute(f"ALTER TABLE requests DROP CONSTRAINT IF EXISTS {CONSTRAINT}")
@@ -0,0 +1,54 @@
+"""project_id herdado do pai nos artefatos criados pela rota /generate
+
+Revision ID: 0007_inherit_project_id
+Revises: 0006_request_id_uuid7_check
+Create Date: 2026-10-19 15:00:00
+
+A rota /generate não recebe project_id: até aqui os artefatos criados por ela ficavam sem
+projeto e não apareciam na exportação (/export/projects) nem nas buscas por tag/Gherkin.
+O worker passa a copiar o project_id do pai; este backfill faz o mesmo com as linhas
+existentes. Uma passada por tabela, pais antes dos filhos (hierarchy.INDEX_ORDER), para a
+herança descer a árvore inteira; em lotes (migrations.batched_backfill) e só nas linhas sem
+projeto cujo pai tem projeto. O downgrade não desfaz (não há como distinguir o herdado).
+"""
+from typing import Sequence, Union
+
+from app.models import TaskType
+from app.utils import hierarchy, migrations
+
+# revision identifiers, used by Alembic.
+revision: str = "0007_inherit_project_id"
+down_revision: Union[str, None] = "0006_request_id_uuid7_check"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _parent_project_sql(task_type: TaskType) -> str:
+    """project_id do pai da linha corrente (NULL se o pai não tem projeto ou é o projeto da equipe)."""
+    spec = hierarchy.HIERARCHY_SPECS[task_type]
+    table = spec.model.__tablename__
+
+    def lookup(parent_type: TaskType) -> str:
+        parent_table = hierarchy.HIERARCHY_SPECS[parent_type].model.__tablename__
+        return f"(SELECT p.project_id FROM {parent_table} p WHERE p.id = {table}.{spec.parent_column})"
+
+    if not spec.has_parent_type:
+        return lookup(spec.default_parent_type)
+    cases = " ".join(f"WHEN '{parent_type.value}' THEN {lookup(parent_type)}" for parent_type in hierarchy.HIERARCHY_SPECS)
+    return f"CASE COALESCE(parent_type, '{spec.default_parent_type.value}') {cases} END"
+
+
+def upgrade() -> None:
+    for task_type in hierarchy.INDEX_ORDER:
+        if task_type == TaskType.EPIC:  # Pai é o projeto da equipe (team_project_id), sem UUID
+            continue
+        spec = hierarchy.HIERARCHY_SPECS[task_type]
+        parent_project = _parent_project_sql(task_type)
+        migrations.batched_backfill(
+            spec.model.__tablename__, f"project_id = {parent_project}",
+            f"project_id IS NULL AND {spec.parent_column} IS NOT NULL AND {parent_project} IS NOT NULL",
+        )
+
+
+def downgrade() -> None:
+    pass
@@ -0,0 +1,77 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from app.agents import llm_agent, llm_clients
+from app.utils import metrics
+
+
+@pytest.fixture(autouse=True)
+def clean_registry():
+    llm_clients.reset()
+    metrics.reset()
+    yield
+    llm_clients.reset()
+    metrics.reset()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    paths = []
+
+    def do_GET(self):
+        self.paths.append(self.path)
+        body = b'{"object": "list", "data": []}' if self.path.endswith("/models") else b"ok"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_cliente_openai_e_compartilhado_entre_agentes(monkeypatch):
+    pytest.importorskip("openai")
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-teste")
+    first, second = llm_agent.LLMAgent(), llm_agent.LLMAgent()
+    assert first.get_openai_client() is second.get_openai_client()
+    assert llm_clients.openai_client("sk-teste", "http://outro/v1") is not first.get_openai_client()
+    assert llm_clients.openai_client("sk-outra") is not first.get_openai_client()
+
+
+def test_transporte_reaproveita_conexao_e_mede_economia(server):
+    import httpx
+
+    with httpx.Client(transport=llm_clients.build_transport("openai", http2=False)) as client:
+        for _ in range(3):
+            assert client.get(server).text == "ok"
+    assert metrics.get("llm_http_requests_total", provider="openai", connection="new") == 1
+    assert metrics.get("llm_http_requests_total", provider="openai", connection="reused") == 2
+    connect = metrics.get("llm_http_connect_seconds_total", provider="openai")
+    assert connect > 0
+    assert metrics.get("llm_http_connect_saved_seconds_total", provider="openai") == pytest.approx(2 * connect)
+
+
+def test_warm_up_abre_a_conexao_pela_api_publica(server, monkeypatch):
+    pytest.importorskip("openai")
+    monkeypatch.setattr(llm_clients, "LLM_WARMUP", True)
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-teste")
+    monkeypatch.setenv("OPENAI_BASE_URL", f"{server}/v1")  # Lida pelo SDK quando base_url é None
+    _Handler.paths.clear()
+    llm_clients.warm_up("openai")
+    assert _Handler.paths == ["/v1/models"]
+    assert metrics.get("llm_http_requests_total", provider="openai", connection="new") == 1
+    # A task seguinte usa o mesmo pool: a conexão aberta no aquecimento é reaproveitada
+    llm_clients.openai_client("sk-teste").models.list()
+    assert metrics.get("llm_http_requests_total", provider="openai", connection="reused") == 1
@@ -0,0 +1,89 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+from app.agents import llm_agent
+from app.agents.model_router import ModelRouter, ModelStats
+from app.utils import metrics
+
+SHORT = {"system": "s", "user": "Quebre a user story em tasks."}
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_politica_por_task_type_tamanho_e_erros():
+    router = ModelRouter(mode="enforce", task_tiers={"epic": "high"}, stats=ModelStats())
+    assert router.route("task", "openai", "gpt-3.5-turbo-0125", SHORT, 1000).model == "gpt-4o-mini"
+    assert router.route("epic", "openai", "gpt-3.5-turbo-0125", SHORT, 1000).model == "gpt-4o"
+    large = {"system": "s", "user": "x" * 40000}  # ~10k tokens estimados
+    assert router.route("task", "openai", "gpt-3.5-turbo-0125", large, 1000).model == "gpt-4o"
+    assert router.route("task", "gemini", "gemini-pro", SHORT, 1000).model == "gemini-1.5-flash"
+
+    for _ in range(6):
+        router.stats.record("openai", "gpt-4o-mini", None, ok=False)
+    assert router.route("task", "openai", "gpt-3.5-turbo-0125", SHORT, 1000).model == "gpt-3.5-turbo-0125"
+    unknown = router.route("task", "openai", "modelo-interno", SHORT, 1000)
+    assert unknown.model == "modelo-interno" and unknown.estimated_cost is None
+
+
+def test_niveis_por_task_type_sao_opt_in(monkeypatch):
+    monkeypatch.delenv("MODEL_ROUTER_TASK_TIERS", raising=False)
+    router = ModelRouter(mode="enforce", stats=ModelStats())
+    assert router.route("epic", "openai", "gpt-3.5-turbo-0125", SHORT, 1000).model == "gpt-4o-mini"
+
+    monkeypatch.setenv("MODEL_ROUTER_TASK_TIERS", "epic=high")
+    router = ModelRouter(mode="enforce", stats=ModelStats())
+    assert router.route("epic", "openai", "gpt-3.5-turbo-0125", SHORT, 1000).model == "gpt-4o"
+
+
+def test_shadow_registra_a_decisao_sem_trocar_o_modelo():
+    router = ModelRouter(mode="shadow", stats=ModelStats())
+    route = router.route("task", "openai", "gpt-3.5-turbo-0125", SHORT, 1000)
+    assert (route.model, route.enforced) == ("gpt-3.5-turbo-0125", False)
+    assert route.estimated_cost < route.baseline_cost
+    assert metrics.get("model_router_decisions_total", task_type="task", mode="shadow",
+                       routed="gpt-4o-mini", baseline="gpt-3.5-turbo-0125") == 1
+
+
+def test_generate_text_roteia_so_sem_modelo_fixado(monkeypatch):
+    monkeypatch.setattr(llm_agent, "model_router", ModelRouter(mode="enforce", stats=ModelStats()))
+    agent = llm_agent.LLMAgent()
+    agent.chosen_llm, agent.openai_model = "openai", "gpt-3.5-turbo-0125"
+    agent.openai_client = MagicMock()
+    agent.openai_client.chat.completions.create.return_value = SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content="ok"), finish_reason="stop")],
+        usage=SimpleNamespace(prompt_tokens=1, completion_tokens=1),
+    )
+    response = agent.generate_text(SHORT, {"llm": "openai", "model": None}, task_type="task")
+    assert response["model"] == "gpt-4o-mini"
+    assert agent.openai_client.chat.completions.create.call_args.kwargs["model"] == "gpt-4o-mini"
+    assert llm_agent.model_router.stats.get("openai", "gpt-4o-mini")[2] == 1
+
+    response = agent.generate_text(SHORT, {"llm": "openai", "model": "gpt-4o"}, task_type="task")
+    assert response["model"] == "gpt-4o"  # Modelo fixado pelo chamador
+
+
+def test_best_of_n_roteia_uma_vez_e_fixa_o_modelo(monkeypatch):
+    monkeypatch.setattr(llm_agent, "model_router", ModelRouter(mode="enforce", stats=ModelStats(), cross_provider=True))
+    monkeypatch.setattr(llm_agent, "OPENAI_NATIVE_N", True)
+    agent = llm_agent.LLMAgent()
+    agent.chosen_llm, agent.openai_model = "openai", "gpt-3.5-turbo-0125"
+    calls = []
+
+    def fake_generate(prompt_data, llm_config=None, n=1, structured=None, task_type=None):
+        calls.append((llm_config["llm"], llm_config["model"], n))
+        return {"text": "t", "prompt_tokens": 1, "completion_tokens": 1,
+                "provider": llm_config["llm"], "model": llm_config["model"]}
+
+    monkeypatch.setattr(agent, "generate_text", fake_generate)
+    response = agent.generate_candidates(SHORT, {"llm": "openai", "model": None}, 3, task_type="task")
+    # Roteado para o Gemini: sem `n` nativo, três chamadas paralelas no mesmo modelo
+    assert calls == [("gemini", "gemini-1.5-flash", 1)] * 3
+    assert (response["provider"], response["model"]) == ("gemini", "gemini-1.5-flash")
+    assert metrics.get("model_router_decisions_total", task_type="task", mode="enforce",
+                       routed="gemini-1.5-flash", baseline="gpt-3.5-turbo-0125") == 1
@@ -0,0 +1,55 @@
+from app.models import TaskType, Epic, Feature, UserStory, Task, Bug
+from app.utils import hierarchy
+
+
+def _tree(db):
+    epic = Epic(title="E", team_project_id=7, version=1, is_active=True)
+    db.add(epic)
+    db.flush()
+    hierarchy.index_items(db, TaskType.EPIC, [epic.id])
+    feature = Feature(title="F", parent=epic.id, parent_type="epic", version=1, is_active=True)
+    db.add(feature)
+    db.flush()
+    hierarchy.index_items(db, TaskType.FEATURE, [feature.id])
+    story = UserStory(title="US", parent=feature.id, version=1, is_active=True)
+    db.add(story)
+    db.flush()
+    hierarchy.index_items(db, TaskType.USER_STORY, [story.id])
+    task = Task(title="T", parent=story.id, parent_type="user_story", version=1, is_active=True)
+    bug = Bug(title="B", user_story_id=story.id, version=1, is_active=True)
+    db.add_all([task, bug])
+    db.flush()
+    hierarchy.index_items(db, TaskType.TASK, [task.id])
+    hierarchy.index_items(db, TaskType.BUG, [bug.id])
+    return epic, feature, story, task, bug
+
+
+def test_subtree_e_ancestrais_em_uma_consulta(db):
+    epic, feature, story, task, bug = _tree(db)
+
+    subtree = hierarchy.get_subtree(db, TaskType.EPIC, epic.id)
+    assert [(n.type, n.id, n.depth) for n in subtree] == [
+        ("feature", feature.id, 1), ("user_story", story.id, 2), ("bug", bug.id, 3), ("task", task.id, 3)]
+    assert [n.id for n in hierarchy.get_subtree(db, TaskType.PROJECT, 7, max_depth=2)] == [epic.id, feature.id]
+
+    ancestors = hierarchy.get_ancestors(db, TaskType.TASK, task.id)
+    assert [(n.type, n.id, n.depth) for n in ancestors] == [
+        ("user_story", story.id, 1), ("feature", feature.id, 2), ("epic", epic.id, 3), ("project", 7, 4)]
+
+
+def test_desativacao_e_reindexacao_idempotente(db):
+    epic, feature, story, task, bug = _tree(db)
+    hierarchy.index_items(db, TaskType.TASK, [task.id])  # Reprocessamento: não duplica linhas
+    hierarchy.mark_inactive(db, TaskType.TASK, [task.id])
+
+    assert [n.id for n in hierarchy.get_subtree(db, TaskType.USER_STORY, story.id)] == [bug.id]
+    assert len(hierarchy.get_subtree(db, TaskType.USER_STORY, story.id, include_inactive=True)) == 2
+    assert hierarchy.get_ancestors(db, TaskType.BUG, bug.id)[0].is_active is True
+
+
+def test_rebuild_index_a_partir_das_tabelas(db):
+    epic, feature, story, task, bug = _tree(db)
+    before = hierarchy.get_subtree(db, TaskType.PROJECT, 7)
+    hierarchy.rebuild_index(db)
+    assert hierarchy.get_subtree(db, TaskType.PROJECT, 7) == before
+    assert hierarchy.parent_of(TaskType.BUG, bug) == story.id
@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+
+from app.models import TaskType, Action, ArtifactHistory, Feature, TestCase, UserStory
+from app.utils import hierarchy, history, metrics
+from app.workers.history_archiver import HistoryArchiver
+
+OLD = datetime(2020, 1, 1)
+
+
+def test_arquiva_versoes_inativas_filhos_antes_dos_pais(session_factory):
+    metrics.reset()
+    db = session_factory()
+    old_feature = Feature(title="F v1", parent=1, parent_type="epic", version=1, is_active=False, updated_at=OLD)
+    new_feature = Feature(title="F v2", parent=1, parent_type="epic", version=2, is_active=True)
+    db.add_all([old_feature, new_feature])
+    db.flush()
+    story = UserStory(title="US", parent=old_feature.id, version=1, is_active=False, updated_at=OLD)
+    db.add(story)
+    db.flush()
+    db.add(TestCase(title="TC", parent=story.id, version=1, is_active=False, updated_at=OLD,
+                    actions=[Action(step="s", expected_result="r", is_active=False)]))
+    db.flush()
+    hierarchy.rebuild_index(db)
+    db.commit()
+    old_id, new_id = old_feature.id, new_feature.id
+
+    moved = HistoryArchiver(session_factory, batch_size=1, min_age_hours=1).run_once()
+
+    assert moved == 3
+    assert [f.id for f in db.query(Feature)] == [new_id]
+    assert db.query(UserStory).count() == db.query(TestCase).count() == db.query(Action).count() == 0
+    archived_tc = db.query(ArtifactHistory).filter(ArtifactHistory.artifact_type == "test_case").one()
+    assert archived_tc.data["actions"][0]["step"] == "s"
+    assert hierarchy.get_subtree(db, TaskType.EPIC, 1, include_inactive=True) == [("feature", new_id, 1, True)]
+    assert metrics.get("history_archived_total", artifact_type="feature") == 1
+
+    versions = history.artifact_versions(db, TaskType.FEATURE, old_id)
+    assert [(v.id, v.version, v.is_active, v.archived) for v in versions] == [(new_id, 2, True, False), (old_id, 1, False, True)]
+    assert versions[1].data["title"] == "F v1"
+    db.close()
+
+
+def test_nao_arquiva_versoes_recentes(session_factory):
+    db = session_factory()
+    db.add(Feature(title="F", parent=1, version=1, is_active=False, updated_at=datetime.now() - timedelta(minutes=5)))
+    db.commit()
+    assert HistoryArchiver(session_factory, min_age_hours=1).run_once() == 0
+    assert history.artifact_versions(db, TaskType.FEATURE, 999) is None
+    db.close()
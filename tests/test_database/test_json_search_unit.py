@@ -0,0 +1,84 @@
+import uuid
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
+
+from app.models import Base, TaskType, Bug, Epic, Request, TestCase, UserStory
+from app.utils import json_codec, json_search
+
+PROJECT_ID = uuid.uuid4()
+
+
+@pytest.fixture()
+def db(db):
+    """Sessão do conftest com os itens de busca (índices GIN são só do PostgreSQL: ddl_if)."""
+    db.add_all([
+        Epic(title="E1", tags=["login", "seguranca"], project_id=PROJECT_ID, version=1, is_active=True),
+        Epic(title="E2", tags=["login"], project_id=PROJECT_ID, version=1, is_active=False),
+        Epic(title="Outro", tags=["login", "seguranca"], project_id=uuid.uuid4(), version=1, is_active=True),
+        Bug(title="B1", tags=["seguranca"], project_id=PROJECT_ID, version=1, is_active=True),
+        TestCase(title="T1", project_id=PROJECT_ID, version=1, is_active=True,
+                 gherkin=json_codec.dumps({"given": "usuário cadastrado", "when": "faz login", "then": "vê o painel"})),
+    ])
+    db.commit()
+    return db
+
+
+def test_busca_por_tags_todas_ou_qualquer(db):
+    assert [(h.type, h.title) for h in json_search.find_by_tags(db, PROJECT_ID, ["login", "seguranca"])] == [("epic", "E1")]
+    hits = json_search.find_by_tags(db, PROJECT_ID, ["seguranca"], match_all=False)
+    assert [(h.type, h.title) for h in hits] == [("bug", "B1"), ("epic", "E1")]
+    hits = json_search.find_by_tags(db, PROJECT_ID, ["login"], [TaskType.EPIC], include_inactive=True)
+    assert [h.title for h in hits] == ["E1", "E2"]
+
+
+def test_busca_no_gherkin(db):
+    assert [h.title for h in json_search.search_gherkin(db, PROJECT_ID, "LOGIN")] == ["T1"]
+    assert json_search.search_gherkin(db, PROJECT_ID, "login", step="given") == []
+    assert [h.title for h in json_search.search_gherkin(db, PROJECT_ID, "faz login", step="when", exact=True)] == ["T1"]
+    with pytest.raises(ValueError):
+        json_search.search_gherkin(db, PROJECT_ID, "x", exact=True)
+
+
+def test_itens_da_rota_generate_entram_nas_buscas_do_projeto(db, session_factory, monkeypatch):
+    from app.workers.processors import base
+    from app.workers.processors.creation import WorkItemCreator
+
+    monkeypatch.setattr(base, "BEST_OF_N_TASK_TYPES", set())
+    story = UserStory(title="US", project_id=PROJECT_ID, version=1, is_active=True)
+    db.add(story)
+    db.commit()
+    creator = WorkItemCreator(session_factory=session_factory, llm_agent=MagicMock())
+    creator.llm_agent.chosen_llm, creator.llm_agent.openai_model = "openai", "gpt-4o-mini"
+    generated = {
+        "bug": '[{"title": "B gerado", "reproSteps": "r", "systemInfo": "s", "tags": ["checkout"]}]',
+        "test_case": ('[{"title": "T gerado", "priority": "High", "actions": [], '
+                      '"gherkin": {"given": "carrinho cheio", "when": "paga", "then": "recibo"}}]'),
+    }
+    for task_type, text in generated.items():
+        request_id = f"req-{task_type}"
+        db.add(Request(request_id=request_id, parent=story.id, parent_type="user_story", task_type=task_type, status="pending"))
+        db.commit()
+        creator.llm_agent.generate_text.return_value = {"text": text, "prompt_tokens": 1, "completion_tokens": 1}
+        # Como na rota /generate: sem project_id na task, herdado da user story
+        creator.process(request_id_interno=request_id, task_type=task_type, parent_type_str="user_story",
+                        prompt_data={"system": "{language}", "user": "u"})
+
+    assert [h.title for h in json_search.find_by_tags(db, PROJECT_ID, ["checkout"])] == ["B gerado"]
+    assert [h.title for h in json_search.search_gherkin(db, PROJECT_ID, "carrinho")] == ["T gerado"]
+
+
+def test_sql_postgres_usa_operadores_jsonb_e_indices_gin():
+    dialect = postgresql.dialect()
+    document = json_search.gherkin_document()
+    sql = str(select(TestCase.id).where(document.contains({"when": "x"})).compile(dialect=dialect))
+    assert "CAST(test_cases.gherkin #>> '{}' AS JSONB) @>" in sql
+
+    ddl = {index.name: str(CreateIndex(index).compile(dialect=dialect))
+           for table in Base.metadata.sorted_tables for index in table.indexes
+           if index.dialect_options["postgresql"].get("using") == "gin"}
+    assert ddl["ix_epics_tags_gin"] == "CREATE INDEX ix_epics_tags_gin ON epics USING gin (tags jsonb_path_ops)"
+    assert "((gherkin #>> '{}')::jsonb) jsonb_path_ops" in ddl["ix_test_cases_gherkin_gin"]
@@ -0,0 +1,128 @@
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from app.models import Base, Request, Status
+from app.utils import metrics, request_retention
+from app.workers.request_pruner import RequestPruner
+
+
+def test_ddl_postgres_particionada_com_indice_de_cobertura():
+    ddl = str(CreateTable(Request.__table__).compile(dialect=postgresql.dialect()))
+    assert "PARTITION BY RANGE (created_at)" in ddl
+    assert "PRIMARY KEY (id, created_at)" in ddl
+    assert "UNIQUE (request_id, created_at)" in ddl
+    index = next(i for i in Request.__table__.indexes if i.name == "ix_requests_status_poll")
+    assert "INCLUDE (status, parent, task_type, created_at, processed_at, project_id)" in \
+        str(CreateIndex(index).compile(dialect=postgresql.dialect()))
+
+
+def test_create_all_no_postgres_cria_as_particoes():
+    from sqlalchemy import create_mock_engine
+
+    statements = []
+    engine = create_mock_engine("postgresql://", lambda sql, *args, **kw: statements.append(str(sql.compile(dialect=engine.dialect))))
+    Base.metadata.create_all(engine, checkfirst=False)
+    created = [s for s in statements if "PARTITION OF" in s]
+    month = request_retention.partition_name(datetime.now(timezone.utc).date())
+    assert any(f"{month} PARTITION OF requests" in s for s in created)
+    assert any("requests_default PARTITION OF requests DEFAULT" in s for s in created)
+    assert any("artifact_history_default PARTITION OF artifact_history DEFAULT" in s for s in created)
+    table = next(i for i, s in enumerate(statements) if s.lstrip().startswith("CREATE TABLE requests "))
+    assert table < statements.index(next(s for s in created if "OF requests" in s))
+
+
+def test_particao_do_mes_move_linhas_que_cairam_na_default():
+    from sqlalchemy import create_mock_engine
+
+    statements = []
+    engine = create_mock_engine("postgresql://", lambda sql, *args, **kw: statements.append(str(sql)))
+    assert request_retention.create_partitions(engine, date(2026, 3, 15), months_ahead=0) == ["requests_y2026m03"]
+    lock_timeout, default, month = statements
+    assert lock_timeout.startswith("SET LOCAL lock_timeout")
+    assert "requests_default PARTITION OF requests DEFAULT" in default
+    # Sem linhas do mês na DEFAULT: só o CREATE. Com linhas: DETACH, CREATE, cópia, DELETE e ATTACH
+    steps = [line.strip() for line in month.splitlines()]
+    start = steps.index("ALTER TABLE requests DETACH PARTITION requests_default;")
+    assert [step.split(" ")[0] for step in steps[start:start + 5]] == ["ALTER", "CREATE", "INSERT", "DELETE", "ALTER"]
+    assert steps[start + 4] == "ALTER TABLE requests ATTACH PARTITION requests_default DEFAULT;"
+    assert "created_at >= '2026-03-01' AND created_at < '2026-04-01'" in steps[start + 2]
+
+
+def test_politica_de_retencao_por_status(monkeypatch):
+    monkeypatch.setenv("REQUEST_RETENTION_DAYS_COMPLETED", "7")
+    monkeypatch.setenv("REQUEST_RETENTION_DAYS_PENDING", "none")
+    policy = request_retention.load_retention_policy()
+    assert policy == {Status.COMPLETED: 7, Status.FAILED: 90, Status.PENDING: None}
+    assert request_retention.partition_name(date(2026, 1, 1)) == "requests_y2026m01"
+    # Com um status mantido para sempre, partições inteiras nunca são removidas
+    assert request_retention.drop_expired_partitions(None, policy) == []
+
+
+def test_detach_da_particao_vencida_tem_lock_timeout(monkeypatch):
+    from unittest.mock import MagicMock
+
+    monkeypatch.setattr(request_retention, "list_partitions", lambda engine: ["requests_y2026m01", "requests_y2026m09"])
+    engine = MagicMock()
+    conn = engine.begin.return_value.__enter__.return_value
+    policy = {Status.COMPLETED: 30, Status.FAILED: 30, Status.PENDING: 30}
+    dropped = request_retention.drop_expired_partitions(engine, policy, datetime(2026, 10, 1, tzinfo=timezone.utc))
+    assert dropped == ["requests_y2026m01"]
+    statements = [str(call.args[0]) for call in conn.execute.call_args_list]
+    # O lock_timeout vem antes do DETACH, na mesma transação: sem lock, falha e tenta no próximo ciclo
+    assert statements[0] == f"SET LOCAL lock_timeout = '{request_retention.REQUEST_PARTITION_LOCK_TIMEOUT}'"
+    assert statements[1:] == ["ALTER TABLE requests DETACH PARTITION requests_y2026m01", "DROP TABLE requests_y2026m01"]
+
+
+def test_pruner_apaga_em_lotes_so_o_que_venceu(engine, session_factory, db):
+    metrics.reset()
+    now = datetime.now(timezone.utc)
+    db.add_all([
+        Request(id=1, request_id="old-done", status="completed", created_at=now - timedelta(days=40)),
+        Request(id=2, request_id="old-done-2", status="completed", created_at=now - timedelta(days=35)),
+        Request(id=3, request_id="new-done", status="completed", created_at=now - timedelta(days=1)),
+        Request(id=4, request_id="old-failed", status="failed", created_at=now - timedelta(days=40)),
+    ])
+    db.commit()
+
+    pruner = RequestPruner(session_factory, lambda: engine, policy={Status.COMPLETED: 30, Status.FAILED: 90, Status.PENDING: None},
+                           batch_size=1)
+    assert pruner.run_once() == 2
+    assert sorted(r.request_id for r in db.query(Request)) == ["new-done", "old-failed"]
+    assert metrics.get("requests_pruned_total", status="completed") == 2
+
+
+def test_falha_nas_particoes_nao_para_a_retencao(engine, session_factory, db, monkeypatch):
+    metrics.reset()
+    db.add(Request(id=1, request_id="old-done", status="completed", created_at=datetime.now(timezone.utc) - timedelta(days=40)))
+    db.commit()
+
+    def fail(*args):
+        raise RuntimeError("lock timeout")
+
+    monkeypatch.setattr(request_retention, "ensure_partitions", fail)
+    monkeypatch.setattr(request_retention, "drop_expired_partitions", fail)
+    pruner = RequestPruner(session_factory, lambda: engine, policy={Status.COMPLETED: 30, Status.FAILED: 90, Status.PENDING: 30})
+    assert pruner.run_once() == 1
+    assert metrics.get("request_partition_errors_total", step="create") == 1
+    assert metrics.get("request_partition_errors_total", step="drop") == 1
+
+
+def test_request_id_uuid7_carrega_o_created_at_e_poda_a_busca(db):
+    from app.models import REQUEST_ID_CREATED_AT_CHECK
+    from app.utils import request_ids
+
+    request_id, created_at = request_ids.new_request_id(datetime(2026, 3, 5, 12, 0, 0, 123456, tzinfo=timezone.utc))
+    assert request_ids.created_at_of(request_id) == created_at == datetime(2026, 3, 5, 12, 0, 0, 123000, tzinfo=timezone.utc)
+    assert request_ids.created_at_of("req-legado") is None
+    sql = str(request_ids.where_request_id(request_id).compile(dialect=postgresql.dialect()))
+    assert "requests.created_at =" in sql  # Chave de partição no predicado
+    ddl = str(CreateTable(Request.__table__).compile(dialect=postgresql.dialect()))
+    assert "CONSTRAINT ck_requests_request_id_created_at CHECK" in ddl and REQUEST_ID_CREATED_AT_CHECK in ddl
+
+    db.add(Request(request_id=request_id, created_at=created_at, status="pending"))
+    db.add(Request(request_id="req-legado", status="pending"))
+    db.commit()
+    assert db.query(Request.status).filter(request_ids.where_request_id(request_id)).scalar() == "pending"
+    assert db.query(Request.id).filter(request_ids.where_request_id("req-legado")).scalar() == 2
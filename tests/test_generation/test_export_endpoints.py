@@ -0,0 +1,98 @@
+import uuid
+from datetime import datetime, timedelta
+
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.models import Epic, Feature, TestCase, Action
+from app.routers import generation
+from app.utils import json_codec
+
+PROJECT_ID = uuid.uuid4()
+
+
+@pytest.fixture(autouse=True)
+def _seed(session_factory):
+    db = session_factory()
+    epic = Epic(title="E", project_id=PROJECT_ID, version=1, is_active=True)
+    db.add(epic)
+    db.flush()
+    db.add_all([
+        Feature(title="F1", parent=epic.id, project_id=PROJECT_ID, version=1, is_active=False),
+        Feature(title="F2", parent=epic.id, project_id=PROJECT_ID, version=2, is_active=True),
+        Feature(title="Outro projeto", project_id=uuid.uuid4(), version=1, is_active=True),
+        TestCase(title="T", project_id=PROJECT_ID, version=1, is_active=True,
+                 actions=[Action(step="s1", expected_result="r1", is_active=True),
+                          Action(step="s0", expected_result="r0", is_active=False)]),
+    ])
+    db.commit()
+    db.close()
+
+
+def _lines(response):
+    return [json_codec.loads(line) for line in response.text.splitlines()]
+
+
+def test_export_ndjson_somente_ativos_do_projeto(client):
+    response = client.get(f"/export/projects/{PROJECT_ID}")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = _lines(response)
+    assert [(line["type"], line["data"]["title"]) for line in lines[:-1]] == [("epic", "E"), ("feature", "F2"), ("test_case", "T")]
+    assert [a["step"] for a in lines[2]["data"]["actions"]] == ["s1"]
+    assert lines[-1]["type"] == "end" and lines[-1]["count"] == 3
+    assert lines[-1]["etag"] == response.headers["etag"]
+
+
+def test_export_etag_retorna_304_e_muda_com_alteracoes(client, session_factory):
+    etag = client.get(f"/export/projects/{PROJECT_ID}").headers["etag"]
+    assert client.get(f"/export/projects/{PROJECT_ID}", headers={"If-None-Match": etag}).status_code == 304
+
+    db = session_factory()
+    db.query(Feature).filter(Feature.title == "F2").update({"is_active": False, "updated_at": datetime.now()})
+    db.commit()
+    db.close()
+    response = client.get(f"/export/projects/{PROJECT_ID}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_export_incremental_inclui_desativados(client, session_factory):
+    since = datetime(2100, 1, 1)  # Depois da criação de todos os itens da fixture
+    db = session_factory()
+    db.query(Feature).filter(Feature.title == "F2").update({"is_active": False, "updated_at": since + timedelta(minutes=1)})
+    db.commit()
+    db.close()
+    lines = _lines(client.get(f"/export/projects/{PROJECT_ID}", params={"since": since.isoformat()}))
+    changed = [line for line in lines if line["type"] == "feature"]
+    assert [(line["data"]["title"], line["data"]["is_active"]) for line in changed] == [("F2", False)]
+
+
+def test_export_inclui_itens_criados_pela_rota_generate(client, session_factory, monkeypatch):
+    from app.workers.processors import base
+    from app.workers.processors.creation import WorkItemCreator
+
+    task = MagicMock()
+    monkeypatch.setattr(generation, "process_message_task", task)
+    monkeypatch.setattr(base, "BEST_OF_N_TASK_TYPES", set())
+    db = session_factory()
+    epic_id = db.query(Epic.id).filter(Epic.title == "E").scalar()
+    db.close()
+    body = {"parent": epic_id, "parent_type": "epic", "task_type": "feature",
+            "prompt_data": {"system": "{language}", "user": "u", "user_input": "i"}}
+    assert client.post("/generation/generate/", json=body).status_code == 201
+
+    # O que o worker Celery faria com a task enfileirada (a rota /generate não recebe project_id)
+    kwargs = task.delay.call_args.kwargs
+    creator = WorkItemCreator(session_factory=session_factory, llm_agent=MagicMock())
+    creator.llm_agent.chosen_llm, creator.llm_agent.openai_model = "openai", "gpt-4o-mini"
+    creator.llm_agent.generate_text.return_value = {
+        "text": '[{"title": "F gerada", "description": "d"}]', "prompt_tokens": 1, "completion_tokens": 1}
+    creator.process(request_id_interno=kwargs["request_id_interno"], task_type=kwargs["task_type"],
+                    prompt_data=kwargs["prompt_data"], parent_type_str=kwargs["parent_type"],
+                    llm_config=kwargs["llm_config"])
+
+    lines = _lines(client.get(f"/export/projects/{PROJECT_ID}"))
+    exported = [line["data"] for line in lines if line["type"] == "feature"]
+    assert [f["project_id"] for f in exported if f["title"] == "F gerada"] == [str(PROJECT_ID)]
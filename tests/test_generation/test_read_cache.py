@@ -0,0 +1,109 @@
+from datetime import datetime
+
+import pytest
+
+from app.models import Request
+from app.utils import cache_invalidation, json_codec, metrics, outbox, read_cache
+from app.utils.read_cache import ReadCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def _reset():
+    metrics.reset()
+    read_cache.clear_all()
+    yield
+    read_cache.clear_all()
+    metrics.reset()
+
+
+def _cache(clock, jobs):
+    return ReadCache("teste", ttl=2, stale_ttl=10, maxsize=2, clock=clock, background=jobs.append)
+
+
+def test_hit_stale_while_revalidate_e_miss():
+    clock, jobs, loads = FakeClock(), [], []
+
+    def load():
+        loads.append(clock.now)
+        return {"v": len(loads)}
+
+    cache = _cache(clock, jobs)
+    assert cache.get("a", load) == {"v": 1}  # miss
+    assert cache.get("a", load) == {"v": 1}  # hit
+    clock.now = 5
+    assert cache.get("a", load) == {"v": 1}  # stale: devolve o antigo e agenda uma recarga
+    assert cache.get("a", load) == {"v": 1}
+    assert len(jobs) == 1 and len(loads) == 1
+    jobs.pop()()
+    assert cache.get("a", load) == {"v": 2}
+    clock.now = 100
+    assert cache.get("a", load) == {"v": 3}  # além da janela stale: recarga síncrona
+
+    assert metrics.get("read_cache_requests_total", cache="teste", result="stale") == 2
+    assert cache.stats()["hit_ratio"] == pytest.approx(4 / 6)
+    assert metrics.get("read_cache_hit_ratio", cache="teste") == pytest.approx(4 / 6)
+
+
+def test_invalidacao_durante_carga_nao_grava_valor_antigo_e_lru():
+    clock, jobs = FakeClock(), []
+    cache = _cache(clock, jobs)
+
+    def slow_load():
+        cache.invalidate("a")  # Evento chega enquanto a consulta roda
+        return "antigo"
+
+    assert cache.get("a", slow_load) == "antigo"
+    assert cache.get("a", lambda: "novo") == "novo"
+    assert cache.get("nada", lambda: None) is None and cache.stats()["size"] == 1  # None não é guardado
+
+    cache.get("b", lambda: "b")
+    cache.get("c", lambda: "c")
+    assert cache.get("a", lambda: "recarregado") == "recarregado"  # "a" foi o menos usado
+    assert metrics.get("read_cache_evictions_total", cache="teste") == 2
+
+
+def test_evento_de_notificacao_invalida_status_e_artefatos():
+    read_cache.get_status("req-1", lambda: {"status": "pending"})
+    read_cache.get_artifact("bug", 3, lambda: {"id": 3, "parent_id": None})
+    cache_invalidation.handle_event(json_codec.dumps_bytes(
+        {"request_id": "req-1", "task_type": "bug", "item_ids": [3], "status": "completed"}))
+    assert read_cache.status_cache.stats()["size"] == 0
+    assert read_cache.artifact_cache.stats()["size"] == 0
+    cache_invalidation.handle_event(b"{")  # Inválido: ignorado
+    assert metrics.get("read_cache_invalid_events_total") == 1
+
+
+def test_envelope_de_lote_invalida_cada_notificacao():
+    read_cache.get_status("req-1", lambda: {"status": "pending"})
+    read_cache.get_status("req-2", lambda: {"status": "pending"})
+    cache_invalidation.handle_event(json_codec.dumps_bytes(outbox.batch_envelope(
+        [{"request_id": "req-1", "item_ids": []}, {"request_id": "req-2", "item_ids": []}])))
+    assert read_cache.status_cache.stats()["size"] == 0
+    assert metrics.get("read_cache_events_total") == 2
+
+
+def test_status_vem_do_cache_ate_o_evento_de_conclusao(client, session_factory):
+    db = session_factory()
+    db.add(Request(id=1, request_id="req-1", task_type="bug", status="pending", created_at=datetime(2026, 1, 1)))
+    db.commit()
+    db.close()
+    assert client.get("/generation/status/req-1").json()["status"] == "pending"
+
+    db = session_factory()
+    db.query(Request).filter(Request.request_id == "req-1").update({"status": "completed"})
+    db.commit()
+    db.close()
+    assert client.get("/generation/status/req-1").json()["status"] == "pending"  # Dentro do TTL
+
+    cache_invalidation.handle_event(json_codec.dumps_bytes({"request_id": "req-1", "item_ids": []}))
+    assert client.get("/generation/status/req-1").json()["status"] == "completed"
+    assert client.get("/generation/status/nao-existe").status_code == 404
+    assert metrics.get("read_cache_requests_total", cache="status", result="hit") == 1
@@ -0,0 +1,67 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.models import Request, TokenUsage
+from app.routers import generation
+from app.utils import metrics, read_cache, token_budget
+
+PROJECT = uuid.UUID("6f1c2a5e-8a43-4f0e-9a51-0c7b6d2b1e11")
+
+
+@pytest.fixture()
+def task(monkeypatch):
+    """Task Celery de criação mockada; zera métricas e cache de leitura em volta do teste."""
+    metrics.reset()
+    read_cache.clear_all()
+    task = MagicMock()
+    monkeypatch.setattr(generation, "process_independent_creation_task", task)
+    yield task
+    read_cache.clear_all()
+
+
+def _usage(db, task_type, model, prompt, completion, created_at=None):
+    token_budget.record_usage(db, str(uuid.uuid4()), PROJECT, task_type, "openai", model, prompt, completion)
+    if created_at:
+        db.flush()
+        db.query(TokenUsage).order_by(TokenUsage.id.desc()).first().created_at = created_at
+    db.commit()
+
+
+def test_relatorio_agrega_por_task_type_e_modelo(client, session_factory, task):
+    db = session_factory()
+    _usage(db, "epic", "gpt-4o", 100, 50)
+    _usage(db, "epic", "gpt-4o", 10, 5)
+    _usage(db, "feature", "gpt-4o-mini", 7, 3)
+    _usage(db, "feature", "gpt-4o-mini", 1000, 1000, created_at=datetime.now(timezone.utc) - timedelta(days=40))
+    db.close()
+
+    report = client.get(f"/usage/projects/{PROJECT}").json()  # Período corrente (mês)
+    assert [(r["task_type"], r["model"], r["requests"], r["prompt_tokens"]) for r in report["rows"]] == [
+        ("epic", "gpt-4o", 2, 110), ("feature", "gpt-4o-mini", 1, 7)]
+    assert report["total_tokens"] == 175 and report["budget"]["used"] == 175
+    assert client.get("/usage/").json()["total_tokens"] == 175 + 2000
+
+
+def test_admissao_rejeita_ou_enfileira_acima_do_orcamento(client, session_factory, task):
+    body = {"project_id": str(PROJECT), "task_type": "epic", "prompt_data": {"system": "s", "user": "u", "user_input": "i"}}
+    assert client.post("/generation/independent/", json=body).status_code == 201  # Sem orçamento
+    assert client.put(f"/usage/projects/{PROJECT}/budget", json={"token_limit": 100}).json()["used"] == 0
+
+    db = session_factory()
+    _usage(db, "epic", "gpt-4o", 80, 30)
+    db.close()
+    read_cache.invalidate_from_notification({"project_id": str(PROJECT), "status": "completed"})
+    response = client.post("/generation/independent/", json=body)
+    assert response.status_code == 429
+    db = session_factory()
+    assert db.query(Request).count() == 1  # Rejeitada antes de criar a requisição
+    db.close()
+
+    client.put(f"/usage/projects/{PROJECT}/budget", json={"token_limit": 100, "action": "queue"})
+    assert client.post("/generation/independent/", json=body).status_code == 201
+    assert task.apply_async.call_args.kwargs["queue"] == token_budget.TOKEN_BUDGET_QUEUE
+    assert task.delay.call_count == 1
+    assert client.put(f"/usage/projects/{PROJECT}/budget", json={"token_limit": 1, "period": "year"}).status_code == 400
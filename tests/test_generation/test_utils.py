@@ -0,0 +1,70 @@
+import json
+import pytest
+from app.utils import json_codec
+
+
+def test_json_codec_roundtrip_preserva_unicode():
+    data = {"title": "Integração", "tags": ["ação", "épico"], "version": 2, "parent": None}
+    encoded = json_codec.dumps(data)
+    assert isinstance(encoded, str)
+    assert json_codec.loads(encoded) == data
+    assert json_codec.loads(json_codec.dumps_bytes(data)) == data
+    assert json.loads(encoded) == data  # Compatível com a stdlib
+
+
+def test_json_codec_erro_de_decode_e_json_decode_error():
+    with pytest.raises(json.JSONDecodeError):
+        json_codec.loads('{"title": ')
+    # Parsers capturam ValueError genérico também
+    with pytest.raises(ValueError):
+        json_codec.loads("não é json")
+
+
+def test_json_codec_fallback_para_stdlib():
+    backend, dumps_bytes, loads = json_codec._select_backend("json")
+    assert backend == "json"
+    assert loads(dumps_bytes({"a": "ç"})) == {"a": "ç"}
+
+    backend, _, _ = json_codec._select_backend("inexistente")
+    assert backend in ("orjson", "msgspec", "json")
+
+
+def test_json_codec_serializer_celery_registrado():
+    from kombu.serialization import dumps, loads
+
+    json_codec.register_celery_serializer()
+    args = {"request_id_interno": "abc", "prompt_data": {"user": "Olá {user_input}"}}
+    content_type, encoding, payload = dumps(args, serializer=json_codec.CELERY_SERIALIZER_NAME)
+    assert content_type == json_codec.CELERY_CONTENT_TYPE
+    assert loads(payload, content_type, encoding) == args
+
+
+def test_rota_metrics_expoe_contadores_no_formato_prometheus():
+    pytest.importorskip("prometheus_client")
+    from fastapi.testclient import TestClient
+    from app.main import create_app
+    from app.utils import metrics
+
+    metrics.reset()
+    metrics.increment("llm_truncations_total", task_type="epic")
+    metrics.set_gauge("read_cache_hit_ratio", 0.75, cache="status")
+    response = TestClient(create_app()).get("/metrics")
+    metrics.reset()
+    assert response.status_code == 200 and response.headers["content-type"].startswith("text/plain")
+    assert 'llm_truncations_total{task_type="epic"} 1.0' in response.text
+    assert 'read_cache_hit_ratio{cache="status"} 0.75' in response.text
+
+
+def test_metrics_multiprocess_soma_os_processos(tmp_path):
+    pytest.importorskip("prometheus_client")
+    import os
+    import subprocess
+    import sys
+
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    increment = "from app.utils import metrics; metrics.increment('llm_json_repairs_total', 2, repair='fence')"
+    for _ in range(2):  # Dois "workers" separados
+        subprocess.run([sys.executable, "-c", increment], env=env, check=True)
+    exposition = subprocess.run([sys.executable, "-c", "from app.utils import metrics; print(metrics.exposition().decode())"],
+                                env=env, check=True, capture_output=True, text=True).stdout
+    assert 'llm_json_repairs_total{repair="fence"} 4.0' in exposition
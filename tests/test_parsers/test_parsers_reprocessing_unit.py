@@ -0,0 +1,38 @@
+import pytest
+from app.models import TaskType
+from app.utils import parsers_reprocessing as prp
+from app.utils.parser_registry import PARSER_SPECS, get_spec
+
+
+def test_registry_cobre_todos_os_tipos_json():
+    expected = {TaskType.EPIC, TaskType.FEATURE, TaskType.USER_STORY, TaskType.TASK, TaskType.TEST_CASE,
+                TaskType.WBS, TaskType.BUG, TaskType.ISSUE, TaskType.PBI}
+    assert set(PARSER_SPECS) == expected
+    with pytest.raises(ValueError):
+        get_spec(TaskType.AUTOMATION_SCRIPT)
+
+
+def test_parse_feature_update_formata_acceptance_criteria_e_usa_primeiro_item():
+    response = ('[{"title": "A", "description": "B", "acceptance_criteria": ["um", "dois"]},'
+                ' {"title": "ignorado", "description": "x"}]')
+    assert prp.parse_feature_update(response) == {
+        "title": "A", "description": "B", "acceptance_criteria": "- um\n- dois", "summary": None
+    }
+
+
+def test_parse_test_case_update_retorna_actions_como_dicts():
+    response = ('{"title": "T", "priority": "Low", "gherkin": {"scenario": "s"}, '
+                '"actions": [{"step": "p1", "expected_result": "r1"}]}')
+    update = prp.parse_test_case_update(response)
+    assert update["actions"] == [{"step": "p1", "expected_result": "r1"}]
+    assert update["gherkin"] == '{"scenario":"s"}'
+
+
+def test_parse_bug_update_usa_nomes_de_coluna():
+    update = prp.parse_bug_update('{"title": "T", "reproSteps": "r", "systemInfo": "s"}')
+    assert update == {"title": "T", "repro_steps": "r", "system_info": "s", "tags": []}
+
+
+def test_parse_update_lista_vazia_e_erro():
+    with pytest.raises(ValueError):
+        prp.parse_task_update("[]")
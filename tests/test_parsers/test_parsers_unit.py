@@ -0,0 +1,118 @@
+import pytest
+from app.utils import parsers, metrics
+from app.utils.json_extraction import extract_json, JSONExtractionError
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_extract_json_sem_reparos_quando_json_valido():
+    result = extract_json('[{"title": "A"}]', "feature")
+    assert result.value == [{"title": "A"}]
+    assert result.repairs == []
+
+
+def test_extract_json_remove_fences_e_texto_ao_redor():
+    text = 'Claro! Segue o resultado:\n```json\n[{"title": "A", "description": "x, ]"},]\n```\nQualquer dúvida, avise.'
+    result = extract_json(text, "feature")
+    assert result.value == [{"title": "A", "description": "x, ]"}]
+    assert result.repairs == ["markdown_fence", "trailing_commas"]
+    assert metrics.get("llm_json_repairs_total", repair="trailing_commas", task_type="feature") == 1
+
+
+def test_extract_json_repara_quebras_de_linha_e_literais_python():
+    text = 'Épico: {"title": "T", "description": "linha 1\nlinha 2", "ativo": True}'
+    result = extract_json(text, "epic")
+    assert result.value == {"title": "T", "description": "linha 1\nlinha 2", "ativo": True}
+    assert "surrounding_prose" in result.repairs
+    assert "control_characters" in result.repairs
+    assert "python_literals" in result.repairs
+
+
+def test_extract_json_falha_quando_irreparavel():
+    with pytest.raises(JSONExtractionError):
+        extract_json("Não consegui gerar o épico.", "epic")
+    with pytest.raises(ValueError):  # JSON truncado não é "completado" silenciosamente
+        extract_json('[{"title": "A"}, {"title": "B"', "feature")
+    assert metrics.get("llm_json_extraction_failures_total", task_type="epic") == 1
+
+
+def test_parse_feature_response_aceita_json_em_fence():
+    response = '```json\n[{"title": "Login", "description": "Permite login.", "acceptance_criteria": ["Aceita e-mail", "Valida senha"]}]\n```'
+    features = parsers.parse_feature_response(response, parent_id=10, prompt_tokens=5, completion_tokens=7)
+    assert len(features) == 1
+    assert features[0].parent == 10
+    assert features[0].acceptance_criteria == "- Aceita e-mail\n- Valida senha"
+
+
+def test_parse_epic_response_erro_de_json_vira_value_error():
+    with pytest.raises(ValueError, match="Épico"):
+        parsers.parse_epic_response("sem json aqui", prompt_tokens=1, completion_tokens=1)
+
+
+def test_parse_test_case_response_lista_ou_objeto_unico():
+    test_case = ('{"title": "Login", "priority": "High", "gherkin": {"scenario": "s", "given": "g", "when": "w", "then": "t"}, '
+                 '"actions": [{"step": "Abrir", "expected_result": "Abre"}]}')
+    for response in (test_case, f"[{test_case}, {test_case}]"):
+        items = parsers.parse_test_case_response(response, parent_id=3, prompt_tokens=1, completion_tokens=1)
+        assert all(item.parent == 3 and item.actions[0].step == "Abrir" for item in items)
+    assert len(items) == 2
+    assert items[0].gherkin == '{"scenario":"s","given":"g","when":"w","then":"t"}'
+
+
+def test_parse_bug_response_mapeia_campos_e_wrapper():
+    response = '[{"bug": {"title": "Falha", "reproSteps": "1. Abrir", "systemInfo": "Chrome", "tags": ["ui"]}}]'
+    bugs = parsers.parse_bug_response(response, issue_id=5, user_story_id=9, prompt_tokens=1, completion_tokens=2)
+    assert bugs[0].repro_steps == "1. Abrir"
+    assert bugs[0].system_info == "Chrome"
+    assert (bugs[0].issue_id, bugs[0].user_story_id) == (5, 9)
+
+
+def test_parse_epic_response_rejeita_lista():
+    with pytest.raises(ValueError):
+        parsers.parse_epic_response('[{"title": "T", "description": "D", "reflection": {}}]', 1, 1)
+
+
+def test_chunking_divide_com_sobreposicao_e_funde_sem_duplicatas():
+    from app.models import TaskType
+    from app.utils import chunking
+
+    lines = [f"Funcionalidade {i}: o sistema deve permitir a operação {i}." for i in range(120)]
+    chunks = chunking.split_text("\n".join(lines), max_tokens=200, overlap_tokens=40)
+    assert len(chunks) > 1
+    assert all(chunking.estimate_tokens(chunk) <= 201 for chunk in chunks)
+    assert all(line in "".join(chunks) for line in lines)
+    assert chunks[0].splitlines()[-1] in chunks[1].splitlines()  # Sobreposição na fronteira
+    assert chunking.split_text("curto", 200, 40) == ["curto"]
+
+    items = chunking.merge_items(TaskType.FEATURE, [
+        '[{"title": "Login", "description": "d"}, {"title": "Relatórios", "description": "r"}]',
+        '[{"title": "login ", "description": "descrição mais completa"}, {"title": "Exportar", "description": "e"}]',
+    ])
+    assert [(item.title, item.description) for item in items] == [
+        ("login ", "descrição mais completa"), ("Relatórios", "r"), ("Exportar", "e")]
+    assert not chunking.is_chunkable(TaskType.EPIC) and chunking.is_chunkable(TaskType.FEATURE)
+
+
+def test_structured_output_schemas_por_task_type():
+    from app.models import TaskType
+    from app.utils import structured_output
+    from app.utils.parser_registry import get_spec
+
+    feature = structured_output.for_task_type(TaskType.FEATURE)
+    assert feature.strict
+    assert feature.schema["required"] == ["items"] and feature.schema["additionalProperties"] is False
+    assert feature.openai_response_format["json_schema"]["strict"] is True
+    assert "$ref" not in str(feature.gemini_schema) and "title" not in feature.gemini_schema["properties"]["items"]["items"]
+    epic = structured_output.for_task_type(TaskType.EPIC)  # reflection é Dict livre
+    assert not epic.strict and epic.gemini_schema is None
+    assert structured_output.for_task_type(TaskType.AUTOMATION_SCRIPT) is None
+
+    items = get_spec(TaskType.FEATURE).validate('{"items": [{"title": "A", "description": "a"}, {"title": "B", "description": "b"}]}', structured=True)
+    assert [item.title for item in items] == ["A", "B"]
+    with pytest.raises(ValueError):
+        get_spec(TaskType.FEATURE).validate('Segue: {"items": []}', structured=True)  # Sem extração tolerante
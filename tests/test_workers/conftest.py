@@ -0,0 +1,37 @@
+import pytest
+from unittest.mock import MagicMock
+
+
+@pytest.fixture()
+def creator():
+    """WorkItemCreator sem conexões reais (DB e LLM mockados), dentro de um contexto de requisição."""
+    from app.workers.processors.creation import WorkItemCreator
+
+    instance = WorkItemCreator(session_factory=MagicMock, llm_agent=MagicMock())
+    instance.llm_agent.chosen_llm = "openai"
+    instance.parent_model_map = {}
+    with instance.task_context(MagicMock()):
+        yield instance
+
+
+@pytest.fixture()
+def sqlite_creator(engine, session_factory):
+    """
+    WorkItemCreator com banco SQLite em memória e LLM mockada; `creator.db` é a sessão de verificação.
+    Retorna (creator, statements): `statements` acumula o SQL executado (um item por round trip).
+    """
+    from sqlalchemy import event
+    from app.workers.processors.base import PARENT_MODEL_MAP
+    from app.workers.processors.creation import WorkItemCreator
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+
+    instance = WorkItemCreator(session_factory=session_factory, llm_agent=MagicMock())
+    instance.llm_agent.chosen_llm = "openai"
+    instance.llm_agent.openai_model = "gpt-4o-mini"
+    instance.parent_model_map = PARENT_MODEL_MAP
+    db = session_factory()  # Sessão de preparação/verificação; process() abre a sua
+    with instance.task_context(db):
+        yield instance, statements
+    db.close()
@@ -0,0 +1,30 @@
+from app import celery as celery_module
+from app.celery import build_celery_settings, celery_app, resolve_backend_url
+from app.workers import signatures
+
+
+def test_modo_sem_backend_forca_ignore_result(monkeypatch):
+    monkeypatch.setenv("CELERY_TASK_IGNORE_RESULT", "false")
+    assert resolve_backend_url("disabled") is None
+    settings = build_celery_settings(None)
+    assert settings["task_ignore_result"] is True
+    assert settings["task_track_started"] is False
+
+
+def test_tuning_do_worker_vem_do_ambiente(monkeypatch):
+    monkeypatch.setenv("CELERY_WORKER_PREFETCH_MULTIPLIER", "4")
+    monkeypatch.setenv("CELERY_TASK_ACKS_LATE", "false")
+    monkeypatch.setenv("CELERY_VISIBILITY_TIMEOUT", "7200")
+    monkeypatch.setenv("CELERY_WORKER_MAX_TASKS_PER_CHILD", "20")
+    settings = build_celery_settings("redis://localhost:6379/1")
+    assert settings["worker_prefetch_multiplier"] == 4
+    assert settings["task_acks_late"] is False and settings["task_reject_on_worker_lost"] is False
+    assert settings["broker_transport_options"] == {"visibility_timeout": 7200}
+    assert settings["worker_max_tasks_per_child"] == 20
+
+
+def test_app_compartilhado_e_assinaturas_ignoram_resultado():
+    import app.workers.consumer  # noqa: F401  registra as tasks no app compartilhado
+    assert signatures.PROCESS_DEMAND_TASK in celery_app.tasks
+    assert celery_module.celery_app.conf.task_ignore_result is True
+    assert signatures.process_message_task.options["ignore_result"] is True
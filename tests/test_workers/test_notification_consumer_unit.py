@@ -0,0 +1,130 @@
+import queue
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+from app.utils import json_codec, metrics
+
+rabbitmq = pytest.importorskip("app.utils.rabbitmq")
+from app.workers.notification_consumer import log_notification, make_callback  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+class FakeConnection:
+    """Callbacks "threadsafe" enfileirados e executados pelo teste, como a thread da conexão faria."""
+
+    def __init__(self):
+        self.channel_mock = MagicMock()
+        self.callbacks = queue.Queue()
+        self.is_open = True
+
+    def channel(self):
+        return self.channel_mock
+
+    def add_callback_threadsafe(self, callback):
+        self.callbacks.put(callback)
+
+    def close(self):
+        self.is_open = False
+
+    def run_callbacks(self, count):
+        for _ in range(count):
+            self.callbacks.get(timeout=5)()
+
+
+def test_ack_tracker_so_confirma_a_sequencia_concluida():
+    tracker = rabbitmq.AckTracker()
+    for tag in (1, 2, 3, 4):
+        tracker.add(tag)
+    tracker.complete(2)
+    assert tracker.take() == (None, 0)  # 1 ainda em processamento
+    tracker.complete(1)
+    tracker.complete(4)
+    assert tracker.take() == (2, 2)
+    tracker.complete(3)
+    assert tracker.take() == (4, 2) and tracker.in_flight == 0
+
+
+def test_consumidor_confirma_em_lote_e_desvia_mensagem_envenenada():
+    connection = FakeConnection()
+    consumer = rabbitmq.RabbitMQConsumer(
+        make_callback(log_notification), queue="notificacoes", prefetch=10, workers=4, ack_batch=3,
+        max_retries=1, connection_factory=lambda: connection,
+    )
+    channel = connection.channel_mock
+    channel.basic_qos.assert_called_once_with(prefetch_count=10)
+    consumer.executor = rabbitmq.ThreadPoolExecutor(max_workers=4)
+
+    def deliver(tag, body, headers=None):
+        consumer._on_message(channel, SimpleNamespace(delivery_tag=tag), SimpleNamespace(headers=headers), body)
+
+    for tag in range(1, 6):
+        deliver(tag, json_codec.dumps_bytes({"request_id": f"req-{tag}", "status": "completed"}))
+    deliver(6, b'{"status": "failed"}')  # Sem request_id: inválida
+    connection.run_callbacks(6)
+    consumer._flush_acks()  # O que o timer faria com o lote parcial
+    deliver(7, b'{"status": "failed"}', headers={rabbitmq.RETRY_COUNT_HEADER: 1})  # Já retentada uma vez
+    connection.run_callbacks(1)
+    consumer._flush_acks()
+    consumer.executor.shutdown()
+
+    acks = [c.kwargs for c in channel.basic_ack.call_args_list]
+    assert all(ack["multiple"] for ack in acks) and acks[-1]["delivery_tag"] == 7
+    assert len(acks) < 7  # Um ack por lote, não por mensagem
+    channel.basic_nack.assert_not_called()
+    retried, dead = [c.kwargs for c in channel.basic_publish.call_args_list]
+    assert retried["routing_key"] == "notificacoes.retry"
+    assert retried["properties"].headers == {rabbitmq.RETRY_COUNT_HEADER: 1}
+    assert (dead["exchange"], dead["routing_key"]) == ("notificacoes.dlx", "notificacoes")
+    assert dead["properties"].headers[rabbitmq.RETRY_COUNT_HEADER] == 2
+    assert dead["properties"].headers[rabbitmq.LAST_ERROR_HEADER].startswith("ValueError")
+    assert metrics.get("notifications_consumed_total", status="completed") == 5
+    assert metrics.get("rabbitmq_consumer_messages_total", queue="notificacoes", outcome="dead_lettered") == 1
+
+
+def test_falha_ao_publicar_retry_reabre_o_canal_sem_ack():
+    connection = FakeConnection()
+    channels = []
+
+    def new_channel():
+        channels.append(MagicMock())
+        return channels[-1]
+
+    connection.channel = new_channel
+    consumer = rabbitmq.RabbitMQConsumer(
+        make_callback(log_notification), queue="notificacoes", prefetch=10, workers=2, ack_batch=5,
+        max_retries=3, connection_factory=lambda: connection,
+    )
+    old = channels[0]
+    old.basic_publish.side_effect = rabbitmq.pika.exceptions.ChannelClosedByBroker(404, "NOT_FOUND")
+    old.is_open = False  # Fechado pelo broker junto com a falha
+    consumer.executor = rabbitmq.ThreadPoolExecutor(max_workers=2)
+
+    def deliver(channel, tag, body):
+        consumer._on_message(channel, SimpleNamespace(delivery_tag=tag), SimpleNamespace(headers=None), body)
+
+    deliver(old, 1, b'{"status": "failed"}')  # Inválida: vai para o retry, cuja publicação falha
+    deliver(old, 2, json_codec.dumps_bytes({"request_id": "req-2", "status": "completed"}))
+    connection.run_callbacks(2)  # A falha não sobe para start_consuming (antes, o serviço encerrava)
+    assert len(channels) == 2 and consumer.channel is channels[1]
+    new = channels[1]
+    new.basic_consume.assert_called_once_with(queue="notificacoes", on_message_callback=consumer._on_message)
+    new.confirm_delivery.assert_called_once_with()
+
+    # O broker reentrega as duas no canal novo; a tag 2 do canal antigo nunca é confirmada nele
+    deliver(new, 1, json_codec.dumps_bytes({"request_id": "req-1", "status": "completed"}))
+    deliver(new, 2, json_codec.dumps_bytes({"request_id": "req-2", "status": "completed"}))
+    connection.run_callbacks(2)
+    consumer._flush_acks()
+    consumer.executor.shutdown()
+
+    old.basic_ack.assert_not_called()  # A mensagem que falhou continua sem ack
+    new.basic_ack.assert_called_once_with(delivery_tag=2, multiple=True)
+    assert metrics.get("rabbitmq_consumer_messages_total", queue="notificacoes", outcome="reroute_failed") == 1
+    assert metrics.get("rabbitmq_consumer_channel_reopens_total", queue="notificacoes") == 1
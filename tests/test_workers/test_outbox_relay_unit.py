@@ -0,0 +1,94 @@
+import pytest
+from unittest.mock import MagicMock
+from app.models import OutboxMessage
+from app.utils import metrics, outbox
+from app.workers.outbox_relay import OutboxRelay
+
+
+@pytest.fixture()
+def session_factory(session_factory):
+    db = session_factory()
+    for i in range(3):
+        outbox.enqueue_notification(db, {"request_id": f"req-{i}", "status": "completed"})
+    db.commit()
+    db.close()
+    metrics.reset()
+    yield session_factory
+    metrics.reset()
+
+
+def _pending(factory):
+    db = factory()
+    try:
+        return [m.request_id for m in db.query(OutboxMessage).filter(OutboxMessage.published_at.is_(None)).order_by(OutboxMessage.id)]
+    finally:
+        db.close()
+
+
+def test_relay_publica_lote_e_marca_como_publicado(session_factory):
+    producer = MagicMock()
+    relay = OutboxRelay(session_factory, lambda: producer, batch_size=2)
+    assert relay.relay_batch() == 2
+    assert [c.args[0]["request_id"] for c in producer.publish.call_args_list] == ["req-0", "req-1"]
+    assert _pending(session_factory) == ["req-2"]
+    assert relay.relay_batch() == 1
+    assert relay.relay_batch() == 0
+    assert metrics.get("outbox_published_total", queue="notification_queue") == 3
+
+
+def test_relay_mantem_pendente_quando_broker_rejeita(session_factory):
+    producer = MagicMock()
+    producer.publish.side_effect = [None, RuntimeError("nack")]
+    relay = OutboxRelay(session_factory, lambda: producer, batch_size=10)
+    assert relay.relay_batch() == 1
+    assert _pending(session_factory) == ["req-1", "req-2"]
+    producer.close.assert_called_once()  # Conexão descartada após a falha
+    db = session_factory()
+    failed = db.query(OutboxMessage).filter(OutboxMessage.request_id == "req-1").one()
+    assert failed.attempts == 1 and "nack" in failed.last_error
+    db.close()
+
+
+def test_relay_falha_no_evento_de_invalidacao_nao_bloqueia(session_factory):
+    producer = MagicMock()
+    producer.publish_event.side_effect = RuntimeError("exchange indisponível")
+    relay = OutboxRelay(session_factory, lambda: producer, batch_size=10)
+    assert relay.relay_batch() == 3
+    assert producer.publish_event.call_count == 3
+    assert metrics.get("outbox_event_publish_failures_total") == 3
+
+
+def test_relay_em_modo_de_lote_publica_um_envelope_por_janela(session_factory):
+    producer = MagicMock()
+    relay = OutboxRelay(session_factory, lambda: producer, publish_mode="batch", batch_max=10, batch_window=60)
+    assert relay.relay_batch() == 0  # Janela aberta e envelope incompleto: aguarda
+    assert _pending(session_factory) == ["req-0", "req-1", "req-2"]
+    relay._window_started -= 60  # Janela vencida
+    assert relay.relay_batch() == 3
+    (envelope, queue), = [c.args for c in producer.publish.call_args_list]
+    assert queue == outbox.NOTIFICATION_BATCH_QUEUE
+    assert envelope["type"] == "notification_batch" and envelope["count"] == 3
+    assert [n["request_id"] for n in envelope["notifications"]] == ["req-0", "req-1", "req-2"]
+    producer.publish_event.assert_called_once_with(envelope)
+    assert _pending(session_factory) == []
+    assert metrics.get("outbox_broker_publishes_total", queue=outbox.NOTIFICATION_BATCH_QUEUE) == 1
+
+
+def test_relay_em_modo_both_mantem_entrega_individual(session_factory):
+    producer = MagicMock()
+    relay = OutboxRelay(session_factory, lambda: producer, publish_mode="both", batch_max=2, batch_window=60)
+    assert relay.relay_batch() == 3  # Envelope cheio não espera a janela
+    queues = [c.args[1] for c in producer.publish.call_args_list]
+    assert queues.count(outbox.NOTIFICATION_BATCH_QUEUE) == 2 and queues.count("notification_queue") == 3
+    assert producer.publish_event.call_count == 2  # Um evento por envelope
+
+
+def test_relay_falha_no_envelope_mantem_lote_pendente(session_factory):
+    producer = MagicMock()
+    producer.publish.side_effect = RuntimeError("nack")
+    relay = OutboxRelay(session_factory, lambda: producer, publish_mode="batch", batch_max=3)
+    assert relay.relay_batch() == 0
+    assert _pending(session_factory) == ["req-0", "req-1", "req-2"]
+    producer.close.assert_called_once()
+    with pytest.raises(ValueError):
+        OutboxRelay(session_factory, lambda: producer, publish_mode="lote")
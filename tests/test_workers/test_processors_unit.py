@@ -0,0 +1,303 @@
+import uuid
+
+import pytest
+from unittest.mock import MagicMock
+from app.models import TaskType
+from app.utils import json_codec, metrics
+from app.utils.json_extraction import JSONExtractionError
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_extract_or_fix_json_reparo_local_nao_chama_llm(creator):
+    text, prompt_tokens, completion_tokens = creator._extract_or_fix_json(
+        TaskType.FEATURE, 'Resultado:\n```json\n[{"title": "A", "description": "B"}]\n```', {"llm": "openai"}
+    )
+    assert text == '[{"title": "A", "description": "B"}]'
+    assert (prompt_tokens, completion_tokens) == (0, 0)
+    creator.llm_agent.generate_text.assert_not_called()
+
+
+def test_extract_or_fix_json_chama_correcao_quando_irreparavel(creator):
+    creator.llm_agent.generate_text.return_value = {
+        "text": '[{"title": "A", "description": "B"}]', "prompt_tokens": 40, "completion_tokens": 12
+    }
+    text, prompt_tokens, completion_tokens = creator._extract_or_fix_json(
+        TaskType.FEATURE, "[{title: A, description: B}]", {"llm": "openai", "temperature": 0.7, "max_tokens": 500}
+    )
+    assert text == '[{"title": "A", "description": "B"}]'
+    assert (prompt_tokens, completion_tokens) == (40, 12)
+
+    fix_prompt, fix_config = creator.llm_agent.generate_text.call_args.args
+    assert fix_prompt["user"] == "[{title: A, description: B}]"
+    assert fix_config["temperature"] == 0.0
+    assert fix_config["max_tokens"] == 500
+    assert metrics.get("llm_json_fix_calls_total", task_type="feature") == 1
+
+
+def test_extract_or_fix_json_falha_se_correcao_tambem_invalida(creator):
+    creator.llm_agent.generate_text.return_value = {"text": "desculpe", "prompt_tokens": 1, "completion_tokens": 1}
+    with pytest.raises(JSONExtractionError):
+        creator._extract_or_fix_json(TaskType.EPIC, "{title: x", None)
+    assert metrics.get("llm_json_fix_failures_total", task_type="epic") == 1
+
+
+
+
+def _run_creation(creator, statements, task_type, llm_text, parent=None, parent_type=None, request_id=None):
+    from app.models import Request
+
+    request_id = request_id or f"req-{task_type}"
+    creator.db.add(Request(request_id=request_id, parent=parent, parent_type=parent_type, task_type=task_type, status="pending"))
+    creator.db.commit()
+    creator.llm_agent.generate_text.return_value = {"text": llm_text, "prompt_tokens": 10, "completion_tokens": 20}
+    statements.clear()
+    creator.process(request_id_interno=request_id, task_type=task_type, parent_type_str=parent_type,
+                    prompt_data={"system": "{language}", "user": "u"})
+    db = creator.db
+    executed = list(statements)  # Antes das consultas de verificação abaixo
+    return db.query(Request).filter(Request.request_id == request_id).one(), executed
+
+
+# Um item por tabela: no PostgreSQL o flush agrupa N linhas num único INSERT ... RETURNING
+# (insertmanyvalues), mas o SQLite não suporta o agrupamento ordenado e emitiria um INSERT por linha.
+FEATURES = '[{"title": "F1", "description": "d"}]'
+TEST_CASES = ('[{"title": "T", "priority": "High", "gherkin": {"given": "g"}, '
+              '"actions": [{"step": "s1", "expected_result": "r1"}]}]')
+
+
+def test_criacao_de_epico_em_uma_transacao(sqlite_creator):
+    from app.models import TokenUsage
+
+    creator, statements = sqlite_creator
+    request, executed = _run_creation(creator, statements, "epic", '{"title": "E", "description": "d", "reflection": {}}')
+    assert request.status == "completed"
+    usage = creator.db.query(TokenUsage).one()
+    assert (usage.request_id, usage.model, usage.prompt_tokens, usage.completion_tokens) == ("req-epic", "gpt-4o-mini", 10, 20)
+    # SELECT request, INSERT epic RETURNING, INSERT índice de hierarquia, INSERT ledger de tokens,
+    # UPDATE requests, INSERT outbox
+    assert len(executed) == 6
+    assert not any("FOR UPDATE" in stmt for stmt in executed)
+
+
+def test_cache_semantico_so_grava_apos_o_commit(sqlite_creator, monkeypatch):
+    from app.workers.processors import base
+
+    creator, statements = sqlite_creator
+    cache = MagicMock(enabled=True)
+    cache.lookup.return_value = None
+    monkeypatch.setattr(base, "semantic_cache", cache)
+    monkeypatch.setattr(base, "BEST_OF_N_TASK_TYPES", set())
+    epic = '{"title": "E", "description": "d", "reflection": {}}'
+
+    # Falha no ledger: a requisição termina FAILED e nada vai para o cache
+    monkeypatch.setattr(base.token_budget, "record_usage", MagicMock(side_effect=RuntimeError("ledger")))
+    request, _ = _run_creation(creator, statements, "epic", epic, request_id="req-falha")
+    assert request.status == "failed"
+    cache.store.assert_not_called()
+
+    monkeypatch.undo()
+    monkeypatch.setattr(base, "semantic_cache", cache)
+    monkeypatch.setattr(base, "BEST_OF_N_TASK_TYPES", set())
+    cache.store.side_effect = RuntimeError("cache")  # Falha no cache após o commit só é logada
+    request, _ = _run_creation(creator, statements, "epic", epic, request_id="req-ok")
+    assert request.status == "completed"
+    assert cache.store.call_args.args[-1] == "req-ok"
+
+
+def test_criacao_de_features_e_reversionamento_em_uma_transacao(sqlite_creator):
+    from app.models import Epic, Feature, OutboxMessage
+
+    creator, statements = sqlite_creator
+    project_id = uuid.uuid4()
+    creator.db.add(Epic(title="E", project_id=project_id, version=1, is_active=True))
+    creator.db.commit()
+    epic_id = creator.db.query(Epic.id).scalar()
+
+    _, executed = _run_creation(creator, statements, "feature", FEATURES, parent=epic_id, parent_type="epic", request_id="req-1")
+    # SELECT request, EXISTS pai, SELECT projeto do pai, UPDATE ... RETURNING (desativação),
+    # um INSERT ... RETURNING, INSERT ... SELECT no índice de hierarquia, INSERT no ledger de tokens,
+    # UPDATE requests, INSERT outbox
+    assert len(executed) == 9
+    assert any("EXISTS" in stmt for stmt in executed)
+    assert not any("count(" in stmt.lower() for stmt in executed)
+    assert sum(stmt.startswith("INSERT INTO features") for stmt in executed) == 1
+    assert creator.db.query(Feature.project_id).scalar() == project_id  # Herdado do épico (rota /generate)
+
+    # Segunda geração: + UPDATE do índice (desativados), itens anteriores desativados e versão incrementada
+    _, executed = _run_creation(creator, statements, "feature", FEATURES, parent=epic_id, parent_type="epic", request_id="req-2")
+    assert len(executed) == 10
+    assert sorted((f.version, f.is_active) for f in creator.db.query(Feature)) == [(1, False), (2, True)]
+    latest = creator.db.query(OutboxMessage).filter(OutboxMessage.request_id == "req-2").one()
+    assert latest.payload["version"] == 2
+
+
+def test_criacao_de_casos_de_teste_desativa_acoes_em_lote(sqlite_creator):
+    from app.models import Action, UserStory
+
+    creator, statements = sqlite_creator
+    creator.db.add(UserStory(title="US", version=1, is_active=True))
+    creator.db.commit()
+    story_id = creator.db.query(UserStory.id).scalar()
+
+    _, executed = _run_creation(creator, statements, "test_case", TEST_CASES, parent=story_id, parent_type="user_story", request_id="req-1")
+    # SELECT request, EXISTS pai, SELECT projeto do pai, UPDATE test_cases RETURNING, INSERT test_cases,
+    # INSERT actions, INSERT índice de hierarquia, INSERT no ledger de tokens, UPDATE requests, INSERT outbox
+    assert len(executed) == 10
+
+    _, executed = _run_creation(creator, statements, "test_case", TEST_CASES, parent=story_id, parent_type="user_story", request_id="req-2")
+    # + UPDATE actions (um único statement para todas as ações dos casos desativados) + UPDATE do índice
+    assert len(executed) == 12
+    assert sorted(a.is_active for a in creator.db.query(Action)) == [False, True]
+
+
+def test_best_of_n_escolhe_o_melhor_candidato_valido(creator):
+    creator.llm_agent.generate_candidates.return_value = {
+        "texts": [
+            '{"title": "E"}',  # Sem description/reflection: inválido no schema
+            '{"title": "E", "description": "d", "reflection": {}}',
+            '```json\n{"title": "E", "description": "completa", "tags": ["a"], "reflection": {"q": "r"}, "summary": "s"}\n```',
+        ],
+        "prompt_tokens": 30, "completion_tokens": 90,
+    }
+    text, prompt_tokens, completion_tokens = creator._generate_best_of_n(TaskType.EPIC, {"user": "u"}, None, 3)
+    assert '"summary": "s"' in text and not text.startswith("```")
+    assert (prompt_tokens, completion_tokens) == (30, 90)
+    assert creator.llm_agent.generate_candidates.call_args.args[2] == 3
+    assert metrics.get("llm_best_of_n_candidates_total", task_type="epic", outcome="invalid") == 1
+    creator.llm_agent.generate_text.assert_not_called()
+
+
+def test_best_of_n_sem_candidato_valido_corrige_o_primeiro(creator):
+    creator.llm_agent.generate_candidates.return_value = {
+        "texts": ["[{title: A, description: B}]", "desculpe"], "prompt_tokens": 10, "completion_tokens": 20,
+    }
+    creator.llm_agent.generate_text.return_value = {
+        "text": '[{"title": "A", "description": "B"}]', "prompt_tokens": 4, "completion_tokens": 2
+    }
+    text, prompt_tokens, completion_tokens = creator._generate_best_of_n(TaskType.FEATURE, {"user": "u"}, None, 2)
+    assert text == '[{"title": "A", "description": "B"}]'
+    assert (prompt_tokens, completion_tokens) == (14, 22)
+    assert metrics.get("llm_best_of_n_no_valid_total", task_type="feature") == 1
+
+
+def test_best_of_n_configuracao(creator, monkeypatch):
+    from app.workers.processors import base
+    monkeypatch.setattr(base, "BEST_OF_N_TASK_TYPES", {"wbs"})
+    assert creator._best_of_n(TaskType.WBS, None) == base.BEST_OF_N
+    assert creator._best_of_n(TaskType.FEATURE, {"best_of_n": None}) == 1
+    assert creator._best_of_n(TaskType.FEATURE, {"best_of_n": 9}) == base.BEST_OF_N_MAX
+    assert creator._best_of_n(TaskType.AUTOMATION_SCRIPT, {"best_of_n": 3}) == 1
+
+
+def test_transcricao_longa_gera_por_chunks_em_paralelo(creator, monkeypatch):
+    from app.workers.processors import base
+    monkeypatch.setattr(base, "CHUNK_THRESHOLD_TOKENS", 100)
+    monkeypatch.setattr(base, "CHUNK_MAX_TOKENS", 100)
+    monkeypatch.setattr(base, "CHUNK_OVERLAP_TOKENS", 10)
+    monkeypatch.setattr(base, "BEST_OF_N_TASK_TYPES", set())
+
+    def fake_generate(prompt_data, llm_config=None, **kwargs):
+        part = prompt_data["user"].split("]")[0]  # "[Parte i de N"
+        return {"text": f'[{{"title": "Comum", "description": "c"}}, {{"title": "{part}", "description": "d"}}]',
+                "prompt_tokens": 3, "completion_tokens": 5}
+
+    creator.llm_agent.generate_text.side_effect = fake_generate
+    progress = []
+    creator.context.progress_callback = lambda done, total: progress.append((done, total))
+    prompt = {"system": "{language}", "user": "{user_input}", "user_input": "\n".join(["requisito " * 8] * 40)}
+    assert creator._should_chunk(TaskType.FEATURE, prompt)
+    assert not creator._should_chunk(TaskType.EPIC, prompt)
+
+    text, prompt_tokens, completion_tokens = creator._generate_chunked("req", TaskType.FEATURE, prompt, None, "português", None)
+    total = progress[-1][1]
+    titles = [item["title"] for item in json_codec.loads(text)]
+    assert titles[0] == "Comum" and len(titles) == total + 1  # "Comum" deduplicado
+    assert progress == [(i, total) for i in range(1, total + 1)]
+    assert (prompt_tokens, completion_tokens) == (3 * total, 5 * total)
+    assert metrics.get("llm_chunks_total", task_type="feature") == total
+
+
+def test_resposta_truncada_e_continuada_e_costurada(creator, monkeypatch):
+    from app.workers.processors import base
+    monkeypatch.setattr(base, "BEST_OF_N_TASK_TYPES", set())
+    creator.llm_agent.generate_text.side_effect = [
+        {"text": '[{"title": "A", "descri', "prompt_tokens": 10, "completion_tokens": 100, "finish_reason": "length"},
+        {"text": 'ption": "B"}]', "prompt_tokens": 30, "completion_tokens": 5, "finish_reason": "stop"},
+    ]
+    text, prompt_tokens, completion_tokens = creator._generate(TaskType.FEATURE, {"system": "s", "user": "u"}, None)
+    assert text == '[{"title": "A", "description": "B"}]'
+    assert (prompt_tokens, completion_tokens) == (40, 105)
+    continuation_prompt = creator.llm_agent.generate_text.call_args_list[1].args[0]
+    assert continuation_prompt["user"].startswith("u") and continuation_prompt["user"].endswith('"descri')
+    assert metrics.get("llm_truncations_total", task_type="feature") == 1
+    assert metrics.get("llm_continuations_total", task_type="feature") == 1
+
+
+def test_truncamento_persistente_respeita_limite_de_continuacoes(creator, monkeypatch):
+    from app.workers.processors import base
+    monkeypatch.setattr(base, "LLM_MAX_CONTINUATIONS", 1)
+    creator.llm_agent.generate_text.return_value = {
+        "text": "x", "prompt_tokens": 1, "completion_tokens": 1, "finish_reason": "length"}
+    creator._generate_text_complete(TaskType.EPIC, {"user": "u"}, None)
+    assert creator.llm_agent.generate_text.call_count == 2
+    assert metrics.get("llm_truncations_unresolved_total", task_type="epic") == 1
+
+
+def test_saida_estruturada_valida_dispensa_reparo(creator, monkeypatch):
+    from app.workers.processors import base
+    monkeypatch.setattr(base, "BEST_OF_N_TASK_TYPES", set())
+    creator.llm_agent.generate_text.return_value = {
+        "text": '{"items": [{"title": "A", "description": "B"}]}', "prompt_tokens": 3, "completion_tokens": 4,
+        "finish_reason": "stop", "structured": True}
+    monkeypatch.setattr(creator, "_extract_or_fix_json", MagicMock(side_effect=AssertionError("não deveria reparar")))
+    text, prompt_tokens, completion_tokens = creator._generate(TaskType.FEATURE, {"system": "s", "user": "u"}, None)
+    assert json_codec.loads(text) == {"items": [{"title": "A", "description": "B"}]}
+    assert creator.llm_agent.generate_text.call_args.kwargs["structured"].name == "feature_response"
+    assert metrics.get("llm_output_parse_total", task_type="feature", mode="structured", outcome="ok") == 1
+
+
+def test_processador_compartilhado_isola_o_contexto_de_cada_requisicao(creator):
+    import threading
+
+    barrier = threading.Barrier(2)
+
+    def fake_generate(prompt_data, llm_config=None, **kwargs):
+        barrier.wait(timeout=5)  # As duas requisições ficam em andamento ao mesmo tempo
+        return {"text": "x", "prompt_tokens": 1, "completion_tokens": 1, "provider": llm_config["llm"], "model": llm_config["model"]}
+
+    creator.llm_agent.generate_text.side_effect = fake_generate
+    results = {}
+
+    def run(name, config):
+        db = MagicMock(name=name)
+        with creator.task_context(db, config):
+            creator._generate_text_complete(TaskType.AUTOMATION_SCRIPT, {"user": "u"}, config)
+            results[name] = (creator.db is db, creator._llm_model())
+
+    threads = [threading.Thread(target=run, args=("a", {"llm": "openai", "model": "gpt-4o"})),
+               threading.Thread(target=run, args=("b", {"llm": "gemini", "model": "gemini-1.5-pro"}))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {"a": (True, ("openai", "gpt-4o")), "b": (True, ("gemini", "gemini-1.5-pro"))}
+    assert creator.llm_agent.chosen_llm == "openai"  # O agente compartilhado não é alterado
+
+    outside = []
+
+    def outside_request():  # Thread nova: sem TaskContext
+        try:
+            creator.db
+        except RuntimeError:
+            outside.append("sem sessão")
+
+    thread = threading.Thread(target=outside_request)
+    thread.start()
+    thread.join()
+    assert outside == ["sem sessão"]
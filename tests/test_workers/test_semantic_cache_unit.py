@@ -0,0 +1,48 @@
+import pytest
+from app.models import TaskType
+from app.utils import metrics
+from app.utils.semantic_cache import SemanticCache, cosine, hashing_embedder
+
+PROMPT = {"system": "Gere features em português.", "user": "Como usuário quero exportar relatórios em PDF e CSV, com filtro por data.", "assistant": ""}
+CONFIG = {"llm": "openai", "model": "gpt-4o-mini", "temperature": 0.7}
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_hashing_embedder_ignora_espacos_caixa_e_acentos():
+    a = hashing_embedder("Exportar  relatórios\nem PDF")
+    assert cosine(a, hashing_embedder("exportar relatorios em pdf")) == pytest.approx(1.0)
+    assert cosine(a, hashing_embedder("cadastrar clientes no sistema")) < 0.2
+
+
+def test_quase_duplicata_reutiliza_e_contexto_diferente_nao():
+    now = [0.0]
+    cache = SemanticCache(threshold=0.8, maxsize=10, ttl=60, enabled=True, clock=lambda: now[0])
+    cache.store(TaskType.FEATURE, PROMPT, CONFIG, '[{"title": "Exportar"}]', 10, 20, "req-1")
+
+    reworded = dict(PROMPT, user="Como usuário, quero exportar relatórios em PDF e CSV com filtro por data!")
+    hit = cache.lookup(TaskType.FEATURE, reworded, CONFIG, request_id="req-2")
+    assert hit.text == '[{"title": "Exportar"}]' and hit.request_id == "req-1" and hit.similarity >= 0.8
+    assert cache.lookup(TaskType.FEATURE, dict(PROMPT, user="Cadastro de clientes com CPF."), CONFIG) is None
+    assert cache.lookup(TaskType.FEATURE, dict(PROMPT, system="Gere features em inglês."), CONFIG) is None
+    assert cache.lookup(TaskType.FEATURE, PROMPT, dict(CONFIG, temperature=0.2)) is None
+    assert cache.lookup(TaskType.USER_STORY, PROMPT, CONFIG) is None
+    assert metrics.get("semantic_cache_requests_total", task_type="feature", result="hit") == 1
+
+    now[0] = 61.0  # TTL vencido
+    assert cache.lookup(TaskType.FEATURE, PROMPT, CONFIG) is None
+
+
+def test_cache_desligado_e_opt_out_por_requisicao(creator, monkeypatch):
+    from app.workers.processors import base
+    cache = SemanticCache(enabled=True)
+    monkeypatch.setattr(base, "semantic_cache", cache)
+    cache.store(TaskType.FEATURE, PROMPT, CONFIG, "[]", 1, 1, "req-1")
+    assert creator._semantic_cache_lookup("req-2", TaskType.FEATURE, PROMPT, CONFIG).request_id == "req-1"
+    assert creator._semantic_cache_lookup("req-2", TaskType.FEATURE, PROMPT, dict(CONFIG, semantic_cache=False)) is None
+    assert SemanticCache(enabled=False).lookup(TaskType.FEATURE, PROMPT, CONFIG) is None